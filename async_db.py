@@ -13,14 +13,21 @@
 # @Author  : relakkes@gmail.com
 # @Time    : 2024/4/6 14:21
 # @Desc    : 异步Aiomysql的增删改查封装
-from typing import Any, Dict, List, Union
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 
 import aiomysql
 
+from tools import utils
+
+# 不参与内容哈希计算的字段，每次爬取都会变化
+CONTENT_HASH_EXCLUDE_FIELDS = ("add_ts", "last_modify_ts")
+
 
 class AsyncMysqlDB:
     def __init__(self, pool: aiomysql.Pool) -> None:
         self.__pool = pool
+        # 每张表 upsert 实际写入和内容没变化跳过的行数
+        self.write_stats: Dict[str, Dict[str, int]] = {}
 
     async def query(self, sql: str, *args: Union[str, int]) -> List[Dict[str, Any]]:
         """
@@ -67,6 +74,193 @@ class AsyncMysqlDB:
                 lastrowid = cur.lastrowid
                 return lastrowid
 
+    async def items_to_table(self, table_name: str, items: List[Dict[str, Any]]) -> int:
+        """
+        批量插入数据，字段相同的记录通过 executemany 合并成一条多行 INSERT，整批在一个事务中提交
+        :param table_name: 表名
+        :param items: 多条记录的字典信息
+        :return: 影响的行数
+        """
+        groups = self.__group_items_by_fields(items)
+        sql_groups = []
+        for fields, rows in groups.items():
+            fieldstr = ','.join([f'`{field}`' for field in fields])
+            valstr = ','.join(['%s'] * len(fields))
+            sql_groups.append(("INSERT INTO %s (%s) VALUES (%s)" % (table_name, fieldstr, valstr), rows))
+        effect_rows, _ = await self.__executemany_in_transaction(sql_groups)
+        return effect_rows
+
+    async def upsert_item(self, table_name: str, item: Dict[str, Any], conflict_fields: Sequence[str],
+                          exclude_update_fields: Sequence[str] = ("add_ts",), hash_field: Optional[str] = None,
+                          hash_exclude_fields: Sequence[str] = (), count_fields: Sequence[str] = ()) -> int:
+        """
+        插入一条记录，命中唯一索引时更新已有记录（INSERT ... ON DUPLICATE KEY UPDATE），一次往返完成
+        :param table_name: 表名
+        :param item: 一条记录的字典信息，不会被修改
+        :param conflict_fields: 唯一索引字段，MySQL 会自动匹配表上的唯一索引，这里只用来排除不需要更新的字段
+        :param exclude_update_fields: 命中唯一索引时不更新的字段，也不参与哈希计算，默认保留首次写入的 add_ts
+        :param hash_field: 保存内容哈希的字段，传入时内容哈希、互动数和平台易变字段都和库里一致的记录不会被更新
+        :param hash_exclude_fields: 每次爬取都可能变化的平台字段，例如小红书的 xsec_token，不参与哈希计算，变化时和互动数一样更新
+        :param count_fields: 互动数字段，不参与哈希计算，只有互动数或平台易变字段变化时只更新它们和不参与哈希的字段
+        :return: 影响的行数，新增为1，更新为2，数据没有变化为0
+        """
+        if hash_field:
+            item = self.__with_content_hash(item, hash_field, hash_exclude_fields, count_fields,
+                                            exclude_update_fields)
+        sql = self.__build_upsert_sql(table_name, list(item.keys()), conflict_fields, exclude_update_fields,
+                                      hash_field, hash_exclude_fields, count_fields)
+        async with self.__pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                rows = await cur.execute(sql, list(item.values()))
+        if hash_field:
+            self.__record_write_stats(table_name, 1, 1 if rows else 0)
+        return rows
+
+    async def upsert_items(self, table_name: str, items: List[Dict[str, Any]], conflict_fields: Sequence[str],
+                           exclude_update_fields: Sequence[str] = ("add_ts",), hash_field: Optional[str] = None,
+                           hash_exclude_fields: Sequence[str] = (), count_fields: Sequence[str] = ()) -> int:
+        """
+        批量 upsert，字段相同的记录通过 executemany 合并成一条多行 INSERT ... ON DUPLICATE KEY UPDATE，整批在一个事务中提交
+        :param table_name: 表名
+        :param items: 多条记录的字典信息，不会被修改
+        :param conflict_fields: 唯一索引字段
+        :param exclude_update_fields: 命中唯一索引时不更新的字段，也不参与哈希计算，默认保留首次写入的 add_ts
+        :param hash_field: 保存内容哈希的字段，传入时内容哈希、互动数和平台易变字段都和库里一致的记录不会被更新
+        :param hash_exclude_fields: 每次爬取都可能变化的平台字段，不参与哈希计算，变化时和互动数一样更新
+        :param count_fields: 互动数字段，不参与哈希计算，只有互动数或平台易变字段变化时只更新它们和不参与哈希的字段
+        :return: 影响的行数
+        """
+        if hash_field:
+            items = [self.__with_content_hash(item, hash_field, hash_exclude_fields, count_fields,
+                                              exclude_update_fields) for item in items]
+        groups = self.__group_items_by_fields(items)
+        sql_groups = [
+            (self.__build_upsert_sql(table_name, list(fields), conflict_fields, exclude_update_fields,
+                                     hash_field, hash_exclude_fields, count_fields), rows)
+            for fields, rows in groups.items()
+        ]
+        if not hash_field:
+            effect_rows, _ = await self.__executemany_in_transaction(sql_groups)
+            return effect_rows
+        # 多行 upsert 的影响行数里新增算1、更新算2、没有变化算0，在同一个事务里先数出已经存在的记录数，
+        # 新增的行数 = 总数 - 已存在数，更新的行数 = (影响行数 - 新增的行数) / 2
+        effect_rows, existing = await self.__executemany_in_transaction(
+            sql_groups, self.__build_count_existing_sql(table_name, conflict_fields, items)
+        )
+        inserted = len(items) - existing
+        updated = max(effect_rows - inserted, 0) // 2
+        self.__record_write_stats(table_name, len(items), min(inserted + updated, len(items)))
+        return effect_rows
+
+    @staticmethod
+    def __with_content_hash(item: Dict[str, Any], hash_field: str, hash_exclude_fields: Sequence[str],
+                            count_fields: Sequence[str], exclude_update_fields: Sequence[str]) -> Dict[str, Any]:
+        """
+        复制一份记录并写入内容哈希，时间戳、平台易变字段、互动数和不更新的字段不参与计算
+        """
+        exclude_fields = ((hash_field,) + CONTENT_HASH_EXCLUDE_FIELDS + tuple(hash_exclude_fields) + tuple(count_fields)
+                          + tuple(exclude_update_fields))
+        return dict(item, **{hash_field: utils.compute_content_hash(item, exclude_fields)})
+
+    def __record_write_stats(self, table_name: str, total: int, written: int):
+        """
+        记录实际写入和内容没有变化跳过的行数
+        """
+        stats = self.write_stats.setdefault(table_name, {"written": 0, "skipped": 0})
+        stats["written"] += written
+        stats["skipped"] += total - written
+
+    @staticmethod
+    def __build_upsert_sql(table_name: str, fields: List[str], conflict_fields: Sequence[str],
+                           exclude_update_fields: Sequence[str], hash_field: Optional[str] = None,
+                           hash_exclude_fields: Sequence[str] = (), count_fields: Sequence[str] = ()) -> str:
+        """
+        生成 INSERT ... ON DUPLICATE KEY UPDATE 语句，没有需要更新的字段时退化为 INSERT IGNORE
+        VALUES 后面的空格不能省略，aiomysql 的 executemany 靠它识别并合并成一条多行 INSERT
+        传入 hash_field 时只在内容哈希、互动数或平台易变字段变化时更新：参与哈希的字段只在哈希变化时改写，
+        时间戳这类不参与哈希的字段在这一行有变化时改写；MySQL 按顺序赋值，后面的表达式读到的是已经更新的值，
+        所以先写依赖旧值判断的字段，互动数和平台易变字段直接取新值放在后面，哈希字段放在最后
+        """
+        fieldstr = ','.join([f'`{field}`' for field in fields])
+        valstr = ','.join(['%s'] * len(fields))
+        update_fields = [field for field in fields if field not in conflict_fields and field not in exclude_update_fields]
+        if not update_fields:
+            return "INSERT IGNORE INTO %s (%s) VALUES (%s)" % (table_name, fieldstr, valstr)
+        if not hash_field:
+            updatestr = ','.join([f'`{field}`=VALUES(`{field}`)' for field in update_fields])
+            return "INSERT INTO %s (%s) VALUES (%s) ON DUPLICATE KEY UPDATE %s" % (table_name, fieldstr, valstr, updatestr)
+
+        unhashed_fields = (hash_field,) + CONTENT_HASH_EXCLUDE_FIELDS + tuple(hash_exclude_fields) + tuple(count_fields)
+        # 互动数和平台易变字段没变化时赋的是原值，不影响行是否被更新
+        refresh_fields = [field for field in update_fields if field in count_fields or field in hash_exclude_fields]
+        hash_unchanged = f'`{hash_field}` <=> VALUES(`{hash_field}`)'
+        unchanged = " AND ".join([hash_unchanged] + [f'`{field}` <=> VALUES(`{field}`)' for field in refresh_fields])
+        updates = []
+        for field in update_fields:
+            if field == hash_field or field in refresh_fields:
+                continue
+            if field in unhashed_fields:
+                updates.append(f'`{field}`=IF({unchanged}, `{field}`, VALUES(`{field}`))')
+            else:
+                updates.append(f'`{field}`=IF({hash_unchanged}, `{field}`, VALUES(`{field}`))')
+        updates += [f'`{field}`=VALUES(`{field}`)' for field in refresh_fields]
+        updates.append(f'`{hash_field}`=VALUES(`{hash_field}`)')
+        return "INSERT INTO %s (%s) VALUES (%s) ON DUPLICATE KEY UPDATE %s" % (table_name, fieldstr, valstr, ','.join(updates))
+
+    @staticmethod
+    def __build_count_existing_sql(table_name: str, conflict_fields: Sequence[str],
+                                   items: List[Dict[str, Any]]) -> Tuple[str, list]:
+        """
+        生成统计这批记录里已经在表中存在的记录数的 sql，同一批里重复的唯一键只算一次
+        """
+        keys = list(dict.fromkeys(tuple(item.get(field) for field in conflict_fields) for item in items))
+        fieldstr = ','.join([f'`{field}`' for field in conflict_fields])
+        rowstr = '(%s)' % ','.join(['%s'] * len(conflict_fields))
+        sql = "SELECT COUNT(*) FROM %s WHERE (%s) IN (%s)" % (table_name, fieldstr, ','.join([rowstr] * len(keys)))
+        return sql, [value for key in keys for value in key]
+
+    @staticmethod
+    def __group_items_by_fields(items: List[Dict[str, Any]]) -> Dict[tuple, List[list]]:
+        """
+        按字段列表分组，executemany 要求同一条 sql 的每行参数字段一致
+        """
+        groups: Dict[tuple, List[list]] = {}
+        for item in items:
+            groups.setdefault(tuple(item.keys()), []).append(list(item.values()))
+        return groups
+
+    async def __executemany_in_transaction(self, sql_groups: List[tuple],
+                                           count_sql: Optional[Tuple[str, list]] = None) -> Tuple[int, int]:
+        """
+        在同一个连接、同一个事务中执行多组 executemany
+        :param sql_groups: [(sql, 参数列表), ...]
+        :param count_sql: 写入前在同一个事务里先执行的 COUNT 查询 (sql, 参数)
+        :return: 影响的总行数，COUNT 查询的结果（没有传 count_sql 时为0）
+        """
+        if not sql_groups:
+            return 0, 0
+        effect_rows = 0
+        count = 0
+        async with self.__pool.acquire() as conn:
+            if len(sql_groups) == 1 and not count_sql:
+                # 只有一组时就是一条多行 INSERT，本身是原子的，省掉 begin/commit 的额外往返
+                sql, rows = sql_groups[0]
+                async with conn.cursor() as cur:
+                    return await cur.executemany(sql, rows) or 0, 0
+            await conn.begin()
+            try:
+                async with conn.cursor() as cur:
+                    if count_sql:
+                        await cur.execute(*count_sql)
+                        count = (await cur.fetchone())[0]
+                    for sql, rows in sql_groups:
+                        effect_rows += await cur.executemany(sql, rows) or 0
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+        return effect_rows, count
+
     async def update_table(self, table_name: str, updates: Dict[str, Any], field_where: str,
                            value_where: Union[str, int, float]) -> int:
         """
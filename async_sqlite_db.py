@@ -13,14 +13,159 @@
 # @Author  : relakkes@gmail.com
 # @Time    : 2024/4/6 14:21
 # @Desc    : 异步SQLite的增删改查封装
-from typing import Any, Dict, List, Union
+#             长驻一个WAL模式的写连接，写操作按条数或时间批量提交事务；读操作使用一个小的只读连接池
+import asyncio
+from typing import Any, Dict, List, Optional, Sequence, Union
 
 import aiosqlite
 
+from tools import utils
+
+# 不参与内容哈希计算的字段，每次爬取都会变化
+CONTENT_HASH_EXCLUDE_FIELDS = ("add_ts", "last_modify_ts")
+
 
 class AsyncSqliteDB:
-    def __init__(self, db_path: str) -> None:
+    def __init__(self, db_path: str, write_batch_size: int = 200, write_flush_interval: float = 1.0,
+                 read_pool_size: int = 2, cache_size_kb: int = 64000) -> None:
+        """
+        Args:
+            db_path: sqlite数据库文件路径
+            write_batch_size: 累计多少条写操作提交一次事务
+            write_flush_interval: 距离上次提交超过多少秒后自动提交事务
+            read_pool_size: 只读连接池大小
+            cache_size_kb: 每个连接的 page cache 大小（KB）
+        """
         self.__db_path = db_path
+        self.__write_batch_size = max(write_batch_size, 1)
+        self.__write_flush_interval = write_flush_interval
+        self.__read_pool_size = max(read_pool_size, 1)
+        self.__cache_size_kb = cache_size_kb
+        self.__writer: Optional[aiosqlite.Connection] = None
+        self.__write_lock: Optional[asyncio.Lock] = None
+        self.__pending_writes = 0
+        self.__flush_task: Optional[asyncio.Task] = None
+        self.__readers: List[aiosqlite.Connection] = []
+        self.__idle_readers: Optional[asyncio.Queue] = None
+        # 每张表 upsert 实际写入和内容没变化跳过的行数
+        self.write_stats: Dict[str, Dict[str, int]] = {}
+
+    async def __connect(self) -> aiosqlite.Connection:
+        """
+        创建一个设置好 pragma 的连接
+        :return:
+        """
+        conn = await aiosqlite.connect(self.__db_path)
+        conn.row_factory = aiosqlite.Row
+        await conn.execute("PRAGMA journal_mode=WAL")
+        await conn.execute("PRAGMA synchronous=NORMAL")
+        await conn.execute(f"PRAGMA cache_size=-{self.__cache_size_kb}")
+        await conn.execute("PRAGMA temp_store=MEMORY")
+        await conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    async def __get_writer(self) -> aiosqlite.Connection:
+        """
+        获取长驻的写连接，不存在则创建，并启动定时提交任务
+        :return:
+        """
+        if self.__writer is None:
+            self.__writer = await self.__connect()
+        if self.__flush_task is None or self.__flush_task.done():
+            self.__flush_task = asyncio.create_task(self.__flush_periodically())
+        return self.__writer
+
+    def __get_write_lock(self) -> asyncio.Lock:
+        if self.__write_lock is None:
+            self.__write_lock = asyncio.Lock()
+        return self.__write_lock
+
+    async def __flush_periodically(self):
+        """
+        定时提交未提交的写操作，保证数据落盘的延迟有上限
+        :return:
+        """
+        while True:
+            await asyncio.sleep(self.__write_flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                utils.logger.error(f"[AsyncSqliteDB.__flush_periodically] commit error: {e}")
+
+    async def __commit(self):
+        """
+        提交当前写事务，调用方需要持有写锁
+        :return:
+        """
+        if self.__writer is not None and self.__pending_writes > 0:
+            await self.__writer.commit()
+            self.__pending_writes = 0
+
+    async def __acquire_reader(self) -> aiosqlite.Connection:
+        """
+        从只读连接池获取一个连接，连接数未达到上限时新建
+        :return:
+        """
+        if self.__idle_readers is None:
+            self.__idle_readers = asyncio.Queue()
+        if self.__idle_readers.empty() and len(self.__readers) < self.__read_pool_size:
+            conn = await self.__connect()
+            self.__readers.append(conn)
+            return conn
+        return await self.__idle_readers.get()
+
+    async def __read(self, sql: str, args: tuple, fetch_one: bool) -> Any:
+        """
+        执行查询，有未提交的写操作时走写连接，保证能读到自己刚写入的数据
+        :param sql:
+        :param args:
+        :param fetch_one:
+        :return:
+        """
+        if self.__pending_writes > 0:
+            async with self.__get_write_lock():
+                if self.__pending_writes > 0:
+                    async with self.__writer.execute(sql, args) as cursor:
+                        return await (cursor.fetchone() if fetch_one else cursor.fetchall())
+
+        conn = await self.__acquire_reader()
+        try:
+            async with conn.execute(sql, args) as cursor:
+                return await (cursor.fetchone() if fetch_one else cursor.fetchall())
+        finally:
+            self.__idle_readers.put_nowait(conn)
+
+    async def __write(self, sql: str, args: Union[tuple, list]) -> aiosqlite.Cursor:
+        """
+        在写连接上执行一条写语句，累计条数达到阈值时提交事务
+        :param sql:
+        :param args:
+        :return:
+        """
+        async with self.__get_write_lock():
+            conn = await self.__get_writer()
+            cursor = await conn.execute(sql, args)
+            await cursor.close()
+            self.__pending_writes += 1
+            if self.__pending_writes >= self.__write_batch_size:
+                await self.__commit()
+            return cursor
+
+    async def __write_many(self, sql: str, seq_of_args: List[list]) -> int:
+        """
+        在写连接上用 executemany 执行一批写语句，这一批写入落在同一个事务中
+        :param sql:
+        :param seq_of_args:
+        :return: 影响的行数
+        """
+        async with self.__get_write_lock():
+            conn = await self.__get_writer()
+            cursor = await conn.executemany(sql, seq_of_args)
+            await cursor.close()
+            self.__pending_writes += len(seq_of_args)
+            if self.__pending_writes >= self.__write_batch_size:
+                await self.__commit()
+            return cursor.rowcount
 
     async def query(self, sql: str, *args: Union[str, int]) -> List[Dict[str, Any]]:
         """
@@ -29,11 +174,8 @@ class AsyncSqliteDB:
         :param args: sql中传递动态参数列表
         :return:
         """
-        async with aiosqlite.connect(self.__db_path) as conn:
-            conn.row_factory = aiosqlite.Row
-            async with conn.execute(sql, args) as cursor:
-                rows = await cursor.fetchall()
-                return [dict(row) for row in rows] if rows else []
+        rows = await self.__read(sql, args, fetch_one=False)
+        return [dict(row) for row in rows] if rows else []
 
     async def get_first(self, sql: str, *args: Union[str, int]) -> Union[Dict[str, Any], None]:
         """
@@ -42,11 +184,8 @@ class AsyncSqliteDB:
         :param args:sql中传递动态参数列表
         :return:
         """
-        async with aiosqlite.connect(self.__db_path) as conn:
-            conn.row_factory = aiosqlite.Row
-            async with conn.execute(sql, args) as cursor:
-                row = await cursor.fetchone()
-                return dict(row) if row else None
+        row = await self.__read(sql, args, fetch_one=True)
+        return dict(row) if row else None
 
     async def item_to_table(self, table_name: str, item: Dict[str, Any]) -> int:
         """
@@ -60,10 +199,134 @@ class AsyncSqliteDB:
         fieldstr = ','.join(fields)
         valstr = ','.join(['?'] * len(item))
         sql = f"INSERT INTO {table_name} ({fieldstr}) VALUES({valstr})"
-        async with aiosqlite.connect(self.__db_path) as conn:
-            async with conn.execute(sql, values) as cursor:
-                await conn.commit()
-                return cursor.lastrowid
+        cursor = await self.__write(sql, values)
+        return cursor.lastrowid
+
+    async def items_to_table(self, table_name: str, items: List[Dict[str, Any]]) -> int:
+        """
+        批量插入数据，字段相同的记录通过一次 executemany 写入
+        :param table_name: 表名
+        :param items: 多条记录的字典信息
+        :return: 影响的行数
+        """
+        effect_rows = 0
+        for fields, rows in self.__group_items_by_fields(items).items():
+            fieldstr = ','.join(fields)
+            valstr = ','.join(['?'] * len(fields))
+            sql = f"INSERT INTO {table_name} ({fieldstr}) VALUES({valstr})"
+            effect_rows += await self.__write_many(sql, rows)
+        return effect_rows
+
+    async def upsert_item(self, table_name: str, item: Dict[str, Any], conflict_fields: Sequence[str],
+                          exclude_update_fields: Sequence[str] = ("add_ts",), hash_field: Optional[str] = None,
+                          hash_exclude_fields: Sequence[str] = (), count_fields: Sequence[str] = ()) -> int:
+        """
+        插入一条记录，命中唯一索引时更新已有记录（INSERT ... ON CONFLICT DO UPDATE），一次往返完成
+        :param table_name: 表名
+        :param item: 一条记录的字典信息，不会被修改
+        :param conflict_fields: 唯一索引字段，需要与表上的唯一索引一致
+        :param exclude_update_fields: 命中唯一索引时不更新的字段，也不参与哈希计算，默认保留首次写入的 add_ts
+        :param hash_field: 保存内容哈希的字段，传入时内容哈希、互动数和平台易变字段都和库里一致的记录不会被更新
+        :param hash_exclude_fields: 每次爬取都可能变化的平台字段，例如小红书的 xsec_token，不参与哈希计算，变化时和互动数一样更新
+        :param count_fields: 互动数字段，不参与哈希计算，只有互动数或平台易变字段变化时只更新它们和不参与哈希的字段
+        :return: 影响的行数，内容没有变化时为0
+        """
+        if hash_field:
+            item = self.__with_content_hash(item, hash_field, hash_exclude_fields, count_fields,
+                                            exclude_update_fields)
+        sql = self.__build_upsert_sql(table_name, list(item.keys()), conflict_fields, exclude_update_fields,
+                                      hash_field, hash_exclude_fields, count_fields)
+        cursor = await self.__write(sql, list(item.values()))
+        if hash_field:
+            self.__record_write_stats(table_name, 1, cursor.rowcount)
+        return cursor.rowcount
+
+    async def upsert_items(self, table_name: str, items: List[Dict[str, Any]], conflict_fields: Sequence[str],
+                           exclude_update_fields: Sequence[str] = ("add_ts",), hash_field: Optional[str] = None,
+                           hash_exclude_fields: Sequence[str] = (), count_fields: Sequence[str] = ()) -> int:
+        """
+        批量 upsert，字段相同的记录通过一次 executemany 写入
+        :param table_name: 表名
+        :param items: 多条记录的字典信息，不会被修改
+        :param conflict_fields: 唯一索引字段，需要与表上的唯一索引一致
+        :param exclude_update_fields: 命中唯一索引时不更新的字段，也不参与哈希计算，默认保留首次写入的 add_ts
+        :param hash_field: 保存内容哈希的字段，传入时内容哈希、互动数和平台易变字段都和库里一致的记录不会被更新
+        :param hash_exclude_fields: 每次爬取都可能变化的平台字段，不参与哈希计算，变化时和互动数一样更新
+        :param count_fields: 互动数字段，不参与哈希计算，只有互动数或平台易变字段变化时只更新它们和不参与哈希的字段
+        :return: 影响的行数
+        """
+        if hash_field:
+            items = [self.__with_content_hash(item, hash_field, hash_exclude_fields, count_fields,
+                                              exclude_update_fields) for item in items]
+        effect_rows = 0
+        for fields, rows in self.__group_items_by_fields(items).items():
+            sql = self.__build_upsert_sql(table_name, list(fields), conflict_fields, exclude_update_fields,
+                                          hash_field, hash_exclude_fields, count_fields)
+            effect_rows += await self.__write_many(sql, rows)
+        if hash_field:
+            self.__record_write_stats(table_name, len(items), effect_rows)
+        return effect_rows
+
+    @staticmethod
+    def __with_content_hash(item: Dict[str, Any], hash_field: str, hash_exclude_fields: Sequence[str],
+                            count_fields: Sequence[str], exclude_update_fields: Sequence[str]) -> Dict[str, Any]:
+        """
+        复制一份记录并写入内容哈希，时间戳、平台易变字段、互动数和不更新的字段不参与计算
+        """
+        exclude_fields = ((hash_field,) + CONTENT_HASH_EXCLUDE_FIELDS + tuple(hash_exclude_fields) + tuple(count_fields)
+                          + tuple(exclude_update_fields))
+        return dict(item, **{hash_field: utils.compute_content_hash(item, exclude_fields)})
+
+    def __record_write_stats(self, table_name: str, total: int, written: int):
+        """
+        记录实际写入和内容没有变化跳过的行数，跳过的行不计入 SQLite 的影响行数
+        """
+        stats = self.write_stats.setdefault(table_name, {"written": 0, "skipped": 0})
+        stats["written"] += written
+        stats["skipped"] += total - written
+
+    @staticmethod
+    def __build_upsert_sql(table_name: str, fields: List[str], conflict_fields: Sequence[str],
+                           exclude_update_fields: Sequence[str], hash_field: Optional[str] = None,
+                           hash_exclude_fields: Sequence[str] = (), count_fields: Sequence[str] = ()) -> str:
+        """
+        生成 INSERT ... ON CONFLICT 语句，没有需要更新的字段时使用 DO NOTHING
+        传入 hash_field 时只在内容哈希、互动数或平台易变字段变化时更新：参与哈希的字段只在哈希变化时改写，
+        互动数、平台易变字段、时间戳这类不参与哈希的字段在这一行需要更新时总是改写
+        """
+        fieldstr = ','.join([f'"{field}"' for field in fields])
+        valstr = ','.join(['?'] * len(fields))
+        conflictstr = ','.join([f'"{field}"' for field in conflict_fields])
+        update_fields = [field for field in fields if field not in conflict_fields and field not in exclude_update_fields]
+        if not update_fields:
+            return f"INSERT INTO {table_name} ({fieldstr}) VALUES({valstr}) ON CONFLICT({conflictstr}) DO NOTHING"
+        if not hash_field:
+            updatestr = ','.join([f'"{field}"=excluded."{field}"' for field in update_fields])
+            return f"INSERT INTO {table_name} ({fieldstr}) VALUES({valstr}) ON CONFLICT({conflictstr}) DO UPDATE SET {updatestr}"
+
+        unhashed_fields = (hash_field,) + CONTENT_HASH_EXCLUDE_FIELDS + tuple(hash_exclude_fields) + tuple(count_fields)
+        hash_unchanged = f'"{hash_field}" IS excluded."{hash_field}"'
+        updates = []
+        for field in update_fields:
+            if field in unhashed_fields:
+                updates.append(f'"{field}"=excluded."{field}"')
+            else:
+                updates.append(f'"{field}"=CASE WHEN {hash_unchanged} THEN "{field}" ELSE excluded."{field}" END')
+        changed = [f'"{hash_field}" IS NOT excluded."{hash_field}"']
+        changed += [f'"{field}" IS NOT excluded."{field}"'
+                    for field in tuple(count_fields) + tuple(hash_exclude_fields) if field in update_fields]
+        return (f"INSERT INTO {table_name} ({fieldstr}) VALUES({valstr}) ON CONFLICT({conflictstr}) "
+                f"DO UPDATE SET {','.join(updates)} WHERE {' OR '.join(changed)}")
+
+    @staticmethod
+    def __group_items_by_fields(items: List[Dict[str, Any]]) -> Dict[tuple, List[list]]:
+        """
+        按字段列表分组，executemany 要求同一条 sql 的每行参数字段一致
+        """
+        groups: Dict[tuple, List[list]] = {}
+        for item in items:
+            groups.setdefault(tuple(item.keys()), []).append(list(item.values()))
+        return groups
 
     async def update_table(self, table_name: str, updates: Dict[str, Any], field_where: str,
                            value_where: Union[str, int, float]) -> int:
@@ -83,10 +346,8 @@ class AsyncSqliteDB:
         upsets_str = ','.join(upsets)
         values.append(value_where)
         sql = f'UPDATE {table_name} SET {upsets_str} WHERE {field_where}=?'
-        async with aiosqlite.connect(self.__db_path) as conn:
-            async with conn.execute(sql, values) as cursor:
-                await conn.commit()
-                return cursor.rowcount
+        cursor = await self.__write(sql, values)
+        return cursor.rowcount
 
     async def execute(self, sql: str, *args: Union[str, int]) -> int:
         """
@@ -95,10 +356,8 @@ class AsyncSqliteDB:
         :param args:
         :return:
         """
-        async with aiosqlite.connect(self.__db_path) as conn:
-            async with conn.execute(sql, args) as cursor:
-                await conn.commit()
-                return cursor.rowcount
+        cursor = await self.__write(sql, args)
+        return cursor.rowcount
 
     async def executescript(self, sql_script: str) -> None:
         """
@@ -106,6 +365,33 @@ class AsyncSqliteDB:
         :param sql_script: SQL脚本内容
         :return:
         """
-        async with aiosqlite.connect(self.__db_path) as conn:
+        async with self.__get_write_lock():
+            conn = await self.__get_writer()
+            await self.__commit()
             await conn.executescript(sql_script)
-            await conn.commit()
\ No newline at end of file
+            await conn.commit()
+
+    async def flush(self):
+        """
+        立即提交所有未提交的写操作
+        :return:
+        """
+        async with self.__get_write_lock():
+            await self.__commit()
+
+    async def close(self):
+        """
+        提交未提交的写操作，并关闭所有连接
+        :return:
+        """
+        if self.__flush_task is not None:
+            self.__flush_task.cancel()
+            self.__flush_task = None
+        if self.__writer is not None:
+            await self.__commit()
+            await self.__writer.close()
+            self.__writer = None
+        for conn in self.__readers:
+            await conn.close()
+        self.__readers = []
+        self.__idle_readers = None
@@ -10,7 +10,7 @@
 
 
 from abc import ABC, abstractmethod
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 
 from playwright.async_api import BrowserContext, BrowserType, Playwright
 
@@ -91,6 +91,18 @@ class AbstractStore(ABC):
     async def store_comment(self, comment_item: Dict):
         pass
 
+    async def store_comments(self, comment_items: List[Dict]):
+        """
+        批量存储评论，默认逐条调用 store_comment，支持批量写入的存储实现（db、sqlite）会覆盖该方法
+        Args:
+            comment_items: comment item list
+
+        Returns:
+
+        """
+        for comment_item in comment_items:
+            await self.store_comment(comment_item)
+
     # TODO support all platform
     # only xhs is supported, so @abstractmethod is commented
     @abstractmethod
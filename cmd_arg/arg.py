@@ -31,12 +31,16 @@ async def parse_cmd():
                         help='please input keywords', default=config.KEYWORDS)
     parser.add_argument('--max_notes', type=int,
                         help='maximum number of notes to crawl', default=config.CRAWLER_MAX_NOTES_COUNT)
+    parser.add_argument('--keyword_workers', type=int,
+                        help='number of keywords searched concurrently', default=config.KEYWORD_WORKERS)
+    parser.add_argument('--resume', action='store_true',
+                        help='resume from the last unfinished crawl checkpoint', default=config.CRAWLER_RESUME)
     parser.add_argument('--get_comment', type=str2bool,
                         help='''whether to crawl level one comment, supported values case insensitive ('yes', 'true', 't', 'y', '1', 'no', 'false', 'f', 'n', '0')''', default=config.ENABLE_GET_COMMENTS)
     parser.add_argument('--get_sub_comment', type=str2bool,
                         help=''''whether to crawl level two comment, supported values case insensitive ('yes', 'true', 't', 'y', '1', 'no', 'false', 'f', 'n', '0')''', default=config.ENABLE_GET_SUB_COMMENTS)
     parser.add_argument('--save_data_option', type=str,
-                        help='where to save the data (csv or db or json or sqlite)', choices=['csv', 'db', 'json', 'sqlite'], default=config.SAVE_DATA_OPTION)
+                        help='where to save the data (csv or db or json or jsonl or sqlite)', choices=['csv', 'db', 'json', 'jsonl', 'sqlite'], default=config.SAVE_DATA_OPTION)
     parser.add_argument('--cookies', type=str,
                         help='cookies used for cookie login type', default=config.COOKIES)
     parser.add_argument('--QURL', type=str,
@@ -57,6 +61,8 @@ async def parse_cmd():
     config.START_PAGE = args.start
     config.KEYWORDS = args.keywords
     config.CRAWLER_MAX_NOTES_COUNT = args.max_notes
+    config.KEYWORD_WORKERS = args.keyword_workers
+    config.CRAWLER_RESUME = args.resume
     config.ENABLE_GET_COMMENTS = args.get_comment
     config.ENABLE_GET_SUB_COMMENTS = args.get_sub_comment
     config.SAVE_DATA_OPTION = args.save_data_option
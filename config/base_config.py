@@ -62,8 +62,73 @@ BROWSER_LAUNCH_TIMEOUT = 30
 # 设置为False可以保持浏览器运行，便于调试
 AUTO_CLOSE_BROWSER = True
 
-# 数据保存类型选项配置,支持四种类型：csv、db、json、sqlite, 最好保存到DB，有排重的功能。
-SAVE_DATA_OPTION = "json"  # csv or db or json or sqlite
+# 数据保存类型选项配置,支持五种类型：csv、db、json、jsonl、sqlite, 最好保存到DB，有排重的功能。
+# jsonl 每条数据追加一行，不会像 json 一样每写一条就重写整个文件，适合评论量大的场景
+SAVE_DATA_OPTION = "json"  # csv or db or json or jsonl or sqlite
+
+# jsonl 存储模式下，程序结束时是否额外导出一份旧版 json 数组格式的文件
+JSONL_EXPORT_JSON_ON_CLOSE = False
+
+# csv 存储模式下单个文件的最大大小（MB），超过后自动切换到新的分片文件，0 表示不按大小切分（文件始终按日期切换）
+CSV_ROLL_FILE_SIZE_MB = 0
+
+# 是否开启异步写入队列（write-behind），开启后爬取协程只把数据放入队列，由后台任务批量写入，存储慢时不会阻塞爬取
+ENABLE_WRITE_BEHIND = False
+
+# 写入队列最大长度，队列满时爬取协程会等待（背压）
+WRITE_BEHIND_QUEUE_SIZE = 1000
+
+# 后台写入任务数量
+WRITE_BEHIND_WORKERS = 1
+
+# 后台写入任务每次最多合并写入的数据条数
+WRITE_BEHIND_BATCH_SIZE = 100
+
+# 写入队列统计日志（队列长度、写入延迟）的输出间隔，单位秒，0 表示不输出
+WRITE_BEHIND_REPORT_INTERVAL = 60
+
+# httpx 连接池：每个平台的 API 客户端复用一个长驻的 AsyncClient，不再为每个请求重新建立 TCP/TLS 连接
+# 连接池最大连接数
+HTTPX_MAX_CONNECTIONS = 100
+
+# 连接池最多保留的 keep-alive 空闲连接数
+HTTPX_MAX_KEEPALIVE_CONNECTIONS = 20
+
+# keep-alive 空闲连接的过期时间，单位秒
+HTTPX_KEEPALIVE_EXPIRY = 30
+
+# 是否开启 HTTP/2，需要额外安装 h2（pip install httpx[http2]），未安装时自动回退到 HTTP/1.1
+HTTPX_ENABLE_HTTP2 = False
+
+# 代理轮换时最多保留多少个代理对应的 AsyncClient，超出时关闭最久未使用的
+HTTPX_MAX_PROXY_CLIENTS = 4
+
+# 抖音 a_bogus、知乎 x-zse-96 等 JS 签名使用常驻的 Node 进程池计算，每个签名脚本启动的进程数量
+JS_SIGN_POOL_SIZE = 2
+
+# 单个签名进程同时在途的签名请求数
+JS_SIGN_WORKER_CONCURRENCY = 16
+
+# 是否开启自适应限速，开启后按 平台+接口+账号/代理 的令牌桶控制请求速率，遇到封禁/验证码时自动降速，持续成功时逐步提速
+# 关闭时使用原来各处固定的随机等待
+ENABLE_RATE_LIMIT = True
+
+# 每个令牌桶的初始速率，单位：请求数/秒
+RATE_LIMIT_INITIAL_RATE = 1.0
+
+# 速率下限和上限，单位：请求数/秒
+RATE_LIMIT_MIN_RATE = 0.1
+RATE_LIMIT_MAX_RATE = 5.0
+
+# 令牌桶容量，允许的突发请求数
+RATE_LIMIT_BURST = 2
+
+# 连续成功多少次后提速一次，每次提速增加的速率
+RATE_LIMIT_SUCCESS_THRESHOLD = 10
+RATE_LIMIT_INCREASE_STEP = 0.1
+
+# 遇到限流信号时速率乘以的系数
+RATE_LIMIT_DECREASE_FACTOR = 0.5
 
 # 用户浏览器缓存的浏览器文件配置
 USER_DATA_DIR = "%s_user_data_dir"  # %s will be replaced by platform name
@@ -74,15 +139,98 @@ START_PAGE = 1
 # 爬取视频/帖子的数量控制
 CRAWLER_MAX_NOTES_COUNT = 200
 
-# 并发爬虫数量控制
+# 帖子数量控制的范围：keyword 表示每个关键词各自最多爬取 CRAWLER_MAX_NOTES_COUNT 个，global 表示所有关键词加起来；
+# 只计算存储成功的帖子，已经被其他关键词抓取过、详情请求失败或最近抓取过而跳过的帖子不计数
+CRAWLER_MAX_NOTES_COUNT_SCOPE = "keyword"
+
+# 同时搜索的关键词数量，1 表示逐个关键词搜索；多个关键词共用并发调度器和限速器
+KEYWORD_WORKERS = 1
+
+# 并发爬虫数量控制（API 请求的并发上限，整个爬取过程共用）
 MAX_CONCURRENCY_NUM = 1
 
+# 全局并发调度器：所有请求（API、媒体文件、HTML 页面）加起来的并发上限
+SCHEDULER_MAX_CONCURRENCY = 8
+
+# 媒体文件（图片、视频）下载的并发上限
+SCHEDULER_MEDIA_CONCURRENCY = 4
+
+# HTML 页面请求的并发上限
+SCHEDULER_PAGE_CONCURRENCY = 2
+
+# 单个域名的并发上限
+SCHEDULER_PER_HOST_CONCURRENCY = 4
+
+# 调度器统计日志的输出间隔（秒），<=0 表示不输出
+SCHEDULER_REPORT_INTERVAL = 60
+
+# 搜索流水线（翻页 -> 详情 -> 存储/媒体/评论）各阶段之间的队列长度，队列满时上游等待
+SEARCH_PIPELINE_QUEUE_SIZE = 20
+
+# 搜索流水线中详情、评论、媒体阶段各自的处理任务数量，实际请求并发仍由调度器控制
+SEARCH_PIPELINE_WORKERS = 4
+
+# 是否开启已抓取ID索引：按平台记录抓取过详情、评论的帖子并保存到 SQLite 文件，
+# 之后的关键词或下次运行在新鲜期内再次搜到同一个帖子时，跳过详情和评论请求
+ENABLE_SEEN_INDEX = False
+
+# 已抓取ID索引的新鲜期（小时），超过新鲜期的帖子会重新抓取，<=0 表示只在本次运行内去重
+SEEN_INDEX_FRESH_HOURS = 24
+
+# 是否记录爬取进度（关键词页码、创作者翻页游标、评论游标），程序中途退出后可以用 --resume 从记录的位置继续
+ENABLE_CHECKPOINT = True
+
+# 是否从上次记录的进度继续爬取，不开启时会丢弃上次的记录重新开始
+CRAWLER_RESUME = False
+
 # 是否开启爬图片模式, 默认不开启爬图片
 ENABLE_GET_IMAGES = False
 
+# 流式下载图片、视频时每次读取写入的块大小（字节），每个下载占用的内存约为一个块
+MEDIA_DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# 下载图片、视频时输出进度日志的间隔（秒），<=0 表示只在下载完成时输出
+MEDIA_DOWNLOAD_PROGRESS_INTERVAL = 5
+
+# 视频分段下载时单个文件的并发连接数，<=1 表示不分段
+MEDIA_RANGE_CONNECTIONS_PER_FILE = 4
+
+# 所有分段下载共用的最大连接数
+MEDIA_DOWNLOAD_MAX_CONNECTIONS = 8
+
+# 超过多少字节的文件才分段下载，较小的文件直接单连接下载
+MEDIA_RANGE_MIN_SIZE = 8 * 1024 * 1024
+
+# 分段下载时每个分段连接断开后的重试次数
+MEDIA_RANGE_RETRIES = 3
+
+# 是否开启媒体文件库：图片、视频按资源ID（小红书 trace id、微博 pid、B站 cid）只保存一份，
+# 已经保存过的资源不再下载，帖子目录下用硬链接指向资源文件；目前支持 xhs、wb、bili
+ENABLE_MEDIA_STORE = False
+
+# 媒体文件库的资源文件保存目录
+MEDIA_STORE_DIR = "data/media_assets"
+
+# 是否记录并校验媒体资源的 sha256，开启后跳过下载前会重新计算文件哈希，校验失败时重新下载
+MEDIA_STORE_VERIFY_HASH = False
+
 # 是否开启爬评论模式, 默认开启爬评论
 ENABLE_GET_COMMENTS = True
 
+# 是否开启增量评论爬取：记录每个帖子已经抓到的最新评论，下次爬取翻到一整页都是已知评论时停止翻页
+# 目前支持 xhs、bili（开启后按时间排序翻页）、wb
+ENABLE_INCREMENTAL_COMMENTS = False
+
+# 是否记录互动数快照：每次爬到帖子时把点赞、收藏、评论、分享、播放数追加到快照表，用来查看增长曲线
+# 目前支持 xhs、dy、ks、bili、wb
+ENABLE_COUNT_SNAPSHOT = False
+
+# 互动数快照保存多少天之后开始压缩，<=0 表示不压缩
+COUNT_SNAPSHOT_COMPACT_AFTER_DAYS = 7
+
+# 压缩后每个帖子每多少小时只保留一条快照
+COUNT_SNAPSHOT_COMPACT_BUCKET_HOURS = 24
+
 # 爬取一级评论的数量控制(单视频/帖子)
 CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES = 10
 
@@ -90,6 +238,12 @@ CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES = 10
 # 老版本项目使用了 db, 则需参考 schema/tables.sql line 287 增加表字段
 ENABLE_GET_SUB_COMMENTS = False
 
+# 爬取二级评论的数量控制(单视频/帖子)，<=0 表示不限制
+CRAWLER_MAX_SUB_COMMENTS_COUNT_SINGLENOTES = 200
+
+# 每条一级评论最多翻多少页二级评论，<=0 表示不限制
+CRAWLER_MAX_SUB_COMMENTS_PAGES = 10
+
 # 词云相关
 # 是否开启生成评论词云图
 ENABLE_GET_WORDCLOUD = False
@@ -45,3 +45,9 @@ CRAWLER_MAX_CONTACTS_COUNT_SINGLENOTES = 100
 
 # 单个视频/帖子最大爬取动态数
 CRAWLER_MAX_DYNAMICS_COUNT_SINGLENOTES = 50
+
+# WBI 签名 key 的缓存文件，key 每天轮换一次，有效期内重复运行时不需要再从浏览器读取
+BILI_WBI_KEYS_CACHE_FILE = "browser_data/bili_wbi_keys.json"
+
+# WBI 签名 key 的缓存有效期，单位秒
+BILI_WBI_KEYS_CACHE_TTL = 6 * 60 * 60
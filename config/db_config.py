@@ -30,4 +30,33 @@ CACHE_TYPE_REDIS = "redis"
 CACHE_TYPE_MEMORY = "memory"
 
 # sqlite config
-SQLITE_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "schema", "sqlite_tables.db")
\ No newline at end of file
+SQLITE_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "schema", "sqlite_tables.db")
+
+# sqlite 写入配置：程序运行期间复用一个WAL模式的写连接，写操作累计 SQLITE_WRITE_BATCH_SIZE 条
+# 或距离上次提交超过 SQLITE_WRITE_FLUSH_INTERVAL 秒时提交一次事务，程序退出时会提交剩余的写入
+SQLITE_WRITE_BATCH_SIZE = 200
+SQLITE_WRITE_FLUSH_INTERVAL = 1.0
+
+# sqlite 只读连接池大小
+SQLITE_READ_POOL_SIZE = 2
+
+# sqlite 每个连接的 page cache 大小（KB）
+SQLITE_CACHE_SIZE_KB = 64000
+
+# 已抓取ID索引的 SQLite 文件路径（ENABLE_SEEN_INDEX 开启时使用）
+SEEN_INDEX_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "schema", "seen_index.db")
+
+# 爬取进度记录（断点续爬）的 SQLite 文件路径
+CHECKPOINT_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "schema", "checkpoint.db")
+
+# 增量评论爬取的评论水位线 SQLite 文件路径
+COMMENT_WATERMARK_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "schema", "comment_watermark.db")
+
+# 互动数快照的 SQLite 文件路径（ENABLE_COUNT_SNAPSHOT 开启时使用）
+COUNT_SNAPSHOT_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "schema", "count_snapshot.db")
+
+# 媒体文件库资源索引的 SQLite 文件路径（ENABLE_MEDIA_STORE 开启时使用）
+MEDIA_STORE_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "schema", "media_store.db")
+
+# 被多个关键词搜到的帖子命中关键词记录的 SQLite 文件路径
+NOTE_KEYWORD_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "schema", "note_keyword.db")
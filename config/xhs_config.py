@@ -15,6 +15,9 @@
 # 排序方式，具体的枚举值在media_platform/xhs/field.py中
 SORT_TYPE = "popularity_descending"
 
+# 签名用到的 localStorage b1 值的缓存时间，单位秒，过期后在下一次签名时顺带刷新
+XHS_SIGN_B1_CACHE_TTL = 300
+
 # 指定笔记URL列表, 必须要携带xsec_token参数
 XHS_SPECIFIED_NOTE_URL_LIST = [
     "https://www.xiaohongshu.com/explore/66fad51c000000001b0224b8?xsec_token=AB3rO-QopW5sgrJ41GwN01WCXh6yWPxjSoFI9D5JIMgKw=&xsec_source=pc_search"
@@ -14,7 +14,7 @@
 # @Time    : 2024/4/6 14:54
 # @Desc    : mediacrawler db 管理
 import asyncio
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
 from urllib.parse import urlparse
 
 import aiofiles
@@ -26,6 +26,40 @@ from async_sqlite_db import AsyncSqliteDB
 from tools import utils
 from var import db_conn_pool_var, media_crawler_db_var
 
+# 上下文变量只在crawler的任务上下文中可见，程序退出清理时需要通过这里的引用关闭数据库连接
+_mysql_pool: Optional[aiomysql.Pool] = None
+_sqlite_db: Optional[AsyncSqliteDB] = None
+_mysql_db: Optional[AsyncMysqlDB] = None
+
+# upsert 时保存内容哈希的字段，内容没有变化的记录跳过写入
+CONTENT_HASH_FIELD = "content_hash"
+
+# 各表用于判重的唯一索引：(表名, 索引名, 唯一键字段)，和 schema 目录下的建表语句保持一致，upsert 依赖这些唯一索引
+UNIQUE_KEYS: List[Tuple[str, str, Tuple[str, ...]]] = [
+    ("bilibili_video", "idx_bilibili_vi_video_i_31c36e", ("video_id",)),
+    ("bilibili_video_comment", "idx_bilibili_vi_comment_41c34e", ("comment_id",)),
+    ("bilibili_up_info", "idx_bilibili_vi_user_123456", ("user_id",)),
+    ("bilibili_contact_info", "idx_bilibili_contact_info_up_fan", ("up_id", "fan_id")),
+    ("bilibili_up_dynamic", "idx_bilibili_up_dynamic_dynamic_id", ("dynamic_id",)),
+    ("douyin_aweme", "idx_douyin_awem_aweme_i_6f7bc6", ("aweme_id",)),
+    ("douyin_aweme_comment", "idx_douyin_awem_comment_fcd7e4", ("comment_id",)),
+    ("dy_creator", "idx_dy_creator_user_id", ("user_id",)),
+    ("kuaishou_video", "idx_kuaishou_vi_video_i_c5c6a6", ("video_id",)),
+    ("kuaishou_video_comment", "idx_kuaishou_vi_comment_ed48fa", ("comment_id",)),
+    ("weibo_note", "idx_weibo_note_note_id_f95b1a", ("note_id",)),
+    ("weibo_note_comment", "idx_weibo_note__comment_c7611c", ("comment_id",)),
+    ("weibo_creator", "idx_weibo_creator_user_id", ("user_id",)),
+    ("xhs_creator", "idx_xhs_creator_user_id", ("user_id",)),
+    ("xhs_note", "idx_xhs_note_note_id_209457", ("note_id",)),
+    ("xhs_note_comment", "idx_xhs_note_co_comment_8e8349", ("comment_id",)),
+    ("tieba_note", "idx_tieba_note_note_id", ("note_id",)),
+    ("tieba_comment", "idx_tieba_comment_comment_id", ("comment_id",)),
+    ("tieba_creator", "idx_tieba_creator_user_id", ("user_id",)),
+    ("zhihu_content", "idx_zhihu_content_content_id", ("content_id",)),
+    ("zhihu_comment", "idx_zhihu_comment_comment_id", ("comment_id",)),
+    ("zhihu_creator", "idx_zhihu_creator_user_id", ("user_id",)),
+]
+
 
 async def init_mediacrawler_db():
     """
@@ -42,6 +76,9 @@ async def init_mediacrawler_db():
         autocommit=True,
     )
     async_db_obj = AsyncMysqlDB(pool)
+    global _mysql_pool, _mysql_db
+    _mysql_pool = pool
+    _mysql_db = async_db_obj
 
     # 将连接池对象和封装的CRUD sql接口对象放到上下文变量中
     db_conn_pool_var.set(pool)
@@ -54,8 +91,16 @@ async def init_sqlite_db():
     Returns:
 
     """
-    async_db_obj = AsyncSqliteDB(config.SQLITE_DB_PATH)
-    
+    async_db_obj = AsyncSqliteDB(
+        config.SQLITE_DB_PATH,
+        write_batch_size=config.SQLITE_WRITE_BATCH_SIZE,
+        write_flush_interval=config.SQLITE_WRITE_FLUSH_INTERVAL,
+        read_pool_size=config.SQLITE_READ_POOL_SIZE,
+        cache_size_kb=config.SQLITE_CACHE_SIZE_KB,
+    )
+    global _sqlite_db
+    _sqlite_db = async_db_obj
+
     # 将SQLite数据库对象放到上下文变量中
     media_crawler_db_var.set(async_db_obj)
 
@@ -73,6 +118,176 @@ async def init_db():
     else:
         await init_mediacrawler_db()
         utils.logger.info("[init_db] end init mysql db connect object")
+    await migrate_unique_keys()
+    await migrate_content_hash_columns()
+
+
+async def migrate_unique_keys(dedupe: bool = False):
+    """
+    给已有数据库补齐 UNIQUE_KEYS 中的唯一索引，旧版本建的是普通索引，upsert 需要唯一索引才能判重
+    没有重复数据的表直接建唯一索引；有重复数据的表默认不做任何修改，只打印警告，
+    需要执行 python db.py 选择 dedupe 显式去重：按唯一键保留id最大即最新的一行，删除的行先备份到 <表名>_dedupe_<时间戳> 表
+    已经是唯一索引的表直接跳过，可重复执行
+    Args:
+        dedupe: 是否清理重复数据
+
+    Returns:
+
+    """
+    async_db_obj = media_crawler_db_var.get()
+    if isinstance(async_db_obj, AsyncSqliteDB):
+        await _migrate_sqlite_unique_keys(async_db_obj, dedupe)
+    else:
+        await _migrate_mysql_unique_keys(async_db_obj, dedupe)
+
+
+def _warn_duplicates(table_name: str, fields: Tuple[str, ...], duplicates: int):
+    utils.logger.warning(
+        f"[migrate_unique_keys] table {table_name} has {duplicates} duplicate rows on {fields}, unique key not created, "
+        f"upsert on this table will fail or insert duplicates; run `python db.py` and choose dedupe to back up "
+        f"and remove them"
+    )
+
+
+async def _migrate_sqlite_unique_keys(async_db_obj: AsyncSqliteDB, dedupe: bool):
+    """
+    SQLite 唯一索引迁移
+    Args:
+        async_db_obj: SQLite数据库对象
+        dedupe: 是否清理重复数据
+
+    Returns:
+
+    """
+    for table_name, index_name, fields in UNIQUE_KEYS:
+        table_exists = await async_db_obj.get_first(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name=?", table_name
+        )
+        if not table_exists:
+            continue
+        index_list = await async_db_obj.query(f'PRAGMA index_list("{table_name}")')
+        if any(index.get("name") == index_name and index.get("unique") for index in index_list):
+            continue
+
+        cols = ",".join(f'"{field}"' for field in fields)
+        not_null = " AND ".join(f'"{field}" IS NOT NULL' for field in fields)
+        duplicate_where = f'{not_null} AND id NOT IN (SELECT MAX(id) FROM "{table_name}" GROUP BY {cols})'
+        row = await async_db_obj.get_first(f'SELECT COUNT(*) AS cnt FROM "{table_name}" WHERE {duplicate_where}')
+        duplicates = row["cnt"] if row else 0
+        if duplicates:
+            if not dedupe:
+                _warn_duplicates(table_name, fields, duplicates)
+                continue
+            backup_table = f"{table_name}_dedupe_{utils.get_current_timestamp()}"
+            await async_db_obj.execute(
+                f'CREATE TABLE "{backup_table}" AS SELECT * FROM "{table_name}" WHERE {duplicate_where}'
+            )
+            await async_db_obj.execute(f'DELETE FROM "{table_name}" WHERE {duplicate_where}')
+            utils.logger.info(
+                f"[_migrate_sqlite_unique_keys] table {table_name} removed {duplicates} duplicate rows, "
+                f"backed up to {backup_table}"
+            )
+        await async_db_obj.execute(f'DROP INDEX IF EXISTS "{index_name}"')
+        await async_db_obj.execute(f'CREATE UNIQUE INDEX "{index_name}" ON "{table_name}" ({cols})')
+        utils.logger.info(f"[_migrate_sqlite_unique_keys] table {table_name} unique key {fields} created")
+    await async_db_obj.flush()
+
+
+async def _migrate_mysql_unique_keys(async_db_obj: AsyncMysqlDB, dedupe: bool):
+    """
+    MySQL 唯一索引迁移
+    Args:
+        async_db_obj: MySQL数据库对象
+        dedupe: 是否清理重复数据
+
+    Returns:
+
+    """
+    for table_name, index_name, fields in UNIQUE_KEYS:
+        table_exists = await async_db_obj.get_first(
+            "SELECT TABLE_NAME FROM information_schema.TABLES WHERE TABLE_SCHEMA=DATABASE() AND TABLE_NAME=%s",
+            table_name
+        )
+        if not table_exists:
+            continue
+        index_rows = await async_db_obj.query(
+            "SELECT NON_UNIQUE FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA=DATABASE() AND TABLE_NAME=%s AND INDEX_NAME=%s",
+            table_name, index_name
+        )
+        if index_rows and not int(index_rows[0]["NON_UNIQUE"]):
+            continue
+
+        join_on = " AND ".join(f"t1.`{field}`=t2.`{field}`" for field in fields)
+        duplicate_join = f"FROM `{table_name}` t1 INNER JOIN `{table_name}` t2 ON {join_on} AND t1.id<t2.id"
+        row = await async_db_obj.get_first(f"SELECT COUNT(DISTINCT t1.id) AS cnt {duplicate_join}")
+        duplicates = int(row["cnt"]) if row else 0
+        if duplicates:
+            if not dedupe:
+                _warn_duplicates(table_name, fields, duplicates)
+                continue
+            backup_table = f"{table_name}_dedupe_{utils.get_current_timestamp()}"
+            await async_db_obj.execute(f"CREATE TABLE `{backup_table}` LIKE `{table_name}`")
+            await async_db_obj.execute(f"INSERT INTO `{backup_table}` SELECT DISTINCT t1.* {duplicate_join}")
+            await async_db_obj.execute(f"DELETE t1 {duplicate_join}")
+            utils.logger.info(
+                f"[_migrate_mysql_unique_keys] table {table_name} removed {duplicates} duplicate rows, "
+                f"backed up to {backup_table}"
+            )
+        cols = ",".join(f"`{field}`" for field in fields)
+        drop_index = f"DROP INDEX `{index_name}`, " if index_rows else ""
+        await async_db_obj.execute(f"ALTER TABLE `{table_name}` {drop_index}ADD UNIQUE KEY `{index_name}` ({cols})")
+        utils.logger.info(f"[_migrate_mysql_unique_keys] table {table_name} unique key {fields} created")
+
+
+async def migrate_content_hash_columns():
+    """
+    给已有数据库的 UNIQUE_KEYS 表补齐内容哈希字段，已经有该字段的表直接跳过，可重复执行
+    Returns:
+
+    """
+    async_db_obj = media_crawler_db_var.get()
+    for table_name, _, _ in UNIQUE_KEYS:
+        if isinstance(async_db_obj, AsyncSqliteDB):
+            columns = await async_db_obj.query(f'PRAGMA table_info("{table_name}")')
+            if not columns or any(column["name"] == CONTENT_HASH_FIELD for column in columns):
+                continue
+            await async_db_obj.execute(
+                f'ALTER TABLE "{table_name}" ADD COLUMN "{CONTENT_HASH_FIELD}" TEXT DEFAULT NULL'
+            )
+        else:
+            table_exists = await async_db_obj.get_first(
+                "SELECT TABLE_NAME FROM information_schema.TABLES WHERE TABLE_SCHEMA=DATABASE() AND TABLE_NAME=%s",
+                table_name
+            )
+            column_exists = await async_db_obj.get_first(
+                "SELECT COLUMN_NAME FROM information_schema.COLUMNS "
+                "WHERE TABLE_SCHEMA=DATABASE() AND TABLE_NAME=%s AND COLUMN_NAME=%s",
+                table_name, CONTENT_HASH_FIELD
+            )
+            if not table_exists or column_exists:
+                continue
+            await async_db_obj.execute(
+                f"ALTER TABLE `{table_name}` ADD COLUMN `{CONTENT_HASH_FIELD}` varchar(32) DEFAULT NULL COMMENT '内容哈希'"
+            )
+        utils.logger.info(f"[migrate_content_hash_columns] table {table_name} add column {CONTENT_HASH_FIELD}")
+    if isinstance(async_db_obj, AsyncSqliteDB):
+        await async_db_obj.flush()
+
+
+def log_write_stats(write_stats: Dict[str, Dict[str, int]]):
+    """
+    打印本次运行各表实际写入和内容没变化跳过的行数
+    Args:
+        write_stats: AsyncSqliteDB / AsyncMysqlDB 的 write_stats
+
+    Returns:
+
+    """
+    for table_name, stats in sorted(write_stats.items()):
+        utils.logger.info(
+            f"[close] table {table_name} written {stats['written']} rows, skipped {stats['skipped']} unchanged rows"
+        )
 
 
 async def close():
@@ -83,11 +298,20 @@ async def close():
     """
     utils.logger.info("[close] close mediacrawler db connection")
     if config.SAVE_DATA_OPTION == "sqlite":
-        # SQLite数据库连接会在AsyncSqliteDB对象销毁时自动关闭
-        utils.logger.info("[close] sqlite db connection will be closed automatically")
+        # 提交未提交的批量写入，并关闭长驻的SQLite连接
+        global _sqlite_db
+        if _sqlite_db is not None:
+            log_write_stats(_sqlite_db.write_stats)
+            await _sqlite_db.close()
+            _sqlite_db = None
+            utils.logger.info("[close] sqlite db connection closed")
     else:
         # MySQL连接池关闭
-        db_pool: aiomysql.Pool = db_conn_pool_var.get()
+        global _mysql_db
+        if _mysql_db is not None:
+            log_write_stats(_mysql_db.write_stats)
+            _mysql_db = None
+        db_pool: aiomysql.Pool = db_conn_pool_var.get(None) or _mysql_pool
         if db_pool is not None:
             db_pool.close()
             utils.logger.info("[close] mysql db pool closed")
@@ -110,6 +334,9 @@ async def init_table_schema(db_type: str = None):
         
         # 检查并删除可能存在的损坏数据库文件
         import os
+        for wal_file in (f"{config.SQLITE_DB_PATH}-wal", f"{config.SQLITE_DB_PATH}-shm"):
+            if os.path.exists(wal_file):
+                os.remove(wal_file)
         if os.path.exists(config.SQLITE_DB_PATH):
             try:
                 # 尝试删除现有的数据库文件
@@ -132,6 +359,7 @@ async def init_table_schema(db_type: str = None):
             schema_sql = await f.read()
             await async_db_obj.executescript(schema_sql)
             utils.logger.info("[init_table_schema] sqlite table schema init successful")
+            await async_db_obj.close()
     elif db_type == "mysql":
         utils.logger.info("[init_table_schema] begin init mysql table schema ...")
         await init_mediacrawler_db()
@@ -146,6 +374,22 @@ async def init_table_schema(db_type: str = None):
         raise ValueError(f"不支持的数据库类型: {db_type}，支持的类型: sqlite, mysql")
 
 
+async def dedupe_unique_keys():
+    """
+    按配置文件中的数据库显式清理重复数据并补齐唯一索引，删除的行会先备份
+    Returns:
+
+    """
+    if config.SAVE_DATA_OPTION == "sqlite":
+        await init_sqlite_db()
+    else:
+        await init_mediacrawler_db()
+    try:
+        await migrate_unique_keys(dedupe=True)
+    finally:
+        await close()
+
+
 def show_database_options():
     """
     显示支持的数据库选项
@@ -155,7 +399,8 @@ def show_database_options():
     print("1. sqlite  - SQLite 数据库 (轻量级，无需额外配置)")
     print("2. mysql   - MySQL 数据库 (需要配置数据库连接信息)")
     print("3. config  - 使用配置文件中的设置")
-    print("4. exit    - 退出程序")
+    print("4. dedupe  - 备份并清理重复数据，补齐唯一索引 (使用配置文件中的数据库)")
+    print("5. exit    - 退出程序")
     print("="*50)
 
 
@@ -166,12 +411,12 @@ def get_user_choice():
         str: 用户选择的数据库类型
     """
     while True:
-        choice = input("请输入数据库类型 (sqlite/mysql/config/exit): ").strip().lower()
+        choice = input("请输入数据库类型 (sqlite/mysql/config/dedupe/exit): ").strip().lower()
         
-        if choice in ['sqlite', 'mysql', 'config', 'exit']:
+        if choice in ['sqlite', 'mysql', 'config', 'dedupe', 'exit']:
             return choice
         else:
-            print("❌ 无效的选择，请输入: sqlite, mysql, config 或 exit")
+            print("❌ 无效的选择，请输入: sqlite, mysql, config, dedupe 或 exit")
 
 
 async def main():
@@ -192,6 +437,11 @@ async def main():
                 await init_table_schema()
                 print("✅ 数据库表结构初始化完成！")
                 break
+            elif choice == 'dedupe':
+                print(f"🧹 开始清理 {config.SAVE_DATA_OPTION} 数据库中的重复数据...")
+                await dedupe_unique_keys()
+                print("✅ 重复数据清理完成，删除的行已备份到 *_dedupe_* 表！")
+                break
             else:
                 print(f"🚀 开始初始化 {choice.upper()} 数据库...")
                 await init_table_schema(choice)
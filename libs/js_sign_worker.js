@@ -0,0 +1,46 @@
+// 常驻的 JS 签名进程，由 tools/js_sign_pool.py 启动
+// 启动时加载一次签名脚本（例如 libs/douyin.js、libs/zhihu.js），之后从 stdin 逐行读取 JSON 请求，向 stdout 逐行写回结果
+// 请求: {"id": 1, "fn": "sign_datail", "args": [...]} 或批量 {"id": 2, "fn": "sign_datail", "batch": [[...], [...]]}
+// 响应: {"id": 1, "result": ...} 或 {"id": 1, "error": "..."}
+const fs = require('fs');
+const readline = require('readline');
+const vm = require('vm');
+
+const scriptPath = process.argv[2];
+// 签名脚本按 execjs 的方式在全局作用域里执行，函数声明直接挂到全局对象上
+global.require = require;
+vm.runInThisContext(fs.readFileSync(scriptPath, 'utf-8').replace(/^\uFEFF/, ''), {filename: scriptPath});
+
+function callFunction(fn, args) {
+    const func = globalThis[fn];
+    if (typeof func !== 'function') {
+        throw new Error(`function ${fn} not found in ${scriptPath}`);
+    }
+    return func.apply(null, args || []);
+}
+
+const rl = readline.createInterface({input: process.stdin, terminal: false});
+rl.on('line', (line) => {
+    if (!line.trim()) {
+        return;
+    }
+    let request;
+    try {
+        request = JSON.parse(line);
+    } catch (e) {
+        return;
+    }
+    const response = {id: request.id};
+    try {
+        if (request.batch) {
+            response.result = request.batch.map((args) => callFunction(request.fn, args));
+        } else {
+            response.result = callFunction(request.fn, request.args);
+        }
+    } catch (e) {
+        response.error = String(e && e.stack || e);
+    }
+    process.stdout.write(JSON.stringify(response) + '\n');
+});
+// 父进程退出时 stdin 被关闭，签名进程随之退出
+rl.on('close', () => process.exit(0));
@@ -26,6 +26,17 @@ from media_platform.weibo import WeiboCrawler
 from media_platform.xhs import XiaoHongShuCrawler
 from media_platform.zhihu import ZhihuCrawler
 import tools.utils as utils
+from store.write_behind import close_write_behind_queue, flush_write_behind_queue_sync
+from tools.buffered_file_writer import close_all_file_writers
+from tools.checkpoint import clear_checkpoints, close_checkpoint_stores
+from tools.comment_watermark import close_comment_watermark_stores
+from tools.count_snapshot import close_count_snapshot_stores
+from tools.crawl_scheduler import get_crawl_scheduler
+from tools.httpx_client_pool import close_httpx_client_pools
+from tools.js_sign_pool import close_sign_pools
+from tools.keyword_workers import close_note_keyword_indexes
+from tools.media_store import close_media_stores
+from tools.seen_index import close_seen_indexes
 
 
 class CrawlerFactory:
@@ -65,6 +76,32 @@ async def main():
 
     crawler = CrawlerFactory.create_crawler(platform=config.PLATFORM)
     await crawler.start()
+    # 爬取结束，所有进度都已完成时清空断点续爬的记录
+    await clear_checkpoints()
+    utils.logger.info(f"[main] crawl scheduler stats: {get_crawl_scheduler().stats()}")
+
+    # 等待写入队列中剩余的数据落盘
+    await close_write_behind_queue()
+
+    # 关闭常驻的 JS 签名进程
+    await close_sign_pools()
+
+    # 连接池绑定爬取的事件循环，在这里关闭；cleanup() 里的 crawler.close() 跑在新的事件循环上，关不了这些连接
+    await close_httpx_client_pools()
+
+    await close_crawl_stores()
+
+
+async def close_crawl_stores():
+    """
+    提交并关闭已抓取ID索引、断点续爬记录、评论水位线、互动数快照、媒体文件库和帖子关键词记录，重复调用时已经关闭的会跳过
+    """
+    await close_seen_indexes()
+    await close_checkpoint_stores()
+    await close_comment_watermark_stores()
+    await close_count_snapshot_stores()
+    await close_media_stores()
+    await close_note_keyword_indexes()
 
 
 def cleanup():
@@ -77,12 +114,32 @@ def cleanup():
         except Exception as e:
             utils.logger.error(f"[main.cleanup] Error closing crawler: {e}")
     
+    try:
+        flush_write_behind_queue_sync()
+        utils.logger.info("[main.cleanup] Write-behind queue flushed successfully")
+    except Exception as e:
+        utils.logger.error(f"[main.cleanup] Error flushing write-behind queue: {e}")
+
+    try:
+        close_all_file_writers()
+        utils.logger.info("[main.cleanup] File writers closed successfully")
+    except Exception as e:
+        utils.logger.error(f"[main.cleanup] Error closing file writers: {e}")
+
     if config.SAVE_DATA_OPTION in ["db", "sqlite"]:
         try:
-            asyncio.run(db.close())
+            # 信号中断时原事件循环仍在运行，run_coroutine_sync 会换到新线程里关闭，保证批量写入被提交
+            utils.run_coroutine_sync(db.close())
             utils.logger.info("[main.cleanup] Database closed successfully")
         except Exception as e:
             utils.logger.error(f"[main.cleanup] Error closing database: {e}")
+
+    try:
+        # 信号中断时 main() 后面的关闭流程不会执行，这里提交爬取进度等 SQLite 记录
+        utils.run_coroutine_sync(close_crawl_stores())
+        utils.logger.info("[main.cleanup] Crawl stores closed successfully")
+    except Exception as e:
+        utils.logger.error(f"[main.cleanup] Error closing crawl stores: {e}")
     
     utils.logger.info("[main.cleanup] Cleanup completed")
 
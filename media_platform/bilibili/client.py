@@ -19,16 +19,27 @@ import random
 from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 from urllib.parse import urlencode
 
-import httpx
 from playwright.async_api import BrowserContext, Page
 
 import config
 from base.base_crawler import AbstractApiClient
 from tools import utils
-
-from .exception import DataFetchError
+from tools.checkpoint import CheckpointScope, get_checkpoint_store
+from tools.comment_watermark import get_comment_watermark_store
+from tools.crawl_scheduler import RequestClass, get_crawl_scheduler
+from tools.httpx_client_pool import HttpxClientPool
+from tools.media_downloader import ranged_download
+from tools.rate_limiter import crawl_sleep, get_rate_limiter
+
+from .exception import DataFetchError, IPBlockError, WbiSignError
 from .field import CommentOrderType, SearchOrderType
-from .help import BilibiliSign
+from .help import BilibiliSign, WbiKeyCache
+
+# WBI 签名校验失败时接口返回的错误码
+WBI_SIGN_ERROR_CODES = (-403,)
+
+# 进程内共享的 WBI key 缓存
+wbi_key_cache = WbiKeyCache(config.BILI_WBI_KEYS_CACHE_FILE, config.BILI_WBI_KEYS_CACHE_TTL)
 
 
 class BilibiliClient(AbstractApiClient):
@@ -43,13 +54,25 @@ class BilibiliClient(AbstractApiClient):
     ):
         self.proxies = proxies
         self.timeout = timeout
+        self.http_client_pool = HttpxClientPool(proxies, timeout=timeout)
         self.headers = headers
         self._host = "https://api.bilibili.com"
         self.playwright_page = playwright_page
         self.cookie_dict = cookie_dict
+        self.rate_limiter = get_rate_limiter("bili", throttle_errors=(DataFetchError, IPBlockError))
+        self.checkpoint_store = get_checkpoint_store("bili")
+        self.comment_watermarks = get_comment_watermark_store("bili")
+        self._wbi_keys_lock = asyncio.Lock()
+        # 签名失败后 localStorage 里的 key 可能也是旧的，改为从 nav 接口获取
+        self._wbi_keys_from_nav = False
 
     async def request(self, method, url, **kwargs) -> Any:
-        async with httpx.AsyncClient(proxies=self.proxies) as client:
+        async with get_crawl_scheduler().limit(RequestClass.API, host=url):
+            async with self.rate_limiter.limit(url, self.proxies):
+                return await self._request(method, url, **kwargs)
+
+    async def _request(self, method, url, **kwargs) -> Any:
+        async with self.http_client_pool.borrow(self.proxies) as client:
             response = await client.request(
                 method, url, timeout=self.timeout,
                 **kwargs
@@ -59,6 +82,8 @@ class BilibiliClient(AbstractApiClient):
         except json.JSONDecodeError:
             utils.logger.error(f"[BilibiliClient.request] Failed to decode JSON from response. status_code: {response.status_code}, response_text: {response.text}")
             raise DataFetchError(f"Failed to decode JSON, content: {response.text}")
+        if data.get("code") in WBI_SIGN_ERROR_CODES:
+            raise WbiSignError(data.get("message", "wbi sign error"))
         if data.get("code") != 0:
             raise DataFetchError(data.get("message", "unkonw error"))
         else:
@@ -79,16 +104,45 @@ class BilibiliClient(AbstractApiClient):
 
     async def get_wbi_keys(self) -> Tuple[str, str]:
         """
-        获取最新的 img_key 和 sub_key
+        获取最新的 img_key 和 sub_key，优先使用缓存，缓存过期后才会访问浏览器或者接口
+        :return:
+        """
+        wbi_keys = wbi_key_cache.get()
+        if wbi_keys:
+            return wbi_keys
+        async with self._wbi_keys_lock:
+            # 并发的请求只需要有一个去获取
+            wbi_keys = wbi_key_cache.get()
+            if wbi_keys:
+                return wbi_keys
+            img_key, sub_key = await self.fetch_wbi_keys(from_local_storage=not self._wbi_keys_from_nav)
+            wbi_key_cache.set(img_key, sub_key)
+            self._wbi_keys_from_nav = False
+            return img_key, sub_key
+
+    def invalidate_wbi_keys(self):
+        """
+        WBI 签名被拒绝时让缓存失效，下一次签名从 nav 接口获取新的 key
+        :return:
+        """
+        wbi_key_cache.invalidate()
+        self._wbi_keys_from_nav = True
+
+    async def fetch_wbi_keys(self, from_local_storage: bool = True) -> Tuple[str, str]:
+        """
+        从 localStorage 或者 nav 接口获取 img_key 和 sub_key
+        :param from_local_storage: 是否先从 localStorage 读取
         :return:
         """
-        local_storage = await self.playwright_page.evaluate("() => window.localStorage")
-        wbi_img_urls = local_storage.get("wbi_img_urls", "")
-        if not wbi_img_urls:
-            img_url_from_storage = local_storage.get("wbi_img_url")
-            sub_url_from_storage = local_storage.get("wbi_sub_url")
-            if img_url_from_storage and sub_url_from_storage:
-                wbi_img_urls = f"{img_url_from_storage}-{sub_url_from_storage}"
+        wbi_img_urls = ""
+        if from_local_storage:
+            local_storage = await self.playwright_page.evaluate("() => window.localStorage")
+            wbi_img_urls = local_storage.get("wbi_img_urls", "")
+            if not wbi_img_urls:
+                img_url_from_storage = local_storage.get("wbi_img_url")
+                sub_url_from_storage = local_storage.get("wbi_sub_url")
+                if img_url_from_storage and sub_url_from_storage:
+                    wbi_img_urls = f"{img_url_from_storage}-{sub_url_from_storage}"
         if wbi_img_urls and "-" in wbi_img_urls:
             img_url, sub_url = wbi_img_urls.split("-")
         else:
@@ -100,16 +154,32 @@ class BilibiliClient(AbstractApiClient):
         return img_key, sub_key
 
     async def get(self, uri: str, params=None, enable_params_sign: bool = True) -> Dict:
+        if not enable_params_sign:
+            return await self._get(uri, params)
+        try:
+            return await self._get(uri, await self.pre_request_data(params))
+        except WbiSignError:
+            # WBI key 已轮换，刷新 key 后重新签名再请求一次
+            utils.logger.warning(f"[BilibiliClient.get] wbi sign rejected, refresh wbi keys and retry, uri: {uri}")
+            self.invalidate_wbi_keys()
+            return await self._get(uri, await self.pre_request_data(params))
+
+    async def _get(self, uri: str, params=None) -> Dict:
         final_uri = uri
-        if enable_params_sign:
-            params = await self.pre_request_data(params)
         if isinstance(params, dict):
             final_uri = (f"{uri}?"
                          f"{urlencode(params)}")
         return await self.request(method="GET", url=f"{self._host}{final_uri}", headers=self.headers)
 
     async def post(self, uri: str, data: dict) -> Dict:
-        data = await self.pre_request_data(data)
+        try:
+            return await self._post(uri, await self.pre_request_data(data))
+        except WbiSignError:
+            utils.logger.warning(f"[BilibiliClient.post] wbi sign rejected, refresh wbi keys and retry, uri: {uri}")
+            self.invalidate_wbi_keys()
+            return await self._post(uri, await self.pre_request_data(data))
+
+    async def _post(self, uri: str, data: Dict) -> Dict:
         json_str = json.dumps(data, separators=(',', ':'), ensure_ascii=False)
         return await self.request(method="POST", url=f"{self._host}{uri}",
                                   data=json_str, headers=self.headers)
@@ -201,14 +271,19 @@ class BilibiliClient(AbstractApiClient):
 
         return await self.get(uri, params, enable_params_sign=True)
 
-    async def get_video_media(self, url: str) -> Union[bytes, None]:
-        async with httpx.AsyncClient(proxies=self.proxies) as client:
-            response = await client.request("GET", url, timeout=self.timeout, headers=self.headers)
-            if not response.reason_phrase == "OK":
-                utils.logger.error(f"[BilibiliClient.get_video_media] request {url} err, res:{response.text}")
-                return None
-            else:
-                return response.content
+    async def download_video_media(self, url: str, save_file_name: str) -> bool:
+        """
+        下载视频到本地文件，大文件按字节区间多个连接并发下载，中断后下次从已下载的位置继续
+        Args:
+            url: 视频地址
+            save_file_name: 保存的文件路径
+
+        Returns:
+            是否下载成功
+        """
+        async with get_crawl_scheduler().limit(RequestClass.MEDIA, host=url):
+            async with self.http_client_pool.borrow(self.proxies) as client:
+                return await ranged_download(client, url, save_file_name, timeout=self.timeout, headers=self.headers)
 
     async def get_video_comments(self,
                                  video_id: str,
@@ -244,15 +319,26 @@ class BilibiliClient(AbstractApiClient):
 
         :return:
         """
+        # 续爬时从上次记录的评论游标继续
+        checkpoint = await self.checkpoint_store.load(CheckpointScope.COMMENTS, video_id)
+        if checkpoint.get("done"):
+            return []
+        fetched_count = checkpoint.get("count", 0)
+        max_count -= fetched_count
         result = []
         is_end = False
-        next_page = 0
+        next_page = checkpoint.get("cursor", 0)
         max_retries = 3
+        watermark = await self.comment_watermarks.begin(
+            video_id, get_id=lambda c: c.get("rpid"), get_time=lambda c: c.get("ctime")
+        )
+        # 增量爬取时按时间倒序翻页，翻到已知评论就可以停止
+        order_mode = CommentOrderType.TIME if self.comment_watermarks.enabled else CommentOrderType.DEFAULT
         while not is_end and len(result) < max_count:
             comments_res = None
             for attempt in range(max_retries):
                 try:
-                    comments_res = await self.get_video_comments(video_id, CommentOrderType.DEFAULT, next_page)
+                    comments_res = await self.get_video_comments(video_id, order_mode, next_page)
                     break  # Success
                 except DataFetchError as e:
                     if attempt < max_retries - 1:
@@ -268,7 +354,8 @@ class BilibiliClient(AbstractApiClient):
                         is_end = True
                         break
             if not comments_res:
-                break
+                # 请求失败，不标记完成，续爬时重新抓取
+                return result
 
             cursor_info: Dict = comments_res.get("cursor")
             if not cursor_info:
@@ -276,6 +363,11 @@ class BilibiliClient(AbstractApiClient):
                 break
 
             comment_list: List[Dict] = comments_res.get("replies", [])
+            if watermark.reached(comment_list):
+                utils.logger.info(
+                    f"[BilibiliClient.get_video_all_comments] video_id: {video_id} reached known comments, stop"
+                )
+                break
             
             # 检查 is_end 和 next 是否存在
             if "is_end" not in cursor_info or "next" not in cursor_info:
@@ -300,10 +392,15 @@ class BilibiliClient(AbstractApiClient):
                 comment_list = comment_list[:max_count - len(result)]
             if callback:  # 如果有回调函数，就执行回调函数
                 await callback(video_id, comment_list)
-            await asyncio.sleep(crawl_interval)
+            await crawl_sleep(crawl_interval)
             if not is_fetch_sub_comments:
                 result.extend(comment_list)
-                continue
+            await self.checkpoint_store.save(
+                CheckpointScope.COMMENTS, video_id,
+                {"cursor": next_page, "count": fetched_count + len(result)},
+            )
+        await watermark.commit()
+        await self.checkpoint_store.finish(CheckpointScope.COMMENTS, video_id)
         return result
 
     async def get_video_all_level_two_comments(self,
@@ -332,7 +429,7 @@ class BilibiliClient(AbstractApiClient):
             comment_list: List[Dict] = result.get("replies", [])
             if callback:  # 如果有回调函数，就执行回调函数
                 await callback(video_id, comment_list)
-            await asyncio.sleep(crawl_interval)
+            await crawl_sleep(crawl_interval)
             if (int(result["page"]["count"]) <= pn * ps):
                 break
 
@@ -476,7 +573,7 @@ class BilibiliClient(AbstractApiClient):
                 fans_list = fans_list[:max_count - len(result)]
             if callback:  # 如果有回调函数，就执行回调函数
                 await callback(creator_info, fans_list)
-            await asyncio.sleep(crawl_interval)
+            await crawl_sleep(crawl_interval)
             if not fans_list:
                 break
             result.extend(fans_list)
@@ -506,7 +603,7 @@ class BilibiliClient(AbstractApiClient):
                 followings_list = followings_list[:max_count - len(result)]
             if callback:  # 如果有回调函数，就执行回调函数
                 await callback(creator_info, followings_list)
-            await asyncio.sleep(crawl_interval)
+            await crawl_sleep(crawl_interval)
             if not followings_list:
                 break
             result.extend(followings_list)
@@ -537,6 +634,6 @@ class BilibiliClient(AbstractApiClient):
                 dynamics_list = dynamics_list[:max_count - len(result)]
             if callback:
                 await callback(creator_info, dynamics_list)
-            await asyncio.sleep(crawl_interval)
+            await crawl_sleep(crawl_interval)
             result.extend(dynamics_list)
         return result
@@ -15,10 +15,11 @@
 # @Desc    : B站爬虫
 
 import asyncio
+import functools
 import os
 import random
 from asyncio import Task
-from typing import Dict, List, Optional, Tuple, Union
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Union
 from datetime import datetime, timedelta
 import pandas as pd
 
@@ -37,7 +38,14 @@ from proxy.proxy_ip_pool import IpInfoModel, create_ip_pool
 from store import bilibili as bilibili_store
 from tools import utils
 from tools.cdp_browser import CDPBrowserManager
-from var import crawler_type_var, source_keyword_var
+from tools.crawl_pipeline import CrawlPipeline
+from tools.crawl_scheduler import RequestClass, SchedulerLimit, get_crawl_scheduler
+from tools.checkpoint import CheckpointScope, SearchProgress, get_checkpoint_store
+from tools.keyword_workers import KeywordNotes, run_keyword_workers, split_keywords
+from tools.media_store import get_media_store
+from tools.seen_index import SeenKind, get_seen_index
+from tools.rate_limiter import crawl_sleep
+from var import crawler_type_var
 
 from .client import BilibiliClient
 from .exception import DataFetchError
@@ -50,11 +58,15 @@ class BilibiliCrawler(AbstractCrawler):
     bili_client: BilibiliClient
     browser_context: BrowserContext
     cdp_manager: Optional[CDPBrowserManager]
+    keyword_notes: KeywordNotes
 
     def __init__(self):
         self.index_url = "https://www.bilibili.com"
         self.user_agent = utils.get_user_agent()
         self.cdp_manager = None
+        self.seen_index = get_seen_index("bili")
+        self.media_store = get_media_store("bili")
+        self.checkpoint_store = get_checkpoint_store("bili")
 
     async def start(self):
         playwright_proxy_format, httpx_proxy_format = None, None
@@ -183,16 +195,34 @@ class BilibiliCrawler(AbstractCrawler):
         bili_limit_count = 20  # bilibili limit page fixed value
         if config.CRAWLER_MAX_NOTES_COUNT < bili_limit_count:
             config.CRAWLER_MAX_NOTES_COUNT = bili_limit_count
+        self.keyword_notes = KeywordNotes(platform="bili")
+        await run_keyword_workers(split_keywords(config.KEYWORDS), self.search_keyword)
+
+    async def search_keyword(self, keyword: str) -> None:
+        """
+        普通模式下搜索单个关键词，详情、存储、评论交给流水线处理
+        Args:
+            keyword: 搜索关键词
+
+        Returns:
+
+        """
+        bili_limit_count = 20  # bilibili limit page fixed value
         start_page = config.START_PAGE  # start page number
-        for keyword in config.KEYWORDS.split(","):
-            source_keyword_var.set(keyword)
-            utils.logger.info(
-                f"[BilibiliCrawler.search_by_keywords] Current search keyword: {keyword}"
-            )
-            page = 1
+        utils.logger.info(
+            f"[BilibiliCrawler.search_by_keywords] Current search keyword: {keyword}"
+        )
+        # 续爬时从上次记录的页码继续，已经搜完的关键词直接跳过
+        checkpoint = await self.checkpoint_store.load(CheckpointScope.SEARCH, keyword)
+        if checkpoint.get("done"):
+            utils.logger.info(f"[BilibiliCrawler.search_by_keywords] keyword: {keyword} already finished, skip")
+            return
+        page = checkpoint.get("page", 1)
+        progress = SearchProgress(self.checkpoint_store, keyword, page)
+        async with self.create_search_pipeline(keyword, on_page_done=progress.page_done) as pipeline:
             while (
                 page - start_page + 1
-            ) * bili_limit_count <= config.CRAWLER_MAX_NOTES_COUNT:
+            ) * bili_limit_count <= config.CRAWLER_MAX_NOTES_COUNT and await self.keyword_notes.wait_budget(keyword):
                 if page < start_page:
                     utils.logger.info(
                         f"[BilibiliCrawler.search_by_keywords] Skip page: {page}"
@@ -203,7 +233,6 @@ class BilibiliCrawler(AbstractCrawler):
                 utils.logger.info(
                     f"[BilibiliCrawler.search_by_keywords] search bilibili keyword: {keyword}, page: {page}"
                 )
-                video_id_list: List[str] = []
                 videos_res = await self.bili_client.search_video_by_keyword(
                     keyword=keyword,
                     page=page,
@@ -220,28 +249,77 @@ class BilibiliCrawler(AbstractCrawler):
                     )
                     break
 
-                semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
-                task_list = []
-                try:
-                    task_list = [
-                        self.get_video_info_task(
-                            aid=video_item.get("aid"), bvid="", semaphore=semaphore
-                        )
-                        for video_item in video_list
-                    ]
-                except Exception as e:
-                    utils.logger.warning(
-                        f"[BilibiliCrawler.search_by_keywords] error in the task list. The video for this page will not be included. {e}"
-                    )
-                video_items = await asyncio.gather(*task_list)
-                for video_item in video_items:
-                    if video_item:
-                        video_id_list.append(video_item.get("View").get("aid"))
-                        await bilibili_store.update_bilibili_video(video_item)
-                        await bilibili_store.update_up_info(video_item)
-                        await self.get_bilibili_video(video_item, semaphore)
+                # 详情、评论等交给流水线处理，这里直接翻下一页；进度记录的是最早一页还没处理完的页码
+                async with progress.page(pipeline, page):
+                    for video_item in video_list:
+                        if not await self.keyword_notes.wait_budget(keyword):
+                            break
+                        # 其他关键词已经登记过的视频只记录命中的关键词，不重复存储
+                        if await self.keyword_notes.claim(str(video_item.get("aid")), keyword):
+                            await pipeline.put("detail", video_item)
                 page += 1
-                await self.batch_get_video_comments(video_id_list)
+        await self.checkpoint_store.finish(CheckpointScope.SEARCH, keyword)
+
+    def create_search_pipeline(
+        self, keyword: str, on_page_done: Optional[Callable[[int], Awaitable[None]]] = None
+    ) -> CrawlPipeline:
+        """
+        搜索流水线：搜索结果 -> 视频详情 -> 存储 / 视频下载 / 评论
+        Args:
+            keyword: 搜索关键词
+            on_page_done: 一页搜索结果全部处理完之后的回调
+
+        Returns:
+
+        """
+        semaphore = get_crawl_scheduler().limit(RequestClass.API, host=self.index_url)
+        pipeline = CrawlPipeline(f"BilibiliCrawler.search[{keyword}]", on_tag_done=on_page_done)
+
+        async def get_detail(video_item: Dict) -> Optional[Dict]:
+            if await self.seen_index.is_fresh(SeenKind.DETAIL, video_item.get("aid")):
+                utils.logger.info(f"[BilibiliCrawler.search_by_keywords] video {video_item.get('aid')} fetched recently, skip")
+                # 详情最近已经存储过，评论是否需要重新抓取由评论阶段按 COMMENTS 的记录判断
+                if config.ENABLE_GET_COMMENTS:
+                    await pipeline.put("comments", video_item.get("aid"))
+                return None
+            return await self.get_video_info_task(
+                aid=video_item.get("aid"), bvid="", semaphore=semaphore
+            )
+
+        async def fetch_detail(video_item: Dict):
+            video_detail = None
+            try:
+                video_detail = await get_detail(video_item)
+            finally:
+                if not video_detail:
+                    # 跳过或者请求失败的视频不存储，释放关键词的名额
+                    await self.keyword_notes.release(str(video_item.get("aid")))
+            if not video_detail:
+                return
+            await pipeline.put("store", video_detail)
+            if config.ENABLE_GET_IMAGES:
+                await pipeline.put("media", video_detail)
+            if config.ENABLE_GET_COMMENTS:
+                await pipeline.put("comments", video_detail.get("View").get("aid"))
+
+        async def store_video(video_detail: Dict):
+            async with self.keyword_notes.storing(str(video_detail.get("View").get("aid"))):
+                await bilibili_store.update_bilibili_video(video_detail)
+                await bilibili_store.update_up_info(video_detail)
+            # 存储成功之后才记录，存储失败的视频下次还会重新抓取
+            await self.seen_index.mark(SeenKind.DETAIL, video_detail.get("View").get("aid"))
+
+        async def fetch_video(video_detail: Dict):
+            await self.get_bilibili_video(video_detail, semaphore)
+
+        async def fetch_comments(video_id: str):
+            await self.get_comments(video_id)
+
+        pipeline.add_stage("detail", fetch_detail, workers=config.SEARCH_PIPELINE_WORKERS)
+        pipeline.add_stage("store", store_video)
+        pipeline.add_stage("media", fetch_video, workers=config.SEARCH_PIPELINE_WORKERS)
+        pipeline.add_stage("comments", fetch_comments, workers=config.SEARCH_PIPELINE_WORKERS)
+        return pipeline
 
     async def search_by_keywords_in_time_range(self, daily_limit: bool):
         """
@@ -251,128 +329,141 @@ class BilibiliCrawler(AbstractCrawler):
         utils.logger.info(
             f"[BilibiliCrawler.search_by_keywords_in_time_range] Begin search with daily_limit={daily_limit}"
         )
+        self.keyword_notes = KeywordNotes(platform="bili")
+        await run_keyword_workers(
+            split_keywords(config.KEYWORDS),
+            functools.partial(self.search_keyword_in_time_range, daily_limit=daily_limit),
+        )
+
+    async def search_keyword_in_time_range(self, keyword: str, daily_limit: bool) -> None:
+        """
+        按时间范围搜索单个关键词
+        Args:
+            keyword: 搜索关键词
+            daily_limit: 是否严格限制每天和总的帖子数量
+
+        Returns:
+
+        """
         bili_limit_count = 20
         start_page = config.START_PAGE
+        utils.logger.info(
+            f"[BilibiliCrawler.search_by_keywords_in_time_range] Current search keyword: {keyword}"
+        )
+        total_notes_crawled_for_keyword = 0
+
+        for day in pd.date_range(
+            start=config.START_DAY, end=config.END_DAY, freq="D"
+        ):
+            if (
+                daily_limit
+                and total_notes_crawled_for_keyword
+                >= config.CRAWLER_MAX_NOTES_COUNT
+            ):
+                utils.logger.info(
+                    f"[BilibiliCrawler.search] Reached CRAWLER_MAX_NOTES_COUNT limit for keyword '{keyword}', skipping remaining days."
+                )
+                break
 
-        for keyword in config.KEYWORDS.split(","):
-            source_keyword_var.set(keyword)
-            utils.logger.info(
-                f"[BilibiliCrawler.search_by_keywords_in_time_range] Current search keyword: {keyword}"
+            if (
+                not daily_limit
+                and total_notes_crawled_for_keyword
+                >= config.CRAWLER_MAX_NOTES_COUNT
+            ):
+                utils.logger.info(
+                    f"[BilibiliCrawler.search] Reached CRAWLER_MAX_NOTES_COUNT limit for keyword '{keyword}', skipping remaining days."
+                )
+                break
+
+            pubtime_begin_s, pubtime_end_s = await self.get_pubtime_datetime(
+                start=day.strftime("%Y-%m-%d"), end=day.strftime("%Y-%m-%d")
             )
-            total_notes_crawled_for_keyword = 0
+            page = 1
+            notes_count_this_day = 0
 
-            for day in pd.date_range(
-                start=config.START_DAY, end=config.END_DAY, freq="D"
-            ):
+            while True:
+                if notes_count_this_day >= config.MAX_NOTES_PER_DAY:
+                    utils.logger.info(
+                        f"[BilibiliCrawler.search] Reached MAX_NOTES_PER_DAY limit for {day.ctime()}."
+                    )
+                    break
                 if (
                     daily_limit
                     and total_notes_crawled_for_keyword
                     >= config.CRAWLER_MAX_NOTES_COUNT
                 ):
                     utils.logger.info(
-                        f"[BilibiliCrawler.search] Reached CRAWLER_MAX_NOTES_COUNT limit for keyword '{keyword}', skipping remaining days."
+                        f"[BilibiliCrawler.search] Reached CRAWLER_MAX_NOTES_COUNT limit for keyword '{keyword}'."
                     )
                     break
-
                 if (
                     not daily_limit
                     and total_notes_crawled_for_keyword
                     >= config.CRAWLER_MAX_NOTES_COUNT
                 ):
-                    utils.logger.info(
-                        f"[BilibiliCrawler.search] Reached CRAWLER_MAX_NOTES_COUNT limit for keyword '{keyword}', skipping remaining days."
-                    )
                     break
 
-                pubtime_begin_s, pubtime_end_s = await self.get_pubtime_datetime(
-                    start=day.strftime("%Y-%m-%d"), end=day.strftime("%Y-%m-%d")
-                )
-                page = 1
-                notes_count_this_day = 0
+                try:
+                    utils.logger.info(
+                        f"[BilibiliCrawler.search] search bilibili keyword: {keyword}, date: {day.ctime()}, page: {page}"
+                    )
+                    video_id_list: List[str] = []
+                    videos_res = await self.bili_client.search_video_by_keyword(
+                        keyword=keyword,
+                        page=page,
+                        page_size=bili_limit_count,
+                        order=SearchOrderType.DEFAULT,
+                        pubtime_begin_s=pubtime_begin_s,
+                        pubtime_end_s=pubtime_end_s,
+                    )
+                    video_list: List[Dict] = videos_res.get("result")
 
-                while True:
-                    if notes_count_this_day >= config.MAX_NOTES_PER_DAY:
-                        utils.logger.info(
-                            f"[BilibiliCrawler.search] Reached MAX_NOTES_PER_DAY limit for {day.ctime()}."
-                        )
-                        break
-                    if (
-                        daily_limit
-                        and total_notes_crawled_for_keyword
-                        >= config.CRAWLER_MAX_NOTES_COUNT
-                    ):
+                    if not video_list:
                         utils.logger.info(
-                            f"[BilibiliCrawler.search] Reached CRAWLER_MAX_NOTES_COUNT limit for keyword '{keyword}'."
+                            f"[BilibiliCrawler.search] No more videos for '{keyword}' on {day.ctime()}, moving to next day."
                         )
                         break
-                    if (
-                        not daily_limit
-                        and total_notes_crawled_for_keyword
-                        >= config.CRAWLER_MAX_NOTES_COUNT
-                    ):
-                        break
 
-                    try:
-                        utils.logger.info(
-                            f"[BilibiliCrawler.search] search bilibili keyword: {keyword}, date: {day.ctime()}, page: {page}"
-                        )
-                        video_id_list: List[str] = []
-                        videos_res = await self.bili_client.search_video_by_keyword(
-                            keyword=keyword,
-                            page=page,
-                            page_size=bili_limit_count,
-                            order=SearchOrderType.DEFAULT,
-                            pubtime_begin_s=pubtime_begin_s,
-                            pubtime_end_s=pubtime_end_s,
+                    semaphore = get_crawl_scheduler().limit(RequestClass.API, host=self.index_url)
+                    task_list = [
+                        self.get_video_info_task(
+                            aid=video_item.get("aid"), bvid="", semaphore=semaphore
                         )
-                        video_list: List[Dict] = videos_res.get("result")
+                        for video_item in video_list
+                    ]
+                    video_items = await asyncio.gather(*task_list)
+
+                    for video_item in video_items:
+                        if video_item:
+                            if (
+                                daily_limit
+                                and total_notes_crawled_for_keyword
+                                >= config.CRAWLER_MAX_NOTES_COUNT
+                            ):
+                                break
+                            if (
+                                not daily_limit
+                                and total_notes_crawled_for_keyword
+                                >= config.CRAWLER_MAX_NOTES_COUNT
+                            ):
+                                break
+                            if notes_count_this_day >= config.MAX_NOTES_PER_DAY:
+                                break
+                            notes_count_this_day += 1
+                            total_notes_crawled_for_keyword += 1
+                            video_id_list.append(video_item.get("View").get("aid"))
+                            await bilibili_store.update_bilibili_video(video_item)
+                            await bilibili_store.update_up_info(video_item)
+                            await self.get_bilibili_video(video_item, semaphore)
 
-                        if not video_list:
-                            utils.logger.info(
-                                f"[BilibiliCrawler.search] No more videos for '{keyword}' on {day.ctime()}, moving to next day."
-                            )
-                            break
+                    page += 1
+                    await self.batch_get_video_comments(video_id_list)
 
-                        semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
-                        task_list = [
-                            self.get_video_info_task(
-                                aid=video_item.get("aid"), bvid="", semaphore=semaphore
-                            )
-                            for video_item in video_list
-                        ]
-                        video_items = await asyncio.gather(*task_list)
-
-                        for video_item in video_items:
-                            if video_item:
-                                if (
-                                    daily_limit
-                                    and total_notes_crawled_for_keyword
-                                    >= config.CRAWLER_MAX_NOTES_COUNT
-                                ):
-                                    break
-                                if (
-                                    not daily_limit
-                                    and total_notes_crawled_for_keyword
-                                    >= config.CRAWLER_MAX_NOTES_COUNT
-                                ):
-                                    break
-                                if notes_count_this_day >= config.MAX_NOTES_PER_DAY:
-                                    break
-                                notes_count_this_day += 1
-                                total_notes_crawled_for_keyword += 1
-                                video_id_list.append(video_item.get("View").get("aid"))
-                                await bilibili_store.update_bilibili_video(video_item)
-                                await bilibili_store.update_up_info(video_item)
-                                await self.get_bilibili_video(video_item, semaphore)
-
-                        page += 1
-                        await self.batch_get_video_comments(video_id_list)
-
-                    except Exception as e:
-                        utils.logger.error(
-                            f"[BilibiliCrawler.search] Error searching on {day.ctime()}: {e}"
-                        )
-                        break
+                except Exception as e:
+                    utils.logger.error(
+                        f"[BilibiliCrawler.search] Error searching on {day.ctime()}: {e}"
+                    )
+                    break
 
     async def batch_get_video_comments(self, video_id_list: List[str]):
         """
@@ -389,46 +480,48 @@ class BilibiliCrawler(AbstractCrawler):
         utils.logger.info(
             f"[BilibiliCrawler.batch_get_video_comments] video ids:{video_id_list}"
         )
-        semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
+        # 评论翻页的每个请求在 client 里单独占用 API 并发名额，这里不再按视频占着名额
         task_list: List[Task] = []
         for video_id in video_id_list:
-            task = asyncio.create_task(
-                self.get_comments(video_id, semaphore), name=video_id
-            )
+            task = asyncio.create_task(self.get_comments(video_id), name=video_id)
             task_list.append(task)
         await asyncio.gather(*task_list)
 
-    async def get_comments(self, video_id: str, semaphore: asyncio.Semaphore):
+    async def get_comments(self, video_id: str):
         """
         get comment for video id
         :param video_id:
-        :param semaphore:
         :return:
         """
-        async with semaphore:
-            try:
-                utils.logger.info(
-                    f"[BilibiliCrawler.get_comments] begin get video_id: {video_id} comments ..."
-                )
-                await asyncio.sleep(random.uniform(0.5, 1.5))
-                await self.bili_client.get_video_all_comments(
-                    video_id=video_id,
-                    crawl_interval=random.random(),
-                    is_fetch_sub_comments=config.ENABLE_GET_SUB_COMMENTS,
-                    callback=bilibili_store.batch_update_bilibili_video_comments,
-                    max_count=config.CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES,
-                )
+        if await self.seen_index.is_fresh(SeenKind.COMMENTS, video_id):
+            utils.logger.info(
+                f"[BilibiliCrawler.get_comments] video_id: {video_id} comments fetched recently, skip"
+            )
+            return
+        try:
+            utils.logger.info(
+                f"[BilibiliCrawler.get_comments] begin get video_id: {video_id} comments ..."
+            )
+            await crawl_sleep(random.uniform(0.5, 1.5))
+            await self.bili_client.get_video_all_comments(
+                video_id=video_id,
+                crawl_interval=random.random(),
+                is_fetch_sub_comments=config.ENABLE_GET_SUB_COMMENTS,
+                callback=bilibili_store.batch_update_bilibili_video_comments,
+                max_count=config.CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES,
+            )
+            await self.seen_index.mark(SeenKind.COMMENTS, video_id)
 
-            except DataFetchError as ex:
-                utils.logger.error(
-                    f"[BilibiliCrawler.get_comments] get video_id: {video_id} comment error: {ex}"
-                )
-            except Exception as e:
-                utils.logger.error(
-                    f"[BilibiliCrawler.get_comments] may be been blocked, err:{e}"
-                )
-                # Propagate the exception to be caught by the main loop
-                raise
+        except DataFetchError as ex:
+            utils.logger.error(
+                f"[BilibiliCrawler.get_comments] get video_id: {video_id} comment error: {ex}"
+            )
+        except Exception as e:
+            utils.logger.error(
+                f"[BilibiliCrawler.get_comments] may be been blocked, err:{e}"
+            )
+            # Propagate the exception to be caught by the main loop
+            raise
 
     async def get_creator_videos(self, creator_id: int):
         """
@@ -443,7 +536,7 @@ class BilibiliCrawler(AbstractCrawler):
             await self.get_specified_videos(video_bvids_list)
             if int(result["page"]["count"]) <= pn * ps:
                 break
-            await asyncio.sleep(random.random())
+            await crawl_sleep(random.random())
             pn += 1
 
     async def get_specified_videos(self, bvids_list: List[str]):
@@ -451,7 +544,7 @@ class BilibiliCrawler(AbstractCrawler):
         get specified videos info
         :return:
         """
-        semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
+        semaphore = get_crawl_scheduler().limit(RequestClass.API, host=self.index_url)
         task_list = [
             self.get_video_info_task(aid=0, bvid=video_id, semaphore=semaphore)
             for video_id in bvids_list
@@ -470,7 +563,7 @@ class BilibiliCrawler(AbstractCrawler):
         await self.batch_get_video_comments(video_aids_list)
 
     async def get_video_info_task(
-        self, aid: int, bvid: str, semaphore: asyncio.Semaphore
+        self, aid: int, bvid: str, semaphore: SchedulerLimit
     ) -> Optional[Dict]:
         """
         Get video detail task
@@ -495,7 +588,7 @@ class BilibiliCrawler(AbstractCrawler):
                 return None
 
     async def get_video_play_url_task(
-        self, aid: int, cid: int, semaphore: asyncio.Semaphore
+        self, aid: int, cid: int, semaphore: SchedulerLimit
     ) -> Union[Dict, None]:
         """
         Get video play url
@@ -661,7 +754,7 @@ class BilibiliCrawler(AbstractCrawler):
                 f"[BilibiliCrawler.close] An error occurred during close: {e}"
             )
 
-    async def get_bilibili_video(self, video_item: Dict, semaphore: asyncio.Semaphore):
+    async def get_bilibili_video(self, video_item: Dict, semaphore: SchedulerLimit):
         """
         download bilibili video
         :param video_item:
@@ -676,31 +769,33 @@ class BilibiliCrawler(AbstractCrawler):
         video_item_view: Dict = video_item.get("View")
         aid = video_item_view.get("aid")
         cid = video_item_view.get("cid")
-        result = await self.get_video_play_url_task(aid, cid, semaphore)
-        if result is None:
-            utils.logger.info(
-                "[BilibiliCrawler.get_bilibili_video] get video play url failed"
-            )
-            return
-        durl_list = result.get("durl")
-        max_size = -1
-        video_url = ""
-        for durl in durl_list:
-            size = durl.get("size")
-            if size > max_size:
-                max_size = size
-                video_url = durl.get("url")
-        if video_url == "":
-            utils.logger.info(
-                "[BilibiliCrawler.get_bilibili_video] get video url failed"
-            )
-            return
 
-        content = await self.bili_client.get_video_media(video_url)
-        if content is None:
-            return
+        async def download(save_file_name: str) -> bool:
+            # 播放地址在下载时才请求，媒体文件库里已经有这个视频时不会发起任何请求
+            result = await self.get_video_play_url_task(aid, cid, semaphore)
+            if result is None:
+                utils.logger.info(
+                    "[BilibiliCrawler.get_bilibili_video] get video play url failed"
+                )
+                return False
+            durl_list = result.get("durl")
+            max_size = -1
+            video_url = ""
+            for durl in durl_list:
+                size = durl.get("size")
+                if size > max_size:
+                    max_size = size
+                    video_url = durl.get("url")
+            if video_url == "":
+                utils.logger.info(
+                    "[BilibiliCrawler.get_bilibili_video] get video url failed"
+                )
+                return False
+            return await self.bili_client.download_video_media(video_url, save_file_name)
+
         extension_file_name = f"video.mp4"
-        await bilibili_store.store_video(aid, content, extension_file_name)
+        save_file_name = bilibili_store.get_bilibili_video_file_name(aid, extension_file_name)
+        await self.media_store.fetch(aid, cid, save_file_name, download)
 
     async def get_all_creator_details(self, creator_id_list: List[int]):
         """
@@ -713,7 +808,7 @@ class BilibiliCrawler(AbstractCrawler):
             f"[BilibiliCrawler.get_creator_details] creator ids:{creator_id_list}"
         )
 
-        semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
+        semaphore = get_crawl_scheduler().limit(RequestClass.API, host=self.index_url)
         task_list: List[Task] = []
         try:
             for creator_id in creator_id_list:
@@ -728,7 +823,7 @@ class BilibiliCrawler(AbstractCrawler):
 
         await asyncio.gather(*task_list)
 
-    async def get_creator_details(self, creator_id: int, semaphore: asyncio.Semaphore):
+    async def get_creator_details(self, creator_id: int, semaphore: SchedulerLimit):
         """
         get details for creator id
         :param creator_id:
@@ -749,7 +844,7 @@ class BilibiliCrawler(AbstractCrawler):
         await self.get_followings(creator_info, semaphore)
         await self.get_dynamics(creator_info, semaphore)
 
-    async def get_fans(self, creator_info: Dict, semaphore: asyncio.Semaphore):
+    async def get_fans(self, creator_info: Dict, semaphore: SchedulerLimit):
         """
         get fans for creator id
         :param creator_info:
@@ -778,7 +873,7 @@ class BilibiliCrawler(AbstractCrawler):
                     f"[BilibiliCrawler.get_fans] may be been blocked, err:{e}"
                 )
 
-    async def get_followings(self, creator_info: Dict, semaphore: asyncio.Semaphore):
+    async def get_followings(self, creator_info: Dict, semaphore: SchedulerLimit):
         """
         get followings for creator id
         :param creator_info:
@@ -807,7 +902,7 @@ class BilibiliCrawler(AbstractCrawler):
                     f"[BilibiliCrawler.get_followings] may be been blocked, err:{e}"
                 )
 
-    async def get_dynamics(self, creator_info: Dict, semaphore: asyncio.Semaphore):
+    async def get_dynamics(self, creator_info: Dict, semaphore: SchedulerLimit):
         """
         get dynamics for creator id
         :param creator_info:
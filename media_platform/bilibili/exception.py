@@ -21,5 +21,9 @@ class DataFetchError(RequestError):
     """something error when fetch"""
 
 
+class WbiSignError(DataFetchError):
+    """wbi sign is rejected, usually the wbi keys have been rotated"""
+
+
 class IPBlockError(RequestError):
     """fetch so fast that the server block us ip"""
@@ -14,34 +14,117 @@
 # @Time    : 2023/12/2 23:26
 # @Desc    : bilibili 请求参数签名
 # 逆向实现参考：https://socialsisteryi.github.io/bilibili-API-collect/docs/misc/sign/wbi.html#wbi%E7%AD%BE%E5%90%8D%E7%AE%97%E6%B3%95
+import json
+import os
+import time
 import urllib.parse
+from functools import lru_cache
 from hashlib import md5
-from typing import Dict
+from typing import Dict, Optional, Tuple
 
 from tools import utils
 
+MIXIN_KEY_ENC_TAB = [
+    46, 47, 18, 2, 53, 8, 23, 32, 15, 50, 10, 31, 58, 3, 45, 35, 27, 43, 5, 49,
+    33, 9, 42, 19, 29, 28, 14, 39, 12, 38, 41, 13, 37, 48, 7, 16, 24, 55, 40,
+    61, 26, 17, 0, 1, 60, 51, 30, 4, 22, 25, 54, 21, 56, 59, 6, 63, 57, 62, 11,
+    36, 20, 34, 44, 52
+]
+
+
+@lru_cache(maxsize=16)
+def get_mixin_key(img_key: str, sub_key: str) -> str:
+    """
+    根据 img_key 和 sub_key 计算加盐的 key，同一对 key 只计算一次
+    :param img_key:
+    :param sub_key:
+    :return:
+    """
+    mixin_key = img_key + sub_key
+    return "".join(mixin_key[mt] for mt in MIXIN_KEY_ENC_TAB)[:32]
+
+
+class WbiKeyCache:
+    """
+    进程内共享的 WBI key 缓存，同时写入本地文件，下次运行时在有效期内可以直接使用
+    WBI key 每天才轮换一次，没必要每次签名都从浏览器的 localStorage 里读取
+    """
+
+    def __init__(self, cache_file: str, ttl: int):
+        """
+        :param cache_file: 缓存文件路径
+        :param ttl: 缓存有效期，单位秒
+        """
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self._keys: Optional[Tuple[str, str]] = None
+        self._update_time = 0.0
+        self._loaded = False
+
+    def _load(self):
+        self._loaded = True
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, encoding="utf-8") as f:
+                data = json.load(f)
+            self._keys = (data["img_key"], data["sub_key"])
+            self._update_time = float(data["update_time"])
+        except Exception as e:
+            utils.logger.warning(f"[WbiKeyCache._load] load wbi keys from {self.cache_file} error: {e}")
+
+    def get(self) -> Optional[Tuple[str, str]]:
+        """
+        获取有效期内的 (img_key, sub_key)，没有或者已过期返回 None
+        :return:
+        """
+        if not self._loaded:
+            self._load()
+        if self._keys and time.time() - self._update_time < self.ttl:
+            return self._keys
+        return None
+
+    def set(self, img_key: str, sub_key: str):
+        """
+        更新缓存并写入本地文件
+        :param img_key:
+        :param sub_key:
+        :return:
+        """
+        self._keys = (img_key, sub_key)
+        self._update_time = time.time()
+        self._loaded = True
+        if not self.cache_file:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.cache_file)), exist_ok=True)
+            with open(self.cache_file, "w", encoding="utf-8") as f:
+                json.dump({"img_key": img_key, "sub_key": sub_key, "update_time": self._update_time}, f)
+        except OSError as e:
+            utils.logger.warning(f"[WbiKeyCache.set] save wbi keys to {self.cache_file} error: {e}")
+
+    def invalidate(self):
+        """
+        签名校验失败时调用，下一次签名重新获取 key
+        :return:
+        """
+        self._keys = None
+        self._update_time = 0.0
+
 
 class BilibiliSign:
     def __init__(self, img_key: str, sub_key: str):
         self.img_key = img_key
         self.sub_key = sub_key
-        self.map_table = [
-            46, 47, 18, 2, 53, 8, 23, 32, 15, 50, 10, 31, 58, 3, 45, 35, 27, 43, 5, 49,
-            33, 9, 42, 19, 29, 28, 14, 39, 12, 38, 41, 13, 37, 48, 7, 16, 24, 55, 40,
-            61, 26, 17, 0, 1, 60, 51, 30, 4, 22, 25, 54, 21, 56, 59, 6, 63, 57, 62, 11,
-            36, 20, 34, 44, 52
-        ]
+        self.map_table = MIXIN_KEY_ENC_TAB
+        self.salt = get_mixin_key(img_key, sub_key)
 
     def get_salt(self) -> str:
         """
         获取加盐的 key
         :return:
         """
-        salt = ""
-        mixin_key = self.img_key + self.sub_key
-        for mt in self.map_table:
-            salt += mixin_key[mt]
-        return salt[:32]
+        return self.salt
 
     def sign(self, req_data: Dict) -> Dict:
         """
@@ -60,8 +143,7 @@ class BilibiliSign:
             in req_data.items()
         }
         query = urllib.parse.urlencode(req_data)
-        salt = self.get_salt()
-        wbi_sign = md5((query + salt).encode()).hexdigest()  # 计算 w_rid
+        wbi_sign = md5((query + self.salt).encode()).hexdigest()  # 计算 w_rid
         req_data['w_rid'] = wbi_sign
         return req_data
 
@@ -9,17 +9,20 @@
 # 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。  
 
 
-import asyncio
 import copy
 import json
 import urllib.parse
-from typing import Any, Callable, Dict, Optional
+from typing import Any, Callable, Dict, List, Optional
 
-import requests
 from playwright.async_api import BrowserContext
 
 from base.base_crawler import AbstractApiClient
 from tools import utils
+from tools.checkpoint import CheckpointScope, get_checkpoint_store
+from tools.crawl_scheduler import RequestClass, get_crawl_scheduler
+from tools.httpx_client_pool import HttpxClientPool
+from tools.rate_limiter import crawl_sleep, get_rate_limiter
+from tools.sub_comments import SubCommentBudget, expand_sub_comments
 from var import request_keyword_var
 
 from .exception import *
@@ -39,6 +42,9 @@ class DOUYINClient(AbstractApiClient):
     ):
         self.proxies = proxies
         self.timeout = timeout
+        self.http_client_pool = HttpxClientPool(proxies, timeout=timeout)
+        self.rate_limiter = get_rate_limiter("dy", throttle_errors=(AccountBlockedError, IPBlockError))
+        self.checkpoint_store = get_checkpoint_store("dy")
         self.headers = headers
         self._host = "https://www.douyin.com"
         self.playwright_page = playwright_page
@@ -92,15 +98,19 @@ class DOUYINClient(AbstractApiClient):
         params["a_bogus"] = a_bogus
 
     async def request(self, method, url, **kwargs):
-        response = None
-        if method == "GET":
-            response = requests.request(method, url, **kwargs)
-        elif method == "POST":
-            response = requests.request(method, url, **kwargs)
+        # 搜索、列表、详情、评论等接口请求都占用调度器的 API 并发名额
+        async with get_crawl_scheduler().limit(RequestClass.API, host=url):
+            async with self.rate_limiter.limit(url, self.proxies):
+                return await self._request(method, url, **kwargs)
+
+    async def _request(self, method, url, **kwargs):
+        # 使用异步的 httpx 连接池，不再用同步的 requests 阻塞事件循环
+        async with self.http_client_pool.borrow(self.proxies) as client:
+            response = await client.request(method, url, timeout=self.timeout, **kwargs)
+        if response.text == "" or response.text == "blocked":
+            utils.logger.error(f"request params incrr, response.text: {response.text}")
+            raise AccountBlockedError(f"account blocked, {response.text}")
         try:
-            if response.text == "" or response.text == "blocked":
-                utils.logger.error(f"request params incrr, response.text: {response.text}")
-                raise Exception("account blocked")
             return response.json()
         except Exception as e:
             raise DataFetchError(f"{e}, {response.text}")
@@ -242,9 +252,16 @@ class DOUYINClient(AbstractApiClient):
         :param max_count: 一次帖子爬取的最大评论数量
         :return: 评论列表
         """
+        # 续爬时从上次记录的评论游标继续
+        checkpoint = await self.checkpoint_store.load(CheckpointScope.COMMENTS, aweme_id)
+        if checkpoint.get("done"):
+            return []
+        fetched_count = checkpoint.get("count", 0)
+        max_count -= fetched_count
         result = []
         comments_has_more = 1
-        comments_cursor = 0
+        comments_cursor = checkpoint.get("cursor", 0)
+        sub_comment_budget = SubCommentBudget(host=self._host)
         while comments_has_more and len(result) < max_count:
             comments_res = await self.get_aweme_comments(aweme_id, comments_cursor)
             comments_has_more = comments_res.get("has_more", 0)
@@ -258,31 +275,65 @@ class DOUYINClient(AbstractApiClient):
             if callback:  # 如果有回调函数，就执行回调函数
                 await callback(aweme_id, comments)
 
-            await asyncio.sleep(crawl_interval)
-            if not is_fetch_sub_comments:
-                continue
-            # 获取二级评论
-            for comment in comments:
-                reply_comment_total = comment.get("reply_comment_total")
+            await crawl_sleep(crawl_interval)
+            if is_fetch_sub_comments:
+                # 获取二级评论，多条一级评论并发展开
+                sub_comments = await self.get_comments_all_sub_comments(
+                    aweme_id, comments, crawl_interval, callback, sub_comment_budget
+                )
+                result.extend(sub_comments)
+            await self.checkpoint_store.save(
+                CheckpointScope.COMMENTS, aweme_id,
+                {"cursor": comments_cursor, "count": fetched_count + len(result)},
+            )
+        await self.checkpoint_store.finish(CheckpointScope.COMMENTS, aweme_id)
+        return result
+
+    async def get_comments_all_sub_comments(
+            self,
+            aweme_id: str,
+            comments: List[Dict],
+            crawl_interval: float = 1.0,
+            callback: Optional[Callable] = None,
+            budget: Optional[SubCommentBudget] = None,
+    ) -> List[Dict]:
+        """
+        获取指定一级评论下的所有二级评论，多条一级评论的二级评论并发展开
+        :param aweme_id: 帖子ID
+        :param comments: 一级评论列表
+        :param crawl_interval: 抓取间隔
+        :param callback: 回调函数，用于处理抓取到的评论
+        :param budget: 帖子的二级评论配额，同一个帖子的多次调用共用
+        :return: 二级评论列表
+        """
+        budget = budget or SubCommentBudget(host=self._host)
 
-                if reply_comment_total > 0:
-                    comment_id = comment.get("cid")
-                    sub_comments_has_more = 1
-                    sub_comments_cursor = 0
+        async def expand(comment: Dict) -> List[Dict]:
+            result = []
+            comment_id = comment.get("cid")
+            sub_comments_has_more = 1
+            sub_comments_cursor = 0
+            page = 0
+            while sub_comments_has_more:
+                async with budget.page_limit():
+                    if not budget.page_allowed(page):
+                        break
+                    page += 1
+                    sub_comments_res = await self.get_sub_comments(aweme_id, comment_id, sub_comments_cursor)
+                sub_comments_has_more = sub_comments_res.get("has_more", 0)
+                sub_comments_cursor = sub_comments_res.get("cursor", 0)
+                sub_comments = budget.take(sub_comments_res.get("comments") or [])
 
-                    while sub_comments_has_more:
-                        sub_comments_res = await self.get_sub_comments(aweme_id, comment_id, sub_comments_cursor)
-                        sub_comments_has_more = sub_comments_res.get("has_more", 0)
-                        sub_comments_cursor = sub_comments_res.get("cursor", 0)
-                        sub_comments = sub_comments_res.get("comments", [])
+                if not sub_comments:
+                    continue
+                result.extend(sub_comments)
+                if callback:  # 如果有回调函数，就执行回调函数
+                    await callback(aweme_id, sub_comments)
+                await crawl_sleep(crawl_interval)
+            return result
 
-                        if not sub_comments:
-                            continue
-                        result.extend(sub_comments)
-                        if callback:  # 如果有回调函数，就执行回调函数
-                            await callback(aweme_id, sub_comments)
-                        await asyncio.sleep(crawl_interval)
-        return result
+        roots = [comment for comment in comments if (comment.get("reply_comment_total") or 0) > 0]
+        return await expand_sub_comments(roots, expand, budget)
 
     async def get_user_info(self, sec_user_id: str):
         uri = "/aweme/v1/web/user/profile/other/"
@@ -307,8 +358,12 @@ class DOUYINClient(AbstractApiClient):
         return await self.get(uri, params)
 
     async def get_all_user_aweme_posts(self, sec_user_id: str, callback: Optional[Callable] = None):
+        # 续爬时从上次记录的翻页游标继续
+        checkpoint = await self.checkpoint_store.load(CheckpointScope.CREATOR, sec_user_id)
+        if checkpoint.get("done"):
+            return []
         posts_has_more = 1
-        max_cursor = ""
+        max_cursor = checkpoint.get("cursor", "")
         result = []
         while posts_has_more == 1:
             aweme_post_res = await self.get_user_aweme_posts(sec_user_id, max_cursor)
@@ -320,4 +375,6 @@ class DOUYINClient(AbstractApiClient):
             if callback:
                 await callback(aweme_list)
             result.extend(aweme_list)
+            await self.checkpoint_store.save(CheckpointScope.CREATOR, sec_user_id, {"cursor": max_cursor})
+        await self.checkpoint_store.finish(CheckpointScope.CREATOR, sec_user_id)
         return result
@@ -13,7 +13,7 @@ import asyncio
 import os
 import random
 from asyncio import Task
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
 from playwright.async_api import (
     BrowserContext,
@@ -29,7 +29,12 @@ from proxy.proxy_ip_pool import IpInfoModel, create_ip_pool
 from store import douyin as douyin_store
 from tools import utils
 from tools.cdp_browser import CDPBrowserManager
-from var import crawler_type_var, source_keyword_var
+from tools.crawl_pipeline import CrawlPipeline
+from tools.checkpoint import CheckpointScope, SearchProgress, get_checkpoint_store
+from tools.keyword_workers import KeywordNotes, run_keyword_workers, split_keywords
+from tools.seen_index import SeenKind, get_seen_index
+from tools.crawl_scheduler import RequestClass, SchedulerLimit, get_crawl_scheduler
+from var import crawler_type_var
 
 from .client import DOUYINClient
 from .exception import DataFetchError
@@ -42,10 +47,13 @@ class DouYinCrawler(AbstractCrawler):
     dy_client: DOUYINClient
     browser_context: BrowserContext
     cdp_manager: Optional[CDPBrowserManager]
+    keyword_notes: KeywordNotes
 
     def __init__(self) -> None:
         self.index_url = "https://www.douyin.com"
         self.cdp_manager = None
+        self.seen_index = get_seen_index("dy")
+        self.checkpoint_store = get_checkpoint_store("dy")
 
     async def start(self) -> None:
         playwright_proxy_format, httpx_proxy_format = None, None
@@ -114,16 +122,33 @@ class DouYinCrawler(AbstractCrawler):
         dy_limit_count = 10  # douyin limit page fixed value
         if config.CRAWLER_MAX_NOTES_COUNT < dy_limit_count:
             config.CRAWLER_MAX_NOTES_COUNT = dy_limit_count
+        self.keyword_notes = KeywordNotes(platform="dy")
+        await run_keyword_workers(split_keywords(config.KEYWORDS), self.search_keyword)
+
+    async def search_keyword(self, keyword: str) -> None:
+        """
+        搜索单个关键词，存储、评论交给流水线处理
+        Args:
+            keyword: 搜索关键词
+
+        Returns:
+
+        """
+        dy_limit_count = 10  # douyin limit page fixed value
         start_page = config.START_PAGE  # start page number
-        for keyword in config.KEYWORDS.split(","):
-            source_keyword_var.set(keyword)
-            utils.logger.info(f"[DouYinCrawler.search] Current keyword: {keyword}")
-            aweme_list: List[str] = []
-            page = 0
-            dy_search_id = ""
+        utils.logger.info(f"[DouYinCrawler.search] Current keyword: {keyword}")
+        # 续爬时从上次记录的页码继续，已经搜完的关键词直接跳过
+        checkpoint = await self.checkpoint_store.load(CheckpointScope.SEARCH, keyword)
+        if checkpoint.get("done"):
+            utils.logger.info(f"[DouYinCrawler.search] keyword: {keyword} already finished, skip")
+            return
+        page = checkpoint.get("page", 0)
+        dy_search_id = checkpoint.get("search_id", "")
+        progress = SearchProgress(self.checkpoint_store, keyword, page, search_id=dy_search_id)
+        async with self.create_search_pipeline(keyword, on_page_done=progress.page_done) as pipeline:
             while (
                 page - start_page + 1
-            ) * dy_limit_count <= config.CRAWLER_MAX_NOTES_COUNT:
+            ) * dy_limit_count <= config.CRAWLER_MAX_NOTES_COUNT and await self.keyword_notes.wait_budget(keyword):
                 if page < start_page:
                     utils.logger.info(f"[DouYinCrawler.search] Skip {page}")
                     page += 1
@@ -147,33 +172,64 @@ class DouYinCrawler(AbstractCrawler):
                     utils.logger.error(
                         f"[DouYinCrawler.search] search douyin keyword: {keyword} failed"
                     )
-                    break
+                    # 不标记完成，续爬时从这一页重新开始
+                    return
 
                 page += 1
                 if "data" not in posts_res:
                     utils.logger.error(
                         f"[DouYinCrawler.search] search douyin keyword: {keyword} failed，账号也许被风控了。"
                     )
-                    break
+                    return
                 dy_search_id = posts_res.get("extra", {}).get("logid", "")
-                for post_item in posts_res.get("data"):
-                    try:
-                        aweme_info: Dict = (
-                            post_item.get("aweme_info")
-                            or post_item.get("aweme_mix_info", {}).get("mix_items")[0]
-                        )
-                    except TypeError:
-                        continue
-                    aweme_list.append(aweme_info.get("aweme_id", ""))
-                    await douyin_store.update_douyin_aweme(aweme_item=aweme_info)
-            utils.logger.info(
-                f"[DouYinCrawler.search] keyword:{keyword}, aweme_list:{aweme_list}"
-            )
-            await self.batch_get_note_comments(aweme_list)
+                progress.state["search_id"] = dy_search_id
+                # 存储和评论交给流水线处理，这里直接翻下一页；进度记录的是最早一页还没处理完的页码
+                async with progress.page(pipeline, page - 1):
+                    for post_item in posts_res.get("data"):
+                        try:
+                            aweme_info: Dict = (
+                                post_item.get("aweme_info")
+                                or post_item.get("aweme_mix_info", {}).get("mix_items")[0]
+                            )
+                        except TypeError:
+                            continue
+                        if not await self.keyword_notes.wait_budget(keyword):
+                            break
+                        # 其他关键词已经登记过的视频只记录命中的关键词，不重复存储
+                        if not await self.keyword_notes.claim(aweme_info.get("aweme_id", ""), keyword):
+                            continue
+                        await pipeline.put("store", aweme_info)
+                        if config.ENABLE_GET_COMMENTS:
+                            await pipeline.put("comments", aweme_info.get("aweme_id", ""))
+        await self.checkpoint_store.finish(CheckpointScope.SEARCH, keyword)
+
+    def create_search_pipeline(
+        self, keyword: str, on_page_done: Optional[Callable[[int], Awaitable[None]]] = None
+    ) -> CrawlPipeline:
+        """
+        搜索流水线：搜索结果 -> 存储 / 评论
+        Args:
+            keyword: 搜索关键词
+            on_page_done: 一页搜索结果全部处理完之后的回调
+
+        Returns:
+
+        """
+        async def store_aweme(aweme_info: Dict):
+            async with self.keyword_notes.storing(aweme_info.get("aweme_id", "")):
+                await douyin_store.update_douyin_aweme(aweme_info)
+
+        async def fetch_comments(aweme_id: str):
+            await self.get_comments(aweme_id)
+
+        pipeline = CrawlPipeline(f"DouYinCrawler.search[{keyword}]", on_tag_done=on_page_done)
+        pipeline.add_stage("store", store_aweme)
+        pipeline.add_stage("comments", fetch_comments, workers=config.SEARCH_PIPELINE_WORKERS)
+        return pipeline
 
     async def get_specified_awemes(self):
         """Get the information and comments of the specified post"""
-        semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
+        semaphore = get_crawl_scheduler().limit(RequestClass.API, host=self.index_url)
         task_list = [
             self.get_aweme_detail(aweme_id=aweme_id, semaphore=semaphore)
             for aweme_id in config.DY_SPECIFIED_ID_LIST
@@ -185,7 +241,7 @@ class DouYinCrawler(AbstractCrawler):
         await self.batch_get_note_comments(config.DY_SPECIFIED_ID_LIST)
 
     async def get_aweme_detail(
-        self, aweme_id: str, semaphore: asyncio.Semaphore
+        self, aweme_id: str, semaphore: SchedulerLimit
     ) -> Any:
         """Get note detail"""
         async with semaphore:
@@ -212,34 +268,37 @@ class DouYinCrawler(AbstractCrawler):
             )
             return
 
+        # 评论翻页的每个请求在 client 里单独占用 API 并发名额，这里不再按视频占着名额
         task_list: List[Task] = []
-        semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
         for aweme_id in aweme_list:
-            task = asyncio.create_task(
-                self.get_comments(aweme_id, semaphore), name=aweme_id
-            )
+            task = asyncio.create_task(self.get_comments(aweme_id), name=aweme_id)
             task_list.append(task)
         if len(task_list) > 0:
             await asyncio.wait(task_list)
 
-    async def get_comments(self, aweme_id: str, semaphore: asyncio.Semaphore) -> None:
-        async with semaphore:
-            try:
-                # 将关键词列表传递给 get_aweme_all_comments 方法
-                await self.dy_client.get_aweme_all_comments(
-                    aweme_id=aweme_id,
-                    crawl_interval=random.random(),
-                    is_fetch_sub_comments=config.ENABLE_GET_SUB_COMMENTS,
-                    callback=douyin_store.batch_update_dy_aweme_comments,
-                    max_count=config.CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES,
-                )
-                utils.logger.info(
-                    f"[DouYinCrawler.get_comments] aweme_id: {aweme_id} comments have all been obtained and filtered ..."
-                )
-            except DataFetchError as e:
-                utils.logger.error(
-                    f"[DouYinCrawler.get_comments] aweme_id: {aweme_id} get comments failed, error: {e}"
-                )
+    async def get_comments(self, aweme_id: str) -> None:
+        if await self.seen_index.is_fresh(SeenKind.COMMENTS, aweme_id):
+            utils.logger.info(
+                f"[DouYinCrawler.get_comments] aweme_id: {aweme_id} comments fetched recently, skip"
+            )
+            return
+        try:
+            # 将关键词列表传递给 get_aweme_all_comments 方法
+            await self.dy_client.get_aweme_all_comments(
+                aweme_id=aweme_id,
+                crawl_interval=random.random(),
+                is_fetch_sub_comments=config.ENABLE_GET_SUB_COMMENTS,
+                callback=douyin_store.batch_update_dy_aweme_comments,
+                max_count=config.CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES,
+            )
+            await self.seen_index.mark(SeenKind.COMMENTS, aweme_id)
+            utils.logger.info(
+                f"[DouYinCrawler.get_comments] aweme_id: {aweme_id} comments have all been obtained and filtered ..."
+            )
+        except DataFetchError as e:
+            utils.logger.error(
+                f"[DouYinCrawler.get_comments] aweme_id: {aweme_id} get comments failed, error: {e}"
+            )
 
     async def get_creators_and_videos(self) -> None:
         """
@@ -265,7 +324,7 @@ class DouYinCrawler(AbstractCrawler):
         """
         Concurrently obtain the specified post list and save the data
         """
-        semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
+        semaphore = get_crawl_scheduler().limit(RequestClass.API, host=self.index_url)
         task_list = [
             self.get_aweme_detail(post_item.get("aweme_id"), semaphore)
             for post_item in video_list
@@ -16,5 +16,9 @@ class DataFetchError(RequestError):
     """something error when fetch"""
 
 
+class AccountBlockedError(DataFetchError):
+    """the account is blocked, response text is empty or 'blocked'"""
+
+
 class IPBlockError(RequestError):
     """fetch so fast that the server block us ip"""
@@ -17,10 +17,11 @@
 
 import random
 
-import execjs
 from playwright.async_api import Page
 
-douyin_sign_obj = execjs.compile(open('libs/douyin.js', encoding='utf-8-sig').read())
+from tools.js_sign_pool import get_sign_pool
+
+DOUYIN_SIGN_JS_PATH = "libs/douyin.js"
 
 def get_web_id():
     """
@@ -48,11 +49,11 @@ async def get_a_bogus(url: str, params: str, post_data: dict, user_agent: str, p
     """
     获取 a_bogus 参数, 目前不支持post请求类型的签名
     """
-    return get_a_bogus_from_js(url, params, user_agent)
+    return await get_a_bogus_from_js(url, params, user_agent)
 
-def get_a_bogus_from_js(url: str, params: str, user_agent: str):
+async def get_a_bogus_from_js(url: str, params: str, user_agent: str):
     """
-    通过js获取 a_bogus 参数
+    通过js获取 a_bogus 参数，由常驻的 Node 签名进程池计算
     Args:
         url:
         params:
@@ -64,7 +65,7 @@ def get_a_bogus_from_js(url: str, params: str, user_agent: str):
     sign_js_name = "sign_datail"
     if "/reply" in url:
         sign_js_name = "sign_reply"
-    return douyin_sign_obj.call(sign_js_name, params, user_agent)
+    return await get_sign_pool(DOUYIN_SIGN_JS_PATH).sign(sign_js_name, params, user_agent)
 
 
 
@@ -10,19 +10,22 @@
 
 
 # -*- coding: utf-8 -*-
-import asyncio
 import json
 from typing import Any, Callable, Dict, List, Optional
 from urllib.parse import urlencode
 
-import httpx
 from playwright.async_api import BrowserContext, Page
 
 import config
 from base.base_crawler import AbstractApiClient
 from tools import utils
+from tools.checkpoint import CheckpointScope, get_checkpoint_store
+from tools.crawl_scheduler import RequestClass, get_crawl_scheduler
+from tools.httpx_client_pool import HttpxClientPool
+from tools.rate_limiter import crawl_sleep, get_rate_limiter
+from tools.sub_comments import SubCommentBudget, expand_sub_comments
 
-from .exception import DataFetchError
+from .exception import DataFetchError, IPBlockError
 from .graphql import KuaiShouGraphQL
 
 
@@ -38,6 +41,9 @@ class KuaiShouClient(AbstractApiClient):
     ):
         self.proxies = proxies
         self.timeout = timeout
+        self.http_client_pool = HttpxClientPool(proxies, timeout=timeout)
+        self.rate_limiter = get_rate_limiter("ks", throttle_errors=(IPBlockError,))
+        self.checkpoint_store = get_checkpoint_store("ks")
         self.headers = headers
         self._host = "https://www.kuaishou.com/graphql"
         self.playwright_page = playwright_page
@@ -45,7 +51,12 @@ class KuaiShouClient(AbstractApiClient):
         self.graphql = KuaiShouGraphQL()
 
     async def request(self, method, url, **kwargs) -> Any:
-        async with httpx.AsyncClient(proxies=self.proxies) as client:
+        async with get_crawl_scheduler().limit(RequestClass.API, host=url):
+            async with self.rate_limiter.limit(url, self.proxies):
+                return await self._request(method, url, **kwargs)
+
+    async def _request(self, method, url, **kwargs) -> Any:
+        async with self.http_client_pool.borrow(self.proxies) as client:
             response = await client.request(method, url, timeout=self.timeout, **kwargs)
         data: Dict = response.json()
         if data.get("errors"):
@@ -193,8 +204,15 @@ class KuaiShouClient(AbstractApiClient):
         :return:
         """
 
+        # 续爬时从上次记录的评论游标继续
+        checkpoint = await self.checkpoint_store.load(CheckpointScope.COMMENTS, photo_id)
+        if checkpoint.get("done"):
+            return []
+        fetched_count = checkpoint.get("count", 0)
+        max_count -= fetched_count
         result = []
-        pcursor = ""
+        pcursor = checkpoint.get("cursor", "")
+        sub_comment_budget = SubCommentBudget(host=self._host)
 
         while pcursor != "no_more" and len(result) < max_count:
             comments_res = await self.get_video_comments(photo_id, pcursor)
@@ -206,11 +224,16 @@ class KuaiShouClient(AbstractApiClient):
             if callback:  # 如果有回调函数，就执行回调函数
                 await callback(photo_id, comments)
             result.extend(comments)
-            await asyncio.sleep(crawl_interval)
+            await crawl_sleep(crawl_interval)
             sub_comments = await self.get_comments_all_sub_comments(
-                comments, photo_id, crawl_interval, callback
+                comments, photo_id, crawl_interval, callback, sub_comment_budget
             )
             result.extend(sub_comments)
+            await self.checkpoint_store.save(
+                CheckpointScope.COMMENTS, photo_id,
+                {"cursor": pcursor, "count": fetched_count + len(result)},
+            )
+        await self.checkpoint_store.finish(CheckpointScope.COMMENTS, photo_id)
         return result
 
     async def get_comments_all_sub_comments(
@@ -219,14 +242,16 @@ class KuaiShouClient(AbstractApiClient):
         photo_id,
         crawl_interval: float = 1.0,
         callback: Optional[Callable] = None,
+        budget: Optional[SubCommentBudget] = None,
     ) -> List[Dict]:
         """
-        获取指定一级评论下的所有二级评论, 该方法会一直查找一级评论下的所有二级评论信息
+        获取指定一级评论下的所有二级评论, 多条一级评论的二级评论并发展开
         Args:
             comments: 评论列表
             photo_id: 视频id
             crawl_interval: 爬取一次评论的延迟单位（秒）
             callback: 一次评论爬取结束后
+            budget: 视频的二级评论配额，同一个视频的多次调用共用
         Returns:
 
         """
@@ -236,32 +261,40 @@ class KuaiShouClient(AbstractApiClient):
             )
             return []
 
-        result = []
-        for comment in comments:
-            sub_comments = comment.get("subComments")
+        budget = budget or SubCommentBudget(host=self._host)
+
+        async def expand(comment: Dict) -> List[Dict]:
+            result = []
+            sub_comments = budget.take(comment.get("subComments") or [])
             if sub_comments and callback:
                 await callback(photo_id, sub_comments)
 
             sub_comment_pcursor = comment.get("subCommentsPcursor")
             if sub_comment_pcursor == "no_more":
-                continue
+                return result
 
             root_comment_id = comment.get("commentId")
             sub_comment_pcursor = ""
-
+            page = 0
             while sub_comment_pcursor != "no_more":
-                comments_res = await self.get_video_sub_comments(
-                    photo_id, root_comment_id, sub_comment_pcursor
-                )
+                async with budget.page_limit():
+                    if not budget.page_allowed(page):
+                        break
+                    page += 1
+                    comments_res = await self.get_video_sub_comments(
+                        photo_id, root_comment_id, sub_comment_pcursor
+                    )
                 vision_sub_comment_list = comments_res.get("visionSubCommentList", {})
                 sub_comment_pcursor = vision_sub_comment_list.get("pcursor", "no_more")
 
-                comments = vision_sub_comment_list.get("subComments", {})
+                sub_comments = budget.take(vision_sub_comment_list.get("subComments") or [])
                 if callback:
-                    await callback(photo_id, comments)
-                await asyncio.sleep(crawl_interval)
-                result.extend(comments)
-        return result
+                    await callback(photo_id, sub_comments)
+                await crawl_sleep(crawl_interval)
+                result.extend(sub_comments)
+            return result
+
+        return await expand_sub_comments(comments, expand, budget)
 
     async def get_creator_info(self, user_id: str) -> Dict:
         """
@@ -308,6 +341,6 @@ class KuaiShouClient(AbstractApiClient):
 
             if callback:
                 await callback(videos)
-            await asyncio.sleep(crawl_interval)
+            await crawl_sleep(crawl_interval)
             result.extend(videos)
         return result
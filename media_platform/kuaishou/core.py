@@ -14,7 +14,7 @@ import os
 import random
 import time
 from asyncio import Task
-from typing import Dict, List, Optional, Tuple
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 
 from playwright.async_api import (
     BrowserContext,
@@ -30,7 +30,12 @@ from proxy.proxy_ip_pool import IpInfoModel, create_ip_pool
 from store import kuaishou as kuaishou_store
 from tools import utils
 from tools.cdp_browser import CDPBrowserManager
-from var import comment_tasks_var, crawler_type_var, source_keyword_var
+from tools.crawl_pipeline import CrawlPipeline
+from tools.checkpoint import CheckpointScope, SearchProgress, get_checkpoint_store
+from tools.keyword_workers import KeywordNotes, run_keyword_workers, split_keywords
+from tools.seen_index import SeenKind, get_seen_index
+from tools.crawl_scheduler import RequestClass, SchedulerLimit, get_crawl_scheduler
+from var import comment_tasks_var, crawler_type_var
 
 from .client import KuaiShouClient
 from .exception import DataFetchError
@@ -42,11 +47,14 @@ class KuaishouCrawler(AbstractCrawler):
     ks_client: KuaiShouClient
     browser_context: BrowserContext
     cdp_manager: Optional[CDPBrowserManager]
+    keyword_notes: KeywordNotes
 
     def __init__(self):
         self.index_url = "https://www.kuaishou.com"
         self.user_agent = utils.get_user_agent()
         self.cdp_manager = None
+        self.seen_index = get_seen_index("ks")
+        self.checkpoint_store = get_checkpoint_store("ks")
 
     async def start(self):
         playwright_proxy_format, httpx_proxy_format = None, None
@@ -116,17 +124,35 @@ class KuaishouCrawler(AbstractCrawler):
         ks_limit_count = 20  # kuaishou limit page fixed value
         if config.CRAWLER_MAX_NOTES_COUNT < ks_limit_count:
             config.CRAWLER_MAX_NOTES_COUNT = ks_limit_count
+        self.keyword_notes = KeywordNotes(platform="ks")
+        await run_keyword_workers(split_keywords(config.KEYWORDS), self.search_keyword)
+
+    async def search_keyword(self, keyword: str) -> None:
+        """
+        搜索单个关键词，存储、评论交给流水线处理
+        Args:
+            keyword: 搜索关键词
+
+        Returns:
+
+        """
+        ks_limit_count = 20  # kuaishou limit page fixed value
         start_page = config.START_PAGE
-        for keyword in config.KEYWORDS.split(","):
-            search_session_id = ""
-            source_keyword_var.set(keyword)
-            utils.logger.info(
-                f"[KuaishouCrawler.search] Current search keyword: {keyword}"
-            )
-            page = 1
+        utils.logger.info(
+            f"[KuaishouCrawler.search] Current search keyword: {keyword}"
+        )
+        # 续爬时从上次记录的页码继续，已经搜完的关键词直接跳过
+        checkpoint = await self.checkpoint_store.load(CheckpointScope.SEARCH, keyword)
+        if checkpoint.get("done"):
+            utils.logger.info(f"[KuaishouCrawler.search] keyword: {keyword} already finished, skip")
+            return
+        page = checkpoint.get("page", 1)
+        search_session_id = checkpoint.get("search_session_id", "")
+        progress = SearchProgress(self.checkpoint_store, keyword, page, search_session_id=search_session_id)
+        async with self.create_search_pipeline(keyword, on_page_done=progress.page_done) as pipeline:
             while (
                 page - start_page + 1
-            ) * ks_limit_count <= config.CRAWLER_MAX_NOTES_COUNT:
+            ) * ks_limit_count <= config.CRAWLER_MAX_NOTES_COUNT and await self.keyword_notes.wait_budget(keyword):
                 if page < start_page:
                     utils.logger.info(f"[KuaishouCrawler.search] Skip page: {page}")
                     page += 1
@@ -134,7 +160,6 @@ class KuaishouCrawler(AbstractCrawler):
                 utils.logger.info(
                     f"[KuaishouCrawler.search] search kuaishou keyword: {keyword}, page: {page}"
                 )
-                video_id_list: List[str] = []
                 videos_res = await self.ks_client.search_info_by_keyword(
                     keyword=keyword,
                     pcursor=str(page),
@@ -153,17 +178,49 @@ class KuaishouCrawler(AbstractCrawler):
                     )
                     continue
                 search_session_id = vision_search_photo.get("searchSessionId", "")
-                for video_detail in vision_search_photo.get("feeds"):
-                    video_id_list.append(video_detail.get("photo", {}).get("id"))
-                    await kuaishou_store.update_kuaishou_video(video_item=video_detail)
-
-                # batch fetch video comments
+                progress.state["search_session_id"] = search_session_id
+                # 存储和评论交给流水线处理，这里直接翻下一页；进度记录的是最早一页还没处理完的页码
+                # 其他关键词已经登记过的视频只记录命中的关键词，不重复存储
+                async with progress.page(pipeline, page):
+                    for video_detail in vision_search_photo.get("feeds"):
+                        if not await self.keyword_notes.wait_budget(keyword):
+                            break
+                        video_id = video_detail.get("photo", {}).get("id")
+                        if not await self.keyword_notes.claim(video_id, keyword):
+                            continue
+                        await pipeline.put("store", video_detail)
+                        if config.ENABLE_GET_COMMENTS:
+                            await pipeline.put("comments", video_id)
                 page += 1
-                await self.batch_get_video_comments(video_id_list)
+        await self.checkpoint_store.finish(CheckpointScope.SEARCH, keyword)
+
+    def create_search_pipeline(
+        self, keyword: str, on_page_done: Optional[Callable[[int], Awaitable[None]]] = None
+    ) -> CrawlPipeline:
+        """
+        搜索流水线：搜索结果 -> 存储 / 评论
+        Args:
+            keyword: 搜索关键词
+            on_page_done: 一页搜索结果全部处理完之后的回调
+
+        Returns:
+
+        """
+        async def fetch_comments(video_id: str):
+            await self.get_comments(video_id)
+
+        async def store_video(video_detail: Dict):
+            async with self.keyword_notes.storing(video_detail.get("photo", {}).get("id")):
+                await kuaishou_store.update_kuaishou_video(video_detail)
+
+        pipeline = CrawlPipeline(f"KuaishouCrawler.search[{keyword}]", on_tag_done=on_page_done)
+        pipeline.add_stage("store", store_video)
+        pipeline.add_stage("comments", fetch_comments, workers=config.SEARCH_PIPELINE_WORKERS)
+        return pipeline
 
     async def get_specified_videos(self):
         """Get the information and comments of the specified post"""
-        semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
+        semaphore = get_crawl_scheduler().limit(RequestClass.API, host=self.index_url)
         task_list = [
             self.get_video_info_task(video_id=video_id, semaphore=semaphore)
             for video_id in config.KS_SPECIFIED_ID_LIST
@@ -175,7 +232,7 @@ class KuaishouCrawler(AbstractCrawler):
         await self.batch_get_video_comments(config.KS_SPECIFIED_ID_LIST)
 
     async def get_video_info_task(
-        self, video_id: str, semaphore: asyncio.Semaphore
+        self, video_id: str, semaphore: SchedulerLimit
     ) -> Optional[Dict]:
         """Get video detail task"""
         async with semaphore:
@@ -211,53 +268,55 @@ class KuaishouCrawler(AbstractCrawler):
         utils.logger.info(
             f"[KuaishouCrawler.batch_get_video_comments] video ids:{video_id_list}"
         )
-        semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
+        # 评论翻页的每个请求在 client 里单独占用 API 并发名额，这里不再按视频占着名额
         task_list: List[Task] = []
         for video_id in video_id_list:
-            task = asyncio.create_task(
-                self.get_comments(video_id, semaphore), name=video_id
-            )
+            task = asyncio.create_task(self.get_comments(video_id), name=video_id)
             task_list.append(task)
 
         comment_tasks_var.set(task_list)
         await asyncio.gather(*task_list)
 
-    async def get_comments(self, video_id: str, semaphore: asyncio.Semaphore):
+    async def get_comments(self, video_id: str):
         """
         get comment for video id
         :param video_id:
-        :param semaphore:
         :return:
         """
-        async with semaphore:
-            try:
-                utils.logger.info(
-                    f"[KuaishouCrawler.get_comments] begin get video_id: {video_id} comments ..."
-                )
-                await self.ks_client.get_video_all_comments(
-                    photo_id=video_id,
-                    crawl_interval=random.random(),
-                    callback=kuaishou_store.batch_update_ks_video_comments,
-                    max_count=config.CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES,
-                )
-            except DataFetchError as ex:
-                utils.logger.error(
-                    f"[KuaishouCrawler.get_comments] get video_id: {video_id} comment error: {ex}"
-                )
-            except Exception as e:
-                utils.logger.error(
-                    f"[KuaishouCrawler.get_comments] may be been blocked, err:{e}"
-                )
-                # use time.sleeep block main coroutine instead of asyncio.sleep and cacel running comment task
-                # maybe kuaishou block our request, we will take a nap and update the cookie again
-                current_running_tasks = comment_tasks_var.get()
-                for task in current_running_tasks:
-                    task.cancel()
-                time.sleep(20)
-                await self.context_page.goto(f"{self.index_url}?isHome=1")
-                await self.ks_client.update_cookies(
-                    browser_context=self.browser_context
-                )
+        if await self.seen_index.is_fresh(SeenKind.COMMENTS, video_id):
+            utils.logger.info(
+                f"[KuaishouCrawler.get_comments] video_id: {video_id} comments fetched recently, skip"
+            )
+            return
+        try:
+            utils.logger.info(
+                f"[KuaishouCrawler.get_comments] begin get video_id: {video_id} comments ..."
+            )
+            await self.ks_client.get_video_all_comments(
+                photo_id=video_id,
+                crawl_interval=random.random(),
+                callback=kuaishou_store.batch_update_ks_video_comments,
+                max_count=config.CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES,
+            )
+            await self.seen_index.mark(SeenKind.COMMENTS, video_id)
+        except DataFetchError as ex:
+            utils.logger.error(
+                f"[KuaishouCrawler.get_comments] get video_id: {video_id} comment error: {ex}"
+            )
+        except Exception as e:
+            utils.logger.error(
+                f"[KuaishouCrawler.get_comments] may be been blocked, err:{e}"
+            )
+            # use time.sleeep block main coroutine instead of asyncio.sleep and cacel running comment task
+            # maybe kuaishou block our request, we will take a nap and update the cookie again
+            current_running_tasks = comment_tasks_var.get()
+            for task in current_running_tasks:
+                task.cancel()
+            time.sleep(20)
+            await self.context_page.goto(f"{self.index_url}?isHome=1")
+            await self.ks_client.update_cookies(
+                browser_context=self.browser_context
+            )
 
     @staticmethod
     def format_proxy_info(
@@ -389,7 +448,7 @@ class KuaishouCrawler(AbstractCrawler):
         """
         Concurrently obtain the specified post list and save the data
         """
-        semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
+        semaphore = get_crawl_scheduler().limit(RequestClass.API, host=self.index_url)
         task_list = [
             self.get_video_info_task(post_item.get("photo", {}).get("id"), semaphore)
             for post_item in video_list
@@ -14,7 +14,6 @@ import json
 from typing import Any, Callable, Dict, List, Optional, Union
 from urllib.parse import urlencode
 
-import httpx
 from playwright.async_api import BrowserContext
 from tenacity import RetryError, retry, stop_after_attempt, wait_fixed
 
@@ -23,6 +22,10 @@ from base.base_crawler import AbstractApiClient
 from model.m_baidu_tieba import TiebaComment, TiebaCreator, TiebaNote
 from proxy.proxy_ip_pool import ProxyIpPool
 from tools import utils
+from tools.crawl_scheduler import RequestClass, get_crawl_scheduler
+from tools.httpx_client_pool import HttpxClientPool
+from tools.rate_limiter import crawl_sleep, get_rate_limiter
+from tools.sub_comments import SubCommentBudget, expand_sub_comments
 
 from .field import SearchNoteType, SearchSortType
 from .help import TieBaExtractor
@@ -37,6 +40,8 @@ class BaiduTieBaClient(AbstractApiClient):
     ):
         self.ip_pool: Optional[ProxyIpPool] = ip_pool
         self.timeout = timeout
+        self.http_client_pool = HttpxClientPool(default_ip_proxy, timeout=timeout)
+        self.rate_limiter = get_rate_limiter("tieba")
         self.headers = {
             "User-Agent": utils.get_user_agent(),
             "Cookies": "",
@@ -60,25 +65,37 @@ class BaiduTieBaClient(AbstractApiClient):
 
         """
         actual_proxies = proxies if proxies else self.default_ip_proxy
-        async with httpx.AsyncClient(proxies=actual_proxies) as client:
-            response = await client.request(
-                method, url, timeout=self.timeout,
-                headers=self.headers, **kwargs
-            )
+        if return_ori_content:
+            # HTML 页面单独占用调度器的页面并发名额
+            async with get_crawl_scheduler().limit(RequestClass.PAGE, host=url):
+                return await self._request(method, url, actual_proxies, return_ori_content, **kwargs)
+        async with get_crawl_scheduler().limit(RequestClass.API, host=url):
+            return await self._request(method, url, actual_proxies, return_ori_content, **kwargs)
+
+    async def _request(self, method, url, proxies, return_ori_content, **kwargs) -> Union[str, Any]:
+        async with self.rate_limiter.limit(url, proxies) as rate_limit_slot:
+            async with self.http_client_pool.borrow(proxies) as client:
+                response = await client.request(
+                    method, url, timeout=self.timeout,
+                    headers=self.headers, **kwargs
+                )
 
-        if response.status_code != 200:
-            utils.logger.error(f"Request failed, method: {method}, url: {url}, status code: {response.status_code}")
-            utils.logger.error(f"Request failed, response: {response.text}")
-            raise Exception(f"Request failed, method: {method}, url: {url}, status code: {response.status_code}")
+            if response.status_code != 200:
+                utils.logger.error(f"Request failed, method: {method}, url: {url}, status code: {response.status_code}")
+                utils.logger.error(f"Request failed, response: {response.text}")
+                if response.status_code in (403, 429):
+                    rate_limit_slot.throttled()
+                raise Exception(f"Request failed, method: {method}, url: {url}, status code: {response.status_code}")
 
-        if response.text == "" or response.text == "blocked":
-            utils.logger.error(f"request params incrr, response.text: {response.text}")
-            raise Exception("account blocked")
+            if response.text == "" or response.text == "blocked":
+                utils.logger.error(f"request params incrr, response.text: {response.text}")
+                rate_limit_slot.throttled()
+                raise Exception("account blocked")
 
-        if return_ori_content:
-            return response.text
+            if return_ori_content:
+                return response.text
 
-        return response.json()
+            return response.json()
 
     async def get(self, uri: str, params=None, return_ori_content=False, **kwargs) -> Any:
         """
@@ -109,6 +126,8 @@ class BaiduTieBaClient(AbstractApiClient):
                                          proxies=proxies,
                                          **kwargs)
                 self.default_ip_proxy = proxies
+                # 换了代理后，连接池的默认客户端也切到新代理上
+                self.http_client_pool.set_proxies(proxies)
                 return res
 
             utils.logger.error(f"[BaiduTieBaClient.get] 达到了最大重试次数，IP已经被Block，请尝试更换新的IP代理: {e}")
@@ -220,6 +239,7 @@ class BaiduTieBaClient(AbstractApiClient):
         uri = f"/p/{note_detail.note_id}"
         result: List[TiebaComment] = []
         current_page = 1
+        sub_comment_budget = SubCommentBudget(host=self._host, request_class=RequestClass.PAGE)
         while note_detail.total_replay_page >= current_page and len(result) < max_count:
             params = {
                 "pn": current_page
@@ -235,19 +255,22 @@ class BaiduTieBaClient(AbstractApiClient):
                 await callback(note_detail.note_id, comments)
             result.extend(comments)
             # 获取所有子评论
-            await self.get_comments_all_sub_comments(comments, crawl_interval=crawl_interval, callback=callback)
-            await asyncio.sleep(crawl_interval)
+            await self.get_comments_all_sub_comments(comments, crawl_interval=crawl_interval, callback=callback,
+                                                     budget=sub_comment_budget)
+            await crawl_sleep(crawl_interval)
             current_page += 1
         return result
 
     async def get_comments_all_sub_comments(self, comments: List[TiebaComment], crawl_interval: float = 1.0,
-                                            callback: Optional[Callable] = None) -> List[TiebaComment]:
+                                            callback: Optional[Callable] = None,
+                                            budget: Optional[SubCommentBudget] = None) -> List[TiebaComment]:
         """
-        获取指定评论下的所有子评论
+        获取指定评论下的所有子评论，多条评论的子评论并发展开
         Args:
             comments: 评论列表
             crawl_interval: 爬取一次笔记的延迟单位（秒）
             callback: 一次笔记爬取结束后
+            budget: 帖子的子评论配额，同一个帖子的多次调用共用
 
         Returns:
 
@@ -260,11 +283,10 @@ class BaiduTieBaClient(AbstractApiClient):
         # if self.headers.get("Cookies") == "" or not self.pong():
         #     raise Exception(f"[BaiduTieBaClient.pong] Cookies is empty, please login first...")
 
-        all_sub_comments: List[TiebaComment] = []
-        for parment_comment in comments:
-            if parment_comment.sub_comment_count == 0:
-                continue
+        budget = budget or SubCommentBudget(host=self._host, request_class=RequestClass.PAGE)
 
+        async def expand(parment_comment: TiebaComment) -> List[TiebaComment]:
+            all_sub_comments: List[TiebaComment] = []
             current_page = 1
             max_sub_page_num = parment_comment.sub_comment_count // 10 + 1
             while max_sub_page_num >= current_page:
@@ -274,18 +296,25 @@ class BaiduTieBaClient(AbstractApiClient):
                     "fid": parment_comment.tieba_id,  # 贴吧ID
                     "pn": current_page  # 页码
                 }
-                page_content = await self.get(uri, params=params, return_ori_content=True)
+                async with budget.page_limit():
+                    if not budget.page_allowed(current_page - 1):
+                        break
+                    page_content = await self.get(uri, params=params, return_ori_content=True)
                 sub_comments = self._page_extractor.extract_tieba_note_sub_comments(page_content,
                                                                                     parent_comment=parment_comment)
+                sub_comments = budget.take(sub_comments)
 
                 if not sub_comments:
                     break
                 if callback:
                     await callback(parment_comment.note_id, sub_comments)
                 all_sub_comments.extend(sub_comments)
-                await asyncio.sleep(crawl_interval)
+                await crawl_sleep(crawl_interval)
                 current_page += 1
-        return all_sub_comments
+            return all_sub_comments
+
+        roots = [comment for comment in comments if comment.sub_comment_count != 0]
+        return await expand_sub_comments(roots, expand, budget)
 
     async def get_notes_by_tieba_name(self, tieba_name: str, page_num: int) -> List[TiebaNote]:
         """
@@ -390,7 +419,7 @@ class BaiduTieBaClient(AbstractApiClient):
             notes = await asyncio.gather(*note_detail_task)
             if callback:
                 await callback(notes)
-            await asyncio.sleep(crawl_interval)
+            await crawl_sleep(crawl_interval)
             result.extend(notes)
             page_number += 1
             total_get_count += page_per_count
@@ -30,6 +30,7 @@ from proxy.proxy_ip_pool import IpInfoModel, create_ip_pool
 from store import tieba as tieba_store
 from tools import utils
 from tools.cdp_browser import CDPBrowserManager
+from tools.crawl_scheduler import RequestClass, SchedulerLimit, get_crawl_scheduler
 from tools.crawler_util import format_proxy_info
 from var import crawler_type_var, source_keyword_var
 
@@ -192,7 +193,7 @@ class TieBaCrawler(AbstractCrawler):
         Returns:
 
         """
-        semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
+        semaphore = get_crawl_scheduler().limit(RequestClass.API, host=self.index_url)
         task_list = [
             self.get_note_detail_async_task(note_id=note_id, semaphore=semaphore)
             for note_id in note_id_list
@@ -206,7 +207,7 @@ class TieBaCrawler(AbstractCrawler):
         await self.batch_get_note_comments(note_details_model)
 
     async def get_note_detail_async_task(
-        self, note_id: str, semaphore: asyncio.Semaphore
+        self, note_id: str, semaphore: SchedulerLimit
     ) -> Optional[TiebaNote]:
         """
         Get note detail
@@ -252,38 +253,34 @@ class TieBaCrawler(AbstractCrawler):
         if not config.ENABLE_GET_COMMENTS:
             return
 
-        semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
+        # 评论翻页的每个请求在 client 里单独占用并发名额，这里不再按帖子占着名额
         task_list: List[Task] = []
         for note_detail in note_detail_list:
             task = asyncio.create_task(
-                self.get_comments_async_task(note_detail, semaphore),
+                self.get_comments_async_task(note_detail),
                 name=note_detail.note_id,
             )
             task_list.append(task)
         await asyncio.gather(*task_list)
 
-    async def get_comments_async_task(
-        self, note_detail: TiebaNote, semaphore: asyncio.Semaphore
-    ):
+    async def get_comments_async_task(self, note_detail: TiebaNote):
         """
         Get comments async task
         Args:
             note_detail:
-            semaphore:
 
         Returns:
 
         """
-        async with semaphore:
-            utils.logger.info(
-                f"[BaiduTieBaCrawler.get_comments] Begin get note id comments {note_detail.note_id}"
-            )
-            await self.tieba_client.get_note_all_comments(
-                note_detail=note_detail,
-                crawl_interval=random.random(),
-                callback=tieba_store.batch_update_tieba_note_comments,
-                max_count=config.CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES,
-            )
+        utils.logger.info(
+            f"[BaiduTieBaCrawler.get_comments] Begin get note id comments {note_detail.note_id}"
+        )
+        await self.tieba_client.get_note_all_comments(
+            note_detail=note_detail,
+            crawl_interval=random.random(),
+            callback=tieba_store.batch_update_tieba_note_comments,
+            max_count=config.CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES,
+        )
 
     async def get_creators_and_notes(self) -> None:
         """
@@ -14,21 +14,25 @@
 # @Time    : 2023/12/23 15:40
 # @Desc    : 微博爬虫 API 请求 client
 
-import asyncio
 import copy
 import json
 import re
 from typing import Callable, Dict, List, Optional, Union
 from urllib.parse import parse_qs, unquote, urlencode
 
-import httpx
 from httpx import Response
 from playwright.async_api import BrowserContext, Page
 
 import config
 from tools import utils
-
-from .exception import DataFetchError
+from tools.checkpoint import CheckpointScope, get_checkpoint_store
+from tools.comment_watermark import get_comment_watermark_store
+from tools.crawl_scheduler import RequestClass, get_crawl_scheduler
+from tools.httpx_client_pool import HttpxClientPool
+from tools.media_downloader import stream_download
+from tools.rate_limiter import crawl_sleep, get_rate_limiter
+
+from .exception import DataFetchError, IPBlockError
 from .field import SearchType
 
 
@@ -44,6 +48,10 @@ class WeiboClient:
     ):
         self.proxies = proxies
         self.timeout = timeout
+        self.http_client_pool = HttpxClientPool(proxies, timeout=timeout)
+        self.rate_limiter = get_rate_limiter("wb", throttle_errors=(IPBlockError,))
+        self.checkpoint_store = get_checkpoint_store("wb")
+        self.comment_watermarks = get_comment_watermark_store("wb")
         self.headers = headers
         self._host = "https://m.weibo.cn"
         self.playwright_page = playwright_page
@@ -51,8 +59,18 @@ class WeiboClient:
         self._image_agent_host = "https://i1.wp.com/"
 
     async def request(self, method, url, **kwargs) -> Union[Response, Dict]:
+        if kwargs.get("return_response"):
+            # HTML 页面单独占用调度器的页面并发名额
+            async with get_crawl_scheduler().limit(RequestClass.PAGE, host=url):
+                async with self.rate_limiter.limit(url, self.proxies):
+                    return await self._request(method, url, **kwargs)
+        async with get_crawl_scheduler().limit(RequestClass.API, host=url):
+            async with self.rate_limiter.limit(url, self.proxies):
+                return await self._request(method, url, **kwargs)
+
+    async def _request(self, method, url, **kwargs) -> Union[Response, Dict]:
         enable_return_response = kwargs.pop("return_response", False)
-        async with httpx.AsyncClient(proxies=self.proxies) as client:
+        async with self.http_client_pool.borrow(self.proxies) as client:
             response = await client.request(
                 method, url, timeout=self.timeout,
                 **kwargs
@@ -166,24 +184,45 @@ class WeiboClient:
         :param max_count:
         :return:
         """
+        # 续爬时从上次记录的评论游标继续
+        checkpoint = await self.checkpoint_store.load(CheckpointScope.COMMENTS, note_id)
+        if checkpoint.get("done"):
+            return []
+        fetched_count = checkpoint.get("count", 0)
+        max_count -= fetched_count
         result = []
         is_end = False
-        max_id = -1
-        max_id_type = 0
+        max_id = checkpoint.get("max_id", -1)
+        max_id_type = checkpoint.get("max_id_type", 0)
+        watermark = await self.comment_watermarks.begin(
+            note_id, get_id=lambda c: c.get("id"),
+            get_time=lambda c: utils.rfc2822_to_timestamp(c.get("created_at")) if c.get("created_at") else 0,
+        )
         while not is_end and len(result) < max_count:
             comments_res = await self.get_note_comments(note_id, max_id, max_id_type)
             max_id: int = comments_res.get("max_id")
             max_id_type: int = comments_res.get("max_id_type")
             comment_list: List[Dict] = comments_res.get("data", [])
             is_end = max_id == 0
+            if watermark.reached(comment_list):
+                utils.logger.info(
+                    f"[WeiboClient.get_note_all_comments] note_id: {note_id} reached known comments, stop"
+                )
+                break
             if len(result) + len(comment_list) > max_count:
                 comment_list = comment_list[:max_count - len(result)]
             if callback:  # 如果有回调函数，就执行回调函数
                 await callback(note_id, comment_list)
-            await asyncio.sleep(crawl_interval)
+            await crawl_sleep(crawl_interval)
             result.extend(comment_list)
             sub_comment_result = await self.get_comments_all_sub_comments(note_id, comment_list, callback)
             result.extend(sub_comment_result)
+            await self.checkpoint_store.save(
+                CheckpointScope.COMMENTS, note_id,
+                {"max_id": max_id, "max_id_type": max_id_type, "count": fetched_count + len(result)},
+            )
+        await watermark.commit()
+        await self.checkpoint_store.finish(CheckpointScope.COMMENTS, note_id)
         return result
 
     @staticmethod
@@ -219,26 +258,29 @@ class WeiboClient:
         :return:
         """
         url = f"{self._host}/detail/{note_id}"
-        async with httpx.AsyncClient(proxies=self.proxies) as client:
+        async with self.http_client_pool.borrow(self.proxies) as client:
             response = await client.request(
                 "GET", url, timeout=self.timeout, headers=self.headers
             )
-            if response.status_code != 200:
-                raise DataFetchError(f"get weibo detail err: {response.text}")
-            match = re.search(r'var \$render_data = (\[.*?\])\[0\]', response.text, re.DOTALL)
-            if match:
-                render_data_json = match.group(1)
-                render_data_dict = json.loads(render_data_json)
-                note_detail = render_data_dict[0].get("status")
-                note_item = {
-                    "mblog": note_detail
-                }
-                return note_item
-            else:
-                utils.logger.info(f"[WeiboClient.get_note_info_by_id] 未找到$render_data的值")
-                return dict()
-
-    async def get_note_image(self, image_url: str) -> bytes:
+        if response.status_code != 200:
+            raise DataFetchError(f"get weibo detail err: {response.text}")
+        match = re.search(r'var \$render_data = (\[.*?\])\[0\]', response.text, re.DOTALL)
+        if match:
+            render_data_json = match.group(1)
+            render_data_dict = json.loads(render_data_json)
+            note_detail = render_data_dict[0].get("status")
+            note_item = {
+                "mblog": note_detail
+            }
+            return note_item
+        else:
+            utils.logger.info(f"[WeiboClient.get_note_info_by_id] 未找到$render_data的值")
+            return dict()
+
+    def _build_image_url(self, image_url: str) -> str:
+        """
+        把图片地址转换为通过图片代理访问的高清大图地址
+        """
         image_url = image_url[8:]  # 去掉 https://
         sub_url = image_url.split("/")
         image_url = ""
@@ -251,16 +293,22 @@ class WeiboClient:
                 image_url += sub_url[i] + "/"
         # 微博图床对外存在防盗链，所以需要代理访问
         # 由于微博图片是通过 i1.wp.com 来访问的，所以需要拼接一下
-        final_uri = (f"{self._image_agent_host}" f"{image_url}")
-        async with httpx.AsyncClient(proxies=self.proxies) as client:
-            response = await client.request("GET", final_uri, timeout=self.timeout)
-            if not response.reason_phrase == "OK":
-                utils.logger.error(f"[WeiboClient.get_note_image] request {final_uri} err, res:{response.text}")
-                return None
-            else:
-                return response.content
+        return f"{self._image_agent_host}" f"{image_url}"
 
+    async def download_note_image(self, image_url: str, save_file_name: str) -> bool:
+        """
+        流式下载微博图片到本地文件，不把整张图片读进内存
+        Args:
+            image_url: 图片地址
+            save_file_name: 保存的文件路径
 
+        Returns:
+            是否下载成功
+        """
+        final_uri = self._build_image_url(image_url)
+        async with get_crawl_scheduler().limit(RequestClass.MEDIA, host=final_uri):
+            async with self.http_client_pool.borrow(self.proxies) as client:
+                return await stream_download(client, final_uri, save_file_name, timeout=self.timeout)
 
     async def get_creator_container_info(self, creator_id: str) -> Dict:
         """
@@ -350,10 +398,14 @@ class WeiboClient:
         Returns:
 
         """
+        # 续爬时从上次记录的 since_id 继续
+        checkpoint = await self.checkpoint_store.load(CheckpointScope.CREATOR, creator_id)
+        if checkpoint.get("done"):
+            return []
         result = []
         notes_has_more = True
-        since_id = ""
-        crawler_total_count = 0
+        since_id = checkpoint.get("since_id", "")
+        crawler_total_count = checkpoint.get("count", 0)
         while notes_has_more:
             notes_res = await self.get_notes_by_creator(creator_id, container_id, since_id)
             if not notes_res:
@@ -372,9 +424,13 @@ class WeiboClient:
             notes = [note for note  in notes if note.get("card_type") == 9]
             if callback:
                 await callback(notes)
-            await asyncio.sleep(crawl_interval)
+            await crawl_sleep(crawl_interval)
             result.extend(notes)
             crawler_total_count += 10
             notes_has_more = notes_res.get("cardlistInfo", {}).get("total", 0) > crawler_total_count
+            await self.checkpoint_store.save(
+                CheckpointScope.CREATOR, creator_id, {"since_id": since_id, "count": crawler_total_count}
+            )
+        await self.checkpoint_store.finish(CheckpointScope.CREATOR, creator_id)
         return result
 
@@ -16,10 +16,11 @@
 
 
 import asyncio
+import functools
 import os
 import random
 from asyncio import Task
-from typing import Dict, List, Optional, Tuple
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 
 from playwright.async_api import (
     BrowserContext,
@@ -35,7 +36,13 @@ from proxy.proxy_ip_pool import IpInfoModel, create_ip_pool
 from store import weibo as weibo_store
 from tools import utils
 from tools.cdp_browser import CDPBrowserManager
-from var import crawler_type_var, source_keyword_var
+from tools.crawl_pipeline import CrawlPipeline
+from tools.checkpoint import CheckpointScope, SearchProgress, get_checkpoint_store
+from tools.keyword_workers import KeywordNotes, run_keyword_workers, split_keywords
+from tools.media_store import get_media_store
+from tools.seen_index import SeenKind, get_seen_index
+from tools.crawl_scheduler import RequestClass, SchedulerLimit, get_crawl_scheduler
+from var import crawler_type_var
 
 from .client import WeiboClient
 from .exception import DataFetchError
@@ -49,6 +56,7 @@ class WeiboCrawler(AbstractCrawler):
     wb_client: WeiboClient
     browser_context: BrowserContext
     cdp_manager: Optional[CDPBrowserManager]
+    keyword_notes: KeywordNotes
 
     def __init__(self):
         self.index_url = "https://www.weibo.com"
@@ -56,6 +64,9 @@ class WeiboCrawler(AbstractCrawler):
         self.user_agent = utils.get_user_agent()
         self.mobile_user_agent = utils.get_mobile_user_agent()
         self.cdp_manager = None
+        self.seen_index = get_seen_index("wb")
+        self.media_store = get_media_store("wb")
+        self.checkpoint_store = get_checkpoint_store("wb")
 
     async def start(self):
         playwright_proxy_format, httpx_proxy_format = None, None
@@ -135,7 +146,6 @@ class WeiboCrawler(AbstractCrawler):
         weibo_limit_count = 10  # weibo limit page fixed value
         if config.CRAWLER_MAX_NOTES_COUNT < weibo_limit_count:
             config.CRAWLER_MAX_NOTES_COUNT = weibo_limit_count
-        start_page = config.START_PAGE
 
         # Set the search type based on the configuration for weibo
         if config.WEIBO_SEARCH_TYPE == "default":
@@ -152,15 +162,37 @@ class WeiboCrawler(AbstractCrawler):
             )
             return
 
-        for keyword in config.KEYWORDS.split(","):
-            source_keyword_var.set(keyword)
-            utils.logger.info(
-                f"[WeiboCrawler.search] Current search keyword: {keyword}"
-            )
-            page = 1
+        self.keyword_notes = KeywordNotes(platform="wb")
+        await run_keyword_workers(
+            split_keywords(config.KEYWORDS), functools.partial(self.search_keyword, search_type=search_type)
+        )
+
+    async def search_keyword(self, keyword: str, search_type: SearchType) -> None:
+        """
+        搜索单个关键词，存储、图片、评论交给流水线处理
+        Args:
+            keyword: 搜索关键词
+            search_type: 搜索类型
+
+        Returns:
+
+        """
+        weibo_limit_count = 10  # weibo limit page fixed value
+        start_page = config.START_PAGE
+        utils.logger.info(
+            f"[WeiboCrawler.search] Current search keyword: {keyword}"
+        )
+        # 续爬时从上次记录的页码继续，已经搜完的关键词直接跳过
+        checkpoint = await self.checkpoint_store.load(CheckpointScope.SEARCH, keyword)
+        if checkpoint.get("done"):
+            utils.logger.info(f"[WeiboCrawler.search] keyword: {keyword} already finished, skip")
+            return
+        page = checkpoint.get("page", 1)
+        progress = SearchProgress(self.checkpoint_store, keyword, page)
+        async with self.create_search_pipeline(keyword, on_page_done=progress.page_done) as pipeline:
             while (
                 page - start_page + 1
-            ) * weibo_limit_count <= config.CRAWLER_MAX_NOTES_COUNT:
+            ) * weibo_limit_count <= config.CRAWLER_MAX_NOTES_COUNT and await self.keyword_notes.wait_budget(keyword):
                 if page < start_page:
                     utils.logger.info(f"[WeiboCrawler.search] Skip page: {page}")
                     page += 1
@@ -171,25 +203,57 @@ class WeiboCrawler(AbstractCrawler):
                 search_res = await self.wb_client.get_note_by_keyword(
                     keyword=keyword, page=page, search_type=search_type
                 )
-                note_id_list: List[str] = []
                 note_list = filter_search_result_card(search_res.get("cards"))
-                for note_item in note_list:
-                    if note_item:
-                        mblog: Dict = note_item.get("mblog")
-                        if mblog:
-                            note_id_list.append(mblog.get("id"))
-                            await weibo_store.update_weibo_note(note_item)
-                            await self.get_note_images(mblog)
-
+                # 存储、图片和评论交给流水线处理，这里直接翻下一页；进度记录的是最早一页还没处理完的页码
+                # 其他关键词已经登记过的微博只记录命中的关键词，不重复存储
+                async with progress.page(pipeline, page):
+                    for note_item in note_list:
+                        if not await self.keyword_notes.wait_budget(keyword):
+                            break
+                        if note_item:
+                            mblog: Dict = note_item.get("mblog")
+                            if mblog:
+                                if not await self.keyword_notes.claim(mblog.get("id"), keyword):
+                                    continue
+                                await pipeline.put("store", note_item)
+                                if config.ENABLE_GET_IMAGES:
+                                    await pipeline.put("media", mblog)
+                                if config.ENABLE_GET_COMMENTS:
+                                    await pipeline.put("comments", mblog.get("id"))
                 page += 1
-                await self.batch_get_notes_comments(note_id_list)
+        await self.checkpoint_store.finish(CheckpointScope.SEARCH, keyword)
+
+    def create_search_pipeline(
+        self, keyword: str, on_page_done: Optional[Callable[[int], Awaitable[None]]] = None
+    ) -> CrawlPipeline:
+        """
+        搜索流水线：搜索结果 -> 存储 / 图片下载 / 评论
+        Args:
+            keyword: 搜索关键词
+            on_page_done: 一页搜索结果全部处理完之后的回调
+
+        Returns:
+
+        """
+        async def fetch_comments(note_id: str):
+            await self.get_note_comments(note_id)
+
+        async def store_note(note_item: Dict):
+            async with self.keyword_notes.storing(note_item.get("mblog", {}).get("id")):
+                await weibo_store.update_weibo_note(note_item)
+
+        pipeline = CrawlPipeline(f"WeiboCrawler.search[{keyword}]", on_tag_done=on_page_done)
+        pipeline.add_stage("store", store_note)
+        pipeline.add_stage("media", self.get_note_images, workers=config.SEARCH_PIPELINE_WORKERS)
+        pipeline.add_stage("comments", fetch_comments, workers=config.SEARCH_PIPELINE_WORKERS)
+        return pipeline
 
     async def get_specified_notes(self):
         """
         get specified notes info
         :return:
         """
-        semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
+        semaphore = get_crawl_scheduler().limit(RequestClass.API, host=self.index_url)
         task_list = [
             self.get_note_info_task(note_id=note_id, semaphore=semaphore)
             for note_id in config.WEIBO_SPECIFIED_ID_LIST
@@ -201,7 +265,7 @@ class WeiboCrawler(AbstractCrawler):
         await self.batch_get_notes_comments(config.WEIBO_SPECIFIED_ID_LIST)
 
     async def get_note_info_task(
-        self, note_id: str, semaphore: asyncio.Semaphore
+        self, note_id: str, semaphore: SchedulerLimit
     ) -> Optional[Dict]:
         """
         Get note detail task
@@ -239,43 +303,45 @@ class WeiboCrawler(AbstractCrawler):
         utils.logger.info(
             f"[WeiboCrawler.batch_get_notes_comments] note ids:{note_id_list}"
         )
-        semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
+        # 评论翻页的每个请求在 client 里单独占用 API 并发名额，这里不再按微博占着名额
         task_list: List[Task] = []
         for note_id in note_id_list:
-            task = asyncio.create_task(
-                self.get_note_comments(note_id, semaphore), name=note_id
-            )
+            task = asyncio.create_task(self.get_note_comments(note_id), name=note_id)
             task_list.append(task)
         await asyncio.gather(*task_list)
 
-    async def get_note_comments(self, note_id: str, semaphore: asyncio.Semaphore):
+    async def get_note_comments(self, note_id: str):
         """
         get comment for note id
         :param note_id:
-        :param semaphore:
         :return:
         """
-        async with semaphore:
-            try:
-                utils.logger.info(
-                    f"[WeiboCrawler.get_note_comments] begin get note_id: {note_id} comments ..."
-                )
-                await self.wb_client.get_note_all_comments(
-                    note_id=note_id,
-                    crawl_interval=random.randint(
-                        1, 3
-                    ),  # 微博对API的限流比较严重，所以延时提高一些
-                    callback=weibo_store.batch_update_weibo_note_comments,
-                    max_count=config.CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES,
-                )
-            except DataFetchError as ex:
-                utils.logger.error(
-                    f"[WeiboCrawler.get_note_comments] get note_id: {note_id} comment error: {ex}"
-                )
-            except Exception as e:
-                utils.logger.error(
-                    f"[WeiboCrawler.get_note_comments] may be been blocked, err:{e}"
-                )
+        if await self.seen_index.is_fresh(SeenKind.COMMENTS, note_id):
+            utils.logger.info(
+                f"[WeiboCrawler.get_note_comments] note_id: {note_id} comments fetched recently, skip"
+            )
+            return
+        try:
+            utils.logger.info(
+                f"[WeiboCrawler.get_note_comments] begin get note_id: {note_id} comments ..."
+            )
+            await self.wb_client.get_note_all_comments(
+                note_id=note_id,
+                crawl_interval=random.randint(
+                    1, 3
+                ),  # 微博对API的限流比较严重，所以延时提高一些
+                callback=weibo_store.batch_update_weibo_note_comments,
+                max_count=config.CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES,
+            )
+            await self.seen_index.mark(SeenKind.COMMENTS, note_id)
+        except DataFetchError as ex:
+            utils.logger.error(
+                f"[WeiboCrawler.get_note_comments] get note_id: {note_id} comment error: {ex}"
+            )
+        except Exception as e:
+            utils.logger.error(
+                f"[WeiboCrawler.get_note_comments] may be been blocked, err:{e}"
+            )
 
     async def get_note_images(self, mblog: Dict):
         """
@@ -296,12 +362,12 @@ class WeiboCrawler(AbstractCrawler):
             url = pic.get("url")
             if not url:
                 continue
-            content = await self.wb_client.get_note_image(url)
-            if content != None:
-                extension_file_name = url.split(".")[-1]
-                await weibo_store.update_weibo_note_image(
-                    pic["pid"], content, extension_file_name
-                )
+            extension_file_name = url.split(".")[-1]
+            save_file_name = weibo_store.get_weibo_note_image_file_name(pic["pid"], extension_file_name)
+            await self.media_store.fetch(
+                mblog.get("id"), pic.get("pid"), save_file_name,
+                functools.partial(self.wb_client.download_note_image, url)
+            )
 
     async def get_creators_and_notes(self) -> None:
         """
@@ -9,22 +9,28 @@
 # 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
 
 
-import asyncio
 import json
 import re
+import time
 from typing import Any, Callable, Dict, List, Optional, Union
 from urllib.parse import urlencode
 
-import httpx
 from playwright.async_api import BrowserContext, Page
 from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_result
 
 import config
 from base.base_crawler import AbstractApiClient
 from tools import utils
+from tools.checkpoint import CheckpointScope, get_checkpoint_store
+from tools.comment_watermark import get_comment_watermark_store
+from tools.crawl_scheduler import RequestClass, get_crawl_scheduler
+from tools.httpx_client_pool import HttpxClientPool
+from tools.media_downloader import ranged_download, stream_download
+from tools.rate_limiter import crawl_sleep, get_rate_limiter
+from tools.sub_comments import SubCommentBudget, expand_sub_comments
 from html import unescape
 
-from .exception import DataFetchError, IPBlockError
+from .exception import CaptchaError, DataFetchError, IPBlockError
 from .field import SearchNoteType, SearchSortType
 from .help import get_search_id, sign
 
@@ -41,6 +47,10 @@ class XiaoHongShuClient(AbstractApiClient):
     ):
         self.proxies = proxies
         self.timeout = timeout
+        self.http_client_pool = HttpxClientPool(proxies, timeout=timeout)
+        self.rate_limiter = get_rate_limiter("xhs", throttle_errors=(IPBlockError, CaptchaError))
+        self.checkpoint_store = get_checkpoint_store("xhs")
+        self.comment_watermarks = get_comment_watermark_store("xhs")
         self.headers = headers
         self._host = "https://edith.xiaohongshu.com"
         self._domain = "https://www.xiaohongshu.com"
@@ -50,6 +60,31 @@ class XiaoHongShuClient(AbstractApiClient):
         self.NOTE_ABNORMAL_CODE = -510001
         self.playwright_page = playwright_page
         self.cookie_dict = cookie_dict
+        # localStorage 中的 b1 基本不变，缓存一段时间，过期后在下一次签名的 evaluate 里顺带刷新
+        self._b1_cache: Optional[str] = None
+        self._b1_expire_time = 0.0
+        # 签名耗时统计
+        self._sign_count = 0
+        self._sign_total_time = 0.0
+        self._sign_max_time = 0.0
+
+    def get_sign_stats(self) -> Dict:
+        """
+        请求头签名的耗时统计
+        Returns:
+
+        """
+        return {
+            "count": self._sign_count,
+            "avg_ms": round(self._sign_total_time / max(self._sign_count, 1) * 1000, 2),
+            "max_ms": round(self._sign_max_time * 1000, 2),
+        }
+
+    def invalidate_sign_cache(self):
+        """
+        让缓存的 b1 失效，下一次签名时重新读取
+        """
+        self._b1_expire_time = 0.0
 
     async def _pre_headers(self, url: str, data=None) -> Dict:
         """
@@ -61,16 +96,33 @@ class XiaoHongShuClient(AbstractApiClient):
         Returns:
 
         """
+        start = time.perf_counter()
+        refresh_b1 = self._b1_cache is None or time.monotonic() >= self._b1_expire_time
+        # _webmsxyw 和 b1 放在同一次 evaluate 里，只读取 b1 这一项，不再把整个 localStorage 序列化回来
         encrypt_params = await self.playwright_page.evaluate(
-            "([url, data]) => window._webmsxyw(url,data)", [url, data]
+            """([url, data, refreshB1]) => {
+                const encryptParams = window._webmsxyw(url, data);
+                return {
+                    "X-s": encryptParams["X-s"],
+                    "X-t": encryptParams["X-t"],
+                    "b1": refreshB1 ? window.localStorage.getItem("b1") : null,
+                };
+            }""",
+            [url, data, refresh_b1],
         )
-        local_storage = await self.playwright_page.evaluate("() => window.localStorage")
+        if refresh_b1:
+            self._b1_cache = encrypt_params.get("b1") or ""
+            self._b1_expire_time = time.monotonic() + config.XHS_SIGN_B1_CACHE_TTL
         signs = sign(
             a1=self.cookie_dict.get("a1", ""),
-            b1=local_storage.get("b1", ""),
+            b1=self._b1_cache,
             x_s=encrypt_params.get("X-s", ""),
             x_t=str(encrypt_params.get("X-t", "")),
         )
+        elapsed = time.perf_counter() - start
+        self._sign_count += 1
+        self._sign_total_time += elapsed
+        self._sign_max_time = max(self._sign_max_time, elapsed)
 
         headers = {
             "X-S": signs["x-s"],
@@ -93,9 +145,19 @@ class XiaoHongShuClient(AbstractApiClient):
         Returns:
 
         """
+        if kwargs.get("return_response"):
+            # HTML 页面单独占用调度器的页面并发名额
+            async with get_crawl_scheduler().limit(RequestClass.PAGE, host=url):
+                async with self.rate_limiter.limit(url, self.proxies):
+                    return await self._request(method, url, **kwargs)
+        async with get_crawl_scheduler().limit(RequestClass.API, host=url):
+            async with self.rate_limiter.limit(url, self.proxies):
+                return await self._request(method, url, **kwargs)
+
+    async def _request(self, method, url, **kwargs) -> Union[str, Any]:
         # return response.text
         return_response = kwargs.pop("return_response", False)
-        async with httpx.AsyncClient(proxies=self.proxies) as client:
+        async with self.http_client_pool.borrow(self.proxies) as client:
             response = await client.request(method, url, timeout=self.timeout, **kwargs)
 
         if response.status_code == 471 or response.status_code == 461:
@@ -104,7 +166,7 @@ class XiaoHongShuClient(AbstractApiClient):
             verify_uuid = response.headers["Verifyuuid"]
             msg = f"出现验证码，请求失败，Verifytype: {verify_type}，Verifyuuid: {verify_uuid}, Response: {response}"
             utils.logger.error(msg)
-            raise Exception(msg)
+            raise CaptchaError(msg)
 
         if return_response:
             return response.text
@@ -154,16 +216,33 @@ class XiaoHongShuClient(AbstractApiClient):
             **kwargs,
         )
 
-    async def get_note_media(self, url: str) -> Union[bytes, None]:
-        async with httpx.AsyncClient(proxies=self.proxies) as client:
-            response = await client.request("GET", url, timeout=self.timeout)
-            if not response.reason_phrase == "OK":
-                utils.logger.error(
-                    f"[XiaoHongShuClient.get_note_media] request {url} err, res:{response.text}"
-                )
-                return None
-            else:
-                return response.content
+    async def download_note_media(self, url: str, save_file_name: str) -> bool:
+        """
+        流式下载笔记图片、视频到本地文件，不把整个文件读进内存
+        Args:
+            url: 媒体地址
+            save_file_name: 保存的文件路径
+
+        Returns:
+            是否下载成功
+        """
+        async with get_crawl_scheduler().limit(RequestClass.MEDIA, host=url):
+            async with self.http_client_pool.borrow(self.proxies) as client:
+                return await stream_download(client, url, save_file_name, timeout=self.timeout)
+
+    async def download_note_video(self, url: str, save_file_name: str) -> bool:
+        """
+        下载笔记视频到本地文件，大文件按字节区间多个连接并发下载，中断后下次从已下载的位置继续
+        Args:
+            url: 视频地址
+            save_file_name: 保存的文件路径
+
+        Returns:
+            是否下载成功
+        """
+        async with get_crawl_scheduler().limit(RequestClass.MEDIA, host=url):
+            async with self.http_client_pool.borrow(self.proxies) as client:
+                return await ranged_download(client, url, save_file_name, timeout=self.timeout)
 
     async def pong(self) -> bool:
         """
@@ -197,6 +276,8 @@ class XiaoHongShuClient(AbstractApiClient):
         cookie_str, cookie_dict = utils.convert_cookies(await browser_context.cookies())
         self.headers["Cookie"] = cookie_str
         self.cookie_dict = cookie_dict
+        # 登录状态变化后 localStorage 可能随之更新
+        self.invalidate_sign_cache()
 
     async def get_note_by_keyword(
         self,
@@ -338,9 +419,19 @@ class XiaoHongShuClient(AbstractApiClient):
         Returns:
 
         """
+        # 续爬时从上次记录的评论游标继续
+        checkpoint = await self.checkpoint_store.load(CheckpointScope.COMMENTS, note_id)
+        if checkpoint.get("done"):
+            return []
+        fetched_count = checkpoint.get("count", 0)
+        max_count -= fetched_count
         result = []
         comments_has_more = True
-        comments_cursor = ""
+        comments_cursor = checkpoint.get("cursor", "")
+        sub_comment_budget = SubCommentBudget(host=self._host)
+        watermark = await self.comment_watermarks.begin(
+            note_id, get_id=lambda c: c.get("id"), get_time=lambda c: c.get("create_time")
+        )
         while comments_has_more and len(result) < max_count:
             comments_res = await self.get_note_comments(
                 note_id=note_id, xsec_token=xsec_token, cursor=comments_cursor
@@ -353,19 +444,31 @@ class XiaoHongShuClient(AbstractApiClient):
                 )
                 break
             comments = comments_res["comments"]
+            if watermark.reached(comments):
+                utils.logger.info(
+                    f"[XiaoHongShuClient.get_note_all_comments] note_id: {note_id} reached known comments, stop"
+                )
+                break
             if len(result) + len(comments) > max_count:
                 comments = comments[: max_count - len(result)]
             if callback:
                 await callback(note_id, comments)
-            await asyncio.sleep(crawl_interval)
+            await crawl_sleep(crawl_interval)
             result.extend(comments)
             sub_comments = await self.get_comments_all_sub_comments(
                 comments=comments,
                 xsec_token=xsec_token,
                 crawl_interval=crawl_interval,
                 callback=callback,
+                budget=sub_comment_budget,
             )
             result.extend(sub_comments)
+            await self.checkpoint_store.save(
+                CheckpointScope.COMMENTS, note_id,
+                {"cursor": comments_cursor, "count": fetched_count + len(result)},
+            )
+        await watermark.commit()
+        await self.checkpoint_store.finish(CheckpointScope.COMMENTS, note_id)
         return result
 
     async def get_comments_all_sub_comments(
@@ -374,14 +477,16 @@ class XiaoHongShuClient(AbstractApiClient):
         xsec_token: str,
         crawl_interval: float = 1.0,
         callback: Optional[Callable] = None,
+        budget: Optional[SubCommentBudget] = None,
     ) -> List[Dict]:
         """
-        获取指定一级评论下的所有二级评论, 该方法会一直查找一级评论下的所有二级评论信息
+        获取指定一级评论下的所有二级评论, 多条一级评论的二级评论并发展开
         Args:
             comments: 评论列表
             xsec_token: 验证token
             crawl_interval: 爬取一次评论的延迟单位（秒）
             callback: 一次评论爬取结束后
+            budget: 笔记的二级评论配额，同一篇笔记的多次调用共用
 
         Returns:
 
@@ -392,34 +497,37 @@ class XiaoHongShuClient(AbstractApiClient):
             )
             return []
 
-        result = []
-        for comment in comments:
+        budget = budget or SubCommentBudget(host=self._host)
+
+        async def expand(comment: Dict) -> List[Dict]:
+            result = []
             note_id = comment.get("note_id")
-            sub_comments = comment.get("sub_comments")
+            sub_comments = budget.take(comment.get("sub_comments") or [])
             if sub_comments and callback:
                 await callback(note_id, sub_comments)
 
             sub_comment_has_more = comment.get("sub_comment_has_more")
-            if not sub_comment_has_more:
-                continue
-
             root_comment_id = comment.get("id")
             sub_comment_cursor = comment.get("sub_comment_cursor")
-
+            page = 0
             while sub_comment_has_more:
-                comments_res = await self.get_note_sub_comments(
-                    note_id=note_id,
-                    root_comment_id=root_comment_id,
-                    xsec_token=xsec_token,
-                    num=10,
-                    cursor=sub_comment_cursor,
-                )
-                
+                async with budget.page_limit():
+                    if not budget.page_allowed(page):
+                        break
+                    page += 1
+                    comments_res = await self.get_note_sub_comments(
+                        note_id=note_id,
+                        root_comment_id=root_comment_id,
+                        xsec_token=xsec_token,
+                        num=10,
+                        cursor=sub_comment_cursor,
+                    )
+
                 if comments_res is None:
                     utils.logger.info(
                         f"[XiaoHongShuClient.get_comments_all_sub_comments] No response found for note_id: {note_id}"
                     )
-                    continue
+                    break
                 sub_comment_has_more = comments_res.get("has_more", False)
                 sub_comment_cursor = comments_res.get("cursor", "")
                 if "comments" not in comments_res:
@@ -427,12 +535,14 @@ class XiaoHongShuClient(AbstractApiClient):
                         f"[XiaoHongShuClient.get_comments_all_sub_comments] No 'comments' key found in response: {comments_res}"
                     )
                     break
-                comments = comments_res["comments"]
-                if callback:
-                    await callback(note_id, comments)
-                await asyncio.sleep(crawl_interval)
-                result.extend(comments)
-        return result
+                sub_comments = budget.take(comments_res["comments"])
+                if callback and sub_comments:
+                    await callback(note_id, sub_comments)
+                await crawl_sleep(crawl_interval)
+                result.extend(sub_comments)
+            return result
+
+        return await expand_sub_comments(comments, expand, budget)
 
     async def get_creator_info(self, user_id: str) -> Dict:
         """
@@ -494,10 +604,15 @@ class XiaoHongShuClient(AbstractApiClient):
         Returns:
 
         """
+        # 续爬时从上次记录的翻页游标继续
+        checkpoint = await self.checkpoint_store.load(CheckpointScope.CREATOR, user_id)
+        if checkpoint.get("done"):
+            return []
+        fetched_count = checkpoint.get("count", 0)
         result = []
         notes_has_more = True
-        notes_cursor = ""
-        while notes_has_more and len(result) < config.CRAWLER_MAX_NOTES_COUNT:
+        notes_cursor = checkpoint.get("cursor", "")
+        while notes_has_more and fetched_count + len(result) < config.CRAWLER_MAX_NOTES_COUNT:
             notes_res = await self.get_notes_by_creator(user_id, notes_cursor)
             if not notes_res:
                 utils.logger.error(
@@ -518,7 +633,7 @@ class XiaoHongShuClient(AbstractApiClient):
                 f"[XiaoHongShuClient.get_all_notes_by_creator] got user_id:{user_id} notes len : {len(notes)}"
             )
 
-            remaining = config.CRAWLER_MAX_NOTES_COUNT - len(result)
+            remaining = config.CRAWLER_MAX_NOTES_COUNT - fetched_count - len(result)
             if remaining <= 0:
                 break
 
@@ -527,7 +642,13 @@ class XiaoHongShuClient(AbstractApiClient):
                 await callback(notes_to_add)
 
             result.extend(notes_to_add)
-            await asyncio.sleep(crawl_interval)
+            await self.checkpoint_store.save(
+                CheckpointScope.CREATOR, user_id,
+                {"cursor": notes_cursor, "count": fetched_count + len(result)},
+            )
+            await crawl_sleep(crawl_interval)
+
+        await self.checkpoint_store.finish(CheckpointScope.CREATOR, user_id)
 
         utils.logger.info(
             f"[XiaoHongShuClient.get_all_notes_by_creator] Finished getting notes for user {user_id}, total: {len(result)}"
@@ -10,11 +10,12 @@
 
 
 import asyncio
+import functools
 import os
 import random
 import time
 from asyncio import Task
-from typing import Dict, List, Optional, Tuple
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 
 from playwright.async_api import (
     BrowserContext,
@@ -33,12 +34,18 @@ from proxy.proxy_ip_pool import IpInfoModel, create_ip_pool
 from store import xhs as xhs_store
 from tools import utils
 from tools.cdp_browser import CDPBrowserManager
-from var import crawler_type_var, source_keyword_var
+from tools.crawl_pipeline import CrawlPipeline
+from tools.checkpoint import CheckpointScope, SearchProgress, get_checkpoint_store
+from tools.keyword_workers import KeywordNotes, run_keyword_workers, split_keywords
+from tools.media_store import get_media_store
+from tools.seen_index import SeenKind, get_seen_index
+from tools.crawl_scheduler import RequestClass, SchedulerLimit, get_crawl_scheduler
+from var import crawler_type_var
 
 from .client import XiaoHongShuClient
 from .exception import DataFetchError
 from .field import SearchSortType
-from .help import parse_note_info_from_note_url, get_search_id
+from .help import parse_note_info_from_note_url, get_search_id, get_trace_id
 from .login import XiaoHongShuLogin
 
 
@@ -47,12 +54,16 @@ class XiaoHongShuCrawler(AbstractCrawler):
     xhs_client: XiaoHongShuClient
     browser_context: BrowserContext
     cdp_manager: Optional[CDPBrowserManager]
+    keyword_notes: KeywordNotes
 
     def __init__(self) -> None:
         self.index_url = "https://www.xiaohongshu.com"
         # self.user_agent = utils.get_user_agent()
         self.user_agent = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36"
         self.cdp_manager = None
+        self.seen_index = get_seen_index("xhs")
+        self.media_store = get_media_store("xhs")
+        self.checkpoint_store = get_checkpoint_store("xhs")
 
     async def start(self) -> None:
         playwright_proxy_format, httpx_proxy_format = None, None
@@ -118,6 +129,7 @@ class XiaoHongShuCrawler(AbstractCrawler):
             else:
                 pass
 
+            utils.logger.info(f"[XiaoHongShuCrawler.start] sign stats: {self.xhs_client.get_sign_stats()}")
             utils.logger.info("[XiaoHongShuCrawler.start] Xhs Crawler finished ...")
 
     async def search(self) -> None:
@@ -128,17 +140,35 @@ class XiaoHongShuCrawler(AbstractCrawler):
         xhs_limit_count = 20  # xhs limit page fixed value
         if config.CRAWLER_MAX_NOTES_COUNT < xhs_limit_count:
             config.CRAWLER_MAX_NOTES_COUNT = xhs_limit_count
+        self.keyword_notes = KeywordNotes(platform="xhs")
+        await run_keyword_workers(split_keywords(config.KEYWORDS), self.search_keyword)
+
+    async def search_keyword(self, keyword: str) -> None:
+        """
+        搜索单个关键词，详情、存储、评论交给流水线处理
+        Args:
+            keyword: 搜索关键词
+
+        Returns:
+
+        """
+        xhs_limit_count = 20  # xhs limit page fixed value
         start_page = config.START_PAGE
-        for keyword in config.KEYWORDS.split(","):
-            source_keyword_var.set(keyword)
-            utils.logger.info(
-                f"[XiaoHongShuCrawler.search] Current search keyword: {keyword}"
-            )
-            page = 1
-            search_id = get_search_id()
+        utils.logger.info(
+            f"[XiaoHongShuCrawler.search] Current search keyword: {keyword}"
+        )
+        # 续爬时从上次记录的页码继续，已经搜完的关键词直接跳过
+        checkpoint = await self.checkpoint_store.load(CheckpointScope.SEARCH, keyword)
+        if checkpoint.get("done"):
+            utils.logger.info(f"[XiaoHongShuCrawler.search] keyword: {keyword} already finished, skip")
+            return
+        page = checkpoint.get("page", 1)
+        search_id = checkpoint.get("search_id") or get_search_id()
+        progress = SearchProgress(self.checkpoint_store, keyword, page, search_id=search_id)
+        async with self.create_search_pipeline(keyword, on_page_done=progress.page_done) as pipeline:
             while (
                     page - start_page + 1
-            ) * xhs_limit_count <= config.CRAWLER_MAX_NOTES_COUNT:
+            ) * xhs_limit_count <= config.CRAWLER_MAX_NOTES_COUNT and await self.keyword_notes.wait_budget(keyword):
                 if page < start_page:
                     utils.logger.info(f"[XiaoHongShuCrawler.search] Skip page {page}")
                     page += 1
@@ -148,8 +178,6 @@ class XiaoHongShuCrawler(AbstractCrawler):
                     utils.logger.info(
                         f"[XiaoHongShuCrawler.search] search xhs keyword: {keyword}, page: {page}"
                     )
-                    note_ids: List[str] = []
-                    xsec_tokens: List[str] = []
                     notes_res = await self.xhs_client.get_note_by_keyword(
                         keyword=keyword,
                         search_id=search_id,
@@ -166,34 +194,89 @@ class XiaoHongShuCrawler(AbstractCrawler):
                     if not notes_res or not notes_res.get("has_more", False):
                         utils.logger.info("No more content!")
                         break
-                    semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
-                    task_list = [
-                        self.get_note_detail_async_task(
-                            note_id=post_item.get("id"),
-                            xsec_source=post_item.get("xsec_source"),
-                            xsec_token=post_item.get("xsec_token"),
-                            semaphore=semaphore,
-                        )
-                        for post_item in notes_res.get("items", {})
-                        if post_item.get("model_type") not in ("rec_query", "hot_query")
-                    ]
-                    note_details = await asyncio.gather(*task_list)
-                    for note_detail in note_details:
-                        if note_detail:
-                            await xhs_store.update_xhs_note(note_detail)
-                            await self.get_notice_media(note_detail)
-                            note_ids.append(note_detail.get("note_id"))
-                            xsec_tokens.append(note_detail.get("xsec_token"))
+                    # 详情、评论等交给流水线处理，这里直接翻下一页；进度记录的是最早一页还没处理完的页码
+                    async with progress.page(pipeline, page):
+                        for post_item in notes_res.get("items", {}):
+                            if post_item.get("model_type") in ("rec_query", "hot_query"):
+                                continue
+                            if not await self.keyword_notes.wait_budget(keyword):
+                                break
+                            # 其他关键词已经登记过的笔记只记录命中的关键词，不重复存储
+                            if await self.keyword_notes.claim(post_item.get("id"), keyword):
+                                await pipeline.put("detail", post_item)
                     page += 1
-                    utils.logger.info(
-                        f"[XiaoHongShuCrawler.search] Note details: {note_details}"
-                    )
-                    await self.batch_get_note_comments(note_ids, xsec_tokens)
                 except DataFetchError:
                     utils.logger.error(
                         "[XiaoHongShuCrawler.search] Get note detail error"
                     )
-                    break
+                    # 不标记完成，续爬时从这一页重新开始
+                    return
+        await self.checkpoint_store.finish(CheckpointScope.SEARCH, keyword)
+
+    def create_search_pipeline(
+            self, keyword: str, on_page_done: Optional[Callable[[int], Awaitable[None]]] = None
+    ) -> CrawlPipeline:
+        """
+        搜索流水线：搜索结果 -> 笔记详情 -> 存储 / 媒体下载 / 评论
+        Args:
+            keyword: 搜索关键词
+            on_page_done: 一页搜索结果全部处理完之后的回调
+
+        Returns:
+
+        """
+        semaphore = get_crawl_scheduler().limit(RequestClass.API, host=self.index_url)
+        pipeline = CrawlPipeline(f"XiaoHongShuCrawler.search[{keyword}]", on_tag_done=on_page_done)
+
+        async def get_detail(post_item: Dict) -> Optional[Dict]:
+            if await self.seen_index.is_fresh(SeenKind.DETAIL, post_item.get("id")):
+                utils.logger.info(f"[XiaoHongShuCrawler.search] note {post_item.get('id')} fetched recently, skip")
+                # 详情最近已经存储过，评论是否需要重新抓取由评论阶段按 COMMENTS 的记录判断
+                if config.ENABLE_GET_COMMENTS:
+                    await pipeline.put(
+                        "comments", {"note_id": post_item.get("id"), "xsec_token": post_item.get("xsec_token")}
+                    )
+                return None
+            return await self.get_note_detail_async_task(
+                note_id=post_item.get("id"),
+                xsec_source=post_item.get("xsec_source"),
+                xsec_token=post_item.get("xsec_token"),
+                semaphore=semaphore,
+            )
+
+        async def fetch_detail(post_item: Dict):
+            note_detail = None
+            try:
+                note_detail = await get_detail(post_item)
+            finally:
+                if not note_detail:
+                    # 跳过或者请求失败的笔记不存储，释放关键词的名额
+                    await self.keyword_notes.release(post_item.get("id"))
+            if not note_detail:
+                return
+            await pipeline.put("store", note_detail)
+            if config.ENABLE_GET_IMAGES:
+                await pipeline.put("media", note_detail)
+            if config.ENABLE_GET_COMMENTS:
+                await pipeline.put("comments", note_detail)
+
+        async def store_note(note_detail: Dict):
+            async with self.keyword_notes.storing(note_detail.get("note_id")):
+                await xhs_store.update_xhs_note(note_detail)
+            # 存储成功之后才记录，存储失败的笔记下次还会重新抓取
+            await self.seen_index.mark(SeenKind.DETAIL, note_detail.get("note_id"))
+
+        async def fetch_comments(note_detail: Dict):
+            await self.get_comments(
+                note_id=note_detail.get("note_id"),
+                xsec_token=note_detail.get("xsec_token"),
+            )
+
+        pipeline.add_stage("detail", fetch_detail, workers=config.SEARCH_PIPELINE_WORKERS)
+        pipeline.add_stage("store", store_note)
+        pipeline.add_stage("media", self.get_notice_media, workers=config.SEARCH_PIPELINE_WORKERS)
+        pipeline.add_stage("comments", fetch_comments, workers=config.SEARCH_PIPELINE_WORKERS)
+        return pipeline
 
     async def get_creators_and_notes(self) -> None:
         """Get creator's notes and retrieve their comment information."""
@@ -231,7 +314,7 @@ class XiaoHongShuCrawler(AbstractCrawler):
         """
         Concurrently obtain the specified post list and save the data
         """
-        semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
+        semaphore = get_crawl_scheduler().limit(RequestClass.API, host=self.index_url)
         task_list = [
             self.get_note_detail_async_task(
                 note_id=post_item.get("note_id"),
@@ -264,7 +347,7 @@ class XiaoHongShuCrawler(AbstractCrawler):
                 note_id=note_url_info.note_id,
                 xsec_source=note_url_info.xsec_source,
                 xsec_token=note_url_info.xsec_token,
-                semaphore=asyncio.Semaphore(config.MAX_CONCURRENCY_NUM),
+                semaphore=get_crawl_scheduler().limit(RequestClass.API, host=self.index_url),
             )
             get_note_detail_task_list.append(crawler_task)
 
@@ -283,7 +366,7 @@ class XiaoHongShuCrawler(AbstractCrawler):
             note_id: str,
             xsec_source: str,
             xsec_token: str,
-            semaphore: asyncio.Semaphore,
+            semaphore: SchedulerLimit,
     ) -> Optional[Dict]:
         """Get note detail
 
@@ -345,38 +428,41 @@ class XiaoHongShuCrawler(AbstractCrawler):
         utils.logger.info(
             f"[XiaoHongShuCrawler.batch_get_note_comments] Begin batch get note comments, note list: {note_list}"
         )
-        semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
+        # 评论翻页的每个请求在 client 里单独占用 API 并发名额，这里不再按帖子占着名额
         task_list: List[Task] = []
         for index, note_id in enumerate(note_list):
             task = asyncio.create_task(
-                self.get_comments(
-                    note_id=note_id, xsec_token=xsec_tokens[index], semaphore=semaphore
-                ),
+                self.get_comments(note_id=note_id, xsec_token=xsec_tokens[index]),
                 name=note_id,
             )
             task_list.append(task)
         await asyncio.gather(*task_list)
 
     async def get_comments(
-            self, note_id: str, xsec_token: str, semaphore: asyncio.Semaphore
+            self, note_id: str, xsec_token: str
     ):
         """Get note comments with keyword filtering and quantity limitation"""
-        async with semaphore:
+        if await self.seen_index.is_fresh(SeenKind.COMMENTS, note_id):
             utils.logger.info(
-                f"[XiaoHongShuCrawler.get_comments] Begin get note id comments {note_id}"
-            )
-            # When proxy is not enabled, increase the crawling interval
-            if config.ENABLE_IP_PROXY:
-                crawl_interval = random.random()
-            else:
-                crawl_interval = random.uniform(1, config.CRAWLER_MAX_SLEEP_SEC)
-            await self.xhs_client.get_note_all_comments(
-                note_id=note_id,
-                xsec_token=xsec_token,
-                crawl_interval=crawl_interval,
-                callback=xhs_store.batch_update_xhs_note_comments,
-                max_count=CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES,
+                f"[XiaoHongShuCrawler.get_comments] note id {note_id} comments fetched recently, skip"
             )
+            return
+        utils.logger.info(
+            f"[XiaoHongShuCrawler.get_comments] Begin get note id comments {note_id}"
+        )
+        # When proxy is not enabled, increase the crawling interval
+        if config.ENABLE_IP_PROXY:
+            crawl_interval = random.random()
+        else:
+            crawl_interval = random.uniform(1, config.CRAWLER_MAX_SLEEP_SEC)
+        await self.xhs_client.get_note_all_comments(
+            note_id=note_id,
+            xsec_token=xsec_token,
+            crawl_interval=crawl_interval,
+            callback=xhs_store.batch_update_xhs_note_comments,
+            max_count=CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES,
+        )
+        await self.seen_index.mark(SeenKind.COMMENTS, note_id)
 
     @staticmethod
     def format_proxy_info(
@@ -513,6 +599,13 @@ class XiaoHongShuCrawler(AbstractCrawler):
         await self.get_note_images(note_detail)
         await self.get_notice_video(note_detail)
 
+    @staticmethod
+    def _get_media_asset_id(url: str) -> str:
+        """
+        媒体文件的资源ID：CDN 地址最后一段的 trace id，去掉 ! 后面的图片格式参数，同一个资源在不同地址下保持一致
+        """
+        return get_trace_id(url.split("?")[0]).split("!")[0]
+
     async def get_note_images(self, note_item: Dict):
         """
         get note images. please use get_notice_media
@@ -535,12 +628,14 @@ class XiaoHongShuCrawler(AbstractCrawler):
             url = pic.get("url")
             if not url:
                 continue
-            content = await self.xhs_client.get_note_media(url)
-            if content is None:
-                continue
             extension_file_name = f"{picNum}.jpg"
+            save_file_name = xhs_store.get_xhs_note_media_file_name(note_id, extension_file_name)
+            if not await self.media_store.fetch(
+                note_id, self._get_media_asset_id(url), save_file_name,
+                functools.partial(self.xhs_client.download_note_media, url)
+            ):
+                continue
             picNum += 1
-            await xhs_store.update_xhs_note_image(note_id, content, extension_file_name)
 
     async def get_notice_video(self, note_item: Dict):
         """
@@ -558,9 +653,11 @@ class XiaoHongShuCrawler(AbstractCrawler):
             return
         videoNum = 0
         for url in videos:
-            content = await self.xhs_client.get_note_media(url)
-            if content is None:
-                continue
             extension_file_name = f"{videoNum}.mp4"
+            save_file_name = xhs_store.get_xhs_note_media_file_name(note_id, extension_file_name)
+            if not await self.media_store.fetch(
+                note_id, self._get_media_asset_id(url), save_file_name,
+                functools.partial(self.xhs_client.download_note_video, url)
+            ):
+                continue
             videoNum += 1
-            await xhs_store.update_xhs_note_image(note_id, content, extension_file_name)
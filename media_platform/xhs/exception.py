@@ -18,3 +18,7 @@ class DataFetchError(RequestError):
 
 class IPBlockError(RequestError):
     """fetch so fast that the server block us ip"""
+
+
+class CaptchaError(RequestError):
+    """the server asks for a captcha, status code 461 or 471"""
@@ -10,12 +10,10 @@
 
 
 # -*- coding: utf-8 -*-
-import asyncio
 import json
 from typing import Any, Callable, Dict, List, Optional, Union
 from urllib.parse import urlencode
 
-import httpx
 from httpx import Response
 from playwright.async_api import BrowserContext, Page
 from tenacity import retry, stop_after_attempt, wait_fixed
@@ -25,8 +23,12 @@ from base.base_crawler import AbstractApiClient
 from constant import zhihu as zhihu_constant
 from model.m_zhihu import ZhihuComment, ZhihuContent, ZhihuCreator, ZhihuQuestionTopic
 from tools import utils
+from tools.crawl_scheduler import RequestClass, get_crawl_scheduler
+from tools.httpx_client_pool import HttpxClientPool
+from tools.rate_limiter import crawl_sleep, get_rate_limiter
+from tools.sub_comments import SubCommentBudget, expand_sub_comments
 
-from .exception import DataFetchError, ForbiddenError
+from .exception import DataFetchError, ForbiddenError, IPBlockError
 from .field import SearchSort, SearchTime, SearchType
 from .help import ZhihuExtractor, sign
 
@@ -43,6 +45,8 @@ class ZhiHuClient(AbstractApiClient):
     ):
         self.proxies = proxies
         self.timeout = timeout
+        self.http_client_pool = HttpxClientPool(proxies, timeout=timeout)
+        self.rate_limiter = get_rate_limiter("zhihu", throttle_errors=(ForbiddenError, IPBlockError))
         self.default_headers = headers
         self.cookie_dict = cookie_dict
         self._extractor = ZhihuExtractor()
@@ -58,7 +62,7 @@ class ZhiHuClient(AbstractApiClient):
         d_c0 = self.cookie_dict.get("d_c0")
         if not d_c0:
             raise Exception("d_c0 not found in cookies")
-        sign_res = sign(url, self.default_headers["cookie"])
+        sign_res = await sign(url, self.default_headers["cookie"])
         headers = self.default_headers.copy()
         headers['x-zst-81'] = sign_res["x-zst-81"]
         headers['x-zse-96'] = sign_res["x-zse-96"]
@@ -76,10 +80,20 @@ class ZhiHuClient(AbstractApiClient):
         Returns:
 
         """
+        if kwargs.get("return_response"):
+            # HTML 页面单独占用调度器的页面并发名额
+            async with get_crawl_scheduler().limit(RequestClass.PAGE, host=url):
+                async with self.rate_limiter.limit(url, self.proxies):
+                    return await self._request(method, url, **kwargs)
+        async with get_crawl_scheduler().limit(RequestClass.API, host=url):
+            async with self.rate_limiter.limit(url, self.proxies):
+                return await self._request(method, url, **kwargs)
+
+    async def _request(self, method, url, **kwargs) -> Union[str, Any]:
         # return response.text
         return_response = kwargs.pop('return_response', False)
 
-        async with httpx.AsyncClient(proxies=self.proxies, ) as client:
+        async with self.http_client_pool.borrow(self.proxies) as client:
             response = await client.request(
                 method, url, timeout=self.timeout,
                 **kwargs
@@ -275,6 +289,7 @@ class ZhiHuClient(AbstractApiClient):
         is_end: bool = False
         offset: str = ""
         limit: int = 10
+        sub_comment_budget = SubCommentBudget(host=zhihu_constant.ZHIHU_URL)
         while not is_end:
             root_comment_res = await self.get_root_comments(content.content_id, content.content_type, offset, limit)
             if not root_comment_res:
@@ -291,19 +306,22 @@ class ZhiHuClient(AbstractApiClient):
                 await callback(comments)
 
             result.extend(comments)
-            await self.get_comments_all_sub_comments(content, comments, crawl_interval=crawl_interval, callback=callback)
-            await asyncio.sleep(crawl_interval)
+            await self.get_comments_all_sub_comments(content, comments, crawl_interval=crawl_interval, callback=callback,
+                                                     budget=sub_comment_budget)
+            await crawl_sleep(crawl_interval)
         return result
 
     async def get_comments_all_sub_comments(self, content: ZhihuContent, comments: List[ZhihuComment], crawl_interval: float = 1.0,
-                                            callback: Optional[Callable] = None) -> List[ZhihuComment]:
+                                            callback: Optional[Callable] = None,
+                                            budget: Optional[SubCommentBudget] = None) -> List[ZhihuComment]:
         """
-        获取指定评论下的所有子评论
+        获取指定评论下的所有子评论，多条评论的子评论并发展开
         Args:
             content: 内容详情对象(问题｜文章｜视频)
             comments: 评论列表
             crawl_interval: 爬取一次笔记的延迟单位（秒）
             callback: 一次笔记爬取结束后
+            budget: 内容的子评论配额，同一个内容的多次调用共用
 
         Returns:
 
@@ -311,22 +329,26 @@ class ZhiHuClient(AbstractApiClient):
         if not config.ENABLE_GET_SUB_COMMENTS:
             return []
 
-        all_sub_comments: List[ZhihuComment] = []
-        for parment_comment in comments:
-            if parment_comment.sub_comment_count == 0:
-                continue
+        budget = budget or SubCommentBudget(host=zhihu_constant.ZHIHU_URL)
 
+        async def expand(parment_comment: ZhihuComment) -> List[ZhihuComment]:
+            all_sub_comments: List[ZhihuComment] = []
             is_end: bool = False
             offset: str = ""
             limit: int = 10
+            page = 0
             while not is_end:
-                child_comment_res = await self.get_child_comments(parment_comment.comment_id, offset, limit)
+                async with budget.page_limit():
+                    if not budget.page_allowed(page):
+                        break
+                    page += 1
+                    child_comment_res = await self.get_child_comments(parment_comment.comment_id, offset, limit)
                 if not child_comment_res:
                     break
                 paging_info = child_comment_res.get("paging", {})
                 is_end = paging_info.get("is_end")
                 offset = self._extractor.extract_offset(paging_info)
-                sub_comments = self._extractor.extract_comments(content, child_comment_res.get("data"))
+                sub_comments = budget.take(self._extractor.extract_comments(content, child_comment_res.get("data")))
 
                 if not sub_comments:
                     break
@@ -335,8 +357,11 @@ class ZhiHuClient(AbstractApiClient):
                     await callback(sub_comments)
 
                 all_sub_comments.extend(sub_comments)
-                await asyncio.sleep(crawl_interval)
-        return all_sub_comments
+                await crawl_sleep(crawl_interval)
+            return all_sub_comments
+
+        roots = [comment for comment in comments if comment.sub_comment_count != 0]
+        return await expand_sub_comments(roots, expand, budget)
 
     async def get_creator_info(self, url_token: str) -> Optional[ZhihuCreator]:
         """
@@ -440,7 +465,7 @@ class ZhiHuClient(AbstractApiClient):
                 await callback(contents)
             all_contents.extend(contents)
             offset += limit
-            await asyncio.sleep(crawl_interval)
+            await crawl_sleep(crawl_interval)
         return all_contents
 
 
@@ -471,7 +496,7 @@ class ZhiHuClient(AbstractApiClient):
                 await callback(contents)
             all_contents.extend(contents)
             offset += limit
-            await asyncio.sleep(crawl_interval)
+            await crawl_sleep(crawl_interval)
         return all_contents
 
 
@@ -502,7 +527,7 @@ class ZhiHuClient(AbstractApiClient):
                 await callback(contents)
             all_contents.extend(contents)
             offset += limit
-            await asyncio.sleep(crawl_interval)
+            await crawl_sleep(crawl_interval)
         return all_contents
 
 
@@ -32,6 +32,7 @@ from proxy.proxy_ip_pool import IpInfoModel, create_ip_pool
 from store import zhihu as zhihu_store
 from tools import utils
 from tools.cdp_browser import CDPBrowserManager
+from tools.crawl_scheduler import RequestClass, SchedulerLimit, get_crawl_scheduler
 from var import crawler_type_var, source_keyword_var
 
 from .client import ZhiHuClient
@@ -197,36 +198,32 @@ class ZhihuCrawler(AbstractCrawler):
             )
             return
 
-        semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
+        # 评论翻页的每个请求在 client 里单独占用 API 并发名额，这里不再按内容占着名额
         task_list: List[Task] = []
         for content_item in content_list:
             task = asyncio.create_task(
-                self.get_comments(content_item, semaphore), name=content_item.content_id
+                self.get_comments(content_item), name=content_item.content_id
             )
             task_list.append(task)
         await asyncio.gather(*task_list)
 
-    async def get_comments(
-        self, content_item: ZhihuContent, semaphore: asyncio.Semaphore
-    ):
+    async def get_comments(self, content_item: ZhihuContent):
         """
         Get note comments with keyword filtering and quantity limitation
         Args:
             content_item:
-            semaphore:
 
         Returns:
 
         """
-        async with semaphore:
-            utils.logger.info(
-                f"[ZhihuCrawler.get_comments] Begin get note id comments {content_item.content_id}"
-            )
-            await self.zhihu_client.get_note_all_comments(
-                content=content_item,
-                crawl_interval=random.random(),
-                callback=zhihu_store.batch_update_zhihu_note_comments,
-            )
+        utils.logger.info(
+            f"[ZhihuCrawler.get_comments] Begin get note id comments {content_item.content_id}"
+        )
+        await self.zhihu_client.get_note_all_comments(
+            content=content_item,
+            crawl_interval=random.random(),
+            callback=zhihu_store.batch_update_zhihu_note_comments,
+        )
 
     async def get_creators_and_notes(self) -> None:
         """
@@ -316,7 +313,7 @@ class ZhihuCrawler(AbstractCrawler):
         )
         
         # 批量获取回答详情
-        semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
+        semaphore = get_crawl_scheduler().limit(RequestClass.API, host=self.index_url)
         get_answer_detail_tasks = []
         for answer_url in all_answer_urls:
             task = self.get_note_detail(
@@ -711,7 +708,7 @@ class ZhihuCrawler(AbstractCrawler):
             utils.logger.warning(f"[ZhihuCrawler._expand_question_detail_with_context_page] 展开问题详情失败: {e}")
 
     async def get_note_detail(
-        self, full_note_url: str, semaphore: asyncio.Semaphore
+        self, full_note_url: str, semaphore: SchedulerLimit
     ) -> Optional[ZhihuContent]:
         """
         Get note detail
@@ -762,7 +759,7 @@ class ZhihuCrawler(AbstractCrawler):
             full_note_url = full_note_url.split("?")[0]
             crawler_task = self.get_note_detail(
                 full_note_url=full_note_url,
-                semaphore=asyncio.Semaphore(config.MAX_CONCURRENCY_NUM),
+                semaphore=get_crawl_scheduler().limit(RequestClass.API, host=self.index_url),
             )
             get_note_detail_task_list.append(crawler_task)
 
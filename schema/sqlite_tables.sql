@@ -12,6 +12,7 @@ CREATE TABLE bilibili_video (
     avatar TEXT DEFAULT NULL,
     add_ts INTEGER NOT NULL,
     last_modify_ts INTEGER NOT NULL,
+    content_hash TEXT DEFAULT NULL,
     video_id TEXT NOT NULL,
     video_type TEXT NOT NULL,
     title TEXT DEFAULT NULL,
@@ -30,7 +31,7 @@ CREATE TABLE bilibili_video (
     source_keyword TEXT DEFAULT ''
 );
 
-CREATE INDEX idx_bilibili_vi_video_i_31c36e ON bilibili_video(video_id);
+CREATE UNIQUE INDEX idx_bilibili_vi_video_i_31c36e ON bilibili_video(video_id);
 CREATE INDEX idx_bilibili_vi_create__73e0ec ON bilibili_video(create_time);
 
 -- ----------------------------
@@ -46,6 +47,7 @@ CREATE TABLE bilibili_video_comment (
     avatar TEXT DEFAULT NULL,
     add_ts INTEGER NOT NULL,
     last_modify_ts INTEGER NOT NULL,
+    content_hash TEXT DEFAULT NULL,
     comment_id TEXT NOT NULL,
     video_id TEXT NOT NULL,
     content TEXT,
@@ -55,7 +57,7 @@ CREATE TABLE bilibili_video_comment (
     like_count TEXT NOT NULL DEFAULT '0'
 );
 
-CREATE INDEX idx_bilibili_vi_comment_41c34e ON bilibili_video_comment(comment_id);
+CREATE UNIQUE INDEX idx_bilibili_vi_comment_41c34e ON bilibili_video_comment(comment_id);
 CREATE INDEX idx_bilibili_vi_video_i_f22873 ON bilibili_video_comment(video_id);
 
 -- ----------------------------
@@ -71,13 +73,14 @@ CREATE TABLE bilibili_up_info (
     avatar TEXT DEFAULT NULL,
     add_ts INTEGER NOT NULL,
     last_modify_ts INTEGER NOT NULL,
+    content_hash TEXT DEFAULT NULL,
     total_fans INTEGER DEFAULT NULL,
     total_liked INTEGER DEFAULT NULL,
     user_rank INTEGER DEFAULT NULL,
     is_official INTEGER DEFAULT NULL
 );
 
-CREATE INDEX idx_bilibili_vi_user_123456 ON bilibili_up_info(user_id);
+CREATE UNIQUE INDEX idx_bilibili_vi_user_123456 ON bilibili_up_info(user_id);
 
 -- ----------------------------
 -- Table structure for bilibili_contact_info
@@ -94,9 +97,12 @@ CREATE TABLE bilibili_contact_info (
     up_avatar TEXT DEFAULT NULL,
     fan_avatar TEXT DEFAULT NULL,
     add_ts INTEGER NOT NULL,
-    last_modify_ts INTEGER NOT NULL
+    last_modify_ts INTEGER NOT NULL,
+    content_hash TEXT DEFAULT NULL
 );
 
+CREATE UNIQUE INDEX idx_bilibili_contact_info_up_fan ON bilibili_contact_info(up_id, fan_id);
+
 CREATE INDEX idx_bilibili_contact_info_up_id ON bilibili_contact_info(up_id);
 CREATE INDEX idx_bilibili_contact_info_fan_id ON bilibili_contact_info(fan_id);
 
@@ -116,10 +122,11 @@ CREATE TABLE bilibili_up_dynamic (
     total_forwards INTEGER DEFAULT NULL,
     total_liked INTEGER DEFAULT NULL,
     add_ts INTEGER NOT NULL,
-    last_modify_ts INTEGER NOT NULL
+    last_modify_ts INTEGER NOT NULL,
+    content_hash TEXT DEFAULT NULL
 );
 
-CREATE INDEX idx_bilibili_up_dynamic_dynamic_id ON bilibili_up_dynamic(dynamic_id);
+CREATE UNIQUE INDEX idx_bilibili_up_dynamic_dynamic_id ON bilibili_up_dynamic(dynamic_id);
 
 -- ----------------------------
 -- Table structure for douyin_aweme
@@ -137,6 +144,7 @@ CREATE TABLE douyin_aweme (
     ip_location TEXT DEFAULT NULL,
     add_ts INTEGER NOT NULL,
     last_modify_ts INTEGER NOT NULL,
+    content_hash TEXT DEFAULT NULL,
     aweme_id TEXT NOT NULL,
     aweme_type TEXT NOT NULL,
     title TEXT DEFAULT NULL,
@@ -152,7 +160,7 @@ CREATE TABLE douyin_aweme (
     source_keyword TEXT DEFAULT ''
 );
 
-CREATE INDEX idx_douyin_awem_aweme_i_6f7bc6 ON douyin_aweme(aweme_id);
+CREATE UNIQUE INDEX idx_douyin_awem_aweme_i_6f7bc6 ON douyin_aweme(aweme_id);
 CREATE INDEX idx_douyin_awem_create__299dfe ON douyin_aweme(create_time);
 
 -- ----------------------------
@@ -171,6 +179,7 @@ CREATE TABLE douyin_aweme_comment (
     ip_location TEXT DEFAULT NULL,
     add_ts INTEGER NOT NULL,
     last_modify_ts INTEGER NOT NULL,
+    content_hash TEXT DEFAULT NULL,
     comment_id TEXT NOT NULL,
     aweme_id TEXT NOT NULL,
     content TEXT,
@@ -181,7 +190,7 @@ CREATE TABLE douyin_aweme_comment (
     pictures TEXT NOT NULL DEFAULT ''
 );
 
-CREATE INDEX idx_douyin_awem_comment_fcd7e4 ON douyin_aweme_comment(comment_id);
+CREATE UNIQUE INDEX idx_douyin_awem_comment_fcd7e4 ON douyin_aweme_comment(comment_id);
 CREATE INDEX idx_douyin_awem_aweme_i_c50049 ON douyin_aweme_comment(aweme_id);
 
 -- ----------------------------
@@ -196,6 +205,7 @@ CREATE TABLE dy_creator (
     ip_location TEXT DEFAULT NULL,
     add_ts INTEGER NOT NULL,
     last_modify_ts INTEGER NOT NULL,
+    content_hash TEXT DEFAULT NULL,
     desc TEXT,
     gender TEXT DEFAULT NULL,
     follows TEXT DEFAULT NULL,
@@ -204,6 +214,8 @@ CREATE TABLE dy_creator (
     videos_count TEXT DEFAULT NULL
 );
 
+CREATE UNIQUE INDEX idx_dy_creator_user_id ON dy_creator(user_id);
+
 -- ----------------------------
 -- Table structure for kuaishou_video
 -- ----------------------------
@@ -215,6 +227,7 @@ CREATE TABLE kuaishou_video (
     avatar TEXT DEFAULT NULL,
     add_ts INTEGER NOT NULL,
     last_modify_ts INTEGER NOT NULL,
+    content_hash TEXT DEFAULT NULL,
     video_id TEXT NOT NULL,
     video_type TEXT NOT NULL,
     title TEXT DEFAULT NULL,
@@ -228,7 +241,7 @@ CREATE TABLE kuaishou_video (
     source_keyword TEXT DEFAULT ''
 );
 
-CREATE INDEX idx_kuaishou_vi_video_i_c5c6a6 ON kuaishou_video(video_id);
+CREATE UNIQUE INDEX idx_kuaishou_vi_video_i_c5c6a6 ON kuaishou_video(video_id);
 CREATE INDEX idx_kuaishou_vi_create__a10dee ON kuaishou_video(create_time);
 
 -- ----------------------------
@@ -242,6 +255,7 @@ CREATE TABLE kuaishou_video_comment (
     avatar TEXT DEFAULT NULL,
     add_ts INTEGER NOT NULL,
     last_modify_ts INTEGER NOT NULL,
+    content_hash TEXT DEFAULT NULL,
     comment_id TEXT NOT NULL,
     video_id TEXT NOT NULL,
     content TEXT,
@@ -249,7 +263,7 @@ CREATE TABLE kuaishou_video_comment (
     sub_comment_count TEXT NOT NULL
 );
 
-CREATE INDEX idx_kuaishou_vi_comment_ed48fa ON kuaishou_video_comment(comment_id);
+CREATE UNIQUE INDEX idx_kuaishou_vi_comment_ed48fa ON kuaishou_video_comment(comment_id);
 CREATE INDEX idx_kuaishou_vi_video_i_e50914 ON kuaishou_video_comment(video_id);
 
 -- ----------------------------
@@ -266,6 +280,7 @@ CREATE TABLE weibo_note (
     ip_location TEXT DEFAULT '',
     add_ts INTEGER NOT NULL,
     last_modify_ts INTEGER NOT NULL,
+    content_hash TEXT DEFAULT NULL,
     note_id TEXT NOT NULL,
     content TEXT,
     create_time INTEGER NOT NULL,
@@ -277,7 +292,7 @@ CREATE TABLE weibo_note (
     source_keyword TEXT DEFAULT ''
 );
 
-CREATE INDEX idx_weibo_note_note_id_f95b1a ON weibo_note(note_id);
+CREATE UNIQUE INDEX idx_weibo_note_note_id_f95b1a ON weibo_note(note_id);
 CREATE INDEX idx_weibo_note_create__692709 ON weibo_note(create_time);
 CREATE INDEX idx_weibo_note_create__d05ed2 ON weibo_note(create_date_time);
 
@@ -295,6 +310,7 @@ CREATE TABLE weibo_note_comment (
     ip_location TEXT DEFAULT '',
     add_ts INTEGER NOT NULL,
     last_modify_ts INTEGER NOT NULL,
+    content_hash TEXT DEFAULT NULL,
     comment_id TEXT NOT NULL,
     note_id TEXT NOT NULL,
     content TEXT,
@@ -305,7 +321,7 @@ CREATE TABLE weibo_note_comment (
     parent_comment_id TEXT DEFAULT NULL
 );
 
-CREATE INDEX idx_weibo_note__comment_c7611c ON weibo_note_comment(comment_id);
+CREATE UNIQUE INDEX idx_weibo_note__comment_c7611c ON weibo_note_comment(comment_id);
 CREATE INDEX idx_weibo_note__note_id_24f108 ON weibo_note_comment(note_id);
 CREATE INDEX idx_weibo_note__create__667fe3 ON weibo_note_comment(create_date_time);
 
@@ -321,6 +337,7 @@ CREATE TABLE weibo_creator (
     ip_location TEXT DEFAULT NULL,
     add_ts INTEGER NOT NULL,
     last_modify_ts INTEGER NOT NULL,
+    content_hash TEXT DEFAULT NULL,
     desc TEXT,
     gender TEXT DEFAULT NULL,
     follows TEXT DEFAULT NULL,
@@ -328,6 +345,8 @@ CREATE TABLE weibo_creator (
     tag_list TEXT
 );
 
+CREATE UNIQUE INDEX idx_weibo_creator_user_id ON weibo_creator(user_id);
+
 -- ----------------------------
 -- Table structure for xhs_creator
 -- ----------------------------
@@ -340,6 +359,7 @@ CREATE TABLE xhs_creator (
     ip_location TEXT DEFAULT NULL,
     add_ts INTEGER NOT NULL,
     last_modify_ts INTEGER NOT NULL,
+    content_hash TEXT DEFAULT NULL,
     desc TEXT,
     gender TEXT DEFAULT NULL,
     follows TEXT DEFAULT NULL,
@@ -348,6 +368,8 @@ CREATE TABLE xhs_creator (
     tag_list TEXT
 );
 
+CREATE UNIQUE INDEX idx_xhs_creator_user_id ON xhs_creator(user_id);
+
 -- ----------------------------
 -- Table structure for xhs_note
 -- ----------------------------
@@ -360,6 +382,7 @@ CREATE TABLE xhs_note (
     ip_location TEXT DEFAULT NULL,
     add_ts INTEGER NOT NULL,
     last_modify_ts INTEGER NOT NULL,
+    content_hash TEXT DEFAULT NULL,
     note_id TEXT NOT NULL,
     type TEXT DEFAULT NULL,
     title TEXT DEFAULT NULL,
@@ -378,7 +401,7 @@ CREATE TABLE xhs_note (
     xsec_token TEXT DEFAULT NULL
 );
 
-CREATE INDEX idx_xhs_note_note_id_209457 ON xhs_note(note_id);
+CREATE UNIQUE INDEX idx_xhs_note_note_id_209457 ON xhs_note(note_id);
 CREATE INDEX idx_xhs_note_time_eaa910 ON xhs_note(time);
 
 -- ----------------------------
@@ -393,6 +416,7 @@ CREATE TABLE xhs_note_comment (
     ip_location TEXT DEFAULT NULL,
     add_ts INTEGER NOT NULL,
     last_modify_ts INTEGER NOT NULL,
+    content_hash TEXT DEFAULT NULL,
     comment_id TEXT NOT NULL,
     create_time INTEGER NOT NULL,
     note_id TEXT NOT NULL,
@@ -403,7 +427,7 @@ CREATE TABLE xhs_note_comment (
     like_count TEXT DEFAULT NULL
 );
 
-CREATE INDEX idx_xhs_note_co_comment_8e8349 ON xhs_note_comment(comment_id);
+CREATE UNIQUE INDEX idx_xhs_note_co_comment_8e8349 ON xhs_note_comment(comment_id);
 CREATE INDEX idx_xhs_note_co_create__204f8d ON xhs_note_comment(create_time);
 
 -- ----------------------------
@@ -428,10 +452,11 @@ CREATE TABLE tieba_note (
     ip_location TEXT DEFAULT '',
     add_ts INTEGER NOT NULL,
     last_modify_ts INTEGER NOT NULL,
+    content_hash TEXT DEFAULT NULL,
     source_keyword TEXT DEFAULT ''
 );
 
-CREATE INDEX idx_tieba_note_note_id ON tieba_note(note_id);
+CREATE UNIQUE INDEX idx_tieba_note_note_id ON tieba_note(note_id);
 CREATE INDEX idx_tieba_note_publish_time ON tieba_note(publish_time);
 
 -- ----------------------------
@@ -455,10 +480,11 @@ CREATE TABLE tieba_comment (
     note_id TEXT NOT NULL,
     note_url TEXT NOT NULL,
     add_ts INTEGER NOT NULL,
-    last_modify_ts INTEGER NOT NULL
+    last_modify_ts INTEGER NOT NULL,
+    content_hash TEXT DEFAULT NULL
 );
 
-CREATE INDEX idx_tieba_comment_comment_id ON tieba_comment(comment_id);
+CREATE UNIQUE INDEX idx_tieba_comment_comment_id ON tieba_comment(comment_id);
 CREATE INDEX idx_tieba_comment_note_id ON tieba_comment(note_id);
 CREATE INDEX idx_tieba_comment_publish_time ON tieba_comment(publish_time);
 
@@ -475,12 +501,15 @@ CREATE TABLE tieba_creator (
     ip_location TEXT DEFAULT NULL,
     add_ts INTEGER NOT NULL,
     last_modify_ts INTEGER NOT NULL,
+    content_hash TEXT DEFAULT NULL,
     gender TEXT DEFAULT NULL,
     follows TEXT DEFAULT NULL,
     fans TEXT DEFAULT NULL,
     registration_duration TEXT DEFAULT NULL
 );
 
+CREATE UNIQUE INDEX idx_tieba_creator_user_id ON tieba_creator(user_id);
+
 -- ----------------------------
 -- Table structure for zhihu_content
 -- ----------------------------
@@ -505,10 +534,11 @@ CREATE TABLE zhihu_content (
     user_avatar TEXT NOT NULL,
     user_url_token TEXT NOT NULL,
     add_ts INTEGER NOT NULL,
-    last_modify_ts INTEGER NOT NULL
+    last_modify_ts INTEGER NOT NULL,
+    content_hash TEXT DEFAULT NULL
 );
 
-CREATE INDEX idx_zhihu_content_content_id ON zhihu_content(content_id);
+CREATE UNIQUE INDEX idx_zhihu_content_content_id ON zhihu_content(content_id);
 CREATE INDEX idx_zhihu_content_created_time ON zhihu_content(created_time);
 
 -- ----------------------------
@@ -532,10 +562,11 @@ CREATE TABLE zhihu_comment (
     user_nickname TEXT NOT NULL,
     user_avatar TEXT NOT NULL,
     add_ts INTEGER NOT NULL,
-    last_modify_ts INTEGER NOT NULL
+    last_modify_ts INTEGER NOT NULL,
+    content_hash TEXT DEFAULT NULL
 );
 
-CREATE INDEX idx_zhihu_comment_comment_id ON zhihu_comment(comment_id);
+CREATE UNIQUE INDEX idx_zhihu_comment_comment_id ON zhihu_comment(comment_id);
 CREATE INDEX idx_zhihu_comment_content_id ON zhihu_comment(content_id);
 CREATE INDEX idx_zhihu_comment_publish_time ON zhihu_comment(publish_time);
 
@@ -561,7 +592,8 @@ CREATE TABLE zhihu_creator (
     column_count INTEGER NOT NULL DEFAULT 0,
     get_voteup_count INTEGER NOT NULL DEFAULT 0,
     add_ts INTEGER NOT NULL,
-    last_modify_ts INTEGER NOT NULL
+    last_modify_ts INTEGER NOT NULL,
+    content_hash TEXT DEFAULT NULL
 );
 
 CREATE UNIQUE INDEX idx_zhihu_creator_user_id ON zhihu_creator(user_id);
\ No newline at end of file
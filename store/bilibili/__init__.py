@@ -14,9 +14,11 @@
 # @Time    : 2024/1/14 19:34
 # @Desc    :
 
-from typing import List
+from typing import List, Optional
 
 import config
+from store.write_behind import wrap_store
+from tools.count_snapshot import get_count_snapshot_store
 from var import source_keyword_var
 
 from .bilibili_store_impl import *
@@ -28,6 +30,7 @@ class BiliStoreFactory:
         "csv": BiliCsvStoreImplement,
         "db": BiliDbStoreImplement,
         "json": BiliJsonStoreImplement,
+        "jsonl": BiliJsonlStoreImplement,
         "sqlite": BiliSqliteStoreImplement,
     }
 
@@ -36,9 +39,9 @@ class BiliStoreFactory:
         store_class = BiliStoreFactory.STORES.get(config.SAVE_DATA_OPTION)
         if not store_class:
             raise ValueError(
-                "[BiliStoreFactory.create_store] Invalid save option only supported csv or db or json or sqlite ..."
+                "[BiliStoreFactory.create_store] Invalid save option only supported csv or db or json or jsonl or sqlite ..."
             )
-        return store_class()
+        return wrap_store(store_class())
 
 
 async def update_bilibili_video(video_item: Dict):
@@ -68,6 +71,13 @@ async def update_bilibili_video(video_item: Dict):
         "video_cover_url": video_item_view.get("pic", ""),
         "source_keyword": source_keyword_var.get(),
     }
+    await get_count_snapshot_store("bili").record(video_id, {
+        "liked_count": video_item_stat.get("like"),
+        "collected_count": video_item_stat.get("favorite"),
+        "comment_count": video_item_stat.get("reply"),
+        "share_count": video_item_stat.get("share"),
+        "play_count": video_item_stat.get("view"),
+    })
     utils.logger.info(
         f"[store.bilibili.update_bilibili_video] bilibili video id:{video_id}, title:{save_content_item.get('title')}"
     )
@@ -98,11 +108,11 @@ async def update_up_info(video_item: Dict):
 async def batch_update_bilibili_video_comments(video_id: str, comments: List[Dict]):
     if not comments:
         return
-    for comment_item in comments:
-        await update_bilibili_video_comment(video_id, comment_item)
+    save_comment_items = [_build_bilibili_video_comment_item(video_id, comment_item) for comment_item in comments]
+    await BiliStoreFactory.create_store().store_comments([item for item in save_comment_items if item])
 
 
-async def update_bilibili_video_comment(video_id: str, comment_item: Dict):
+def _build_bilibili_video_comment_item(video_id: str, comment_item: Dict) -> Optional[Dict]:
     comment_id = str(comment_item.get("rpid"))
     parent_comment_id = str(comment_item.get("parent", 0))
     content: Dict = comment_item.get("content")
@@ -126,24 +136,24 @@ async def update_bilibili_video_comment(video_id: str, comment_item: Dict):
     utils.logger.info(
         f"[store.bilibili.update_bilibili_video_comment] Bilibili video comment: {comment_id}, content: {save_comment_item.get('content')}"
     )
-    await BiliStoreFactory.create_store().store_comment(comment_item=save_comment_item)
+    return save_comment_item
+
 
+async def update_bilibili_video_comment(video_id: str, comment_item: Dict):
+    save_comment_item = _build_bilibili_video_comment_item(video_id, comment_item)
+    if not save_comment_item:
+        return
+    await BiliStoreFactory.create_store().store_comment(save_comment_item)
 
-async def store_video(aid, video_content, extension_file_name):
+
+def get_bilibili_video_file_name(aid, extension_file_name) -> str:
     """
-    video video storage implementation
+    video local file name, streaming download writes to it directly
     Args:
         aid:
-        video_content:
         extension_file_name:
     """
-    await BilibiliVideo().store_video(
-        {
-            "aid": aid,
-            "video_content": video_content,
-            "extension_file_name": extension_file_name,
-        }
-    )
+    return BilibiliVideo().make_save_file_name(str(aid), extension_file_name)
 
 
 async def batch_update_bilibili_creator_fans(creator_info: Dict, fans_list: List[Dict]):
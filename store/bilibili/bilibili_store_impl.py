@@ -14,17 +14,17 @@
 # @Time    : 2024/1/14 19:34
 # @Desc    : B站存储实现类
 import asyncio
-import csv
 import json
 import os
 import pathlib
-from typing import Dict
+from typing import Dict, List
 
 import aiofiles
 
 import config
 from base.base_crawler import AbstractStore
 from tools import utils, words
+from tools.buffered_file_writer import CsvFileWriter, JsonlFileWriter
 from var import crawler_type_var
 
 
@@ -51,14 +51,14 @@ class BiliCsvStoreImplement(AbstractStore):
         Args:
             store_type: contents or comments
 
-        Returns: eg: data/bilibili/search_comments_20240114.csv ...
+        Returns: eg: data/bilibili/1_search_comments, 写入时会自动加上日期后缀，例如 search_comments_20240114.csv
 
         """
-        return f"{self.csv_store_path}/{self.file_count}_{crawler_type_var.get()}_{store_type}_{utils.get_current_date()}.csv"
+        return f"{self.csv_store_path}/{self.file_count}_{crawler_type_var.get()}_{store_type}"
 
     async def save_data_to_csv(self, save_item: Dict, store_type: str):
         """
-        Below is a simple way to save it in CSV format.
+        以 CSV 格式追加保存一条数据，同一类数据的文件句柄在进程内复用，按日期和大小自动切换文件
         Args:
             save_item:  save content dict info
             store_type: Save type contains content and comments（contents | comments）
@@ -66,13 +66,11 @@ class BiliCsvStoreImplement(AbstractStore):
         Returns: no returns
 
         """
-        pathlib.Path(self.csv_store_path).mkdir(parents=True, exist_ok=True)
-        save_file_name = self.make_save_file_name(store_type=store_type)
-        async with aiofiles.open(save_file_name, mode='a+', encoding="utf-8-sig", newline="") as f:
-            writer = csv.writer(f)
-            if await f.tell() == 0:
-                await writer.writerow(save_item.keys())
-            await writer.writerow(save_item.values())
+        writer = CsvFileWriter.get_writer(
+            self.make_save_file_name(store_type=store_type),
+            max_bytes=config.CSV_ROLL_FILE_SIZE_MB * 1024 * 1024,
+        )
+        writer.write_row(save_item)
 
     async def store_content(self, content_item: Dict):
         """
@@ -143,16 +141,9 @@ class BiliDbStoreImplement(AbstractStore):
 
         """
 
-        from .bilibili_store_sql import (add_new_content,
-                                         query_content_by_content_id,
-                                         update_content_by_content_id)
-        video_id = content_item.get("video_id")
-        video_detail: Dict = await query_content_by_content_id(content_id=video_id)
-        if not video_detail:
-            content_item["add_ts"] = utils.get_current_timestamp()
-            await add_new_content(content_item)
-        else:
-            await update_content_by_content_id(video_id, content_item=content_item)
+        from .bilibili_store_sql import upsert_content
+        content_item["add_ts"] = utils.get_current_timestamp()
+        await upsert_content(content_item)
 
     async def store_comment(self, comment_item: Dict):
         """
@@ -164,16 +155,24 @@ class BiliDbStoreImplement(AbstractStore):
 
         """
 
-        from .bilibili_store_sql import (add_new_comment,
-                                         query_comment_by_comment_id,
-                                         update_comment_by_comment_id)
-        comment_id = comment_item.get("comment_id")
-        comment_detail: Dict = await query_comment_by_comment_id(comment_id=comment_id)
-        if not comment_detail:
-            comment_item["add_ts"] = utils.get_current_timestamp()
-            await add_new_comment(comment_item)
-        else:
-            await update_comment_by_comment_id(comment_id, comment_item=comment_item)
+        from .bilibili_store_sql import upsert_comment
+        comment_item["add_ts"] = utils.get_current_timestamp()
+        await upsert_comment(comment_item)
+
+    async def store_comments(self, comment_items: List[Dict]):
+        """
+        Batch store comments, one executemany round trip for the whole page
+        Args:
+            comment_items: comment item list
+
+        Returns:
+
+        """
+        from .bilibili_store_sql import batch_upsert_comments
+        add_ts = utils.get_current_timestamp()
+        for comment_item in comment_items:
+            comment_item["add_ts"] = add_ts
+        await batch_upsert_comments(comment_items)
 
     async def store_creator(self, creator: Dict):
         """
@@ -185,16 +184,9 @@ class BiliDbStoreImplement(AbstractStore):
 
         """
 
-        from .bilibili_store_sql import (add_new_creator,
-                                         query_creator_by_creator_id,
-                                         update_creator_by_creator_id)
-        creator_id = creator.get("user_id")
-        creator_detail: Dict = await query_creator_by_creator_id(creator_id=creator_id)
-        if not creator_detail:
-            creator["add_ts"] = utils.get_current_timestamp()
-            await add_new_creator(creator)
-        else:
-            await update_creator_by_creator_id(creator_id,creator_item=creator)
+        from .bilibili_store_sql import upsert_creator
+        creator["add_ts"] = utils.get_current_timestamp()
+        await upsert_creator(creator)
 
     async def store_contact(self, contact_item: Dict):
         """
@@ -206,19 +198,9 @@ class BiliDbStoreImplement(AbstractStore):
 
         """
 
-        from .bilibili_store_sql import (add_new_contact,
-                                         query_contact_by_up_and_fan,
-                                         update_contact_by_id, )
-
-        up_id = contact_item.get("up_id")
-        fan_id = contact_item.get("fan_id")
-        contact_detail: Dict = await query_contact_by_up_and_fan(up_id=up_id, fan_id=fan_id)
-        if not contact_detail:
-            contact_item["add_ts"] = utils.get_current_timestamp()
-            await add_new_contact(contact_item)
-        else:
-            key_id = contact_detail.get("id")
-            await update_contact_by_id(id=key_id, contact_item=contact_item)
+        from .bilibili_store_sql import upsert_contact
+        contact_item["add_ts"] = utils.get_current_timestamp()
+        await upsert_contact(contact_item)
 
     async def store_dynamic(self, dynamic_item):
         """
@@ -230,17 +212,9 @@ class BiliDbStoreImplement(AbstractStore):
 
         """
 
-        from .bilibili_store_sql import (add_new_dynamic,
-                                         query_dynamic_by_dynamic_id,
-                                         update_dynamic_by_dynamic_id)
-
-        dynamic_id = dynamic_item.get("dynamic_id")
-        dynamic_detail = await query_dynamic_by_dynamic_id(dynamic_id=dynamic_id)
-        if not dynamic_detail:
-            dynamic_item["add_ts"] = utils.get_current_timestamp()
-            await add_new_dynamic(dynamic_item)
-        else:
-            await update_dynamic_by_dynamic_id(dynamic_id, dynamic_item=dynamic_item)
+        from .bilibili_store_sql import upsert_dynamic
+        dynamic_item["add_ts"] = utils.get_current_timestamp()
+        await upsert_dynamic(dynamic_item)
 
 
 class BiliJsonStoreImplement(AbstractStore):
@@ -354,6 +328,92 @@ class BiliJsonStoreImplement(AbstractStore):
         await self.save_data_to_json(save_item=dynamic_item, store_type="dynamics")
 
 
+class BiliJsonlStoreImplement(AbstractStore):
+    jsonl_store_path: str = "data/bilibili/jsonl"
+
+    def make_save_file_name(self, store_type: str) -> str:
+        """
+        make save file name by store type
+        Args:
+            store_type: Save type contains content and comments（contents | comments）
+
+        Returns: eg: data/bilibili/jsonl/search_comments.jsonl ...
+
+        """
+        return f"{self.jsonl_store_path}/{crawler_type_var.get()}_{store_type}.jsonl"
+
+    async def save_data_to_jsonl(self, save_item: Dict, store_type: str):
+        """
+        以 JSON Lines 格式追加保存一条数据，同一个文件的句柄在进程内复用，不会重写整个文件
+        Args:
+            save_item: save content dict info
+            store_type: Save type contains content and comments（contents | comments）
+
+        Returns:
+
+        """
+        writer = JsonlFileWriter.get_writer(
+            self.make_save_file_name(store_type=store_type),
+            export_json_on_close=config.JSONL_EXPORT_JSON_ON_CLOSE,
+        )
+        writer.write_item(save_item)
+
+    async def store_content(self, content_item: Dict):
+        """
+        content JSONL storage implementation
+        Args:
+            content_item:
+
+        Returns:
+
+        """
+        await self.save_data_to_jsonl(content_item, "contents")
+
+    async def store_comment(self, comment_item: Dict):
+        """
+        comment JSONL storage implementation
+        Args:
+            comment_item:
+
+        Returns:
+
+        """
+        await self.save_data_to_jsonl(comment_item, "comments")
+
+    async def store_creator(self, creator: Dict):
+        """
+        Bilibili creator JSONL storage implementation
+        Args:
+            creator: creator dict
+
+        Returns:
+
+        """
+        await self.save_data_to_jsonl(creator, "creators")
+
+    async def store_contact(self, contact_item: Dict):
+        """
+        creator contact JSONL storage implementation
+        Args:
+            contact_item: creator's contact item dict
+
+        Returns:
+
+        """
+        await self.save_data_to_jsonl(save_item=contact_item, store_type="contacts")
+
+    async def store_dynamic(self, dynamic_item: Dict):
+        """
+        creator dynamic JSONL storage implementation
+        Args:
+            dynamic_item: creator's dynamic item dict
+
+        Returns:
+
+        """
+        await self.save_data_to_jsonl(save_item=dynamic_item, store_type="dynamics")
+
+
 class BiliSqliteStoreImplement(AbstractStore):
     async def store_content(self, content_item: Dict):
         """
@@ -365,16 +425,9 @@ class BiliSqliteStoreImplement(AbstractStore):
 
         """
 
-        from .bilibili_store_sql import (add_new_content,
-                                         query_content_by_content_id,
-                                         update_content_by_content_id)
-        video_id = content_item.get("video_id")
-        video_detail: Dict = await query_content_by_content_id(content_id=video_id)
-        if not video_detail:
-            content_item["add_ts"] = utils.get_current_timestamp()
-            await add_new_content(content_item)
-        else:
-            await update_content_by_content_id(video_id, content_item=content_item)
+        from .bilibili_store_sql import upsert_content
+        content_item["add_ts"] = utils.get_current_timestamp()
+        await upsert_content(content_item)
 
     async def store_comment(self, comment_item: Dict):
         """
@@ -386,16 +439,24 @@ class BiliSqliteStoreImplement(AbstractStore):
 
         """
 
-        from .bilibili_store_sql import (add_new_comment,
-                                         query_comment_by_comment_id,
-                                         update_comment_by_comment_id)
-        comment_id = comment_item.get("comment_id")
-        comment_detail: Dict = await query_comment_by_comment_id(comment_id=comment_id)
-        if not comment_detail:
-            comment_item["add_ts"] = utils.get_current_timestamp()
-            await add_new_comment(comment_item)
-        else:
-            await update_comment_by_comment_id(comment_id, comment_item=comment_item)
+        from .bilibili_store_sql import upsert_comment
+        comment_item["add_ts"] = utils.get_current_timestamp()
+        await upsert_comment(comment_item)
+
+    async def store_comments(self, comment_items: List[Dict]):
+        """
+        Batch store comments, one executemany round trip for the whole page
+        Args:
+            comment_items: comment item list
+
+        Returns:
+
+        """
+        from .bilibili_store_sql import batch_upsert_comments
+        add_ts = utils.get_current_timestamp()
+        for comment_item in comment_items:
+            comment_item["add_ts"] = add_ts
+        await batch_upsert_comments(comment_items)
 
     async def store_creator(self, creator: Dict):
         """
@@ -407,16 +468,9 @@ class BiliSqliteStoreImplement(AbstractStore):
 
         """
 
-        from .bilibili_store_sql import (add_new_creator,
-                                         query_creator_by_creator_id,
-                                         update_creator_by_creator_id)
-        creator_id = creator.get("user_id")
-        creator_detail: Dict = await query_creator_by_creator_id(creator_id=creator_id)
-        if not creator_detail:
-            creator["add_ts"] = utils.get_current_timestamp()
-            await add_new_creator(creator)
-        else:
-            await update_creator_by_creator_id(creator_id, creator_item=creator)
+        from .bilibili_store_sql import upsert_creator
+        creator["add_ts"] = utils.get_current_timestamp()
+        await upsert_creator(creator)
 
     async def store_contact(self, contact_item: Dict):
         """
@@ -428,19 +482,9 @@ class BiliSqliteStoreImplement(AbstractStore):
 
         """
 
-        from .bilibili_store_sql import (add_new_contact,
-                                         query_contact_by_up_and_fan,
-                                         update_contact_by_id, )
-
-        up_id = contact_item.get("up_id")
-        fan_id = contact_item.get("fan_id")
-        contact_detail: Dict = await query_contact_by_up_and_fan(up_id=up_id, fan_id=fan_id)
-        if not contact_detail:
-            contact_item["add_ts"] = utils.get_current_timestamp()
-            await add_new_contact(contact_item)
-        else:
-            key_id = contact_detail.get("id")
-            await update_contact_by_id(id=key_id, contact_item=contact_item)
+        from .bilibili_store_sql import upsert_contact
+        contact_item["add_ts"] = utils.get_current_timestamp()
+        await upsert_contact(contact_item)
 
     async def store_dynamic(self, dynamic_item):
         """
@@ -452,14 +496,6 @@ class BiliSqliteStoreImplement(AbstractStore):
 
         """
 
-        from .bilibili_store_sql import (add_new_dynamic,
-                                         query_dynamic_by_dynamic_id,
-                                         update_dynamic_by_dynamic_id)
-
-        dynamic_id = dynamic_item.get("dynamic_id")
-        dynamic_detail = await query_dynamic_by_dynamic_id(dynamic_id=dynamic_id)
-        if not dynamic_detail:
-            dynamic_item["add_ts"] = utils.get_current_timestamp()
-            await add_new_dynamic(dynamic_item)
-        else:
-            await update_dynamic_by_dynamic_id(dynamic_id, dynamic_item=dynamic_item)
+        from .bilibili_store_sql import upsert_dynamic
+        dynamic_item["add_ts"] = utils.get_current_timestamp()
+        await upsert_dynamic(dynamic_item)
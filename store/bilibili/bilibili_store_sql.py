@@ -20,27 +20,27 @@ from async_db import AsyncMysqlDB
 from async_sqlite_db import AsyncSqliteDB
 from var import media_crawler_db_var
 
-
-async def query_content_by_content_id(content_id: str) -> Dict:
-    """
-    查询一条内容记录（xhs的帖子 ｜ 抖音的视频 ｜ 微博 ｜ 快手视频 ...）
-    Args:
-        content_id:
-
-    Returns:
-
-    """
-    async_db_conn: Union[AsyncMysqlDB, AsyncSqliteDB] = media_crawler_db_var.get()
-    sql: str = f"select * from bilibili_video where video_id = '{content_id}'"
-    rows: List[Dict] = await async_db_conn.query(sql)
-    if len(rows) > 0:
-        return rows[0]
-    return dict()
-
-
-async def add_new_content(content_item: Dict) -> int:
-    """
-    新增一条内容记录（xhs的帖子 ｜ 抖音的视频 ｜ 微博 ｜ 快手视频 ...）
+# 内容哈希配置：hash_exclude_fields 是每次爬取都可能变化的平台字段（带签名的链接、头像地址等），不参与哈希，变化时照常更新；
+# count_fields 是互动数字段，不参与哈希，只有互动数或平台易变字段变化时只更新它们和不参与哈希的字段；
+# exclude_update_fields 只在首次插入时写入，来源关键词保留首次搜到这条内容的关键词，其他关键词记录在 crawler_note_keyword
+CONTENT_HASH_OPTIONS = {
+    "bilibili_video": dict(hash_field="content_hash", hash_exclude_fields=(),
+                           exclude_update_fields=("add_ts", "source_keyword"),
+                           count_fields=("liked_count", "disliked_count", "video_play_count", "video_favorite_count", "video_share_count", "video_coin_count", "video_danmaku", "video_comment")),
+    "bilibili_video_comment": dict(hash_field="content_hash", hash_exclude_fields=(),
+                                   count_fields=("like_count", "sub_comment_count")),
+    "bilibili_up_info": dict(hash_field="content_hash", hash_exclude_fields=(),
+                             count_fields=("total_fans", "total_liked")),
+    "bilibili_contact_info": dict(hash_field="content_hash", hash_exclude_fields=(),
+                                  count_fields=()),
+    "bilibili_up_dynamic": dict(hash_field="content_hash", hash_exclude_fields=(),
+                                count_fields=("total_comments", "total_forwards", "total_liked")),
+}
+
+
+async def upsert_content(content_item: Dict) -> int:
+    """
+    新增或更新一条视频记录，依赖 bilibili_video 表上 video_id 的唯一索引判重，一条sql完成
     Args:
         content_item:
 
@@ -48,139 +48,57 @@ async def add_new_content(content_item: Dict) -> int:
 
     """
     async_db_conn: Union[AsyncMysqlDB, AsyncSqliteDB] = media_crawler_db_var.get()
-    last_row_id: int = await async_db_conn.item_to_table("bilibili_video", content_item)
-    return last_row_id
-
-
-async def update_content_by_content_id(content_id: str, content_item: Dict) -> int:
-    """
-    更新一条记录（xhs的帖子 ｜ 抖音的视频 ｜ 微博 ｜ 快手视频 ...）
-    Args:
-        content_id:
-        content_item:
-
-    Returns:
-
-    """
-    async_db_conn: Union[AsyncMysqlDB, AsyncSqliteDB] = media_crawler_db_var.get()
-    effect_row: int = await async_db_conn.update_table("bilibili_video", content_item, "video_id", content_id)
+    effect_row: int = await async_db_conn.upsert_item("bilibili_video", content_item, conflict_fields=["video_id"], **CONTENT_HASH_OPTIONS["bilibili_video"])
     return effect_row
 
 
-
-async def query_comment_by_comment_id(comment_id: str) -> Dict:
+async def upsert_comment(comment_item: Dict) -> int:
     """
-    查询一条评论内容
+    新增或更新一条评论记录，依赖 bilibili_video_comment 表上 comment_id 的唯一索引判重，一条sql完成
     Args:
-        comment_id:
-
-    Returns:
-
-    """
-    async_db_conn: Union[AsyncMysqlDB, AsyncSqliteDB] = media_crawler_db_var.get()
-    sql: str = f"select * from bilibili_video_comment where comment_id = '{comment_id}'"
-    rows: List[Dict] = await async_db_conn.query(sql)
-    if len(rows) > 0:
-        return rows[0]
-    return dict()
-
-
-async def add_new_comment(comment_item: Dict) -> int:
-    """
-    新增一条评论记录
-    Args:
-        comment_item:
-
-    Returns:
-
-    """
-    async_db_conn: Union[AsyncMysqlDB, AsyncSqliteDB] = media_crawler_db_var.get()
-    last_row_id: int = await async_db_conn.item_to_table("bilibili_video_comment", comment_item)
-    return last_row_id
-
-
-async def update_comment_by_comment_id(comment_id: str, comment_item: Dict) -> int:
-    """
-    更新增一条评论记录
-    Args:
-        comment_id:
         comment_item:
 
     Returns:
 
     """
     async_db_conn: Union[AsyncMysqlDB, AsyncSqliteDB] = media_crawler_db_var.get()
-    effect_row: int = await async_db_conn.update_table("bilibili_video_comment", comment_item, "comment_id", comment_id)
+    effect_row: int = await async_db_conn.upsert_item("bilibili_video_comment", comment_item, conflict_fields=["comment_id"], **CONTENT_HASH_OPTIONS["bilibili_video_comment"])
     return effect_row
 
 
-async def query_creator_by_creator_id(creator_id: str) -> Dict:
-    """
-    查询up主信息
-    Args:
-        creator_id:
-
-    Returns:
-
-    """
-    async_db_conn: Union[AsyncMysqlDB, AsyncSqliteDB] = media_crawler_db_var.get()
-    sql: str = f"select * from bilibili_up_info where user_id = '{creator_id}'"
-    rows: List[Dict] = await async_db_conn.query(sql)
-    if len(rows) > 0:
-        return rows[0]
-    return dict()
-
-
-async def add_new_creator(creator_item: Dict) -> int:
+async def batch_upsert_comments(comment_items: List[Dict]) -> int:
     """
-    新增up主信息
+    批量新增或更新评论记录，一页评论通过一次 executemany 写入
     Args:
-        creator_item:
+        comment_items:
 
     Returns:
 
     """
+    if not comment_items:
+        return 0
     async_db_conn: Union[AsyncMysqlDB, AsyncSqliteDB] = media_crawler_db_var.get()
-    last_row_id: int = await async_db_conn.item_to_table("bilibili_up_info", creator_item)
-    return last_row_id
+    effect_row: int = await async_db_conn.upsert_items("bilibili_video_comment", comment_items, conflict_fields=["comment_id"], **CONTENT_HASH_OPTIONS["bilibili_video_comment"])
+    return effect_row
 
 
-async def update_creator_by_creator_id(creator_id: str, creator_item: Dict) -> int:
+async def upsert_creator(creator_item: Dict) -> int:
     """
-    更新up主信息
+    新增或更新一条创作者信息，依赖 bilibili_up_info 表上 user_id 的唯一索引判重，一条sql完成
     Args:
-        creator_id:
         creator_item:
 
     Returns:
 
     """
     async_db_conn: Union[AsyncMysqlDB, AsyncSqliteDB] = media_crawler_db_var.get()
-    effect_row: int = await async_db_conn.update_table("bilibili_up_info", creator_item, "user_id", creator_id)
+    effect_row: int = await async_db_conn.upsert_item("bilibili_up_info", creator_item, conflict_fields=["user_id"], **CONTENT_HASH_OPTIONS["bilibili_up_info"])
     return effect_row
 
 
-async def query_contact_by_up_and_fan(up_id: str, fan_id: str) -> Dict:
+async def upsert_contact(contact_item: Dict) -> int:
     """
-    查询一条关联关系
-    Args:
-        up_id:
-        fan_id:
-
-    Returns:
-
-    """
-    async_db_conn: Union[AsyncMysqlDB, AsyncSqliteDB] = media_crawler_db_var.get()
-    sql: str = f"select * from bilibili_contact_info where up_id = '{up_id}' and fan_id = '{fan_id}'"
-    rows: List[Dict] = await async_db_conn.query(sql)
-    if len(rows) > 0:
-        return rows[0]
-    return dict()
-
-
-async def add_new_contact(contact_item: Dict) -> int:
-    """
-    新增关联关系
+    新增或更新一条粉丝关系，依赖 bilibili_contact_info 表上 up_id, fan_id 的唯一索引判重，一条sql完成
     Args:
         contact_item:
 
@@ -188,66 +106,19 @@ async def add_new_contact(contact_item: Dict) -> int:
 
     """
     async_db_conn: Union[AsyncMysqlDB, AsyncSqliteDB] = media_crawler_db_var.get()
-    last_row_id: int = await async_db_conn.item_to_table("bilibili_contact_info", contact_item)
-    return last_row_id
-
-
-async def update_contact_by_id(id: str, contact_item: Dict) -> int:
-    """
-    更新关联关系
-    Args:
-        id:
-        contact_item:
-
-    Returns:
-
-    """
-    async_db_conn: Union[AsyncMysqlDB, AsyncSqliteDB] = media_crawler_db_var.get()
-    effect_row: int = await async_db_conn.update_table("bilibili_contact_info", contact_item, "id", id)
+    effect_row: int = await async_db_conn.upsert_item("bilibili_contact_info", contact_item, conflict_fields=["up_id", "fan_id"], **CONTENT_HASH_OPTIONS["bilibili_contact_info"])
     return effect_row
 
 
-async def query_dynamic_by_dynamic_id(dynamic_id: str) -> Dict:
-    """
-    查询一条动态信息
-    Args:
-        dynamic_id:
-
-    Returns:
-
-    """
-    async_db_conn: Union[AsyncMysqlDB, AsyncSqliteDB] = media_crawler_db_var.get()
-    sql: str = f"select * from bilibili_up_dynamic where dynamic_id = '{dynamic_id}'"
-    rows: List[Dict] = await async_db_conn.query(sql)
-    if len(rows) > 0:
-        return rows[0]
-    return dict()
-
-
-async def add_new_dynamic(dynamic_item: Dict) -> int:
-    """
-    新增动态信息
-    Args:
-        dynamic_item:
-
-    Returns:
-
-    """
-    async_db_conn: Union[AsyncMysqlDB, AsyncSqliteDB] = media_crawler_db_var.get()
-    last_row_id: int = await async_db_conn.item_to_table("bilibili_up_dynamic", dynamic_item)
-    return last_row_id
-
-
-async def update_dynamic_by_dynamic_id(dynamic_id: str, dynamic_item: Dict) -> int:
+async def upsert_dynamic(dynamic_item: Dict) -> int:
     """
-    更新动态信息
+    新增或更新一条动态信息，依赖 bilibili_up_dynamic 表上 dynamic_id 的唯一索引判重，一条sql完成
     Args:
-        dynamic_id:
         dynamic_item:
 
     Returns:
 
     """
     async_db_conn: Union[AsyncMysqlDB, AsyncSqliteDB] = media_crawler_db_var.get()
-    effect_row: int = await async_db_conn.update_table("bilibili_up_dynamic", dynamic_item, "dynamic_id", dynamic_id)
+    effect_row: int = await async_db_conn.upsert_item("bilibili_up_dynamic", dynamic_item, conflict_fields=["dynamic_id"], **CONTENT_HASH_OPTIONS["bilibili_up_dynamic"])
     return effect_row
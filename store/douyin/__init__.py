@@ -13,9 +13,11 @@
 # @Author  : relakkes@gmail.com
 # @Time    : 2024/1/14 18:46
 # @Desc    :
-from typing import List
+from typing import List, Optional
 
 import config
+from store.write_behind import wrap_store
+from tools.count_snapshot import get_count_snapshot_store
 from var import source_keyword_var
 
 from .douyin_store_impl import *
@@ -26,6 +28,7 @@ class DouyinStoreFactory:
         "csv": DouyinCsvStoreImplement,
         "db": DouyinDbStoreImplement,
         "json": DouyinJsonStoreImplement,
+        "jsonl": DouyinJsonlStoreImplement,
         "sqlite": DouyinSqliteStoreImplement
     }
 
@@ -34,9 +37,9 @@ class DouyinStoreFactory:
         store_class = DouyinStoreFactory.STORES.get(config.SAVE_DATA_OPTION)
         if not store_class:
             raise ValueError(
-                "[DouyinStoreFactory.create_store] Invalid save option only supported csv or db or json or sqlite ..."
+                "[DouyinStoreFactory.create_store] Invalid save option only supported csv or db or json or jsonl or sqlite ..."
             )
-        return store_class()
+        return wrap_store(store_class())
 
 
 def _extract_comment_image_list(comment_item: Dict) -> List[str]:
@@ -133,6 +136,7 @@ async def update_douyin_aweme(aweme_item: Dict):
         "video_download_url": _extract_video_download_url(aweme_item),
         "source_keyword": source_keyword_var.get(),
     }
+    await get_count_snapshot_store("dy").record(aweme_id, save_content_item)
     utils.logger.info(
         f"[store.douyin.update_douyin_aweme] douyin aweme id:{aweme_id}, title:{save_content_item.get('title')}"
     )
@@ -144,17 +148,17 @@ async def update_douyin_aweme(aweme_item: Dict):
 async def batch_update_dy_aweme_comments(aweme_id: str, comments: List[Dict]):
     if not comments:
         return
-    for comment_item in comments:
-        await update_dy_aweme_comment(aweme_id, comment_item)
+    save_comment_items = [_build_dy_aweme_comment_item(aweme_id, comment_item) for comment_item in comments]
+    await DouyinStoreFactory.create_store().store_comments([item for item in save_comment_items if item])
 
 
-async def update_dy_aweme_comment(aweme_id: str, comment_item: Dict):
+def _build_dy_aweme_comment_item(aweme_id: str, comment_item: Dict) -> Optional[Dict]:
     comment_aweme_id = comment_item.get("aweme_id")
     if aweme_id != comment_aweme_id:
         utils.logger.error(
             f"[store.douyin.update_dy_aweme_comment] comment_aweme_id: {comment_aweme_id} != aweme_id: {aweme_id}"
         )
-        return
+        return None
     user_info = comment_item.get("user", {})
     comment_id = comment_item.get("cid")
     parent_comment_id = comment_item.get("reply_id", "0")
@@ -189,10 +193,14 @@ async def update_dy_aweme_comment(aweme_id: str, comment_item: Dict):
     utils.logger.info(
         f"[store.douyin.update_dy_aweme_comment] douyin aweme comment: {comment_id}, content: {save_comment_item.get('content')}"
     )
+    return save_comment_item
 
-    await DouyinStoreFactory.create_store().store_comment(
-        comment_item=save_comment_item
-    )
+
+async def update_dy_aweme_comment(aweme_id: str, comment_item: Dict):
+    save_comment_item = _build_dy_aweme_comment_item(aweme_id, comment_item)
+    if not save_comment_item:
+        return
+    await DouyinStoreFactory.create_store().store_comment(save_comment_item)
 
 
 async def save_creator(user_id: str, creator: Dict):
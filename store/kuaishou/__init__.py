@@ -13,9 +13,11 @@
 # @Author  : relakkes@gmail.com
 # @Time    : 2024/1/14 20:03
 # @Desc    :
-from typing import List
+from typing import List, Optional
 
 import config
+from store.write_behind import wrap_store
+from tools.count_snapshot import get_count_snapshot_store
 from var import source_keyword_var
 
 from .kuaishou_store_impl import *
@@ -26,6 +28,7 @@ class KuaishouStoreFactory:
         "csv": KuaishouCsvStoreImplement,
         "db": KuaishouDbStoreImplement,
         "json": KuaishouJsonStoreImplement,
+        "jsonl": KuaishouJsonlStoreImplement,
         "sqlite": KuaishouSqliteStoreImplement
     }
 
@@ -34,8 +37,8 @@ class KuaishouStoreFactory:
         store_class = KuaishouStoreFactory.STORES.get(config.SAVE_DATA_OPTION)
         if not store_class:
             raise ValueError(
-                "[KuaishouStoreFactory.create_store] Invalid save option only supported csv or db or json or sqlite ...")
-        return store_class()
+                "[KuaishouStoreFactory.create_store] Invalid save option only supported csv or db or json or jsonl or sqlite ...")
+        return wrap_store(store_class())
 
 
 async def update_kuaishou_video(video_item: Dict):
@@ -61,6 +64,10 @@ async def update_kuaishou_video(video_item: Dict):
         "video_play_url": photo_info.get("photoUrl", ""),
         "source_keyword": source_keyword_var.get(),
     }
+    await get_count_snapshot_store("ks").record(video_id, {
+        "liked_count": photo_info.get("realLikeCount"),
+        "play_count": photo_info.get("viewCount"),
+    })
     utils.logger.info(
         f"[store.kuaishou.update_kuaishou_video] Kuaishou video id:{video_id}, title:{save_content_item.get('title')}")
     await KuaishouStoreFactory.create_store().store_content(content_item=save_content_item)
@@ -70,11 +77,11 @@ async def batch_update_ks_video_comments(video_id: str, comments: List[Dict]):
     utils.logger.info(f"[store.kuaishou.batch_update_ks_video_comments] video_id:{video_id}, comments:{comments}")
     if not comments:
         return
-    for comment_item in comments:
-        await update_ks_video_comment(video_id, comment_item)
+    save_comment_items = [_build_ks_video_comment_item(video_id, comment_item) for comment_item in comments]
+    await KuaishouStoreFactory.create_store().store_comments([item for item in save_comment_items if item])
 
 
-async def update_ks_video_comment(video_id: str, comment_item: Dict):
+def _build_ks_video_comment_item(video_id: str, comment_item: Dict) -> Optional[Dict]:
     comment_id = comment_item.get("commentId")
     save_comment_item = {
         "comment_id": comment_id,
@@ -89,7 +96,15 @@ async def update_ks_video_comment(video_id: str, comment_item: Dict):
     }
     utils.logger.info(
         f"[store.kuaishou.update_ks_video_comment] Kuaishou video comment: {comment_id}, content: {save_comment_item.get('content')}")
-    await KuaishouStoreFactory.create_store().store_comment(comment_item=save_comment_item)
+    return save_comment_item
+
+
+async def update_ks_video_comment(video_id: str, comment_item: Dict):
+    save_comment_item = _build_ks_video_comment_item(video_id, comment_item)
+    if not save_comment_item:
+        return
+    await KuaishouStoreFactory.create_store().store_comment(save_comment_item)
+
 
 async def save_creator(user_id: str, creator: Dict):
     ownerCount = creator.get('ownerCount', {})
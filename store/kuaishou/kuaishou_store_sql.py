@@ -20,74 +20,35 @@ from async_db import AsyncMysqlDB
 from async_sqlite_db import AsyncSqliteDB
 from var import media_crawler_db_var
 
-
-async def query_content_by_content_id(content_id: str) -> Dict:
-    """
-    查询一条内容记录（xhs的帖子 ｜ 抖音的视频 ｜ 微博 ｜ 快手视频 ...）
-    Args:
-        content_id:
-
-    Returns:
-
-    """
-    async_db_conn: Union[AsyncMysqlDB, AsyncSqliteDB] = media_crawler_db_var.get()
-    sql: str = f"select * from kuaishou_video where video_id = '{content_id}'"
-    rows: List[Dict] = await async_db_conn.query(sql)
-    if len(rows) > 0:
-        return rows[0]
-    return dict()
-
-
-async def add_new_content(content_item: Dict) -> int:
-    """
-    新增一条内容记录（xhs的帖子 ｜ 抖音的视频 ｜ 微博 ｜ 快手视频 ...）
-    Args:
-        content_item:
-
-    Returns:
-
+# 内容哈希配置：hash_exclude_fields 是每次爬取都可能变化的平台字段（带签名的链接、头像地址等），不参与哈希，变化时照常更新；
+# count_fields 是互动数字段，不参与哈希，只有互动数或平台易变字段变化时只更新它们和不参与哈希的字段；
+# exclude_update_fields 只在首次插入时写入，来源关键词保留首次搜到这条内容的关键词，其他关键词记录在 crawler_note_keyword
+CONTENT_HASH_OPTIONS = {
+    "kuaishou_video": dict(hash_field="content_hash", hash_exclude_fields=("video_cover_url", "video_play_url"),
+                           exclude_update_fields=("add_ts", "source_keyword"),
+                           count_fields=("liked_count", "viewd_count")),
+    "kuaishou_video_comment": dict(hash_field="content_hash", hash_exclude_fields=(),
+                                   count_fields=("sub_comment_count",)),
+}
+
+
+async def upsert_content(content_item: Dict) -> int:
     """
-    async_db_conn: Union[AsyncMysqlDB, AsyncSqliteDB] = media_crawler_db_var.get()
-    last_row_id: int = await async_db_conn.item_to_table("kuaishou_video", content_item)
-    return last_row_id
-
-
-async def update_content_by_content_id(content_id: str, content_item: Dict) -> int:
-    """
-    更新一条记录（xhs的帖子 ｜ 抖音的视频 ｜ 微博 ｜ 快手视频 ...）
+    新增或更新一条内容记录（xhs的帖子 ｜ 抖音的视频 ｜ 微博 ｜ 快手视频 ...），依赖 kuaishou_video 表上 video_id 的唯一索引判重，一条sql完成
     Args:
-        content_id:
         content_item:
 
     Returns:
 
     """
     async_db_conn: Union[AsyncMysqlDB, AsyncSqliteDB] = media_crawler_db_var.get()
-    effect_row: int = await async_db_conn.update_table("kuaishou_video", content_item, "video_id", content_id)
+    effect_row: int = await async_db_conn.upsert_item("kuaishou_video", content_item, conflict_fields=["video_id"], **CONTENT_HASH_OPTIONS["kuaishou_video"])
     return effect_row
 
 
-
-async def query_comment_by_comment_id(comment_id: str) -> Dict:
-    """
-    查询一条评论内容
-    Args:
-        comment_id:
-
-    Returns:
-
-    """
-    async_db_conn: Union[AsyncMysqlDB, AsyncSqliteDB] = media_crawler_db_var.get()
-    sql: str = f"select * from kuaishou_video_comment where comment_id = '{comment_id}'"
-    rows: List[Dict] = await async_db_conn.query(sql)
-    if len(rows) > 0:
-        return rows[0]
-    return dict()
-
-
-async def add_new_comment(comment_item: Dict) -> int:
+async def upsert_comment(comment_item: Dict) -> int:
     """
-    新增一条评论记录
+    新增或更新一条评论记录，依赖 kuaishou_video_comment 表上 comment_id 的唯一索引判重，一条sql完成
     Args:
         comment_item:
 
@@ -95,20 +56,21 @@ async def add_new_comment(comment_item: Dict) -> int:
 
     """
     async_db_conn: Union[AsyncMysqlDB, AsyncSqliteDB] = media_crawler_db_var.get()
-    last_row_id: int = await async_db_conn.item_to_table("kuaishou_video_comment", comment_item)
-    return last_row_id
+    effect_row: int = await async_db_conn.upsert_item("kuaishou_video_comment", comment_item, conflict_fields=["comment_id"], **CONTENT_HASH_OPTIONS["kuaishou_video_comment"])
+    return effect_row
 
 
-async def update_comment_by_comment_id(comment_id: str, comment_item: Dict) -> int:
+async def batch_upsert_comments(comment_items: List[Dict]) -> int:
     """
-    更新增一条评论记录
+    批量新增或更新评论记录，一页评论通过一次 executemany 写入
     Args:
-        comment_id:
-        comment_item:
+        comment_items:
 
     Returns:
 
     """
+    if not comment_items:
+        return 0
     async_db_conn: Union[AsyncMysqlDB, AsyncSqliteDB] = media_crawler_db_var.get()
-    effect_row: int = await async_db_conn.update_table("kuaishou_video_comment", comment_item, "comment_id", comment_id)
+    effect_row: int = await async_db_conn.upsert_items("kuaishou_video_comment", comment_items, conflict_fields=["comment_id"], **CONTENT_HASH_OPTIONS["kuaishou_video_comment"])
     return effect_row
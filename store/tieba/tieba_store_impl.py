@@ -11,17 +11,17 @@
 
 # -*- coding: utf-8 -*-
 import asyncio
-import csv
 import json
 import os
 import pathlib
-from typing import Dict
+from typing import Dict, List
 
 import aiofiles
 
 import config
 from base.base_crawler import AbstractStore
 from tools import utils, words
+from tools.buffered_file_writer import CsvFileWriter, JsonlFileWriter
 from var import crawler_type_var
 
 
@@ -50,14 +50,14 @@ class TieBaCsvStoreImplement(AbstractStore):
         Args:
             store_type: contents or comments
 
-        Returns: eg: data/tieba/search_comments_20240114.csv ...
+        Returns: eg: data/tieba/1_search_comments, 写入时会自动加上日期后缀，例如 search_comments_20240114.csv
 
         """
-        return f"{self.csv_store_path}/{self.file_count}_{crawler_type_var.get()}_{store_type}_{utils.get_current_date()}.csv"
+        return f"{self.csv_store_path}/{self.file_count}_{crawler_type_var.get()}_{store_type}"
 
     async def save_data_to_csv(self, save_item: Dict, store_type: str):
         """
-        Below is a simple way to save it in CSV format.
+        以 CSV 格式追加保存一条数据，同一类数据的文件句柄在进程内复用，按日期和大小自动切换文件
         Args:
             save_item:  save content dict info
             store_type: Save type contains content and comments（contents | comments）
@@ -65,14 +65,11 @@ class TieBaCsvStoreImplement(AbstractStore):
         Returns: no returns
 
         """
-        pathlib.Path(self.csv_store_path).mkdir(parents=True, exist_ok=True)
-        save_file_name = self.make_save_file_name(store_type=store_type)
-        async with aiofiles.open(save_file_name, mode='a+', encoding="utf-8-sig", newline="") as f:
-            f.fileno()
-            writer = csv.writer(f)
-            if await f.tell() == 0:
-                await writer.writerow(save_item.keys())
-            await writer.writerow(save_item.values())
+        writer = CsvFileWriter.get_writer(
+            self.make_save_file_name(store_type=store_type),
+            max_bytes=config.CSV_ROLL_FILE_SIZE_MB * 1024 * 1024,
+        )
+        writer.write_row(save_item)
 
     async def store_content(self, content_item: Dict):
         """
@@ -118,16 +115,9 @@ class TieBaDbStoreImplement(AbstractStore):
         Returns:
 
         """
-        from .tieba_store_sql import (add_new_content,
-                                      query_content_by_content_id,
-                                      update_content_by_content_id)
-        note_id = content_item.get("note_id")
-        note_detail: Dict = await query_content_by_content_id(content_id=note_id)
-        if not note_detail:
-            content_item["add_ts"] = utils.get_current_timestamp()
-            await add_new_content(content_item)
-        else:
-            await update_content_by_content_id(note_id, content_item=content_item)
+        from .tieba_store_sql import upsert_content
+        content_item["add_ts"] = utils.get_current_timestamp()
+        await upsert_content(content_item)
 
     async def store_comment(self, comment_item: Dict):
         """
@@ -138,16 +128,24 @@ class TieBaDbStoreImplement(AbstractStore):
         Returns:
 
         """
-        from .tieba_store_sql import (add_new_comment,
-                                      query_comment_by_comment_id,
-                                      update_comment_by_comment_id)
-        comment_id = comment_item.get("comment_id")
-        comment_detail: Dict = await query_comment_by_comment_id(comment_id=comment_id)
-        if not comment_detail:
-            comment_item["add_ts"] = utils.get_current_timestamp()
-            await add_new_comment(comment_item)
-        else:
-            await update_comment_by_comment_id(comment_id, comment_item=comment_item)
+        from .tieba_store_sql import upsert_comment
+        comment_item["add_ts"] = utils.get_current_timestamp()
+        await upsert_comment(comment_item)
+
+    async def store_comments(self, comment_items: List[Dict]):
+        """
+        Batch store comments, one executemany round trip for the whole page
+        Args:
+            comment_items: comment item list
+
+        Returns:
+
+        """
+        from .tieba_store_sql import batch_upsert_comments
+        add_ts = utils.get_current_timestamp()
+        for comment_item in comment_items:
+            comment_item["add_ts"] = add_ts
+        await batch_upsert_comments(comment_items)
 
     async def store_creator(self, creator: Dict):
         """
@@ -158,16 +156,9 @@ class TieBaDbStoreImplement(AbstractStore):
         Returns:
 
         """
-        from .tieba_store_sql import (add_new_creator,
-                                      query_creator_by_user_id,
-                                      update_creator_by_user_id)
-        user_id = creator.get("user_id")
-        user_detail: Dict = await query_creator_by_user_id(user_id)
-        if not user_detail:
-            creator["add_ts"] = utils.get_current_timestamp()
-            await add_new_creator(creator)
-        else:
-            await update_creator_by_user_id(user_id, creator)
+        from .tieba_store_sql import upsert_creator
+        creator["add_ts"] = utils.get_current_timestamp()
+        await upsert_creator(creator)
 
 
 class TieBaJsonStoreImplement(AbstractStore):
@@ -256,6 +247,70 @@ class TieBaJsonStoreImplement(AbstractStore):
         await self.save_data_to_json(creator, "creator")
 
 
+class TieBaJsonlStoreImplement(AbstractStore):
+    jsonl_store_path: str = "data/tieba/jsonl"
+
+    def make_save_file_name(self, store_type: str) -> str:
+        """
+        make save file name by store type
+        Args:
+            store_type: Save type contains content and comments（contents | comments）
+
+        Returns: eg: data/tieba/jsonl/search_comments.jsonl ...
+
+        """
+        return f"{self.jsonl_store_path}/{crawler_type_var.get()}_{store_type}.jsonl"
+
+    async def save_data_to_jsonl(self, save_item: Dict, store_type: str):
+        """
+        以 JSON Lines 格式追加保存一条数据，同一个文件的句柄在进程内复用，不会重写整个文件
+        Args:
+            save_item: save content dict info
+            store_type: Save type contains content and comments（contents | comments）
+
+        Returns:
+
+        """
+        writer = JsonlFileWriter.get_writer(
+            self.make_save_file_name(store_type=store_type),
+            export_json_on_close=config.JSONL_EXPORT_JSON_ON_CLOSE,
+        )
+        writer.write_item(save_item)
+
+    async def store_content(self, content_item: Dict):
+        """
+        content JSONL storage implementation
+        Args:
+            content_item:
+
+        Returns:
+
+        """
+        await self.save_data_to_jsonl(content_item, "contents")
+
+    async def store_comment(self, comment_item: Dict):
+        """
+        comment JSONL storage implementation
+        Args:
+            comment_item:
+
+        Returns:
+
+        """
+        await self.save_data_to_jsonl(comment_item, "comments")
+
+    async def store_creator(self, creator: Dict):
+        """
+        TieBa creator JSONL storage implementation
+        Args:
+            creator: creator dict
+
+        Returns:
+
+        """
+        await self.save_data_to_jsonl(creator, "creator")
+
+
 class TieBaSqliteStoreImplement(AbstractStore):
     async def store_content(self, content_item: Dict):
         """
@@ -266,16 +321,9 @@ class TieBaSqliteStoreImplement(AbstractStore):
         Returns:
 
         """
-        from .tieba_store_sql import (add_new_content,
-                                      query_content_by_content_id,
-                                      update_content_by_content_id)
-        note_id = content_item.get("note_id")
-        note_detail: Dict = await query_content_by_content_id(content_id=note_id)
-        if not note_detail:
-            content_item["add_ts"] = utils.get_current_timestamp()
-            await add_new_content(content_item)
-        else:
-            await update_content_by_content_id(note_id, content_item=content_item)
+        from .tieba_store_sql import upsert_content
+        content_item["add_ts"] = utils.get_current_timestamp()
+        await upsert_content(content_item)
 
     async def store_comment(self, comment_item: Dict):
         """
@@ -286,16 +334,24 @@ class TieBaSqliteStoreImplement(AbstractStore):
         Returns:
 
         """
-        from .tieba_store_sql import (add_new_comment,
-                                      query_comment_by_comment_id,
-                                      update_comment_by_comment_id)
-        comment_id = comment_item.get("comment_id")
-        comment_detail: Dict = await query_comment_by_comment_id(comment_id=comment_id)
-        if not comment_detail:
-            comment_item["add_ts"] = utils.get_current_timestamp()
-            await add_new_comment(comment_item)
-        else:
-            await update_comment_by_comment_id(comment_id, comment_item=comment_item)
+        from .tieba_store_sql import upsert_comment
+        comment_item["add_ts"] = utils.get_current_timestamp()
+        await upsert_comment(comment_item)
+
+    async def store_comments(self, comment_items: List[Dict]):
+        """
+        Batch store comments, one executemany round trip for the whole page
+        Args:
+            comment_items: comment item list
+
+        Returns:
+
+        """
+        from .tieba_store_sql import batch_upsert_comments
+        add_ts = utils.get_current_timestamp()
+        for comment_item in comment_items:
+            comment_item["add_ts"] = add_ts
+        await batch_upsert_comments(comment_items)
 
     async def store_creator(self, creator: Dict):
         """
@@ -306,13 +362,6 @@ class TieBaSqliteStoreImplement(AbstractStore):
         Returns:
 
         """
-        from .tieba_store_sql import (add_new_creator,
-                                      query_creator_by_user_id,
-                                      update_creator_by_user_id)
-        user_id = creator.get("user_id")
-        user_detail: Dict = await query_creator_by_user_id(user_id)
-        if not user_detail:
-            creator["add_ts"] = utils.get_current_timestamp()
-            await add_new_creator(creator)
-        else:
-            await update_creator_by_user_id(user_id, creator)
+        from .tieba_store_sql import upsert_creator
+        creator["add_ts"] = utils.get_current_timestamp()
+        await upsert_creator(creator)
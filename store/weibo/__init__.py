@@ -15,8 +15,10 @@
 # @Desc    :
 
 import re
-from typing import List
+from typing import List, Optional
 
+from store.write_behind import wrap_store
+from tools.count_snapshot import get_count_snapshot_store
 from var import source_keyword_var
 
 from .weibo_store_image import *
@@ -28,6 +30,7 @@ class WeibostoreFactory:
         "csv": WeiboCsvStoreImplement,
         "db": WeiboDbStoreImplement,
         "json": WeiboJsonStoreImplement,
+        "jsonl": WeiboJsonlStoreImplement,
         "sqlite": WeiboSqliteStoreImplement,
     }
 
@@ -36,8 +39,8 @@ class WeibostoreFactory:
         store_class = WeibostoreFactory.STORES.get(config.SAVE_DATA_OPTION)
         if not store_class:
             raise ValueError(
-                "[WeibotoreFactory.create_store] Invalid save option only supported csv or db or json or sqlite ...")
-        return store_class()
+                "[WeibotoreFactory.create_store] Invalid save option only supported csv or db or json or jsonl or sqlite ...")
+        return wrap_store(store_class())
 
 
 async def batch_update_weibo_notes(note_list: List[Dict]):
@@ -94,6 +97,11 @@ async def update_weibo_note(note_item: Dict):
 
         "source_keyword": source_keyword_var.get(),
     }
+    await get_count_snapshot_store("wb").record(note_id, {
+        "liked_count": mblog.get("attitudes_count"),
+        "comment_count": mblog.get("comments_count"),
+        "share_count": mblog.get("reposts_count"),
+    })
     utils.logger.info(
         f"[store.weibo.update_weibo_note] weibo note id:{note_id}, title:{save_content_item.get('content')[:24]} ...")
     await WeibostoreFactory.create_store().store_content(content_item=save_content_item)
@@ -111,13 +119,13 @@ async def batch_update_weibo_note_comments(note_id: str, comments: List[Dict]):
     """
     if not comments:
         return
-    for comment_item in comments:
-        await update_weibo_note_comment(note_id, comment_item)
+    save_comment_items = [_build_weibo_note_comment_item(note_id, comment_item) for comment_item in comments]
+    await WeibostoreFactory.create_store().store_comments([item for item in save_comment_items if item])
 
 
-async def update_weibo_note_comment(note_id: str, comment_item: Dict):
+def _build_weibo_note_comment_item(note_id: str, comment_item: Dict) -> Optional[Dict]:
     """
-    Update weibo note comment
+    Convert weibo note comment to the store item
     Args:
         note_id: weibo note id
         comment_item: weibo comment item
@@ -126,7 +134,7 @@ async def update_weibo_note_comment(note_id: str, comment_item: Dict):
 
     """
     if not comment_item or not note_id:
-        return
+        return None
     comment_id = str(comment_item.get("id"))
     user_info: Dict = comment_item.get("user")
     content_text = comment_item.get("text")
@@ -152,22 +160,36 @@ async def update_weibo_note_comment(note_id: str, comment_item: Dict):
     }
     utils.logger.info(
         f"[store.weibo.update_weibo_note_comment] Weibo note comment: {comment_id}, content: {save_comment_item.get('content', '')[:24]} ...")
-    await WeibostoreFactory.create_store().store_comment(comment_item=save_comment_item)
+    return save_comment_item
+
+
+async def update_weibo_note_comment(note_id: str, comment_item: Dict):
+    """
+    Update weibo note comment
+    Args:
+        note_id: weibo note id
+        comment_item: weibo comment item
+
+    Returns:
+
+    """
+    save_comment_item = _build_weibo_note_comment_item(note_id, comment_item)
+    if not save_comment_item:
+        return
+    await WeibostoreFactory.create_store().store_comment(save_comment_item)
 
 
-async def update_weibo_note_image(picid: str, pic_content, extension_file_name):
+def get_weibo_note_image_file_name(picid: str, extension_file_name: str) -> str:
     """
-    Save weibo note image to local
+    Get the local file name of weibo note image, streaming download writes to it directly
     Args:
         picid:
-        pic_content:
         extension_file_name:
 
     Returns:
 
     """
-    await WeiboStoreImage().store_image(
-        {"pic_id": picid, "pic_content": pic_content, "extension_file_name": extension_file_name})
+    return WeiboStoreImage().make_save_file_name(picid, extension_file_name)
 
 
 async def save_creator(user_id: str, user_info: Dict):
@@ -20,27 +20,23 @@ from async_db import AsyncMysqlDB
 from async_sqlite_db import AsyncSqliteDB
 from var import media_crawler_db_var
 
-
-async def query_content_by_content_id(content_id: str) -> Dict:
-    """
-    查询一条内容记录（xhs的帖子 ｜ 抖音的视频 ｜ 微博 ｜ 快手视频 ...）
-    Args:
-        content_id:
-
-    Returns:
-
-    """
-    async_db_conn: Union[AsyncMysqlDB, AsyncSqliteDB] = media_crawler_db_var.get()
-    sql: str = f"select * from weibo_note where note_id = '{content_id}'"
-    rows: List[Dict] = await async_db_conn.query(sql)
-    if len(rows) > 0:
-        return rows[0]
-    return dict()
-
-
-async def add_new_content(content_item: Dict) -> int:
-    """
-    新增一条内容记录（xhs的帖子 ｜ 抖音的视频 ｜ 微博 ｜ 快手视频 ...）
+# 内容哈希配置：hash_exclude_fields 是每次爬取都可能变化的平台字段（带签名的链接、头像地址等），不参与哈希，变化时照常更新；
+# count_fields 是互动数字段，不参与哈希，只有互动数或平台易变字段变化时只更新它们和不参与哈希的字段；
+# exclude_update_fields 只在首次插入时写入，来源关键词保留首次搜到这条内容的关键词，其他关键词记录在 crawler_note_keyword
+CONTENT_HASH_OPTIONS = {
+    "weibo_note": dict(hash_field="content_hash", hash_exclude_fields=(),
+                       exclude_update_fields=("add_ts", "source_keyword"),
+                       count_fields=("liked_count", "comments_count", "shared_count")),
+    "weibo_note_comment": dict(hash_field="content_hash", hash_exclude_fields=(),
+                               count_fields=("comment_like_count", "sub_comment_count")),
+    "weibo_creator": dict(hash_field="content_hash", hash_exclude_fields=(),
+                          count_fields=("follows", "fans")),
+}
+
+
+async def upsert_content(content_item: Dict) -> int:
+    """
+    新增或更新一条内容记录（xhs的帖子 ｜ 抖音的视频 ｜ 微博 ｜ 快手视频 ...），依赖 weibo_note 表上 note_id 的唯一索引判重，一条sql完成
     Args:
         content_item:
 
@@ -48,113 +44,49 @@ async def add_new_content(content_item: Dict) -> int:
 
     """
     async_db_conn: Union[AsyncMysqlDB, AsyncSqliteDB] = media_crawler_db_var.get()
-    last_row_id: int = await async_db_conn.item_to_table("weibo_note", content_item)
-    return last_row_id
-
-
-async def update_content_by_content_id(content_id: str, content_item: Dict) -> int:
-    """
-    更新一条记录（xhs的帖子 ｜ 抖音的视频 ｜ 微博 ｜ 快手视频 ...）
-    Args:
-        content_id:
-        content_item:
-
-    Returns:
-
-    """
-    async_db_conn: Union[AsyncMysqlDB, AsyncSqliteDB] = media_crawler_db_var.get()
-    effect_row: int = await async_db_conn.update_table("weibo_note", content_item, "note_id", content_id)
+    effect_row: int = await async_db_conn.upsert_item("weibo_note", content_item, conflict_fields=["note_id"], **CONTENT_HASH_OPTIONS["weibo_note"])
     return effect_row
 
 
-
-async def query_comment_by_comment_id(comment_id: str) -> Dict:
+async def upsert_comment(comment_item: Dict) -> int:
     """
-    查询一条评论内容
+    新增或更新一条评论记录，依赖 weibo_note_comment 表上 comment_id 的唯一索引判重，一条sql完成
     Args:
-        comment_id:
-
-    Returns:
-
-    """
-    async_db_conn: Union[AsyncMysqlDB, AsyncSqliteDB] = media_crawler_db_var.get()
-    sql: str = f"select * from weibo_note_comment where comment_id = '{comment_id}'"
-    rows: List[Dict] = await async_db_conn.query(sql)
-    if len(rows) > 0:
-        return rows[0]
-    return dict()
-
-
-async def add_new_comment(comment_item: Dict) -> int:
-    """
-    新增一条评论记录
-    Args:
-        comment_item:
-
-    Returns:
-
-    """
-    async_db_conn: Union[AsyncMysqlDB, AsyncSqliteDB] = media_crawler_db_var.get()
-    last_row_id: int = await async_db_conn.item_to_table("weibo_note_comment", comment_item)
-    return last_row_id
-
-
-async def update_comment_by_comment_id(comment_id: str, comment_item: Dict) -> int:
-    """
-    更新增一条评论记录
-    Args:
-        comment_id:
         comment_item:
 
     Returns:
 
     """
     async_db_conn: Union[AsyncMysqlDB, AsyncSqliteDB] = media_crawler_db_var.get()
-    effect_row: int = await async_db_conn.update_table("weibo_note_comment", comment_item, "comment_id", comment_id)
+    effect_row: int = await async_db_conn.upsert_item("weibo_note_comment", comment_item, conflict_fields=["comment_id"], **CONTENT_HASH_OPTIONS["weibo_note_comment"])
     return effect_row
 
 
-async def query_creator_by_user_id(user_id: str) -> Dict:
+async def batch_upsert_comments(comment_items: List[Dict]) -> int:
     """
-    查询一条创作者记录
+    批量新增或更新评论记录，一页评论通过一次 executemany 写入
     Args:
-        user_id:
+        comment_items:
 
     Returns:
 
     """
+    if not comment_items:
+        return 0
     async_db_conn: Union[AsyncMysqlDB, AsyncSqliteDB] = media_crawler_db_var.get()
-    sql: str = f"select * from weibo_creator where user_id = '{user_id}'"
-    rows: List[Dict] = await async_db_conn.query(sql)
-    if len(rows) > 0:
-        return rows[0]
-    return dict()
-
-
-async def add_new_creator(creator_item: Dict) -> int:
-    """
-    新增一条创作者信息
-    Args:
-        creator_item:
-
-    Returns:
-
-    """
-    async_db_conn: Union[AsyncMysqlDB, AsyncSqliteDB] = media_crawler_db_var.get()
-    last_row_id: int = await async_db_conn.item_to_table("weibo_creator", creator_item)
-    return last_row_id
+    effect_row: int = await async_db_conn.upsert_items("weibo_note_comment", comment_items, conflict_fields=["comment_id"], **CONTENT_HASH_OPTIONS["weibo_note_comment"])
+    return effect_row
 
 
-async def update_creator_by_user_id(user_id: str, creator_item: Dict) -> int:
+async def upsert_creator(creator_item: Dict) -> int:
     """
-    更新一条创作者信息
+    新增或更新一条创作者信息，依赖 weibo_creator 表上 user_id 的唯一索引判重，一条sql完成
     Args:
-        user_id:
         creator_item:
 
     Returns:
 
     """
     async_db_conn: Union[AsyncMysqlDB, AsyncSqliteDB] = media_crawler_db_var.get()
-    effect_row: int = await async_db_conn.update_table("weibo_creator", creator_item, "user_id", user_id)
-    return effect_row
\ No newline at end of file
+    effect_row: int = await async_db_conn.upsert_item("weibo_creator", creator_item, conflict_fields=["user_id"], **CONTENT_HASH_OPTIONS["weibo_creator"])
+    return effect_row
@@ -0,0 +1,300 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 异步写入队列（write-behind）
+#            爬取协程调用 store_xxx 时只把数据放进一个有界队列就返回，由后台写入任务批量落盘，
+#            磁盘慢或者远程 MySQL 抖动时不会拖慢网络请求；队列满时 put 会等待，对爬取形成背压
+import asyncio
+import contextvars
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import config
+from base.base_crawler import AbstractStore
+from tools import utils
+
+
+class _WriteEntry:
+    __slots__ = ("store", "method_name", "item", "enqueue_time")
+
+    def __init__(self, store: AbstractStore, method_name: str, item: Any):
+        self.store = store
+        self.method_name = method_name
+        self.item = item
+        self.enqueue_time = time.monotonic()
+
+
+class WriteBehindQueue:
+    def __init__(self, max_size: int = 1000, workers: int = 1, batch_size: int = 100,
+                 report_interval: float = 60.0):
+        """
+        Args:
+            max_size: 队列最大长度，队列满时入队的协程会等待
+            workers: 后台写入任务数量
+            batch_size: 每个写入任务一次最多取出多少条数据合并写入
+            report_interval: 输出队列统计日志的间隔（秒），<=0 表示不输出
+        """
+        self.max_size = max(max_size, 1)
+        self.workers = max(workers, 1)
+        self.batch_size = max(batch_size, 1)
+        self.report_interval = report_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        # 写入任务运行的上下文（db连接、crawler_type等），程序退出时剩余数据在新的事件循环里也用它写入
+        self._worker_context: Optional[contextvars.Context] = None
+        self._inflight: List[_WriteEntry] = []
+        self._last_report_time = time.monotonic()
+        # 统计信息
+        self.enqueued = 0
+        self.written = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.backpressure_waits = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.total_write_time = 0.0
+
+    def _ensure_started(self):
+        """
+        在第一次入队时创建队列和写入任务，保证它们绑定到爬虫所在的事件循环和上下文
+        """
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_size)
+        if not self._worker_tasks:
+            # create_task 会复制当前上下文，写入任务和这里保存的上下文看到的是同一份上下文变量
+            self._worker_context = contextvars.copy_context()
+            self._worker_tasks = [asyncio.create_task(self._worker(self._queue)) for _ in range(self.workers)]
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def put(self, store: AbstractStore, method_name: str, item: Any):
+        """
+        数据入队，队列满时等待写入任务腾出空间
+        Args:
+            store: 实际执行写入的存储对象
+            method_name: 存储对象上的方法名，例如 store_content
+            item: 待写入的数据
+
+        Returns:
+
+        """
+        self._ensure_started()
+        if self._queue.full():
+            self.backpressure_waits += 1
+        await self._queue.put(_WriteEntry(store, method_name, item))
+        self.enqueued += 1
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            entries = [await queue.get()]
+            while len(entries) < self.batch_size and not queue.empty():
+                entries.append(queue.get_nowait())
+            self._inflight.extend(entries)
+            try:
+                await self._write_entries(entries)
+            finally:
+                for entry in entries:
+                    if entry in self._inflight:
+                        self._inflight.remove(entry)
+                    queue.task_done()
+            self._report_if_needed()
+
+    async def _write_entries(self, entries: List[_WriteEntry]):
+        """
+        按存储类型和方法分组写入，连续的评论合并成一次 store_comments 调用
+        Args:
+            entries:
+
+        Returns:
+
+        """
+        for store, method_name, group in self._group_entries(entries):
+            start = time.monotonic()
+            try:
+                if method_name == "store_comment" and len(group) > 1:
+                    await store.store_comments([entry.item for entry in group])
+                else:
+                    for entry in group:
+                        await getattr(store, method_name)(entry.item)
+                self.written += len(group)
+            except Exception as e:
+                self.failed += len(group)
+                utils.logger.error(
+                    f"[WriteBehindQueue._write_entries] {type(store).__name__}.{method_name} write {len(group)} items error: {e}"
+                )
+            finished = time.monotonic()
+            self.total_write_time += finished - start
+            for entry in group:
+                latency = finished - entry.enqueue_time
+                self.total_latency += latency
+                self.max_latency = max(self.max_latency, latency)
+
+    @staticmethod
+    def _group_entries(entries: List[_WriteEntry]) -> List[Tuple[AbstractStore, str, List[_WriteEntry]]]:
+        """
+        相邻且写入同一张表（同一个存储类型和方法）的数据归为一组，保持原有的写入顺序
+        """
+        groups: List[Tuple[AbstractStore, str, List[_WriteEntry]]] = []
+        for entry in entries:
+            if groups and type(groups[-1][0]) is type(entry.store) and groups[-1][1] == entry.method_name:
+                groups[-1][2].append(entry)
+            else:
+                groups.append((entry.store, entry.method_name, [entry]))
+        return groups
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        队列统计信息，用来评估队列长度、写入任务数量是否合适
+        """
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "failed": self.failed,
+            "backpressure_waits": self.backpressure_waits,
+            "avg_latency_ms": round(self.total_latency / max(self.written + self.failed, 1) * 1000, 2),
+            "max_latency_ms": round(self.max_latency * 1000, 2),
+            "write_time_s": round(self.total_write_time, 3),
+        }
+
+    def _report_if_needed(self):
+        if self.report_interval <= 0:
+            return
+        now = time.monotonic()
+        if now - self._last_report_time >= self.report_interval:
+            self._last_report_time = now
+            utils.logger.info(f"[WriteBehindQueue] stats: {self.stats()}")
+
+    async def flush(self):
+        """
+        等待队列中已有的数据全部写入
+        """
+        if self._queue is not None and self._worker_tasks:
+            await self._queue.join()
+
+    async def close(self):
+        """
+        写完队列中剩余的数据并停止写入任务
+        """
+        await self.flush()
+        for task in self._worker_tasks:
+            task.cancel()
+        if self._worker_tasks:
+            await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        if self.enqueued:
+            utils.logger.info(f"[WriteBehindQueue.close] stats: {self.stats()}")
+
+    def drain_pending_sync(self):
+        """
+        程序被信号中断时原事件循环已经无法继续调度，这里把还没写完的数据（包括写入任务手上正在写的一批）
+        取出来，放到新的事件循环里同步写完，之后旧的写入任务不再使用
+        正在写的那一批可能已经部分写入，db/sqlite 是 upsert 不受影响，csv/json 可能出现少量重复行
+        """
+        pending = list(self._inflight)
+        self._inflight = []
+        if self._queue is not None:
+            while not self._queue.empty():
+                pending.append(self._queue.get_nowait())
+        self._worker_tasks = []
+        self._queue = None
+        if not pending:
+            return
+        utils.logger.info(f"[WriteBehindQueue.drain_pending_sync] writing {len(pending)} pending items ...")
+        utils.run_coroutine_sync(self._write_entries(pending), context=self._worker_context)
+        utils.logger.info(f"[WriteBehindQueue.drain_pending_sync] stats: {self.stats()}")
+
+
+class WriteBehindStore(AbstractStore):
+    """
+    存储对象的代理，store_xxx 调用只负责入队，实际写入交给 WriteBehindQueue 的后台任务
+    """
+
+    def __init__(self, store: AbstractStore, queue: WriteBehindQueue):
+        self._store = store
+        self._queue = queue
+
+    async def store_content(self, content_item: Dict):
+        await self._queue.put(self._store, "store_content", content_item)
+
+    async def store_comment(self, comment_item: Dict):
+        await self._queue.put(self._store, "store_comment", comment_item)
+
+    async def store_comments(self, comment_items: List[Dict]):
+        # 逐条入队，由写入任务重新合并成批，队列满时每条都能感知到背压
+        for comment_item in comment_items:
+            await self._queue.put(self._store, "store_comment", comment_item)
+
+    async def store_creator(self, creator: Dict):
+        await self._queue.put(self._store, "store_creator", creator)
+
+    def __getattr__(self, name: str):
+        # 平台特有的存储方法（例如 B站的 store_contact、store_dynamic）同样走队列
+        attr = getattr(self._store, name)
+        if name.startswith("store_") and asyncio.iscoroutinefunction(attr):
+            async def enqueue(item: Dict):
+                await self._queue.put(self._store, name, item)
+
+            return enqueue
+        return attr
+
+
+_write_behind_queue: Optional[WriteBehindQueue] = None
+
+
+def get_write_behind_queue() -> WriteBehindQueue:
+    """
+    获取全局的写入队列，所有平台的存储共用一个队列
+    """
+    global _write_behind_queue
+    if _write_behind_queue is None:
+        _write_behind_queue = WriteBehindQueue(
+            max_size=config.WRITE_BEHIND_QUEUE_SIZE,
+            workers=config.WRITE_BEHIND_WORKERS,
+            batch_size=config.WRITE_BEHIND_BATCH_SIZE,
+            report_interval=config.WRITE_BEHIND_REPORT_INTERVAL,
+        )
+    return _write_behind_queue
+
+
+def wrap_store(store: AbstractStore) -> AbstractStore:
+    """
+    开启 ENABLE_WRITE_BEHIND 时返回入队代理，否则原样返回存储对象
+    Args:
+        store:
+
+    Returns:
+
+    """
+    if not config.ENABLE_WRITE_BEHIND:
+        return store
+    return WriteBehindStore(store, get_write_behind_queue())
+
+
+async def close_write_behind_queue():
+    """
+    在爬虫所在的事件循环中写完剩余数据并停止写入任务
+    """
+    if _write_behind_queue is not None:
+        await _write_behind_queue.close()
+
+
+def flush_write_behind_queue_sync():
+    """
+    程序退出清理时调用，把没来得及写入的数据同步写完
+    """
+    if _write_behind_queue is not None:
+        _write_behind_queue.drain_pending_sync()
@@ -13,9 +13,11 @@
 # @Author  : relakkes@gmail.com
 # @Time    : 2024/1/14 17:34
 # @Desc    :
-from typing import List
+from typing import List, Optional
 
 import config
+from store.write_behind import wrap_store
+from tools.count_snapshot import get_count_snapshot_store
 from var import source_keyword_var
 
 from . import xhs_store_impl
@@ -28,6 +30,7 @@ class XhsStoreFactory:
         "csv": XhsCsvStoreImplement,
         "db": XhsDbStoreImplement,
         "json": XhsJsonStoreImplement,
+        "jsonl": XhsJsonlStoreImplement,
         "sqlite": XhsSqliteStoreImplement
     }
 
@@ -35,8 +38,8 @@ class XhsStoreFactory:
     def create_store() -> AbstractStore:
         store_class = XhsStoreFactory.STORES.get(config.SAVE_DATA_OPTION)
         if not store_class:
-            raise ValueError("[XhsStoreFactory.create_store] Invalid save option only supported csv or db or json or sqlite ...")
-        return store_class()
+            raise ValueError("[XhsStoreFactory.create_store] Invalid save option only supported csv or db or json or jsonl or sqlite ...")
+        return wrap_store(store_class())
 
 
 def get_video_url_arr(note_item: Dict) -> List:
@@ -110,6 +113,7 @@ async def update_xhs_note(note_item: Dict):
         "source_keyword": source_keyword_var.get(), # 搜索关键词
         "xsec_token": note_item.get("xsec_token"), # xsec_token
     }
+    await get_count_snapshot_store("xhs").record(note_id, local_db_item)
     utils.logger.info(f"[store.xhs.update_xhs_note] xhs note: {local_db_item}")
     await XhsStoreFactory.create_store().store_content(local_db_item)
 
@@ -126,13 +130,13 @@ async def batch_update_xhs_note_comments(note_id: str, comments: List[Dict]):
     """
     if not comments:
         return
-    for comment_item in comments:
-        await update_xhs_note_comment(note_id, comment_item)
+    save_comment_items = [_build_xhs_note_comment_item(note_id, comment_item) for comment_item in comments]
+    await XhsStoreFactory.create_store().store_comments([item for item in save_comment_items if item])
 
 
-async def update_xhs_note_comment(note_id: str, comment_item: Dict):
+def _build_xhs_note_comment_item(note_id: str, comment_item: Dict) -> Optional[Dict]:
     """
-    更新小红书笔记评论
+    将小红书笔记评论转换成存储层需要的字段
     Args:
         note_id:
         comment_item:
@@ -160,7 +164,23 @@ async def update_xhs_note_comment(note_id: str, comment_item: Dict):
         "like_count": comment_item.get("like_count", 0),
     }
     utils.logger.info(f"[store.xhs.update_xhs_note_comment] xhs note comment:{local_db_item}")
-    await XhsStoreFactory.create_store().store_comment(local_db_item)
+    return local_db_item
+
+
+async def update_xhs_note_comment(note_id: str, comment_item: Dict):
+    """
+    更新小红书笔记评论
+    Args:
+        note_id:
+        comment_item:
+
+    Returns:
+
+    """
+    save_comment_item = _build_xhs_note_comment_item(note_id, comment_item)
+    if not save_comment_item:
+        return
+    await XhsStoreFactory.create_store().store_comment(save_comment_item)
 
 
 async def save_creator(user_id: str, creator: Dict):
@@ -212,17 +232,14 @@ async def save_creator(user_id: str, creator: Dict):
     await XhsStoreFactory.create_store().store_creator(local_db_item)
 
 
-async def update_xhs_note_image(note_id, pic_content, extension_file_name):
+def get_xhs_note_media_file_name(note_id: str, extension_file_name: str) -> str:
     """
-    更新小红书笔
+    获取小红书笔记图片、视频的本地保存路径，流式下载时直接写入该文件
     Args:
         note_id:
-        pic_content:
         extension_file_name:
 
     Returns:
 
     """
-
-    await XiaoHongShuImage().store_image(
-        {"notice_id": note_id, "pic_content": pic_content, "extension_file_name": extension_file_name})
+    return XiaoHongShuImage().make_save_file_name(note_id, extension_file_name)
@@ -10,14 +10,16 @@
 
 
 # -*- coding: utf-8 -*-
-from typing import List
+from typing import Dict, List, Optional
 
 import config
 from base.base_crawler import AbstractStore
 from model.m_zhihu import ZhihuComment, ZhihuContent, ZhihuCreator, ZhihuQuestionTopic
+from store.write_behind import wrap_store
 from store.zhihu.zhihu_store_impl import (ZhihuCsvStoreImplement,
                                           ZhihuDbStoreImplement,
                                           ZhihuJsonStoreImplement,
+                                          ZhihuJsonlStoreImplement,
                                           ZhihuSqliteStoreImplement)
 from tools import utils
 from var import source_keyword_var
@@ -28,6 +30,7 @@ class ZhihuStoreFactory:
         "csv": ZhihuCsvStoreImplement,
         "db": ZhihuDbStoreImplement,
         "json": ZhihuJsonStoreImplement,
+        "jsonl": ZhihuJsonlStoreImplement,
         "sqlite": ZhihuSqliteStoreImplement
     }
 
@@ -35,8 +38,8 @@ class ZhihuStoreFactory:
     def create_store() -> AbstractStore:
         store_class = ZhihuStoreFactory.STORES.get(config.SAVE_DATA_OPTION)
         if not store_class:
-            raise ValueError("[ZhihuStoreFactory.create_store] Invalid save option only supported csv or db or json or sqlite ...")
-        return store_class()
+            raise ValueError("[ZhihuStoreFactory.create_store] Invalid save option only supported csv or db or json or jsonl or sqlite ...")
+        return wrap_store(store_class())
 
 async def batch_update_zhihu_contents(contents: List[ZhihuContent]):
     """
@@ -82,13 +85,13 @@ async def batch_update_zhihu_note_comments(comments: List[ZhihuComment]):
     if not comments:
         return
     
-    for comment_item in comments:
-        await update_zhihu_content_comment(comment_item)
+    save_comment_items = [_build_zhihu_content_comment_item(comment_item) for comment_item in comments]
+    await ZhihuStoreFactory.create_store().store_comments([item for item in save_comment_items if item])
 
 
-async def update_zhihu_content_comment(comment_item: ZhihuComment):
+def _build_zhihu_content_comment_item(comment_item: ZhihuComment) -> Optional[Dict]:
     """
-    更新知乎内容评论
+    将知乎内容评论转换成存储层需要的字段
     Args:
         comment_item:
 
@@ -98,7 +101,22 @@ async def update_zhihu_content_comment(comment_item: ZhihuComment):
     local_db_item = comment_item.model_dump()
     local_db_item.update({"last_modify_ts": utils.get_current_timestamp()})
     utils.logger.info(f"[store.zhihu.update_zhihu_note_comment] zhihu content comment:{local_db_item}")
-    await ZhihuStoreFactory.create_store().store_comment(local_db_item)
+    return local_db_item
+
+
+async def update_zhihu_content_comment(comment_item: ZhihuComment):
+    """
+    更新知乎内容评论
+    Args:
+        comment_item:
+
+    Returns:
+
+    """
+    save_comment_item = _build_zhihu_content_comment_item(comment_item)
+    if not save_comment_item:
+        return
+    await ZhihuStoreFactory.create_store().store_comment(save_comment_item)
 
 
 async def save_creator(creator: ZhihuCreator):
@@ -134,9 +152,11 @@ async def save_question_topic(question_topic: ZhihuQuestionTopic):
     local_db_item.update({"last_modify_ts": utils.get_current_timestamp()})
     utils.logger.info(f"[store.zhihu.save_question_topic] zhihu question topic: {local_db_item}")
     
-    # 只在JSON存储中保存问题主题
+    # 只在JSON/JSONL存储中保存问题主题
     if config.SAVE_DATA_OPTION == "json":
         store = ZhihuJsonStoreImplement()
         await store.save_question_topic_to_json(local_db_item)
+    elif config.SAVE_DATA_OPTION == "jsonl":
+        await ZhihuJsonlStoreImplement().save_question_topic_to_jsonl(local_db_item)
     else:
         utils.logger.warning(f"[store.zhihu.save_question_topic] Question topic storage only supported for JSON format, current: {config.SAVE_DATA_OPTION}")
\ No newline at end of file
@@ -0,0 +1,61 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : JS 签名吞吐量对比：execjs 逐次调用 vs 常驻 Node 进程池
+#            运行方式（项目根目录）：python -m test.benchmark_js_sign_pool
+import asyncio
+import time
+
+import execjs
+
+from tools.js_sign_pool import JsSignPool
+
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"
+SIGN_CASES = [
+    ("libs/douyin.js", "sign_datail", ("aweme_id=7378810571505847586&count=20&cursor=0", USER_AGENT)),
+    ("libs/zhihu.js", "get_sign", ("/api/v4/search_v3?q=python&offset=0", "d_c0=AECXYZ1234567890|1700000000;")),
+]
+
+
+def bench_execjs(script_path: str, fn: str, args: tuple, count: int) -> float:
+    with open(script_path, encoding="utf-8-sig") as f:
+        ctx = execjs.compile(f.read())
+    start = time.perf_counter()
+    for _ in range(count):
+        ctx.call(fn, *args)
+    return count / (time.perf_counter() - start)
+
+
+async def bench_pool(script_path: str, fn: str, args: tuple, count: int, batch: bool) -> float:
+    pool = JsSignPool(script_path)
+    await pool.sign(fn, *args)  # 预热，启动常驻进程
+    start = time.perf_counter()
+    if batch:
+        await pool.sign_many(fn, [args] * count)
+    else:
+        await asyncio.gather(*[pool.sign(fn, *args) for _ in range(count)])
+    rate = count / (time.perf_counter() - start)
+    await pool.close()
+    return rate
+
+
+def main():
+    execjs_count, pool_count = 30, 3000
+    for script_path, fn, args in SIGN_CASES:
+        print(f"{script_path}:{fn}")
+        print(f"  execjs           : {bench_execjs(script_path, fn, args, execjs_count):10.1f} signs/s")
+        print(f"  pool (concurrent): {asyncio.run(bench_pool(script_path, fn, args, pool_count, False)):10.1f} signs/s")
+        print(f"  pool (batch)     : {asyncio.run(bench_pool(script_path, fn, args, pool_count, True)):10.1f} signs/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+from unittest import IsolatedAsyncioTestCase
+
+from async_sqlite_db import AsyncSqliteDB
+
+
+class TestAsyncSqliteDB(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, "test.db")
+        self.db = AsyncSqliteDB(self.db_path, write_batch_size=50, write_flush_interval=60)
+        await self.db.executescript(
+            "CREATE TABLE note (id INTEGER PRIMARY KEY, note_id TEXT, title TEXT, liked_count INTEGER, "
+            "xsec_token TEXT, source_keyword TEXT, add_ts INTEGER, last_modify_ts INTEGER, content_hash TEXT);"
+            "CREATE UNIQUE INDEX idx_note_note_id ON note (note_id);"
+        )
+
+    async def test_read_your_writes_before_commit(self):
+        await self.db.item_to_table("note", {"note_id": "n1", "liked_count": 1})
+        row = await self.db.get_first("select * from note where note_id = ?", "n1")
+        self.assertEqual(row["liked_count"], 1)
+        await self.db.update_table("note", {"liked_count": 2}, "note_id", "n1")
+        rows = await self.db.query("select * from note")
+        self.assertEqual(rows[0]["liked_count"], 2)
+
+    async def test_batched_writes_persist_after_close(self):
+        for i in range(120):
+            await self.db.item_to_table("note", {"note_id": f"n{i}", "liked_count": i})
+        await self.db.close()
+
+        self.db = AsyncSqliteDB(self.db_path)
+        rows = await self.db.query("select count(*) as total from note")
+        self.assertEqual(rows[0]["total"], 120)
+        journal_mode = await self.db.get_first("PRAGMA journal_mode")
+        self.assertEqual(journal_mode["journal_mode"], "wal")
+
+    async def test_upsert_item_updates_existing_row(self):
+        await self.db.upsert_item("note", {"note_id": "n1", "liked_count": 1, "add_ts": 100}, ["note_id"])
+        await self.db.upsert_item("note", {"note_id": "n1", "liked_count": 5, "add_ts": 200}, ["note_id"])
+        rows = await self.db.query("select * from note")
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["liked_count"], 5)
+        # add_ts 记录的是首次入库时间，更新时保持不变
+        self.assertEqual(rows[0]["add_ts"], 100)
+
+    async def test_upsert_items_in_one_batch(self):
+        await self.db.items_to_table("note", [{"note_id": "n1", "liked_count": 1, "add_ts": 100}])
+        comments = [{"note_id": f"n{i}", "liked_count": i * 10, "add_ts": 200} for i in range(20)]
+        effect_rows = await self.db.upsert_items("note", comments, ["note_id"])
+        self.assertEqual(effect_rows, 20)
+        rows = await self.db.query("select * from note order by id")
+        self.assertEqual(len(rows), 20)
+        self.assertEqual(rows[0]["liked_count"], 10)
+        self.assertEqual(rows[0]["add_ts"], 100)
+
+    async def test_upsert_skips_unchanged_rows(self):
+        item = {"note_id": "n1", "liked_count": 1, "add_ts": 100, "last_modify_ts": 100}
+        self.assertEqual(await self.db.upsert_item("note", dict(item), ["note_id"], hash_field="content_hash"), 1)
+        # 只有时间戳变化，内容相同，跳过写入
+        unchanged = dict(item, add_ts=200, last_modify_ts=200)
+        self.assertEqual(await self.db.upsert_item("note", unchanged, ["note_id"], hash_field="content_hash"), 0)
+        changed = [dict(item, liked_count=5, last_modify_ts=300), dict(item, note_id="n2")]
+        self.assertEqual(await self.db.upsert_items("note", changed, ["note_id"], hash_field="content_hash"), 2)
+
+        rows = await self.db.query("select * from note order by id")
+        self.assertEqual([row["liked_count"] for row in rows], [5, 1])
+        self.assertEqual(rows[0]["last_modify_ts"], 300)
+        self.assertEqual(self.db.write_stats["note"], {"written": 3, "skipped": 1})
+        # 传入的记录不会被写入哈希字段
+        self.assertNotIn("content_hash", item)
+
+    async def test_upsert_updates_only_counts_when_content_unchanged(self):
+        options = dict(hash_field="content_hash", hash_exclude_fields=("xsec_token",), count_fields=("liked_count",),
+                       exclude_update_fields=("add_ts", "source_keyword"))
+        item = {"note_id": "n1", "title": "t1", "liked_count": 1, "xsec_token": "a", "source_keyword": "k1",
+                "last_modify_ts": 100}
+        self.assertEqual(await self.db.upsert_item("note", item, ["note_id"], **options), 1)
+        # 只有首次写入的字段不同，不写入
+        self.assertEqual(await self.db.upsert_item("note", dict(item, source_keyword="k2", last_modify_ts=200), ["note_id"], **options), 0)
+        # 平台易变字段变化时更新，过期的 xsec_token 不会一直留在库里
+        self.assertEqual(await self.db.upsert_item("note", dict(item, xsec_token="b", last_modify_ts=200), ["note_id"], **options), 1)
+        row = await self.db.get_first("select * from note where note_id = ?", "n1")
+        self.assertEqual((row["xsec_token"], row["source_keyword"], row["last_modify_ts"]), ("b", "k1", 200))
+        # 只有互动数变化，更新互动数和不参与哈希的字段
+        self.assertEqual(await self.db.upsert_item("note", dict(item, liked_count=2, xsec_token="c", last_modify_ts=300), ["note_id"], **options), 1)
+        row = await self.db.get_first("select * from note where note_id = ?", "n1")
+        self.assertEqual((row["title"], row["liked_count"], row["xsec_token"], row["last_modify_ts"]), ("t1", 2, "c", 300))
+        # 内容变化时整行更新，来源关键词保持首次写入的值
+        self.assertEqual(await self.db.upsert_items("note", [dict(item, title="t2", liked_count=2, xsec_token="c", source_keyword="k3")], ["note_id"], **options), 1)
+        row = await self.db.get_first("select * from note where note_id = ?", "n1")
+        self.assertEqual((row["title"], row["liked_count"], row["source_keyword"], row["last_modify_ts"]), ("t2", 2, "k1", 100))
+        self.assertEqual(self.db.write_stats["note"], {"written": 4, "skipped": 1})
+
+    async def asyncTearDown(self):
+        await self.db.close()
+        self.temp_dir.cleanup()
@@ -0,0 +1,93 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import unittest
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+import httpx
+
+from media_platform.bilibili import client as bili_client_module
+from media_platform.bilibili.client import BilibiliClient
+from media_platform.bilibili.help import BilibiliSign, WbiKeyCache
+from tools.httpx_client_pool import HttpxClientPool
+
+IMG_KEY = "7cd084941338484aae1ad9425b84077c"
+SUB_KEY = "4932caff0ff746eab6f01bf08b70ac45"
+# 浏览器 localStorage 中已经轮换掉的旧 key
+STALE_WBI_IMG_URLS = f"https://i0.hdslb.com/bfs/wbi/{'a' * 32}.png-https://i0.hdslb.com/bfs/wbi/{'b' * 32}.png"
+
+
+class TestBilibiliSign(unittest.TestCase):
+
+    def test_sign(self):
+        # 参考 bilibili-API-collect 文档中的示例
+        sign = BilibiliSign(IMG_KEY, SUB_KEY)
+        self.assertEqual(sign.get_salt(), "ea1db124af3c7062474693fa704f4ff8")
+        with patch("media_platform.bilibili.help.utils.get_unix_timestamp", return_value=1702204169):
+            req_data = sign.sign({"foo": "114", "bar": "514", "zab": 1919810})
+        self.assertEqual(req_data["w_rid"], "8f6f2b5b3d485fe1886cec6a0be8c5d4")
+
+    def test_wbi_key_cache_is_persisted(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache_file = os.path.join(tmp_dir, "wbi_keys.json")
+            WbiKeyCache(cache_file, ttl=60).set(IMG_KEY, SUB_KEY)
+            self.assertEqual(WbiKeyCache(cache_file, ttl=60).get(), (IMG_KEY, SUB_KEY))
+            self.assertIsNone(WbiKeyCache(cache_file, ttl=0).get())
+
+
+class FakePage:
+    def __init__(self):
+        self.evaluate_count = 0
+
+    async def evaluate(self, expression: str):
+        self.evaluate_count += 1
+        return {"wbi_img_urls": STALE_WBI_IMG_URLS}
+
+
+class TestBilibiliClientWbiKeys(IsolatedAsyncioTestCase):
+
+    async def test_rejected_sign_refreshes_keys_from_nav(self):
+        signed_keys = []
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.path == "/x/web-interface/nav":
+                return httpx.Response(200, json={"code": 0, "data": {"wbi_img": {
+                    "img_url": f"https://i0.hdslb.com/bfs/wbi/{IMG_KEY}.png",
+                    "sub_url": f"https://i0.hdslb.com/bfs/wbi/{SUB_KEY}.png",
+                }}})
+            params = dict(request.url.params)
+            w_rid = params.pop("w_rid")
+            with patch("media_platform.bilibili.help.utils.get_unix_timestamp", return_value=params.pop("wts")):
+                valid = BilibiliSign(IMG_KEY, SUB_KEY).sign(params)["w_rid"] == w_rid
+            signed_keys.append(valid)
+            if not valid:
+                return httpx.Response(200, json={"code": -403, "message": "访问权限不足"})
+            return httpx.Response(200, json={"code": 0, "data": {"ok": True}})
+
+        page = FakePage()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = WbiKeyCache(os.path.join(tmp_dir, "wbi_keys.json"), ttl=60)
+            with patch.object(bili_client_module, "wbi_key_cache", cache):
+                client = BilibiliClient(headers={}, playwright_page=page, cookie_dict={})
+                await client.http_client_pool.aclose()
+                client.http_client_pool = HttpxClientPool(transport=httpx.MockTransport(handler))
+                self.assertEqual(await client.get("/x/test", {"aid": 1}), {"ok": True})
+                self.assertEqual(await client.get("/x/test", {"aid": 2}), {"ok": True})
+                await client.http_client_pool.aclose()
+
+            self.assertEqual(signed_keys, [False, True, True])
+            # 只有第一次从 localStorage 读取，之后都使用缓存
+            self.assertEqual(page.evaluate_count, 1)
+            self.assertEqual(cache.get(), (IMG_KEY, SUB_KEY))
@@ -0,0 +1,129 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import asyncio
+import csv
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from tools.buffered_file_writer import (BufferedFileWriter, CsvFileWriter,
+                                        JsonlFileWriter, convert_jsonl_to_json)
+
+
+class TestJsonlFileWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.jsonl_file = os.path.join(self.temp_dir.name, "search_comments.jsonl")
+
+    def test_write_and_reuse_handle(self):
+        writer = JsonlFileWriter.get_writer(self.jsonl_file)
+        writer.write_item({"comment_id": "1", "content": "你好"})
+        self.assertIs(JsonlFileWriter.get_writer(self.jsonl_file), writer)
+        writer.write_item({"comment_id": "2", "content": "world"})
+        writer.close()
+        with open(self.jsonl_file, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        self.assertEqual([json.loads(line)["comment_id"] for line in lines], ["1", "2"])
+
+    def test_convert_matches_legacy_json_format(self):
+        items = [{"note_id": "a", "desc": "多行\n内容", "tags": ["x", "y"], "user": {"id": 1}}, {"note_id": "b"}]
+        writer = JsonlFileWriter.get_writer(self.jsonl_file, export_json_on_close=True)
+        for item in items:
+            writer.write_item(item)
+        writer.close()
+        with open(os.path.join(self.temp_dir.name, "search_comments.json"), encoding="utf-8") as f:
+            self.assertEqual(f.read(), json.dumps(items, ensure_ascii=False, indent=4))
+
+    def test_convert_empty_file(self):
+        open(self.jsonl_file, "w").close()
+        json_file = convert_jsonl_to_json(self.jsonl_file)
+        with open(json_file, encoding="utf-8") as f:
+            self.assertEqual(f.read(), "[]")
+
+    def tearDown(self):
+        JsonlFileWriter.close_all()
+        self.temp_dir.cleanup()
+
+
+class TestBufferedFileWriterTimer(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.temp_dir.name, "search_contents.jsonl")
+
+    async def test_idle_buffer_flushed_after_interval(self):
+        writer = BufferedFileWriter.get_writer(self.file_path, flush_interval=0.05)
+        writer.write("1\n")
+        self.assertEqual(os.path.getsize(self.file_path), 0)
+        # 之后没有新的写入，定时器到点后也会落盘
+        await asyncio.sleep(0.1)
+        self.assertEqual(os.path.getsize(self.file_path), 2)
+
+    def tearDown(self):
+        BufferedFileWriter.close_all()
+        self.temp_dir.cleanup()
+
+
+class TestCsvFileWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.file_prefix = os.path.join(self.temp_dir.name, "1_search_comments")
+
+    def read_rows(self, file_path):
+        with open(file_path, encoding="utf-8-sig", newline="") as f:
+            return list(csv.reader(f))
+
+    def test_header_written_once_per_file(self):
+        with mock.patch("tools.utils.get_current_date", return_value="20240114"):
+            writer = CsvFileWriter.get_writer(self.file_prefix)
+            writer.write_row({"comment_id": "1", "content": "你好,\"世界\""})
+            self.assertIs(CsvFileWriter.get_writer(self.file_prefix), writer)
+            writer.write_row({"comment_id": "2", "content": "多行\n内容"})
+            writer.close()
+            # 重新打开已有文件继续追加时不再重复写表头
+            CsvFileWriter.get_writer(self.file_prefix).write_row({"comment_id": "3", "content": "x"})
+            CsvFileWriter.close_all()
+        rows = self.read_rows(f"{self.file_prefix}_20240114.csv")
+        self.assertEqual(rows[0], ["comment_id", "content"])
+        self.assertEqual(rows[1:], [["1", "你好,\"世界\""], ["2", "多行\n内容"], ["3", "x"]])
+
+    def test_roll_by_size_and_date(self):
+        with mock.patch("tools.utils.get_current_date", return_value="20240114"):
+            writer = CsvFileWriter.get_writer(self.file_prefix, max_bytes=64)
+            for i in range(6):
+                writer.write_row({"comment_id": str(i), "content": "a" * 20})
+        with mock.patch("tools.utils.get_current_date", return_value="20240115"):
+            writer.write_row({"comment_id": "6", "content": "b"})
+        CsvFileWriter.close_all()
+
+        day1_files = sorted(f for f in os.listdir(self.temp_dir.name) if "20240114" in f)
+        self.assertGreater(len(day1_files), 1)
+        day1_ids = []
+        for file_name in day1_files:
+            rows = self.read_rows(os.path.join(self.temp_dir.name, file_name))
+            self.assertEqual(rows[0], ["comment_id", "content"])
+            day1_ids.extend(row[0] for row in rows[1:])
+        self.assertEqual(sorted(day1_ids), [str(i) for i in range(6)])
+        self.assertEqual(self.read_rows(f"{self.file_prefix}_20240115.csv"), [["comment_id", "content"], ["6", "b"]])
+
+    def tearDown(self):
+        CsvFileWriter.close_all()
+        self.temp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+import tempfile
+from unittest import IsolatedAsyncioTestCase
+
+from tools.checkpoint import CheckpointScope, CheckpointStore, SearchProgress
+from tools.crawl_pipeline import CrawlPipeline
+
+
+class TestCheckpointStore(IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, "checkpoint.db")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def new_store(self, resume: bool) -> CheckpointStore:
+        return CheckpointStore("xhs", db_path=self.db_path, resume=resume, enabled=True)
+
+    async def test_resume_loads_saved_cursors(self):
+        store = self.new_store(resume=False)
+        await store.save(CheckpointScope.SEARCH, "python", {"page": 3, "search_id": "abc"})
+        await store.finish(CheckpointScope.COMMENTS, "n1")
+        # 不调用 close，模拟程序被中途杀掉
+        store = self.new_store(resume=True)
+        self.assertEqual(await store.load(CheckpointScope.SEARCH, "python"), {"page": 3, "search_id": "abc"})
+        self.assertTrue((await store.load(CheckpointScope.COMMENTS, "n1")).get("done"))
+        self.assertEqual(await store.load(CheckpointScope.CREATOR, "u1"), {})
+        await store.close()
+
+    async def test_fresh_run_discards_old_checkpoints(self):
+        store = self.new_store(resume=False)
+        await store.save(CheckpointScope.SEARCH, "python", {"page": 3})
+        await store.close()
+        store = self.new_store(resume=False)
+        self.assertEqual(await store.load(CheckpointScope.SEARCH, "python"), {})
+        await store.close()
+        store = self.new_store(resume=True)
+        self.assertEqual(await store.load(CheckpointScope.SEARCH, "python"), {})
+        await store.close()
+
+    async def test_clear_keeps_unfinished_checkpoints(self):
+        store = self.new_store(resume=False)
+        await store.finish(CheckpointScope.SEARCH, "a")
+        await store.save(CheckpointScope.SEARCH, "b", {"page": 2})
+        await store.clear()
+        await store.close()
+        store = self.new_store(resume=True)
+        self.assertEqual(await store.load(CheckpointScope.SEARCH, "b"), {"page": 2})
+        await store.finish(CheckpointScope.SEARCH, "b")
+        await store.clear()
+        await store.close()
+        store = self.new_store(resume=True)
+        self.assertEqual(await store.load(CheckpointScope.SEARCH, "a"), {})
+        await store.close()
+
+    async def test_search_progress_keeps_lowest_unfinished_page(self):
+        store = self.new_store(resume=False)
+        progress = SearchProgress(store, "python", 1, search_id="abc")
+        release = {1: asyncio.Event(), 2: asyncio.Event()}
+        pipeline = CrawlPipeline("test", on_tag_done=progress.page_done)
+
+        async def fetch_detail(item):
+            await pipeline.put("comments", item)
+
+        async def fetch_comments(item):
+            await release[item[0]].wait()
+
+        pipeline.add_stage("detail", fetch_detail)
+        pipeline.add_stage("comments", fetch_comments, workers=4)
+        async with pipeline:
+            for page in (1, 2, 3):
+                async with progress.page(pipeline, page):
+                    if page in release:
+                        await pipeline.put("detail", (page, "note"))
+            await asyncio.sleep(0.01)
+            # 第 1 页的评论还没处理完，即使已经翻到第 4 页，续爬也要从第 1 页开始
+            self.assertEqual(await store.load(CheckpointScope.SEARCH, "python"), {"page": 1, "search_id": "abc"})
+            release[1].set()
+            await asyncio.sleep(0.01)
+            self.assertEqual((await store.load(CheckpointScope.SEARCH, "python"))["page"], 2)
+            release[2].set()
+        self.assertEqual((await store.load(CheckpointScope.SEARCH, "python"))["page"], 4)
+        await store.close()
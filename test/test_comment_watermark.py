@@ -0,0 +1,64 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+from unittest import IsolatedAsyncioTestCase
+
+from tools.comment_watermark import CommentWatermarkStore
+
+
+def comment(comment_id: int, create_time: int):
+    return {"id": comment_id, "create_time": create_time}
+
+
+class TestCommentWatermark(IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = CommentWatermarkStore(
+            "xhs", db_path=os.path.join(self.tmp_dir.name, "watermark.db"), enabled=True
+        )
+
+    async def asyncTearDown(self):
+        await self.store.close()
+        self.tmp_dir.cleanup()
+
+    async def begin(self):
+        return await self.store.begin("n1", get_id=lambda c: c["id"], get_time=lambda c: c["create_time"])
+
+    async def test_stops_at_known_page_on_next_crawl(self):
+        watermark = await self.begin()
+        # 第一次爬取没有水位线，不会提前停止
+        self.assertFalse(watermark.reached([comment(3, 300), comment(2, 200)]))
+        self.assertFalse(watermark.reached([comment(1, 100)]))
+        await watermark.commit()
+
+        watermark = await self.begin()
+        self.assertFalse(watermark.reached([comment(5, 500), comment(4, 400), comment(3, 300)]))
+        self.assertTrue(watermark.reached([comment(2, 200), comment(1, 100)]))
+        await watermark.commit()
+
+        watermark = await self.begin()
+        self.assertEqual(watermark.newest_time, 500)
+        # 同一秒内的已知评论按ID判断
+        self.assertTrue(watermark.reached([comment(5, 500), comment(4, 400)]))
+        self.assertFalse(watermark.reached([comment(6, 500)]))
+
+    async def test_disabled_store_never_stops(self):
+        store = CommentWatermarkStore("xhs", db_path=os.path.join(self.tmp_dir.name, "off.db"), enabled=False)
+        watermark = await store.begin("n1", get_id=lambda c: c["id"], get_time=lambda c: c["create_time"])
+        watermark.reached([comment(1, 100)])
+        await watermark.commit()
+        watermark = await store.begin("n1", get_id=lambda c: c["id"], get_time=lambda c: c["create_time"])
+        self.assertFalse(watermark.reached([comment(1, 100)]))
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_dir.name, "off.db")))
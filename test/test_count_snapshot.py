@@ -0,0 +1,61 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import time
+from unittest import IsolatedAsyncioTestCase
+
+from tools.count_snapshot import CountSnapshotStore, parse_count
+
+
+class TestCountSnapshot(IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = CountSnapshotStore(
+            "xhs", db_path=os.path.join(self.tmp_dir.name, "snapshot.db"), enabled=True
+        )
+
+    async def asyncTearDown(self):
+        await self.store.close()
+        self.tmp_dir.cleanup()
+
+    def test_parse_count(self):
+        self.assertEqual(parse_count("1.2万"), 12000)
+        self.assertEqual(parse_count("10万+"), 100000)
+        self.assertEqual(parse_count(35), 35)
+        self.assertIsNone(parse_count("None"))
+
+    async def test_trajectory_skips_unchanged_counts(self):
+        await self.store.record("n1", {"liked_count": "10", "comment_count": 1}, ts=100)
+        await self.store.record("n1", {"liked_count": "10", "comment_count": 1}, ts=200)
+        await self.store.record("n1", {"liked_count": "1.5万", "comment_count": 3}, ts=300)
+        await self.store.record("n2", {"liked_count": 1}, ts=300)
+
+        rows = await self.store.trajectory("n1")
+        self.assertEqual([row["ts"] for row in rows], [100, 300])
+        self.assertEqual([row["liked_count"] for row in rows], [10, 15000])
+        self.assertIsNone(rows[0]["share_count"])
+
+    async def test_compact_keeps_last_snapshot_per_bucket(self):
+        day = 86400
+        old_day = (int(time.time()) // day - 30) * day
+        for hour in range(24):
+            await self.store.record("n1", {"liked_count": hour}, ts=old_day + hour * 3600)
+        await self.store.record("n1", {"liked_count": 100}, ts=int(time.time()) - 60)
+        await self.store.record("n1", {"liked_count": 101}, ts=int(time.time()))
+
+        deleted = await self.store.compact(older_than_seconds=7 * day, bucket_seconds=day)
+        self.assertEqual(deleted, 23)
+        rows = await self.store.trajectory("n1")
+        self.assertEqual([row["liked_count"] for row in rows], [23, 100, 101])
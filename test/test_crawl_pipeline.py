@@ -0,0 +1,91 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+from unittest import IsolatedAsyncioTestCase
+
+from tools.crawl_pipeline import CrawlPipeline
+from var import source_keyword_var
+
+
+class TestCrawlPipeline(IsolatedAsyncioTestCase):
+
+    async def test_items_flow_through_all_stages(self):
+        stored, comments = [], []
+        pipeline = CrawlPipeline("test", queue_size=2)
+
+        async def fetch_detail(item: int):
+            if item == 3:
+                raise ValueError("detail error")
+            await pipeline.put("store", {"id": item})
+            await pipeline.put("comments", item)
+
+        async def store(detail):
+            stored.append(detail["id"])
+
+        async def fetch_comments(item: int):
+            await asyncio.sleep(0.01)
+            comments.append(item)
+
+        pipeline.add_stage("detail", fetch_detail, workers=2)
+        pipeline.add_stage("store", store)
+        pipeline.add_stage("comments", fetch_comments, workers=2)
+        async with pipeline:
+            for item in range(10):
+                await pipeline.put("detail", item)
+
+        expected = [item for item in range(10) if item != 3]
+        self.assertEqual(sorted(stored), expected)
+        self.assertEqual(sorted(comments), expected)
+        stats = pipeline.stats()
+        self.assertEqual(stats["detail"]["failed"], 1)
+        self.assertLessEqual(stats["comments"]["max_depth"], 2)
+
+    async def test_stages_overlap(self):
+        # 翻页、详情、评论各 0.02s，串行执行需要 10 * 0.06s，流水线接近 10 * 0.02s
+        pipeline = CrawlPipeline("test", queue_size=5)
+
+        async def fetch_detail(item: int):
+            await asyncio.sleep(0.02)
+            await pipeline.put("comments", item)
+
+        async def fetch_comments(item: int):
+            await asyncio.sleep(0.02)
+
+        pipeline.add_stage("detail", fetch_detail)
+        pipeline.add_stage("comments", fetch_comments)
+        start = time.monotonic()
+        async with pipeline:
+            for page in range(10):
+                await asyncio.sleep(0.02)
+                await pipeline.put("detail", page)
+        self.assertLess(time.monotonic() - start, 10 * 0.06 * 0.6)
+
+    async def test_workers_inherit_context(self):
+        keywords = []
+
+        async def store(item):
+            keywords.append(source_keyword_var.get())
+
+        source_keyword_var.set("python")
+        async with CrawlPipeline("test").add_stage("store", store) as pipeline:
+            await pipeline.put("store", 1)
+        self.assertEqual(keywords, ["python"])
+
+    async def test_source_error_stops_workers(self):
+        pipeline = CrawlPipeline("test").add_stage("store", lambda item: asyncio.sleep(10))
+        with self.assertRaises(RuntimeError):
+            async with pipeline:
+                await pipeline.put("store", 1)
+                raise RuntimeError("search failed")
+        self.assertEqual(pipeline._stages["store"].worker_tasks, [])
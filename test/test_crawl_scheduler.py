@@ -0,0 +1,139 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+
+from tools.crawl_scheduler import CrawlScheduler, RequestClass
+
+
+def new_scheduler(max_concurrency: int = 4, api: int = 2, media: int = 3, per_host: int = 10) -> CrawlScheduler:
+    return CrawlScheduler(
+        max_concurrency=max_concurrency,
+        class_limits={RequestClass.API: api, RequestClass.MEDIA: media, RequestClass.PAGE: 1},
+        per_host_limit=per_host,
+        report_interval=0,
+    )
+
+
+class TestCrawlScheduler(IsolatedAsyncioTestCase):
+
+    async def _max_running(self, scheduler: CrawlScheduler, jobs):
+        running = 0
+        max_running = 0
+
+        async def job(request_class: str, host: str):
+            nonlocal running, max_running
+            async with scheduler.limit(request_class, host):
+                running += 1
+                max_running = max(max_running, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        await asyncio.gather(*[job(request_class, host) for request_class, host in jobs])
+        return max_running
+
+    async def test_class_limit(self):
+        scheduler = new_scheduler()
+        max_running = await self._max_running(scheduler, [(RequestClass.API, "https://a.com")] * 10)
+        self.assertEqual(max_running, 2)
+
+    async def test_global_limit(self):
+        scheduler = new_scheduler(max_concurrency=4)
+        jobs = [(RequestClass.API, "https://a.com")] * 10 + [(RequestClass.MEDIA, "https://b.com/1.jpg")] * 10
+        max_running = await self._max_running(scheduler, jobs)
+        self.assertEqual(max_running, 4)
+
+    async def test_per_host_limit(self):
+        scheduler = new_scheduler(max_concurrency=10, media=10, per_host=2)
+        max_running = await self._max_running(scheduler, [(RequestClass.MEDIA, "https://img.com/a.jpg")] * 10)
+        self.assertEqual(max_running, 2)
+        self.assertIn("host:img.com", scheduler.stats())
+
+    async def test_shared_limit_object(self):
+        # 和原来的 asyncio.Semaphore 一样，一个名额对象在多个任务之间共用
+        scheduler = new_scheduler(api=1)
+        semaphore = scheduler.limit(RequestClass.API, "https://a.com")
+        order = []
+
+        async def job(index: int):
+            async with semaphore:
+                order.append(("enter", index))
+                await asyncio.sleep(0.01)
+                order.append(("exit", index))
+
+        await asyncio.gather(*[job(i) for i in range(3)])
+        self.assertEqual(order, [("enter", 0), ("exit", 0), ("enter", 1), ("exit", 1), ("enter", 2), ("exit", 2)])
+        self.assertEqual(scheduler.stats()["class:api"]["in_flight"], 0)
+
+    async def test_nested_limit_does_not_deadlock(self):
+        scheduler = new_scheduler(max_concurrency=1, api=1)
+
+        async def child():
+            async with scheduler.limit(RequestClass.API, "https://a.com"):
+                return "done"
+
+        async with scheduler.limit(RequestClass.API, "https://a.com"):
+            # 同一个任务里嵌套申请不会再等待已经持有的名额
+            self.assertEqual(await child(), "done")
+
+        stats = scheduler.stats()
+        self.assertEqual(stats["global"]["acquired"], 1)
+        self.assertEqual(stats["global"]["in_flight"], 0)
+
+    async def test_child_tasks_do_not_inherit_limit(self):
+        scheduler = new_scheduler(max_concurrency=10, api=1)
+        running = 0
+        max_running = 0
+
+        async def child():
+            nonlocal running, max_running
+            async with scheduler.limit(RequestClass.API, "https://a.com"):
+                running += 1
+                max_running = max(max_running, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        async with scheduler.limit(RequestClass.API, "https://a.com"):
+            tasks = [asyncio.create_task(child()) for _ in range(4)]
+            await asyncio.sleep(0.02)
+            # 父任务占着名额时，子任务要排队等待，而不是继承父任务的名额一起发出请求
+            self.assertEqual(max_running, 0)
+        await asyncio.gather(*tasks)
+        self.assertEqual(max_running, 1)
+        self.assertEqual(scheduler.stats()["class:api"]["in_flight"], 0)
+
+    async def test_cancel_while_waiting_releases_acquired(self):
+        scheduler = new_scheduler(max_concurrency=10, api=1)
+        entered = asyncio.Event()
+        release = asyncio.Event()
+
+        async def holder():
+            async with scheduler.limit(RequestClass.API, "https://a.com"):
+                entered.set()
+                await release.wait()
+
+        holder_task = asyncio.create_task(holder())
+        await entered.wait()
+        waiter = asyncio.create_task(scheduler.acquire(RequestClass.API, "a.com"))
+        await asyncio.sleep(0.01)
+        self.assertEqual(scheduler.stats()["class:api"]["waiting"], 1)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        release.set()
+        await holder_task
+
+        stats = scheduler.stats()
+        self.assertEqual(stats["global"]["in_flight"], 0)
+        self.assertEqual(stats["class:api"]["waiting"], 0)
+        async with scheduler.limit(RequestClass.API, "https://a.com"):
+            self.assertEqual(scheduler.stats()["class:api"]["in_flight"], 1)
@@ -0,0 +1,77 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+import httpx
+
+from media_platform.douyin.client import DOUYINClient
+from tools.crawl_scheduler import CrawlScheduler, RequestClass
+from tools.httpx_client_pool import HttpxClientPool
+from var import request_keyword_var
+
+RESPONSE_DELAY = 0.2
+
+
+class FakePage:
+    async def evaluate(self, expression: str):
+        return {}
+
+
+async def fake_a_bogus(*args, **kwargs):
+    return "a_bogus"
+
+
+class TestDouYinClient(IsolatedAsyncioTestCase):
+
+    async def test_concurrent_comment_requests_overlap(self):
+        async def handler(request: httpx.Request) -> httpx.Response:
+            await asyncio.sleep(RESPONSE_DELAY)
+            aweme_id = request.url.params["aweme_id"]
+            return httpx.Response(200, json={"comments": [{"aweme_id": aweme_id}], "has_more": 0})
+
+        client = DOUYINClient(
+            headers={"User-Agent": "test", "Cookie": ""},
+            playwright_page=FakePage(),
+            cookie_dict={},
+        )
+        await client.http_client_pool.aclose()
+        client.http_client_pool = HttpxClientPool(transport=httpx.MockTransport(handler))
+        request_keyword_var.set("test")
+
+        concurrency = 5
+        # 只验证请求不会阻塞事件循环，关闭自适应限速、放开调度器的 API 并发名额，避免排队影响耗时
+        scheduler = CrawlScheduler(
+            max_concurrency=concurrency,
+            class_limits={RequestClass.API: concurrency},
+            per_host_limit=concurrency,
+            report_interval=0,
+        )
+        with patch("media_platform.douyin.client.get_a_bogus", fake_a_bogus), \
+                patch("media_platform.douyin.client.get_crawl_scheduler", lambda: scheduler), \
+                patch("config.ENABLE_RATE_LIMIT", False):
+            start = time.monotonic()
+            results = await asyncio.gather(
+                *[client.get_aweme_comments(str(aweme_id)) for aweme_id in range(concurrency)]
+            )
+            elapsed = time.monotonic() - start
+        await client.http_client_pool.aclose()
+
+        self.assertEqual(
+            [res["comments"][0]["aweme_id"] for res in results],
+            [str(aweme_id) for aweme_id in range(concurrency)],
+        )
+        # 请求串行执行需要 concurrency * RESPONSE_DELAY，真正并发时接近一个 RESPONSE_DELAY
+        self.assertLess(elapsed, RESPONSE_DELAY * concurrency / 2)
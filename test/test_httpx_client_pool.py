@@ -0,0 +1,56 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+
+from tools.httpx_client_pool import HttpxClientPool
+
+PROXY_A = {"http://": "http://127.0.0.1:8001", "https://": "http://127.0.0.1:8001"}
+PROXY_B = {"http://": "http://127.0.0.1:8002", "https://": "http://127.0.0.1:8002"}
+PROXY_C = {"http://": "http://127.0.0.1:8003", "https://": "http://127.0.0.1:8003"}
+
+
+class TestHttpxClientPool(IsolatedAsyncioTestCase):
+
+    async def test_client_is_reused_per_proxy(self):
+        pool = HttpxClientPool(PROXY_A, timeout=10)
+        client = pool.get_client(PROXY_A)
+        self.assertIs(pool.get_client(dict(PROXY_A)), client)
+        self.assertIs(pool.client, client)
+
+        pool.set_proxies(PROXY_B)
+        self.assertIsNot(pool.client, client)
+        # 换回之前用过的代理时复用原来的客户端
+        self.assertIs(pool.get_client(PROXY_A), client)
+        await pool.aclose()
+        self.assertTrue(client.is_closed)
+
+    async def test_least_recently_used_client_is_closed(self):
+        pool = HttpxClientPool(PROXY_A, max_proxy_clients=2)
+        client_a = pool.get_client(PROXY_A)
+        pool.get_client(PROXY_B)
+        pool.get_client(PROXY_C)
+        await asyncio.sleep(0)
+        self.assertTrue(client_a.is_closed)
+        self.assertIsNot(pool.get_client(PROXY_A), client_a)
+        await pool.aclose()
+
+    async def test_evicted_client_closed_after_in_flight_requests(self):
+        pool = HttpxClientPool(PROXY_A, max_proxy_clients=1)
+        async with pool.borrow(PROXY_A) as client_a:
+            pool.get_client(PROXY_B)
+            await asyncio.sleep(0)
+            # 还有请求在用，被淘汰后也不会马上关闭
+            self.assertFalse(client_a.is_closed)
+        self.assertTrue(client_a.is_closed)
+        await pool.aclose()
@@ -0,0 +1,60 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import shutil
+import unittest
+from unittest import IsolatedAsyncioTestCase
+
+from tools.js_sign_pool import JsSignError, JsSignPool
+
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"
+ZHIHU_COOKIES = "d_c0=AECXYZ1234567890|1700000000;"
+
+
+@unittest.skipIf(shutil.which("node") is None, "node is not installed")
+class TestJsSignPool(IsolatedAsyncioTestCase):
+
+    async def test_zhihu_sign_matches_execjs(self):
+        import execjs
+        with open("libs/zhihu.js", encoding="utf-8-sig") as f:
+            expected = execjs.compile(f.read()).call("get_sign", "/api/v4/search_v3?q=test", ZHIHU_COOKIES)
+
+        pool = JsSignPool("libs/zhihu.js", size=1)
+        result = await pool.sign("get_sign", "/api/v4/search_v3?q=test", ZHIHU_COOKIES)
+        await pool.close()
+        # x-zse-96 带有随机数，只比较固定部分和格式
+        self.assertEqual(result["x-zst-81"], expected["x-zst-81"])
+        self.assertTrue(result["x-zse-96"].startswith("2.0_"))
+        self.assertEqual(len(result["x-zse-96"]), len(expected["x-zse-96"]))
+
+    async def test_sign_many_keeps_order(self):
+        pool = JsSignPool("libs/douyin.js", size=2)
+        # rc4_encrypt 没有随机数，结果可以直接和逐个调用比较
+        args_list = [(f"aweme_id={i}", "key") for i in range(9)]
+        results = await pool.sign_many("rc4_encrypt", args_list)
+        self.assertEqual(results, [await pool.sign("rc4_encrypt", *args) for args in args_list])
+        self.assertEqual(len(set(results)), len(args_list))
+        await pool.close()
+
+    async def test_douyin_sign_and_worker_restart(self):
+        pool = JsSignPool("libs/douyin.js", size=1)
+        a_bogus = await pool.sign("sign_datail", "aweme_id=1&count=20", USER_AGENT)
+        self.assertIsInstance(a_bogus, str)
+        self.assertTrue(a_bogus)
+
+        with self.assertRaises(JsSignError):
+            await pool.sign("not_exists_function")
+
+        # 签名进程意外退出后，下一次调用会重新拉起
+        pool._workers[0].kill()
+        self.assertTrue(await pool.sign("sign_reply", "comment_id=1&count=20", USER_AGENT))
+        await pool.close()
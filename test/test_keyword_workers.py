@@ -0,0 +1,122 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+import tempfile
+import time
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+from async_sqlite_db import AsyncSqliteDB
+from tools import keyword_workers
+from tools.keyword_workers import (KeywordNotes, NoteKeywordIndex, close_note_keyword_indexes, run_keyword_workers,
+                                   split_keywords)
+from var import source_keyword_var
+
+
+class TestKeywordNotes(IsolatedAsyncioTestCase):
+
+    async def test_duplicate_note_merges_keywords(self):
+        notes = KeywordNotes(max_notes_count=10, budget_scope="keyword")
+        self.assertTrue(await notes.claim("n1", "a"))
+        self.assertFalse(await notes.claim("n1", "b"))
+        self.assertFalse(await notes.claim("n1", "b"))
+        self.assertEqual(notes.keywords_of("n1"), "a,b")
+
+        source_keyword_var.set("b")
+        async with notes.storing("n1"):
+            self.assertEqual(source_keyword_var.get(), "a,b")
+        self.assertEqual(source_keyword_var.get(), "b")
+
+    async def test_keywords_found_after_store_are_recorded(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db_path = os.path.join(temp_dir, "note_keyword.db")
+            with patch.object(keyword_workers, "_note_keyword_indexes", {"xhs": NoteKeywordIndex("xhs", db_path)}):
+                notes = KeywordNotes(max_notes_count=10, platform="xhs")
+                await notes.claim("n1", "a")
+                async with notes.storing("n1"):
+                    pass
+                self.assertFalse(await notes.claim("n1", "b"))
+                await close_note_keyword_indexes()
+
+            db = AsyncSqliteDB(db_path)
+            rows = await db.query("SELECT note_id, keyword FROM crawler_note_keyword ORDER BY keyword")
+            await db.close()
+        self.assertEqual([(row["note_id"], row["keyword"]) for row in rows], [("n1", "a"), ("n1", "b")])
+
+    async def test_budget_scope(self):
+        notes = KeywordNotes(max_notes_count=2, budget_scope="keyword")
+        await notes.claim("n1", "a")
+        await notes.claim("n2", "a")
+        self.assertTrue(notes.is_exhausted("a"))
+        self.assertFalse(notes.is_exhausted("b"))
+
+        notes = KeywordNotes(max_notes_count=2, budget_scope="global")
+        await notes.claim("n1", "a")
+        await notes.claim("n2", "b")
+        self.assertTrue(notes.is_exhausted("a"))
+        self.assertTrue(notes.is_exhausted("c"))
+
+    async def test_budget_counts_only_stored_notes(self):
+        notes = KeywordNotes(max_notes_count=2, budget_scope="keyword")
+        await notes.claim("n1", "a")
+        await notes.claim("n2", "a")
+        waiter = asyncio.create_task(notes.wait_budget("a"))
+        await asyncio.sleep(0.01)
+        # 两个帖子都还在处理，占着名额
+        self.assertFalse(waiter.done())
+
+        async with notes.storing("n1"):
+            pass
+        with self.assertRaises(ValueError):
+            async with notes.storing("n2"):
+                raise ValueError("store failed")
+        # 存储失败的帖子不计数，名额释放出来
+        self.assertTrue(await waiter)
+        await notes.claim("n3", "a")
+        await notes.release("n3")
+        self.assertTrue(await notes.wait_budget("a"))
+
+        await notes.claim("n4", "a")
+        async with notes.storing("n4"):
+            pass
+        self.assertFalse(await notes.wait_budget("a"))
+
+    def test_split_keywords(self):
+        self.assertEqual(split_keywords(" a, b,,a ,c"), ["a", "b", "c"])
+
+
+class TestRunKeywordWorkers(IsolatedAsyncioTestCase):
+
+    async def test_keywords_run_concurrently_with_own_context(self):
+        seen = {}
+
+        async def search_keyword(keyword: str):
+            await asyncio.sleep(0.02)
+            seen[keyword] = source_keyword_var.get()
+
+        start = time.monotonic()
+        await run_keyword_workers(["a", "b", "c", "d"], search_keyword, workers=4)
+        self.assertLess(time.monotonic() - start, 4 * 0.02 * 0.6)
+        self.assertEqual(seen, {"a": "a", "b": "b", "c": "c", "d": "d"})
+
+    async def test_error_does_not_stop_other_keywords(self):
+        finished = []
+
+        async def search_keyword(keyword: str):
+            if keyword == "a":
+                raise ValueError("blocked")
+            finished.append(keyword)
+
+        await run_keyword_workers(["a", "b", "c"], search_keyword, workers=1)
+        self.assertEqual(finished, ["b", "c"])
@@ -0,0 +1,95 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import os
+import re
+import tempfile
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+import httpx
+
+from tools.media_downloader import MANIFEST_FILE_SUFFIX, TEMP_FILE_SUFFIX, ranged_download, stream_download
+
+
+class TestMediaDownloader(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.content = os.urandom(300 * 1024)
+
+        self.requested_ranges = []
+        self.fail_range_start = None
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.path == "/missing":
+                return httpx.Response(404)
+            match = re.match(r"bytes=(\d+)-(\d+)", request.headers.get("Range", ""))
+            if not match or request.url.path == "/no-range":
+                return httpx.Response(200, content=self.content)
+            start, end = int(match.group(1)), int(match.group(2))
+            self.requested_ranges.append((start, end))
+            if start == self.fail_range_start:
+                self.fail_range_start = None
+                raise httpx.ReadError("connection reset")
+            return httpx.Response(206, content=self.content[start:end + 1], headers={
+                "Content-Range": f"bytes {start}-{end}/{len(self.content)}"
+            })
+
+        self.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+        self.tmp_dir.cleanup()
+
+    async def test_download_in_chunks(self):
+        save_file_name = os.path.join(self.tmp_dir.name, "note", "0.mp4")
+        ok = await stream_download(self.client, "https://example.com/video.mp4", save_file_name, chunk_size=64 * 1024)
+        self.assertTrue(ok)
+        with open(save_file_name, "rb") as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertFalse(os.path.exists(save_file_name + TEMP_FILE_SUFFIX))
+
+    async def test_failed_download_leaves_no_file(self):
+        save_file_name = os.path.join(self.tmp_dir.name, "0.jpg")
+        ok = await stream_download(self.client, "https://example.com/missing", save_file_name)
+        self.assertFalse(ok)
+        self.assertFalse(os.path.exists(save_file_name))
+        self.assertFalse(os.path.exists(save_file_name + TEMP_FILE_SUFFIX))
+
+    @patch("config.MEDIA_RANGE_MIN_SIZE", 1024)
+    @patch("config.MEDIA_RANGE_RETRIES", 0)
+    async def test_ranged_download_resumes_failed_part(self):
+        save_file_name = os.path.join(self.tmp_dir.name, "video.mp4")
+        # 第二个分段第一次请求时连接断开，本次下载失败，保留临时文件和清单
+        self.fail_range_start = 100 * 1024
+        ok = await ranged_download(self.client, "https://example.com/video.mp4", save_file_name, connections=3)
+        self.assertFalse(ok)
+        self.assertTrue(os.path.exists(save_file_name + MANIFEST_FILE_SUFFIX))
+
+        # 再次下载只请求没有完成的分段
+        self.requested_ranges.clear()
+        ok = await ranged_download(self.client, "https://example.com/video.mp4", save_file_name, connections=3)
+        self.assertTrue(ok)
+        self.assertEqual(self.requested_ranges, [(0, 0), (100 * 1024, 200 * 1024 - 1)])
+        with open(save_file_name, "rb") as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertFalse(os.path.exists(save_file_name + TEMP_FILE_SUFFIX))
+        self.assertFalse(os.path.exists(save_file_name + MANIFEST_FILE_SUFFIX))
+
+    @patch("config.MEDIA_RANGE_MIN_SIZE", 1024)
+    async def test_ranged_download_falls_back_without_range_support(self):
+        save_file_name = os.path.join(self.tmp_dir.name, "video.mp4")
+        ok = await ranged_download(self.client, "https://example.com/no-range", save_file_name, connections=3)
+        self.assertTrue(ok)
+        with open(save_file_name, "rb") as f:
+            self.assertEqual(f.read(), self.content)
@@ -0,0 +1,75 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+import tempfile
+from unittest import IsolatedAsyncioTestCase
+
+from tools.media_store import MediaStore
+
+
+class TestMediaStore(IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.downloads = []
+        self.store = self.new_store()
+
+    def new_store(self) -> MediaStore:
+        return MediaStore(
+            "xhs", asset_dir=os.path.join(self.tmp_dir.name, "assets"),
+            db_path=os.path.join(self.tmp_dir.name, "media_store.db"), enabled=True, verify_hash=True
+        )
+
+    async def asyncTearDown(self):
+        await self.store.close()
+        self.tmp_dir.cleanup()
+
+    def note_file(self, note_id: str, name: str) -> str:
+        return os.path.join(self.tmp_dir.name, "images", note_id, name)
+
+    async def download(self, save_file_name: str) -> bool:
+        self.downloads.append(save_file_name)
+        await asyncio.sleep(0.01)
+        os.makedirs(os.path.dirname(save_file_name), exist_ok=True)
+        with open(save_file_name, "wb") as f:
+            f.write(b"image-bytes")
+        return True
+
+    async def test_same_asset_downloaded_once_across_notes(self):
+        results = await asyncio.gather(
+            self.store.fetch("n1", "trace/abc", self.note_file("n1", "0.jpg"), self.download),
+            self.store.fetch("n2", "trace/abc", self.note_file("n2", "3.jpg"), self.download),
+        )
+        self.assertEqual(results, [True, True])
+        self.assertEqual(len(self.downloads), 1)
+        self.assertTrue(os.path.samefile(self.note_file("n1", "0.jpg"), self.note_file("n2", "3.jpg")))
+        assets = await self.store.note_assets("n2")
+        self.assertEqual([asset["asset_id"] for asset in assets], ["trace/abc"])
+        # 资源都处理完后不再保留锁
+        self.assertEqual(self.store._asset_locks, {})
+
+    async def test_existing_asset_skipped_on_next_run_unless_corrupted(self):
+        await self.store.fetch("n1", "abc", self.note_file("n1", "0.jpg"), self.download)
+        await self.store.close()
+
+        self.store = self.new_store()
+        await self.store.fetch("n1", "abc", self.note_file("n1", "0.jpg"), self.download)
+        self.assertEqual(len(self.downloads), 1)
+        self.assertEqual(self.store.skipped, 1)
+
+        # 文件内容被改坏时 sha256 校验失败，重新下载
+        with open(self.downloads[0], "wb") as f:
+            f.write(b"broken-byte")
+        await self.store.fetch("n1", "abc", self.note_file("n1", "0.jpg"), self.download)
+        self.assertEqual(len(self.downloads), 2)
@@ -0,0 +1,74 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+from tools.rate_limiter import AdaptiveTokenBucket, RateLimiter
+
+
+class BlockedError(Exception):
+    pass
+
+
+def new_bucket(rate: float = 10.0, burst: float = 1) -> AdaptiveTokenBucket:
+    return AdaptiveTokenBucket(rate=rate, burst=burst, min_rate=0.5, max_rate=20,
+                               increase_step=1, decrease_factor=0.5, success_threshold=3)
+
+
+class TestAdaptiveTokenBucket(IsolatedAsyncioTestCase):
+
+    async def test_acquire_is_paced_by_rate(self):
+        bucket = new_bucket(rate=20)
+        start = time.monotonic()
+        await asyncio.gather(*[bucket.acquire() for _ in range(5)])
+        # 容量为 1，第一个请求不等待，后面 4 个请求按 20 次/秒排队
+        self.assertAlmostEqual(time.monotonic() - start, 0.2, delta=0.08)
+
+    def test_aimd(self):
+        bucket = new_bucket(rate=10)
+        for _ in range(6):
+            bucket.on_success()
+        self.assertEqual(bucket.rate, 12)
+        bucket.on_failure()
+        self.assertEqual(bucket.rate, 6)
+        for _ in range(10):
+            bucket.on_failure()
+        self.assertEqual(bucket.rate, 0.5)
+
+
+class TestRateLimiter(IsolatedAsyncioTestCase):
+
+    async def test_limit_adjusts_rate_per_endpoint(self):
+        limiter = RateLimiter("test", throttle_errors=(BlockedError,))
+        with patch("config.RATE_LIMIT_INITIAL_RATE", 10), patch("config.RATE_LIMIT_SUCCESS_THRESHOLD", 2), \
+                patch("config.RATE_LIMIT_INCREASE_STEP", 1), patch("config.RATE_LIMIT_BURST", 10), \
+                patch("config.RATE_LIMIT_MAX_RATE", 20):
+            for _ in range(2):
+                async with limiter.limit("https://example.com/api/search?page=1", "proxy_a"):
+                    pass
+            with self.assertRaises(BlockedError):
+                async with limiter.limit("https://example.com/api/comments?page=1", "proxy_a"):
+                    raise BlockedError()
+            async with limiter.limit("https://example.com/api/comments?page=2", "proxy_b") as slot:
+                slot.throttled()
+            with self.assertRaises(ValueError):
+                async with limiter.limit("https://example.com/api/comments?page=3", "proxy_b"):
+                    raise ValueError()
+
+        self.assertEqual(limiter.get_bucket("https://example.com/api/search", "proxy_a").rate, 11)
+        self.assertEqual(limiter.get_bucket("https://example.com/api/comments", "proxy_a").rate, 5)
+        comments_b = limiter.get_bucket("https://example.com/api/comments", "proxy_b")
+        # 不是限流信号的异常既不算成功也不算失败
+        self.assertEqual((comments_b.rate, comments_b.successes, comments_b.failures), (5, 0, 1))
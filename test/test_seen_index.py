@@ -0,0 +1,61 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import time
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+from tools.seen_index import SeenIndex, SeenKind
+
+
+class TestSeenIndex(IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, "seen_index.db")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    async def test_seen_ids_persist_across_runs(self):
+        seen_index = SeenIndex("xhs", db_path=self.db_path, fresh_hours=1, enabled=True)
+        self.assertFalse(await seen_index.is_fresh(SeenKind.COMMENTS, "n1"))
+        await seen_index.mark(SeenKind.COMMENTS, "n1")
+        self.assertTrue(await seen_index.is_fresh(SeenKind.COMMENTS, "n1"))
+        self.assertFalse(await seen_index.is_fresh(SeenKind.DETAIL, "n1"))
+        await seen_index.close()
+
+        seen_index = SeenIndex("xhs", db_path=self.db_path, fresh_hours=1, enabled=True)
+        self.assertTrue(await seen_index.is_fresh(SeenKind.COMMENTS, "n1"))
+        other_platform = SeenIndex("dy", db_path=self.db_path, fresh_hours=1, enabled=True)
+        self.assertFalse(await other_platform.is_fresh(SeenKind.COMMENTS, "n1"))
+        await seen_index.close()
+        await other_platform.close()
+
+    async def test_expired_records_are_fetched_again(self):
+        seen_index = SeenIndex("xhs", db_path=self.db_path, fresh_hours=1, enabled=True)
+        await seen_index.mark(SeenKind.DETAIL, "n1")
+        with patch("tools.seen_index.time.time", return_value=time.time() + 2 * 3600):
+            self.assertFalse(await seen_index.is_fresh(SeenKind.DETAIL, "n1"))
+        await seen_index.close()
+
+    async def test_disabled_and_in_memory_modes(self):
+        disabled = SeenIndex("xhs", db_path=self.db_path, fresh_hours=1, enabled=False)
+        await disabled.mark(SeenKind.DETAIL, "n1")
+        self.assertFalse(await disabled.is_fresh(SeenKind.DETAIL, "n1"))
+
+        in_memory = SeenIndex("xhs", db_path=self.db_path, fresh_hours=0, enabled=True)
+        await in_memory.mark(SeenKind.DETAIL, "n1")
+        self.assertTrue(await in_memory.is_fresh(SeenKind.DETAIL, "n1"))
+        self.assertFalse(os.path.exists(self.db_path))
@@ -0,0 +1,108 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+from tools.crawl_scheduler import CrawlScheduler, RequestClass
+from tools.sub_comments import SubCommentBudget, expand_sub_comments
+
+
+def new_scheduler(api: int) -> CrawlScheduler:
+    return CrawlScheduler(
+        max_concurrency=10,
+        class_limits={RequestClass.API: api},
+        per_host_limit=10,
+        report_interval=0,
+    )
+
+
+class TestSubCommentBudget(IsolatedAsyncioTestCase):
+
+    def test_take_and_pages(self):
+        budget = SubCommentBudget(max_count=5, max_pages=2)
+        self.assertTrue(budget.page_allowed(1))
+        self.assertFalse(budget.page_allowed(2))
+        self.assertEqual(budget.take([1, 2, 3]), [1, 2, 3])
+        self.assertEqual(budget.take([4, 5, 6]), [4, 5])
+        self.assertTrue(budget.exhausted)
+        self.assertFalse(budget.page_allowed(0))
+        self.assertEqual(budget.take([7]), [])
+
+    def test_unlimited(self):
+        budget = SubCommentBudget(max_count=0, max_pages=0)
+        self.assertEqual(budget.take(list(range(1000))), list(range(1000)))
+        self.assertFalse(budget.exhausted)
+        self.assertTrue(budget.page_allowed(10000))
+
+
+class TestExpandSubComments(IsolatedAsyncioTestCase):
+
+    async def test_roots_expand_concurrently_in_order(self):
+        budget = SubCommentBudget(max_count=0, max_pages=1, host="https://a.com")
+        running = 0
+        max_running = 0
+
+        async def expand(root: int):
+            nonlocal running, max_running
+            async with budget.page_limit():
+                running += 1
+                max_running = max(max_running, running)
+                await asyncio.sleep(0.02)
+                running -= 1
+            return [f"{root}-{i}" for i in range(2)]
+
+        scheduler = new_scheduler(api=4)
+        start = time.monotonic()
+        with patch("tools.sub_comments.get_crawl_scheduler", lambda: scheduler):
+            result = await expand_sub_comments(list(range(8)), expand, budget)
+        self.assertLess(time.monotonic() - start, 8 * 0.02 * 0.6)
+        # 同时翻页的数量由调度器的 API 名额控制
+        self.assertEqual(max_running, 4)
+        self.assertEqual(result, [f"{root}-{i}" for root in range(8) for i in range(2)])
+
+    async def test_budget_stops_remaining_roots(self):
+        budget = SubCommentBudget(max_count=3, max_pages=0, host="https://a.com")
+        expanded = []
+
+        async def expand(root: int):
+            async with budget.page_limit():
+                if not budget.page_allowed(0):
+                    return []
+                expanded.append(root)
+                await asyncio.sleep(0.01)
+                return budget.take([root, root])
+
+        scheduler = new_scheduler(api=1)
+        with patch("tools.sub_comments.get_crawl_scheduler", lambda: scheduler):
+            result = await expand_sub_comments(list(range(5)), expand, budget)
+        self.assertEqual(result, [0, 0, 1])
+        # 排队等名额的一级评论在拿到名额时发现配额已经用完，不再发出请求
+        self.assertEqual(expanded, [0, 1])
+        self.assertEqual(scheduler.stats()["class:api"]["in_flight"], 0)
+
+    async def test_error_is_raised_after_other_roots_finish(self):
+        budget = SubCommentBudget(max_count=0, max_pages=0)
+        finished = []
+
+        async def expand(root: int):
+            if root == 0:
+                raise ValueError("blocked")
+            await asyncio.sleep(0.01)
+            finished.append(root)
+            return [root]
+
+        with self.assertRaises(ValueError):
+            await expand_sub_comments(list(range(3)), expand, budget)
+        self.assertEqual(sorted(finished), [1, 2])
@@ -0,0 +1,85 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import asyncio
+import contextvars
+from typing import Dict, List
+from unittest import IsolatedAsyncioTestCase
+
+from base.base_crawler import AbstractStore
+from store.write_behind import WriteBehindQueue, WriteBehindStore
+
+
+crawler_type_var: contextvars.ContextVar = contextvars.ContextVar("crawler_type", default="")
+
+
+class RecordStore(AbstractStore):
+    def __init__(self, delay: float = 0):
+        self.delay = delay
+        self.calls = []
+
+    async def store_content(self, content_item: Dict):
+        await asyncio.sleep(self.delay)
+        self.calls.append(("content", content_item["id"]))
+
+    async def store_comment(self, comment_item: Dict):
+        self.calls.append(("comment", comment_item["id"]))
+
+    async def store_comments(self, comment_items: List[Dict]):
+        self.calls.append(("comments", [item["id"] for item in comment_items]))
+
+    async def store_creator(self, creator: Dict):
+        self.calls.append(("creator", creator["id"], crawler_type_var.get()))
+
+
+class TestWriteBehindQueue(IsolatedAsyncioTestCase):
+
+    async def test_comments_are_batched_and_order_is_kept(self):
+        queue = WriteBehindQueue(max_size=100, batch_size=100, report_interval=0)
+        real_store = RecordStore()
+        store = WriteBehindStore(real_store, queue)
+        await store.store_content({"id": 1})
+        await store.store_comments([{"id": i} for i in range(5)])
+        await store.store_creator({"id": 9})
+        await queue.close()
+
+        self.assertEqual(real_store.calls[0], ("content", 1))
+        self.assertEqual(real_store.calls[-1], ("creator", 9, ""))
+        written_comments = []
+        for kind, ids in real_store.calls[1:-1]:
+            written_comments.extend(ids if kind == "comments" else [ids])
+        self.assertEqual(written_comments, list(range(5)))
+        self.assertEqual(queue.stats()["written"], 7)
+        self.assertEqual(queue.stats()["depth"], 0)
+
+    async def test_full_queue_applies_backpressure(self):
+        queue = WriteBehindQueue(max_size=2, batch_size=1, report_interval=0)
+        real_store = RecordStore(delay=0.01)
+        store = WriteBehindStore(real_store, queue)
+        for i in range(10):
+            await store.store_content({"id": i})
+            self.assertLessEqual(queue.depth, 2)
+        await queue.close()
+        self.assertEqual([item_id for _, item_id in real_store.calls], list(range(10)))
+        self.assertGreater(queue.stats()["backpressure_waits"], 0)
+
+    async def test_drain_writes_pending_items_in_worker_context(self):
+        queue = WriteBehindQueue(max_size=100, batch_size=100, report_interval=0)
+        real_store = RecordStore()
+        store = WriteBehindStore(real_store, queue)
+        crawler_type_var.set("search")
+        # 写入任务还没来得及调度，数据都还在队列里
+        await store.store_creator({"id": 1})
+        await store.store_creator({"id": 2})
+        crawler_type_var.set("detail")
+        queue.drain_pending_sync()
+        self.assertEqual(real_store.calls, [("creator", 1, "search"), ("creator", 2, "search")])
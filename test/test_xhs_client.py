@@ -0,0 +1,47 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+from unittest import IsolatedAsyncioTestCase
+
+from media_platform.xhs.client import XiaoHongShuClient
+
+X_S = "XYW_" + "eyJzaWduU3ZuIjoiNTYiLCJzaWduVHlwZSI6IngyIiwiYXBwSWQiOiJ4aHMtcGMtd2ViIn0"
+
+
+class FakePage:
+    def __init__(self):
+        self.evaluate_args = []
+
+    async def evaluate(self, expression: str, arg=None):
+        self.evaluate_args.append(arg)
+        url, data, refresh_b1 = arg
+        return {"X-s": X_S, "X-t": 1700000000000, "b1": "b1_value" if refresh_b1 else None}
+
+
+class TestXiaoHongShuClient(IsolatedAsyncioTestCase):
+
+    async def test_pre_headers_signs_with_one_evaluate_and_caches_b1(self):
+        page = FakePage()
+        client = XiaoHongShuClient(headers={}, playwright_page=page, cookie_dict={"a1": "a1_value"})
+        for _ in range(3):
+            headers = await client._pre_headers("/api/sns/web/v1/search/notes", {"keyword": "test"})
+            self.assertEqual(headers["X-S"], X_S)
+            self.assertEqual(headers["X-T"], "1700000000000")
+
+        # 每次签名只有一次 evaluate，b1 只在第一次读取
+        self.assertEqual([arg[2] for arg in page.evaluate_args], [True, False, False])
+        self.assertEqual(client.get_sign_stats()["count"], 3)
+
+        client.invalidate_sign_cache()
+        await client._pre_headers("/api/sns/web/v1/feed")
+        self.assertTrue(page.evaluate_args[-1][2])
+        await client.http_client_pool.aclose()
@@ -0,0 +1,96 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import random
+import unittest
+
+from media_platform.xhs import help as xhs_help
+from test import xhs_sign_reference as reference
+
+try:
+    from hypothesis import given, settings
+    from hypothesis import strategies as st
+except ImportError:
+    given = None
+
+X_S = "XYW_eyJzaWduU3ZuIjoiNTYiLCJzaWduVHlwZSI6IngyIiwiYXBwSWQiOiJ4aHMtcGMtd2ViIiwic2lnblZlcnNpb24iOiIxIn0="
+
+
+def random_text(rng: random.Random, max_code_point: int, min_len: int = 0, max_len: int = 100) -> str:
+    chars = []
+    for _ in range(rng.randint(min_len, max_len)):
+        code_point = rng.randint(0, max_code_point)
+        # 跳过代理区，单独的代理字符无法编码成 UTF-8
+        chars.append(chr(code_point if not 0xD800 <= code_point <= 0xDFFF else 0x20))
+    return "".join(chars)
+
+
+class TestXhsSignEquivalence(unittest.TestCase):
+    """
+    优化后的签名函数与原始实现（test/xhs_sign_reference.py）逐位比较
+    """
+
+    def setUp(self):
+        self.rng = random.Random(20240601)
+
+    def test_mrc(self):
+        for _ in range(1000):
+            text = random_text(self.rng, 0xFF, min_len=57, max_len=200)
+            self.assertEqual(xhs_help.mrc(text), reference.mrc(text))
+
+    def test_encode_utf8(self):
+        for max_code_point in (0x7F, 0xFFFF, 0x10FFFF):
+            for _ in range(300):
+                text = random_text(self.rng, max_code_point)
+                self.assertEqual(xhs_help.encodeUtf8(text), reference.encodeUtf8(text))
+
+    def test_b64_encode(self):
+        for _ in range(1000):
+            data = [self.rng.randint(0, 255) for _ in range(self.rng.randint(0, 200))]
+            self.assertEqual(xhs_help.b64Encode(data), reference.b64Encode(data))
+            self.assertEqual(xhs_help.b64Encode(bytes(data)), reference.b64Encode(data))
+
+    def test_sign(self):
+        for seed in range(50):
+            args = dict(a1=random_text(self.rng, 0x7F, 52, 52), b1=random_text(self.rng, 0xFFFF, 0, 80),
+                        x_s=X_S, x_t=str(1700000000000 + seed))
+            random.seed(seed)
+            result = xhs_help.sign(**args)
+            random.seed(seed)
+            self.assertEqual(result, reference.sign(**args))
+
+    def test_search_id(self):
+        random.seed(1)
+        search_id = xhs_help.get_search_id()
+        random.seed(1)
+        self.assertEqual(len(search_id), len(reference.get_search_id()))
+        for number in (0, 35, 36, -36, 2 ** 64 + 12345, self.rng.getrandbits(128)):
+            self.assertEqual(xhs_help.base36encode(number), reference.base36encode(number))
+
+
+@unittest.skipIf(given is None, "hypothesis is not installed")
+class TestXhsSignProperties(unittest.TestCase):
+    if given is not None:
+        @settings(max_examples=300, deadline=None)
+        @given(st.text(alphabet=st.characters(max_codepoint=0xFF), min_size=57))
+        def test_mrc(self, text):
+            self.assertEqual(xhs_help.mrc(text), reference.mrc(text))
+
+        @settings(max_examples=300, deadline=None)
+        @given(st.text())
+        def test_encode_utf8(self, text):
+            self.assertEqual(xhs_help.encodeUtf8(text), reference.encodeUtf8(text))
+
+        @settings(max_examples=300, deadline=None)
+        @given(st.binary())
+        def test_b64_encode(self, data):
+            self.assertEqual(xhs_help.b64Encode(data), reference.b64Encode(list(data)))
@@ -0,0 +1,47 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 小红书签名函数的基准测试，需要安装 pytest-benchmark
+#            运行方式：python -m pytest test/test_xhs_sign_benchmark.py --benchmark-group-by=func
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from media_platform.xhs import help as xhs_help
+from test import xhs_sign_reference as reference
+
+IMPLEMENTATIONS = {"reference": reference, "optimized": xhs_help}
+A1 = "18f8a9c1b2dxkq0w9z5l2b3n4m5p6q7r8s9t0u1v2w3x4y5z6a7b8"
+B1 = "I38rHdgsjopgIvesdVwgIC+oIELmBZ5e3VwXLgFTIxS3bqwErFeexd0ekncAzMFYnqthIhJeSnMDKutRI3KsYorWHPtGrbV0P9WfIi/eWc6eYqtyQApPI37ekmR6QL+5Ii6sdneeSfqYHqwl2qt5B0DBIx+PGDi/sVtkIxdsxuwr4qtiIhuaIE3e3LV0I3VTIC7e0utl2ADmsLveDSKsSPw5IEvsiVtJOqw8BuwfPpdeTFWOIx4TIiu6ZPwrPut5IvlaLbgs3qtxIxes1VwHIkumIkIyejgsY/WTge7eSqte/D7sDcpipedeYrDtIC6eDVw2IENsSqtlnlSuNjVtIvoekqt3cZ7sVo4gIESyIhE+QutCIipPQPwDNqtwIhYGIiu5ZPwoBqtWIkvsxVwXIEuEIE0s1MYsi0oeDptqIkee3L/eDbgeiqtvIiVHIxuhIhdsxuwCIvuq/pTzIiesjgeeeqw02qwLIhiD2UvewVw+KMvekduoeVtgtqwyIhHz2ed29utxmSg/IkesYqt3Ih6sWU6sfzAeWI6eHqtNIhV88PtlICi2PIt6IxEZIvvsDqtAIi+VIkvswU6sfuwZZVtUIhvsiVwWIkkcIiWjaPt1IhAs2Pwe1Po+/aoeSVwBIvmNaqtWbnD="
+X_S = "XYW_eyJzaWduU3ZuIjoiNTYiLCJzaWduVHlwZSI6IngyIiwiYXBwSWQiOiJ4aHMtcGMtd2ViIiwic2lnblZlcnNpb24iOiIxIiwicGF5bG9hZCI6IjBlNGJlYzgzIn0="
+X_T = "1700000000000"
+
+
+@pytest.mark.parametrize("impl", IMPLEMENTATIONS.keys())
+def test_sign(benchmark, impl):
+    benchmark(IMPLEMENTATIONS[impl].sign, a1=A1, b1=B1, x_s=X_S, x_t=X_T)
+
+
+@pytest.mark.parametrize("impl", IMPLEMENTATIONS.keys())
+def test_mrc(benchmark, impl):
+    benchmark(IMPLEMENTATIONS[impl].mrc, X_T + X_S + B1)
+
+
+@pytest.mark.parametrize("impl", IMPLEMENTATIONS.keys())
+def test_b64_encode(benchmark, impl):
+    data = IMPLEMENTATIONS[impl].encodeUtf8(X_S + B1)
+    benchmark(IMPLEMENTATIONS[impl].b64Encode, data)
+
+
+@pytest.mark.parametrize("impl", IMPLEMENTATIONS.keys())
+def test_get_search_id(benchmark, impl):
+    benchmark(IMPLEMENTATIONS[impl].get_search_id)
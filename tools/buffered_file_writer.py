@@ -0,0 +1,364 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 长驻内存的缓冲写文件工具，避免每写一条数据都打开、读取、重写整个文件
+
+import asyncio
+import csv
+import io
+import json
+import os
+import pathlib
+import time
+from typing import Dict, List, Optional
+
+from tools import utils
+
+
+class BufferedFileWriter:
+    """
+    缓冲写文件对象，同一个文件路径在进程内只打开一次文件句柄
+    写入的数据先放在内存缓冲区中，缓冲区大小超过 flush_bytes 或者距离上次落盘超过 flush_interval 秒时才真正写入磁盘；
+    在事件循环中写入时，缓冲区里有数据后会挂一个 flush_interval 秒的定时器，之后没有新的写入也会按时落盘
+    """
+    _writers: Dict[str, "BufferedFileWriter"] = {}
+
+    def __init__(self, file_path: str, flush_bytes: int = 1024 * 1024, flush_interval: float = 3.0,
+                 encoding: str = "utf-8"):
+        self.file_path = file_path
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.encoding = encoding
+        self._buffer: List[str] = []
+        self._buffer_size = 0
+        self._last_flush_time = time.monotonic()
+        self._flush_timer: Optional[asyncio.TimerHandle] = None
+        pathlib.Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+        self._fp = open(file_path, mode="a", encoding=encoding, newline="")
+
+    @classmethod
+    def get_writer(cls, file_path: str, **kwargs) -> "BufferedFileWriter":
+        """
+        获取指定路径的写文件对象，不存在则创建
+        Args:
+            file_path: 文件路径
+            **kwargs: 创建写文件对象时的参数
+
+        Returns:
+
+        """
+        writer = BufferedFileWriter._writers.get(file_path)
+        if writer is None or writer.closed:
+            writer = cls(file_path, **kwargs)
+            BufferedFileWriter._writers[file_path] = writer
+        return writer
+
+    @property
+    def closed(self) -> bool:
+        return self._fp.closed
+
+    def write(self, text: str):
+        """
+        写入一段文本到缓冲区，满足落盘条件时写入磁盘
+        Args:
+            text: 文本内容
+
+        Returns:
+
+        """
+        self._buffer.append(text)
+        self._buffer_size += len(text)
+        if self._buffer_size >= self.flush_bytes or time.monotonic() - self._last_flush_time >= self.flush_interval:
+            self.flush()
+        else:
+            self._arm_flush_timer()
+
+    def _arm_flush_timer(self):
+        """
+        缓冲区里有数据时挂一个定时落盘的回调，没有运行中的事件循环时只在 write 里按时间判断
+        """
+        if self._flush_timer is not None or self.flush_interval <= 0:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._flush_timer = loop.call_later(self.flush_interval, self._flush_on_timer)
+
+    def _flush_on_timer(self):
+        self._flush_timer = None
+        if self.closed:
+            return
+        try:
+            self.flush()
+        except Exception as e:
+            utils.logger.error(f"[BufferedFileWriter._flush_on_timer] flush {self.file_path} error: {e}")
+
+    def flush(self):
+        """
+        将缓冲区中的数据写入磁盘
+        Returns:
+
+        """
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if self._buffer:
+            self._fp.write("".join(self._buffer))
+            self._buffer.clear()
+            self._buffer_size = 0
+        self._fp.flush()
+        self._last_flush_time = time.monotonic()
+
+    def close(self):
+        """
+        落盘并关闭文件句柄
+        Returns:
+
+        """
+        if self.closed:
+            return
+        self.flush()
+        self._fp.close()
+        BufferedFileWriter._writers.pop(self.file_path, None)
+
+    @classmethod
+    def close_all(cls):
+        """
+        关闭进程内所有打开的写文件对象，程序退出时调用
+        Returns:
+
+        """
+        for writer in list(BufferedFileWriter._writers.values()):
+            try:
+                writer.close()
+            except Exception as e:
+                utils.logger.error(f"[BufferedFileWriter.close_all] close {writer.file_path} error: {e}")
+
+
+class JsonlFileWriter(BufferedFileWriter):
+    """
+    JSON Lines 格式的写文件对象，每条数据占一行，只追加不重写
+    """
+
+    def __init__(self, file_path: str, export_json_on_close: bool = False, **kwargs):
+        super().__init__(file_path, **kwargs)
+        self.export_json_on_close = export_json_on_close
+
+    def write_item(self, item: Dict):
+        """
+        写入一条数据
+        Args:
+            item: 数据字典
+
+        Returns:
+
+        """
+        self.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+    def close(self):
+        if self.closed:
+            return
+        super().close()
+        if self.export_json_on_close:
+            json_file_path = os.path.splitext(self.file_path)[0] + ".json"
+            convert_jsonl_to_json(self.file_path, json_file_path)
+            utils.logger.info(f"[JsonlFileWriter.close] export {self.file_path} to {json_file_path}")
+
+
+class CsvFileWriter:
+    """
+    CSV 格式的写文件对象，同一个文件前缀（一般对应 crawler_type + store_type）在进程内只保留一个文件句柄
+    文件名会自动加上日期后缀，日期变化时切换到新文件；设置了 max_bytes 时单个文件超过该大小也会切换到新的分片文件
+    """
+    _writers: Dict[str, "CsvFileWriter"] = {}
+
+    def __init__(self, file_prefix: str, max_bytes: int = 0, roll_by_date: bool = True,
+                 encoding: str = "utf-8-sig", **kwargs):
+        """
+        Args:
+            file_prefix: 文件路径前缀，例如 data/xhs/1_search_comments
+            max_bytes: 单个文件的最大字节数，超过后切换到新的分片文件，0 表示不按大小切分
+            roll_by_date: 是否在文件名中加上日期并按天切换文件
+            encoding: 文件编码，默认带 BOM 方便 Excel 直接打开
+            **kwargs: 传给 BufferedFileWriter 的缓冲参数
+        """
+        self.file_prefix = file_prefix
+        self.max_bytes = max_bytes
+        self.roll_by_date = roll_by_date
+        self.encoding = encoding
+        self.buffer_kwargs = kwargs
+        self._writer: Optional[BufferedFileWriter] = None
+        self._date = ""
+        self._part = 0
+        self._file_size = 0
+        self._row_buffer = io.StringIO()
+        self._csv_writer = csv.writer(self._row_buffer)
+
+    @classmethod
+    def get_writer(cls, file_prefix: str, **kwargs) -> "CsvFileWriter":
+        """
+        获取指定文件前缀的写文件对象，不存在则创建
+        Args:
+            file_prefix: 文件路径前缀
+            **kwargs: 创建写文件对象时的参数
+
+        Returns:
+
+        """
+        writer = CsvFileWriter._writers.get(file_prefix)
+        if writer is None:
+            writer = cls(file_prefix, **kwargs)
+            CsvFileWriter._writers[file_prefix] = writer
+        return writer
+
+    @property
+    def file_path(self) -> Optional[str]:
+        return self._writer.file_path if self._writer is not None else None
+
+    def _make_file_path(self) -> str:
+        file_path = self.file_prefix
+        if self.roll_by_date:
+            file_path += f"_{self._date}"
+        if self._part:
+            file_path += f"_part{self._part}"
+        return file_path + ".csv"
+
+    def _open(self):
+        """
+        打开当前日期、分片对应的文件，已经写满的分片会被跳过
+        """
+        while True:
+            file_path = self._make_file_path()
+            file_size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+            if not self.max_bytes or file_size < self.max_bytes:
+                break
+            self._part += 1
+        self._writer = BufferedFileWriter(file_path, encoding=self.encoding, **self.buffer_kwargs)
+        self._file_size = file_size
+
+    def _roll_if_needed(self):
+        """
+        日期变化或者文件大小超过限制时关闭当前文件，下次写入时打开新文件
+        """
+        if self.roll_by_date:
+            today = utils.get_current_date()
+            if today != self._date:
+                self._close_current()
+                self._date = today
+                self._part = 0
+        if self.max_bytes and self._writer is not None and self._file_size >= self.max_bytes:
+            self._close_current()
+            self._part += 1
+
+    def _close_current(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def _format_row(self, values) -> str:
+        self._row_buffer.seek(0)
+        self._row_buffer.truncate()
+        self._csv_writer.writerow(values)
+        return self._row_buffer.getvalue()
+
+    def write_row(self, item: Dict):
+        """
+        写入一条数据，新文件会先写入表头（item 的 key）
+        Args:
+            item: 数据字典
+
+        Returns:
+
+        """
+        self._roll_if_needed()
+        if self._writer is None:
+            self._open()
+            if self._file_size == 0:
+                self._write_text(self._format_row(item.keys()))
+        self._write_text(self._format_row(item.values()))
+
+    def _write_text(self, text: str):
+        self._writer.write(text)
+        self._file_size += len(text) if text.isascii() else len(text.encode("utf-8"))
+
+    def flush(self):
+        if self._writer is not None:
+            self._writer.flush()
+
+    def close(self):
+        """
+        落盘并关闭当前文件
+        Returns:
+
+        """
+        self._close_current()
+        CsvFileWriter._writers.pop(self.file_prefix, None)
+
+    @classmethod
+    def close_all(cls):
+        """
+        关闭进程内所有的 CSV 写文件对象
+        Returns:
+
+        """
+        for writer in list(CsvFileWriter._writers.values()):
+            try:
+                writer.close()
+            except Exception as e:
+                utils.logger.error(f"[CsvFileWriter.close_all] close {writer.file_prefix} error: {e}")
+
+
+def convert_jsonl_to_json(jsonl_file_path: str, json_file_path: Optional[str] = None) -> str:
+    """
+    将 JSON Lines 文件转换成旧版 json 存储格式（indent=4 的 json 数组），逐行读取，不会把整个文件加载到内存
+    Args:
+        jsonl_file_path: jsonl 文件路径
+        json_file_path: 输出的 json 文件路径，默认与 jsonl 文件同名
+
+    Returns:
+        json 文件路径
+    """
+    if not json_file_path:
+        json_file_path = os.path.splitext(jsonl_file_path)[0] + ".json"
+
+    has_item = False
+    with open(jsonl_file_path, "r", encoding="utf-8") as src, open(json_file_path, "w", encoding="utf-8") as dst:
+        for line in src:
+            line = line.strip()
+            if not line:
+                continue
+            item_str = json.dumps(json.loads(line), ensure_ascii=False, indent=4)
+            dst.write(",\n" if has_item else "[\n")
+            dst.write("\n".join("    " + row for row in item_str.split("\n")))
+            has_item = True
+        dst.write("\n]" if has_item else "[]")
+    return json_file_path
+
+
+def close_all_file_writers():
+    """
+    关闭所有的写文件对象
+    Returns:
+
+    """
+    CsvFileWriter.close_all()
+    BufferedFileWriter.close_all()
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) < 2:
+        print("usage: python -m tools.buffered_file_writer <jsonl_file_path> [json_file_path]")
+        sys.exit(1)
+    print(convert_jsonl_to_json(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None))
@@ -0,0 +1,236 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 断点续爬
+#            之前程序中途退出（验证码、代理失效、被 kill）后只能从 START_PAGE 重新开始，所有请求再来一遍；
+#            这里按平台记录爬取进度：每个关键词的页码和 search_id、每个创作者的翻页游标、每个帖子的评论游标，
+#            每次更新立即提交到 SQLite 文件，使用 --resume 启动时从记录的位置继续；
+#            爬取结束且所有记录都已完成时清空记录，不带 --resume 启动时丢弃上次的记录
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Set, Tuple
+
+import config
+from async_sqlite_db import AsyncSqliteDB
+from tools import utils
+from tools.crawl_pipeline import CrawlPipeline
+
+
+class CheckpointScope:
+    SEARCH = "search"
+    CREATOR = "creator"
+    COMMENTS = "comments"
+
+
+_CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS crawler_checkpoint (
+    platform TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    item_key TEXT NOT NULL,
+    state TEXT NOT NULL,
+    updated_at INTEGER NOT NULL,
+    PRIMARY KEY (platform, scope, item_key)
+);
+"""
+
+
+class CheckpointStore:
+    def __init__(self, platform: str, db_path: Optional[str] = None, resume: Optional[bool] = None,
+                 enabled: Optional[bool] = None):
+        """
+        Args:
+            platform: 平台名称
+            db_path: SQLite 文件路径
+            resume: 是否从上次的记录继续，False 时第一次使用会清空该平台上次的记录
+            enabled: 是否记录爬取进度
+        """
+        self.platform = platform
+        self.db_path = db_path or config.CHECKPOINT_DB_PATH
+        self.resume = config.CRAWLER_RESUME if resume is None else resume
+        self.enabled = config.ENABLE_CHECKPOINT if enabled is None else enabled
+        self._states: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._db: Optional[AsyncSqliteDB] = None
+        self._load_lock: Optional[asyncio.Lock] = None
+
+    async def _ensure_loaded(self):
+        """
+        第一次使用时建表，续爬时加载上次的记录，否则清空上次的记录
+        """
+        if self._db is not None:
+            return
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+        async with self._load_lock:
+            if self._db is not None:
+                return
+            # 每次写入都单独提交事务，程序随时退出都不会丢掉已经写入的进度
+            db = AsyncSqliteDB(self.db_path, write_batch_size=1)
+            await db.executescript(_CREATE_TABLE_SQL)
+            if self.resume:
+                rows = await db.query(
+                    "SELECT scope, item_key, state FROM crawler_checkpoint WHERE platform=?", self.platform
+                )
+                for row in rows:
+                    self._states[(row["scope"], row["item_key"])] = json.loads(row["state"])
+                utils.logger.info(f"[CheckpointStore] platform {self.platform} resume from {len(rows)} checkpoints")
+            else:
+                await db.execute("DELETE FROM crawler_checkpoint WHERE platform=?", self.platform)
+            self._db = db
+
+    async def load(self, scope: str, key: str) -> Dict[str, Any]:
+        """
+        读取记录的进度
+        Args:
+            scope: 进度类型，关键词搜索、创作者、评论
+            key: 关键词、创作者ID或帖子ID
+
+        Returns:
+            记录的进度，没有记录时返回空字典
+        """
+        if not self.enabled:
+            return {}
+        await self._ensure_loaded()
+        return dict(self._states.get((scope, str(key)), {}))
+
+    async def save(self, scope: str, key: str, state: Dict[str, Any]):
+        """
+        记录进度，立即提交
+        Args:
+            scope: 进度类型，关键词搜索、创作者、评论
+            key: 关键词、创作者ID或帖子ID
+            state: 进度，需要能序列化为 json
+
+        Returns:
+
+        """
+        if not self.enabled:
+            return
+        await self._ensure_loaded()
+        self._states[(scope, str(key))] = dict(state)
+        await self._db.execute(
+            "INSERT INTO crawler_checkpoint (platform, scope, item_key, state, updated_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(platform, scope, item_key) DO UPDATE SET state=excluded.state, updated_at=excluded.updated_at",
+            self.platform, scope, str(key), json.dumps(state, ensure_ascii=False), int(time.time())
+        )
+
+    async def finish(self, scope: str, key: str):
+        """
+        标记已经爬取完成，续爬时直接跳过
+        """
+        await self.save(scope, key, {"done": True})
+
+    async def clear(self):
+        """
+        爬取结束后，所有记录都已完成时清空该平台的记录；
+        还有未完成的记录（例如某个关键词中途出错）时保留，下次可以用 --resume 继续
+        """
+        if not self.enabled:
+            return
+        await self._ensure_loaded()
+        unfinished = [key for key, state in self._states.items() if not state.get("done")]
+        if unfinished:
+            utils.logger.info(
+                f"[CheckpointStore.clear] platform {self.platform} has {len(unfinished)} unfinished checkpoints, keep them for --resume"
+            )
+            return
+        self._states.clear()
+        await self._db.execute("DELETE FROM crawler_checkpoint WHERE platform=?", self.platform)
+
+    async def close(self):
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+
+class SearchProgress:
+    def __init__(self, store: CheckpointStore, keyword: str, page: int, **state: Any):
+        """
+        关键词搜索的翻页进度
+        搜索结果交给流水线之后游标就翻到下一页了，前面页里的帖子可能还在详情、存储、评论阶段排队；
+        这里记录还有帖子没处理完的页码，保存的是最早一页没有处理完的页码，续爬时从这一页重新开始
+        Args:
+            store: 平台的进度记录
+            keyword: 搜索关键词
+            page: 开始搜索的页码
+            **state: 需要一起保存的其他进度，例如 search_id
+        """
+        self.store = store
+        self.keyword = keyword
+        self.next_page = page
+        self.state = state
+        self._pending_pages: Set[int] = set()
+
+    @property
+    def resume_page(self) -> int:
+        return min(self._pending_pages, default=self.next_page)
+
+    @asynccontextmanager
+    async def page(self, pipeline: CrawlPipeline, page: int) -> AsyncIterator[None]:
+        """
+        把一页搜索结果放进流水线，上下文里放入的数据都记在这一页上
+        Args:
+            pipeline: 搜索流水线，需要把 page_done 设置为它的 on_tag_done
+            page: 页码
+
+        Returns:
+
+        """
+        self._pending_pages.add(page)
+        async with pipeline.track(page):
+            yield
+        self.next_page = max(self.next_page, page + 1)
+        await self.save()
+
+    async def page_done(self, page: int):
+        """
+        一页搜索结果在流水线中全部处理完
+        """
+        self._pending_pages.discard(page)
+        await self.save()
+
+    async def save(self):
+        await self.store.save(CheckpointScope.SEARCH, self.keyword, {"page": self.resume_page, **self.state})
+
+
+_checkpoint_stores: Dict[str, CheckpointStore] = {}
+
+
+def get_checkpoint_store(platform: str) -> CheckpointStore:
+    """
+    获取平台对应的进度记录，同一个平台共用
+    """
+    store = _checkpoint_stores.get(platform)
+    if store is None:
+        store = CheckpointStore(platform)
+        _checkpoint_stores[platform] = store
+    return store
+
+
+async def clear_checkpoints():
+    """
+    爬取结束后清空所有平台已经完成的进度记录
+    """
+    for store in _checkpoint_stores.values():
+        await store.clear()
+
+
+async def close_checkpoint_stores():
+    """
+    关闭所有平台的进度记录
+    """
+    for store in _checkpoint_stores.values():
+        try:
+            await store.close()
+        except Exception as e:
+            utils.logger.error(f"[close_checkpoint_stores] close checkpoint store {store.platform} error: {e}")
@@ -0,0 +1,180 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 增量评论爬取
+#            每天重复爬同一批帖子时，之前每次都要把评论从头翻到 CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES；
+#            这里按帖子记录已经抓到的最新评论时间（水位线）和最新一页的评论ID，
+#            下次翻页时遇到一整页都是已知评论（ID已知或者评论时间早于水位线）就停止翻页
+import json
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+import config
+from async_sqlite_db import AsyncSqliteDB
+from tools import utils
+
+# 每个帖子最多记录多少条最新评论的ID
+MAX_KNOWN_IDS = 100
+
+_CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS crawler_comment_watermark (
+    platform TEXT NOT NULL,
+    content_id TEXT NOT NULL,
+    newest_time INTEGER NOT NULL,
+    newest_ids TEXT NOT NULL,
+    updated_at INTEGER NOT NULL,
+    PRIMARY KEY (platform, content_id)
+);
+"""
+
+
+class CommentWatermark:
+    def __init__(self, store: Optional["CommentWatermarkStore"], content_id: str,
+                 get_id: Callable[[Dict], Any], get_time: Callable[[Dict], Any],
+                 newest_time: int = 0, known_ids: Iterable[str] = ()):
+        """
+        单个帖子一次评论爬取的水位线
+        Args:
+            store: 水位线存储，为 None 时不开启增量爬取
+            content_id: 帖子ID
+            get_id: 获取评论ID
+            get_time: 获取评论时间（时间戳，单位和平台返回的一致）
+            newest_time: 上次抓到的最新评论时间
+            known_ids: 上次抓到的最新一页评论ID
+        """
+        self.store = store
+        self.content_id = content_id
+        self.get_id = get_id
+        self.get_time = get_time
+        self.newest_time = newest_time
+        self.known_ids: Set[str] = set(known_ids)
+        self._seen_newest_time = newest_time
+        self._seen_newest_ids: List[str] = []
+
+    @property
+    def has_watermark(self) -> bool:
+        return self.store is not None and (self.newest_time > 0 or bool(self.known_ids))
+
+    def reached(self, comments: List[Dict]) -> bool:
+        """
+        记录一页一级评论，判断是否已经翻到上次抓过的位置
+        Args:
+            comments: 一页一级评论
+
+        Returns:
+            这一页是否全部是已知评论，是则可以停止翻页
+        """
+        if not comments:
+            return False
+        all_known = True
+        for comment in comments:
+            comment_id = str(self.get_id(comment))
+            comment_time = int(self.get_time(comment) or 0)
+            self._seen_newest_time = max(self._seen_newest_time, comment_time)
+            if comment_id not in self.known_ids and comment_time >= self.newest_time:
+                all_known = False
+        if not self._seen_newest_ids:
+            self._seen_newest_ids = [str(self.get_id(comment)) for comment in comments[:MAX_KNOWN_IDS]]
+        return self.has_watermark and all_known
+
+    async def commit(self):
+        """
+        评论爬取完成后保存新的水位线
+        """
+        if self.store is None or not self._seen_newest_ids:
+            return
+        await self.store.save(self.content_id, self._seen_newest_time, self._seen_newest_ids)
+
+
+class CommentWatermarkStore:
+    def __init__(self, platform: str, db_path: Optional[str] = None, enabled: Optional[bool] = None):
+        """
+        Args:
+            platform: 平台名称
+            db_path: SQLite 文件路径
+            enabled: 是否开启增量评论爬取
+        """
+        self.platform = platform
+        self.db_path = db_path or config.COMMENT_WATERMARK_DB_PATH
+        self.enabled = config.ENABLE_INCREMENTAL_COMMENTS if enabled is None else enabled
+        self._db: Optional[AsyncSqliteDB] = None
+
+    async def _get_db(self) -> AsyncSqliteDB:
+        if self._db is None:
+            db = AsyncSqliteDB(self.db_path)
+            await db.executescript(_CREATE_TABLE_SQL)
+            self._db = db
+        return self._db
+
+    async def begin(self, content_id: str, get_id: Callable[[Dict], Any],
+                    get_time: Callable[[Dict], Any]) -> CommentWatermark:
+        """
+        开始爬取一个帖子的评论，读取上次的水位线
+        Args:
+            content_id: 帖子ID
+            get_id: 获取评论ID
+            get_time: 获取评论时间
+
+        Returns:
+
+        """
+        content_id = str(content_id)
+        if not self.enabled:
+            return CommentWatermark(None, content_id, get_id, get_time)
+        db = await self._get_db()
+        row = await db.get_first(
+            "SELECT newest_time, newest_ids FROM crawler_comment_watermark WHERE platform=? AND content_id=?",
+            self.platform, content_id
+        )
+        if not row:
+            return CommentWatermark(self, content_id, get_id, get_time)
+        return CommentWatermark(self, content_id, get_id, get_time,
+                                newest_time=row["newest_time"], known_ids=json.loads(row["newest_ids"]))
+
+    async def save(self, content_id: str, newest_time: int, newest_ids: List[str]):
+        db = await self._get_db()
+        await db.execute(
+            "INSERT INTO crawler_comment_watermark (platform, content_id, newest_time, newest_ids, updated_at) "
+            "VALUES (?, ?, ?, ?, ?) ON CONFLICT(platform, content_id) DO UPDATE SET "
+            "newest_time=excluded.newest_time, newest_ids=excluded.newest_ids, updated_at=excluded.updated_at",
+            self.platform, str(content_id), int(newest_time), json.dumps(newest_ids), int(time.time())
+        )
+
+    async def close(self):
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+
+_watermark_stores: Dict[str, CommentWatermarkStore] = {}
+
+
+def get_comment_watermark_store(platform: str) -> CommentWatermarkStore:
+    """
+    获取平台对应的评论水位线存储，同一个平台共用
+    """
+    store = _watermark_stores.get(platform)
+    if store is None:
+        store = CommentWatermarkStore(platform)
+        _watermark_stores[platform] = store
+    return store
+
+
+async def close_comment_watermark_stores():
+    """
+    关闭所有平台的评论水位线存储
+    """
+    for store in _watermark_stores.values():
+        try:
+            await store.close()
+        except Exception as e:
+            utils.logger.error(f"[close_comment_watermark_stores] close watermark store {store.platform} error: {e}")
@@ -0,0 +1,184 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 互动数快照
+#            重复爬取同一个帖子时点赞、收藏、评论、分享数会被直接覆盖，看不到增长曲线；
+#            这里按平台把每次爬到的互动数追加到一张窄表（帖子ID、时间戳、几个整数计数），不重复保存正文，
+#            写入走 AsyncSqliteDB 的批量提交，提供按帖子查询变化曲线的接口，
+#            并在程序退出时把较早的快照按时间段压缩为每段一条
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import config
+from async_sqlite_db import AsyncSqliteDB
+from tools import utils
+
+# 快照保存的计数字段，平台没有的字段存 NULL
+COUNTER_FIELDS: Tuple[str, ...] = ("liked_count", "collected_count", "comment_count", "share_count", "play_count")
+
+_COUNT_UNITS = {"万": 10000, "w": 10000, "W": 10000, "亿": 100000000}
+
+
+def parse_count(value: Any) -> Optional[int]:
+    """
+    把平台返回的计数转换为整数，支持 "1.2万"、"10万+" 这种格式
+    Args:
+        value: 平台返回的计数
+
+    Returns:
+        整数计数，无法解析时返回 None
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = re.search(r"(\d+(?:\.\d+)?)\s*([万wW亿]?)", str(value))
+    if not match:
+        return None
+    return int(float(match.group(1)) * _COUNT_UNITS.get(match.group(2), 1))
+
+
+class CountSnapshotStore:
+    def __init__(self, platform: str, db_path: Optional[str] = None, enabled: Optional[bool] = None):
+        """
+        Args:
+            platform: 平台名称，每个平台一张快照表
+            db_path: SQLite 文件路径
+            enabled: 是否记录互动数快照
+        """
+        self.platform = platform
+        self.db_path = db_path or config.COUNT_SNAPSHOT_DB_PATH
+        self.enabled = config.ENABLE_COUNT_SNAPSHOT if enabled is None else enabled
+        self.table_name = f"{platform}_count_snapshot"
+        self._db: Optional[AsyncSqliteDB] = None
+        # 本次运行每个帖子最后记录的计数，同一个帖子被多个关键词搜到时计数没变化就不再写入
+        self._last_counters: Dict[str, Tuple[Optional[int], ...]] = {}
+
+    async def _get_db(self) -> AsyncSqliteDB:
+        if self._db is None:
+            db = AsyncSqliteDB(self.db_path)
+            counter_columns = "".join(f"    {field} INTEGER,\n" for field in COUNTER_FIELDS)
+            await db.executescript(
+                f"CREATE TABLE IF NOT EXISTS {self.table_name} (\n"
+                f"    content_id TEXT NOT NULL,\n"
+                f"    ts INTEGER NOT NULL,\n"
+                f"{counter_columns}"
+                f"    PRIMARY KEY (content_id, ts)\n"
+                f") WITHOUT ROWID;"
+            )
+            self._db = db
+        return self._db
+
+    async def record(self, content_id: str, counters: Dict[str, Any], ts: Optional[int] = None):
+        """
+        追加一条互动数快照
+        Args:
+            content_id: 帖子ID
+            counters: 计数字段和值，字段名见 COUNTER_FIELDS
+            ts: 快照时间戳（秒），默认当前时间
+
+        Returns:
+
+        """
+        if not self.enabled or not content_id:
+            return
+        content_id = str(content_id)
+        values = tuple(parse_count(counters.get(field)) for field in COUNTER_FIELDS)
+        if self._last_counters.get(content_id) == values:
+            return
+        self._last_counters[content_id] = values
+        db = await self._get_db()
+        fieldstr = ", ".join(COUNTER_FIELDS)
+        valstr = ", ".join(["?"] * len(COUNTER_FIELDS))
+        await db.execute(
+            f"INSERT OR REPLACE INTO {self.table_name} (content_id, ts, {fieldstr}) VALUES (?, ?, {valstr})",
+            content_id, int(ts if ts is not None else time.time()), *values
+        )
+
+    async def trajectory(self, content_id: str, start_ts: int = 0, end_ts: Optional[int] = None) -> List[Dict]:
+        """
+        查询帖子的互动数变化曲线
+        Args:
+            content_id: 帖子ID
+            start_ts: 开始时间戳（秒）
+            end_ts: 结束时间戳（秒），默认不限制
+
+        Returns:
+            按时间排序的快照列表
+        """
+        db = await self._get_db()
+        sql = f"SELECT * FROM {self.table_name} WHERE content_id=? AND ts>=?"
+        args = [str(content_id), int(start_ts)]
+        if end_ts is not None:
+            sql += " AND ts<=?"
+            args.append(int(end_ts))
+        return await db.query(sql + " ORDER BY ts", *args)
+
+    async def compact(self, older_than_seconds: float, bucket_seconds: float) -> int:
+        """
+        压缩较早的快照：早于 older_than_seconds 的快照每个帖子每个时间段只保留最后一条
+        Args:
+            older_than_seconds: 多久之前的快照需要压缩（秒）
+            bucket_seconds: 压缩后的时间段长度（秒）
+
+        Returns:
+            删除的快照条数
+        """
+        bucket_seconds = int(bucket_seconds)
+        if bucket_seconds <= 0:
+            return 0
+        db = await self._get_db()
+        cutoff = int(time.time() - older_than_seconds)
+        deleted = await db.execute(
+            f"DELETE FROM {self.table_name} WHERE ts<? AND (content_id, ts) NOT IN "
+            f"(SELECT content_id, MAX(ts) FROM {self.table_name} WHERE ts<? GROUP BY content_id, ts / ?)",
+            cutoff, cutoff, bucket_seconds
+        )
+        await db.flush()
+        if deleted:
+            utils.logger.info(f"[CountSnapshotStore.compact] table {self.table_name} removed {deleted} old snapshots")
+        return deleted
+
+    async def close(self):
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+
+_snapshot_stores: Dict[str, CountSnapshotStore] = {}
+
+
+def get_count_snapshot_store(platform: str) -> CountSnapshotStore:
+    """
+    获取平台对应的互动数快照存储，同一个平台共用
+    """
+    store = _snapshot_stores.get(platform)
+    if store is None:
+        store = CountSnapshotStore(platform)
+        _snapshot_stores[platform] = store
+    return store
+
+
+async def close_count_snapshot_stores():
+    """
+    压缩较早的快照并关闭所有平台的互动数快照存储
+    """
+    for store in _snapshot_stores.values():
+        try:
+            # 已经关闭的不再重新打开压缩（程序退出时会重复调用）
+            if store._db is not None and store.enabled and config.COUNT_SNAPSHOT_COMPACT_AFTER_DAYS > 0:
+                await store.compact(config.COUNT_SNAPSHOT_COMPACT_AFTER_DAYS * 86400,
+                                    config.COUNT_SNAPSHOT_COMPACT_BUCKET_HOURS * 3600)
+            await store.close()
+        except Exception as e:
+            utils.logger.error(f"[close_count_snapshot_stores] close count snapshot store {store.platform} error: {e}")
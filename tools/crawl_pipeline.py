@@ -0,0 +1,232 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 流水线式的搜索抓取
+#            原来的搜索循环按 搜索一页 -> 获取详情 -> 存储 -> 下载媒体 -> 获取评论 -> 搜索下一页 的顺序串行执行，
+#            这里把各个步骤拆成独立的阶段，阶段之间用有界队列连接：搜索游标在限速范围内可以提前翻页，
+#            每个关键词的耗时接近最慢的那个阶段，而不是所有阶段之和；队列满时上游等待，形成背压
+import asyncio
+import contextvars
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import config
+from tools import utils
+
+StageHandler = Callable[[Any], Awaitable[None]]
+
+# 当前数据所属的标记（例如搜索结果的页码），阶段处理时传给下游的数据沿用同一个标记
+_item_tag_var: contextvars.ContextVar[Optional[Any]] = contextvars.ContextVar("pipeline_item_tag", default=None)
+
+
+class PipelineStage:
+    def __init__(self, name: str, handler: StageHandler, workers: int = 1, queue_size: int = 20,
+                 on_item_done: Optional[Callable[[Any], Awaitable[None]]] = None):
+        """
+        Args:
+            name: 阶段名称
+            handler: 处理单个数据的协程函数，需要传给下游时在里面调用 CrawlPipeline.put
+            workers: 并发处理的任务数量，实际请求并发仍然由调度器和限速器控制
+            queue_size: 输入队列的最大长度
+            on_item_done: 单个数据处理完（无论成功失败）之后的回调，参数是数据的标记
+        """
+        self.name = name
+        self.handler = handler
+        self.on_item_done = on_item_done
+        self.workers = max(workers, 1)
+        self.queue_size = max(queue_size, 1)
+        self.queue: Optional[asyncio.Queue] = None
+        self.worker_tasks: List[asyncio.Task] = []
+        # 统计信息
+        self.processed = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.busy_time = 0.0
+
+    def start(self):
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.worker_tasks = [asyncio.create_task(self._worker(self.queue)) for _ in range(self.workers)]
+
+    async def put(self, item: Any, tag: Optional[Any] = None):
+        await self.queue.put((item, tag))
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            item, tag = await queue.get()
+            _item_tag_var.set(tag)
+            start = time.monotonic()
+            try:
+                await self.handler(item)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                utils.logger.error(f"[PipelineStage._worker] stage {self.name} handle item error: {e}")
+            finally:
+                self.busy_time += time.monotonic() - start
+                try:
+                    if tag is not None and self.on_item_done:
+                        await self.on_item_done(tag)
+                finally:
+                    queue.task_done()
+
+    async def stop(self):
+        for task in self.worker_tasks:
+            task.cancel()
+        if self.worker_tasks:
+            await asyncio.gather(*self.worker_tasks, return_exceptions=True)
+        self.worker_tasks = []
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "processed": self.processed,
+            "failed": self.failed,
+            "max_depth": self.max_depth,
+            "busy_time_s": round(self.busy_time, 3),
+        }
+
+
+class CrawlPipeline:
+    """
+    用法：
+        pipeline = CrawlPipeline("xhs.search")
+        pipeline.add_stage("detail", get_detail, workers=4)
+        pipeline.add_stage("store", store_detail)
+        async with pipeline:
+            for item in search_results:
+                await pipeline.put("detail", item)
+    阶段只能把数据传给在它之后添加的阶段，退出 async with 时按添加顺序依次等待各阶段处理完
+
+    需要知道某一批数据什么时候全部处理完时（例如搜索结果的某一页），在 async with pipeline.track(tag) 里放入数据，
+    这批数据以及各阶段由它产生的下游数据都处理完之后调用 on_tag_done(tag)
+    """
+
+    def __init__(self, name: str, queue_size: Optional[int] = None,
+                 on_tag_done: Optional[Callable[[Any], Awaitable[None]]] = None):
+        """
+        Args:
+            name: 流水线名称，用于日志
+            queue_size: 各阶段输入队列的默认长度
+            on_tag_done: 同一个标记的数据全部处理完之后的回调，参数是标记
+        """
+        self.name = name
+        self.queue_size = queue_size or config.SEARCH_PIPELINE_QUEUE_SIZE
+        self.on_tag_done = on_tag_done
+        self._stages: Dict[str, PipelineStage] = {}
+        self._start_time = 0.0
+        # 每个标记还没处理完的数据数量
+        self._tag_counts: Dict[Any, int] = {}
+
+    def add_stage(self, name: str, handler: StageHandler, workers: int = 1,
+                  queue_size: Optional[int] = None) -> "CrawlPipeline":
+        """
+        添加一个阶段
+        Args:
+            name: 阶段名称
+            handler: 处理单个数据的协程函数
+            workers: 并发处理的任务数量
+            queue_size: 输入队列的最大长度，默认使用流水线的队列长度
+
+        Returns:
+
+        """
+        self._stages[name] = PipelineStage(name, handler, workers, queue_size or self.queue_size,
+                                           on_item_done=self._release_tag)
+        return self
+
+    async def put(self, stage_name: str, item: Any):
+        """
+        把数据交给指定阶段，队列满时等待
+        Args:
+            stage_name: 阶段名称
+            item: 数据
+
+        Returns:
+
+        """
+        tag = _item_tag_var.get()
+        if tag is not None:
+            self._tag_counts[tag] = self._tag_counts.get(tag, 0) + 1
+        await self._stages[stage_name].put(item, tag)
+
+    @asynccontextmanager
+    async def track(self, tag: Any) -> AsyncIterator[None]:
+        """
+        在这个上下文里放入的数据都带上标记 tag；退出上下文之前不会认为这个标记已经处理完，
+        避免前面的数据处理得比放入得快时提前触发 on_tag_done
+        Args:
+            tag: 标记，例如搜索结果的页码
+
+        Returns:
+
+        """
+        self._tag_counts[tag] = self._tag_counts.get(tag, 0) + 1
+        token = _item_tag_var.set(tag)
+        try:
+            yield
+        finally:
+            _item_tag_var.reset(token)
+            await self._release_tag(tag)
+
+    async def _release_tag(self, tag: Any):
+        count = self._tag_counts.get(tag, 0) - 1
+        if count > 0:
+            self._tag_counts[tag] = count
+            return
+        self._tag_counts.pop(tag, None)
+        if self.on_tag_done:
+            try:
+                await self.on_tag_done(tag)
+            except Exception as e:
+                utils.logger.error(f"[CrawlPipeline._release_tag] {self.name} tag {tag} done callback error: {e}")
+
+    def start(self):
+        """
+        启动各阶段的处理任务，任务会继承当前的上下文变量（关键词、爬取类型等）
+        """
+        self._start_time = time.monotonic()
+        for stage in self._stages.values():
+            stage.start()
+
+    async def join(self):
+        """
+        按阶段顺序等待所有数据处理完，然后停止处理任务
+        上游阶段处理完之后不会再产生新的数据，所以依次等待即可
+        """
+        try:
+            for stage in self._stages.values():
+                await stage.queue.join()
+        finally:
+            await self.stop()
+        utils.logger.info(
+            f"[CrawlPipeline.join] {self.name} finished in {time.monotonic() - self._start_time:.2f}s, "
+            f"stats: {self.stats()}"
+        )
+
+    async def stop(self):
+        for stage in self._stages.values():
+            await stage.stop()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: stage.stats() for name, stage in self._stages.items()}
+
+    async def __aenter__(self) -> "CrawlPipeline":
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            await self.join()
+        else:
+            # 数据源出错或者被取消时不再等待剩余数据
+            await self.stop()
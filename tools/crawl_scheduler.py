@@ -0,0 +1,245 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 整个爬取过程共用的并发调度器
+#            之前每一页搜索结果、每一批任务甚至每一个任务都会新建一个 asyncio.Semaphore，并发上限实际上不起作用；
+#            这里用一个调度器统一控制：全局并发上限 + 按请求类型（API / 媒体文件 / HTML 页面）的上限 + 按域名的上限，
+#            并统计在途请求数和排队等待时间
+import asyncio
+import contextvars
+import time
+from typing import Any, Awaitable, Dict, FrozenSet, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import config
+from tools import utils
+
+
+class RequestClass:
+    API = "api"
+    MEDIA = "media"
+    PAGE = "page"
+
+
+# 当前任务已经持有的并发名额，同一个任务里嵌套申请时不再重复占用；
+# 记录的是 (任务, 名额)，子任务虽然会复制上下文变量，但任务不同，仍然要自己申请名额，不能绕过并发上限
+_held_limits_var: contextvars.ContextVar[Tuple[Optional[asyncio.Task], FrozenSet[str]]] = contextvars.ContextVar(
+    "held_limits", default=(None, frozenset())
+)
+# 每层 async with 实际占用的名额，按进入顺序入栈；同一个 SchedulerLimit 对象会被多个任务共用，不能记在对象上
+_acquired_keys_var: contextvars.ContextVar[Tuple[Tuple[str, ...], ...]] = contextvars.ContextVar("acquired_limits", default=())
+
+
+def _held_limits() -> FrozenSet[str]:
+    """
+    当前任务已经持有的名额，从父任务继承过来的不算
+    """
+    task, held = _held_limits_var.get()
+    if task is None or task is not asyncio.current_task():
+        return frozenset()
+    return held
+
+
+class _LimitStats:
+    __slots__ = ("in_flight", "waiting", "acquired", "total_wait_time", "max_wait_time")
+
+    def __init__(self):
+        self.in_flight = 0
+        self.waiting = 0
+        self.acquired = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "acquired": self.acquired,
+            "avg_wait_ms": round(self.total_wait_time / max(self.acquired, 1) * 1000, 2),
+            "max_wait_ms": round(self.max_wait_time * 1000, 2),
+        }
+
+
+class SchedulerLimit:
+    """
+    调度器的并发名额，用法和 asyncio.Semaphore 一样（async with），同一个对象可以在多个任务之间共用
+    """
+
+    def __init__(self, scheduler: "CrawlScheduler", request_class: str, host: str):
+        self.scheduler = scheduler
+        self.request_class = request_class
+        self.host = host
+
+    async def __aenter__(self):
+        keys = await self.scheduler.acquire(self.request_class, self.host)
+        _held_limits_var.set((asyncio.current_task(), _held_limits() | frozenset(keys)))
+        _acquired_keys_var.set(_acquired_keys_var.get() + (keys,))
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        acquired = _acquired_keys_var.get()
+        keys = acquired[-1]
+        _acquired_keys_var.set(acquired[:-1])
+        _held_limits_var.set((asyncio.current_task(), _held_limits() - frozenset(keys)))
+        self.scheduler.release(keys)
+
+
+class CrawlScheduler:
+    def __init__(self, max_concurrency: int, class_limits: Dict[str, int], per_host_limit: int,
+                 report_interval: float = 60.0):
+        """
+        Args:
+            max_concurrency: 全局并发上限
+            class_limits: 各请求类型的并发上限，例如 {"api": 1, "media": 4, "page": 2}
+            per_host_limit: 单个域名的并发上限
+            report_interval: 输出统计日志的间隔（秒），<=0 表示不输出
+        """
+        self.max_concurrency = max(max_concurrency, 1)
+        self.class_limits = {name: max(limit, 1) for name, limit in class_limits.items()}
+        self.per_host_limit = max(per_host_limit, 1)
+        self.report_interval = report_interval
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._stats: Dict[str, _LimitStats] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._last_report_time = time.monotonic()
+
+    @staticmethod
+    def _host_of(host: str) -> str:
+        if host and "://" in host:
+            return urlparse(host).netloc
+        return host or ""
+
+    def _limit_of(self, key: str) -> int:
+        if key == "global":
+            return self.max_concurrency
+        if key.startswith("class:"):
+            return self.class_limits.get(key[len("class:"):], self.max_concurrency)
+        return self.per_host_limit
+
+    def _semaphore(self, key: str) -> asyncio.Semaphore:
+        # 信号量绑定在事件循环上，换了事件循环（例如测试或者退出清理）时重新创建
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._semaphores = {}
+            self._loop = loop
+        semaphore = self._semaphores.get(key)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self._limit_of(key))
+            self._semaphores[key] = semaphore
+        return semaphore
+
+    def _stat(self, key: str) -> _LimitStats:
+        stat = self._stats.get(key)
+        if stat is None:
+            stat = self._stats[key] = _LimitStats()
+        return stat
+
+    def limit(self, request_class: str = RequestClass.API, host: str = "") -> SchedulerLimit:
+        """
+        获取一个并发名额对象，用来替代原来的 asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
+        Args:
+            request_class: 请求类型，见 RequestClass
+            host: 域名或者 URL
+
+        Returns:
+
+        """
+        return SchedulerLimit(self, request_class, self._host_of(host))
+
+    async def acquire(self, request_class: str, host: str) -> Tuple[str, ...]:
+        """
+        依次获取 全局 -> 请求类型 -> 域名 的名额，当前任务已经持有的跳过
+        Returns:
+            实际占用的名额
+        """
+        held = _held_limits()
+        keys = [key for key in ("global", f"class:{request_class}", f"host:{host}" if host else "")
+                if key and key not in held]
+        acquired: List[str] = []
+        try:
+            for key in keys:
+                semaphore = self._semaphore(key)
+                stat = self._stat(key)
+                start = time.monotonic()
+                stat.waiting += 1
+                try:
+                    await semaphore.acquire()
+                finally:
+                    stat.waiting -= 1
+                wait_time = time.monotonic() - start
+                acquired.append(key)
+                stat.in_flight += 1
+                stat.acquired += 1
+                stat.total_wait_time += wait_time
+                stat.max_wait_time = max(stat.max_wait_time, wait_time)
+        except BaseException:
+            self.release(tuple(acquired))
+            raise
+        return tuple(acquired)
+
+    def release(self, keys: Tuple[str, ...]):
+        for key in reversed(keys):
+            self._stat(key).in_flight -= 1
+            semaphore = self._semaphores.get(key)
+            if semaphore is not None:
+                semaphore.release()
+        self._report_if_needed()
+
+    async def run(self, coro: Awaitable, request_class: str = RequestClass.API, host: str = "") -> Any:
+        """
+        在调度器的名额内执行协程
+        Args:
+            coro: 协程
+            request_class: 请求类型
+            host: 域名或者 URL
+
+        Returns:
+
+        """
+        async with self.limit(request_class, host):
+            return await coro
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        各个名额的在途数量、排队数量和等待时间
+        """
+        return {key: stat.to_dict() for key, stat in self._stats.items()}
+
+    def _report_if_needed(self):
+        if self.report_interval <= 0:
+            return
+        now = time.monotonic()
+        if now - self._last_report_time >= self.report_interval:
+            self._last_report_time = now
+            utils.logger.info(f"[CrawlScheduler] stats: {self.stats()}")
+
+
+_crawl_scheduler: Optional[CrawlScheduler] = None
+
+
+def get_crawl_scheduler() -> CrawlScheduler:
+    """
+    获取本次爬取共用的调度器
+    """
+    global _crawl_scheduler
+    if _crawl_scheduler is None:
+        _crawl_scheduler = CrawlScheduler(
+            max_concurrency=config.SCHEDULER_MAX_CONCURRENCY,
+            class_limits={
+                RequestClass.API: config.MAX_CONCURRENCY_NUM,
+                RequestClass.MEDIA: config.SCHEDULER_MEDIA_CONCURRENCY,
+                RequestClass.PAGE: config.SCHEDULER_PAGE_CONCURRENCY,
+            },
+            per_host_limit=config.SCHEDULER_PER_HOST_CONCURRENCY,
+            report_interval=config.SCHEDULER_REPORT_INTERVAL,
+        )
+    return _crawl_scheduler
@@ -15,6 +15,7 @@
 # @Desc    : 爬虫相关的工具函数
 
 import base64
+import hashlib
 import json
 import random
 import re
@@ -203,3 +204,18 @@ def extract_url_params_to_dict(url: str) -> Dict:
     parsed_url = urllib.parse.urlparse(url)
     url_params_dict = dict(urllib.parse.parse_qsl(parsed_url.query))
     return url_params_dict
+
+
+def compute_content_hash(item: Dict, exclude_fields: Tuple[str, ...] = ()) -> str:
+    """
+    计算一条记录内容的哈希，用来判断再次爬到的数据和库里的是否一致
+    Args:
+        item: 一条记录
+        exclude_fields: 不参与计算的字段，例如每次都会变化的 add_ts、last_modify_ts
+
+    Returns:
+        32位十六进制的 md5
+    """
+    content = {key: value for key, value in item.items() if key not in exclude_fields}
+    raw = json.dumps(content, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.md5(raw.encode("utf-8")).hexdigest()
@@ -0,0 +1,200 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 长驻的 httpx.AsyncClient 连接池
+#            每个平台的 API 客户端持有一个 HttpxClientPool，请求复用同一个 AsyncClient 的 keep-alive 连接，
+#            不再为每个请求重新建立 TCP/TLS 连接；代理切换时按代理缓存 AsyncClient，换回已用过的代理时直接复用；
+#            AsyncClient 绑定创建它的事件循环，爬取结束时由 main() 在爬取的事件循环里调用 close_httpx_client_pools 关闭
+import asyncio
+import json
+import weakref
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Set, Union
+
+import httpx
+
+import config
+from tools import utils
+
+ProxiesType = Optional[Union[str, Dict[str, str]]]
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class HttpxClientPool:
+    def __init__(self, proxies: ProxiesType = None, timeout: Optional[float] = None,
+                 max_proxy_clients: Optional[int] = None, **client_kwargs):
+        """
+        Args:
+            proxies: 默认使用的代理，格式同 httpx 的 proxies 参数
+            timeout: 默认超时时间（秒），单个请求仍然可以传 timeout 覆盖
+            max_proxy_clients: 代理轮换时最多保留多少个代理对应的 AsyncClient，超出时关闭最久未使用的
+            **client_kwargs: 其他传给 httpx.AsyncClient 的参数
+        """
+        self.proxies = proxies
+        self.timeout = timeout
+        self.max_proxy_clients = max(max_proxy_clients or config.HTTPX_MAX_PROXY_CLIENTS, 1)
+        self.client_kwargs = client_kwargs
+        self._clients: "OrderedDict[str, httpx.AsyncClient]" = OrderedDict()
+        # 每个客户端上正在进行的请求数，被淘汰时还有请求的客户端等最后一个请求结束再关闭
+        self._in_flight: Dict[httpx.AsyncClient, int] = {}
+        self._retired: Set[httpx.AsyncClient] = set()
+        self._http2 = config.HTTPX_ENABLE_HTTP2
+        if self._http2 and not _http2_available():
+            utils.logger.warning(
+                "[HttpxClientPool] HTTPX_ENABLE_HTTP2 is on but the h2 package is not installed, "
+                "fallback to HTTP/1.1, run `pip install httpx[http2]` to enable it"
+            )
+            self._http2 = False
+        # 构造时就创建默认代理对应的客户端
+        self.get_client(proxies)
+        _client_pools.add(self)
+
+    @staticmethod
+    def _proxies_key(proxies: ProxiesType) -> str:
+        if not proxies:
+            return ""
+        if isinstance(proxies, str):
+            return proxies
+        return json.dumps(proxies, sort_keys=True)
+
+    def _create_client(self, proxies: ProxiesType) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=config.HTTPX_MAX_CONNECTIONS,
+            max_keepalive_connections=config.HTTPX_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=config.HTTPX_KEEPALIVE_EXPIRY,
+        )
+        kwargs = dict(self.client_kwargs)
+        if self.timeout is not None:
+            kwargs.setdefault("timeout", self.timeout)
+        return httpx.AsyncClient(proxies=proxies or None, limits=limits, http2=self._http2, **kwargs)
+
+    def get_client(self, proxies: ProxiesType = None) -> httpx.AsyncClient:
+        """
+        获取指定代理对应的 AsyncClient，不存在则创建
+        Args:
+            proxies: 代理，None 表示不使用代理
+
+        Returns:
+
+        """
+        key = self._proxies_key(proxies)
+        client = self._clients.get(key)
+        if client is not None and not client.is_closed:
+            self._clients.move_to_end(key)
+            return client
+
+        client = self._create_client(proxies)
+        self._clients[key] = client
+        while len(self._clients) > self.max_proxy_clients:
+            _, expired_client = self._clients.popitem(last=False)
+            self._close_later(expired_client)
+        return client
+
+    def _close_later(self, client: httpx.AsyncClient):
+        """
+        关闭被淘汰的客户端：没有正在进行的请求时放到后台关闭，否则等 borrow 里最后一个请求结束后再关闭
+        """
+        if self._in_flight.get(client):
+            self._retired.add(client)
+            return
+        try:
+            asyncio.get_running_loop().create_task(client.aclose())
+        except RuntimeError:
+            pass
+
+    @asynccontextmanager
+    async def borrow(self, proxies: ProxiesType = None) -> AsyncIterator[httpx.AsyncClient]:
+        """
+        借用指定代理对应的 AsyncClient 发请求，借用期间客户端即使被淘汰也不会被关闭
+        Args:
+            proxies: 代理，None 表示不使用代理
+
+        Returns:
+
+        """
+        client = self.get_client(proxies)
+        self._in_flight[client] = self._in_flight.get(client, 0) + 1
+        try:
+            yield client
+        finally:
+            self._in_flight[client] -= 1
+            if not self._in_flight[client]:
+                del self._in_flight[client]
+                if client in self._retired:
+                    self._retired.discard(client)
+                    await client.aclose()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """
+        当前默认代理对应的 AsyncClient
+        """
+        return self.get_client(self.proxies)
+
+    def set_proxies(self, proxies: ProxiesType):
+        """
+        切换默认代理，之前代理对应的连接池会保留一段时间，换回来时可以直接复用
+        Args:
+            proxies:
+
+        Returns:
+
+        """
+        self.proxies = proxies
+        self.get_client(proxies)
+
+    async def request(self, method: str, url: str, proxies: ProxiesType = None, **kwargs) -> httpx.Response:
+        """
+        使用连接池发起请求
+        Args:
+            method: 请求方法
+            url: 请求地址
+            proxies: 本次请求使用的代理，默认使用当前默认代理
+            **kwargs: 其他请求参数
+
+        Returns:
+
+        """
+        async with self.borrow(proxies if proxies else self.proxies) as client:
+            return await client.request(method, url, **kwargs)
+
+    async def aclose(self):
+        """
+        关闭所有的 AsyncClient，释放连接
+        """
+        clients = list(self._clients.values()) + list(self._retired)
+        self._clients.clear()
+        self._retired.clear()
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception as e:
+                utils.logger.error(f"[HttpxClientPool.aclose] close client error: {e}")
+
+
+_client_pools: "weakref.WeakSet[HttpxClientPool]" = weakref.WeakSet()
+
+
+async def close_httpx_client_pools():
+    """
+    关闭所有 API 客户端的 httpx 连接池，需要在创建连接的事件循环里调用
+    """
+    for pool in list(_client_pools):
+        await pool.aclose()
@@ -0,0 +1,249 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 常驻的 JS 签名进程池
+#            execjs 在 Node 运行时下每次 call 都会新起一个进程并重新执行整个签名脚本，耗时几十毫秒且阻塞事件循环；
+#            这里启动若干个常驻的 Node 进程（libs/js_sign_worker.js），脚本只加载一次，通过 stdin/stdout 的 JSON 行协议异步调用
+import asyncio
+import itertools
+import json
+import os
+import shutil
+from typing import Any, Dict, List, Optional, Sequence
+
+import config
+from tools import utils
+
+JS_SIGN_WORKER_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "libs", "js_sign_worker.js")
+
+# 批量签名时单行响应可能比较长，放大 StreamReader 的行长度限制
+_STREAM_LIMIT = 16 * 1024 * 1024
+
+
+class JsSignError(Exception):
+    pass
+
+
+class JsSignWorker:
+    def __init__(self, script_path: str, max_concurrency: int = 16):
+        """
+        Args:
+            script_path: 签名脚本路径
+            max_concurrency: 单个进程同时在途的请求数，请求在进程内按顺序执行，在途请求多了可以省掉来回等待的时间
+        """
+        self.script_path = script_path
+        self.max_concurrency = max(max_concurrency, 1)
+        self.pending = 0
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._start_lock: Optional[asyncio.Lock] = None
+        self._futures: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+
+    @property
+    def alive(self) -> bool:
+        return self._process is not None and self._process.returncode is None
+
+    async def _ensure_started(self):
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._start_lock:
+            if self.alive:
+                return
+            self._process = await asyncio.create_subprocess_exec(
+                "node", JS_SIGN_WORKER_PATH, self.script_path,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                limit=_STREAM_LIMIT,
+            )
+            self._reader_task = asyncio.create_task(self._read_loop(self._process))
+
+    async def _read_loop(self, process: asyncio.subprocess.Process):
+        while True:
+            line = await process.stdout.readline()
+            if not line:
+                break
+            try:
+                response = json.loads(line)
+            except ValueError:
+                continue
+            future = self._futures.pop(response.get("id"), None)
+            if future is None or future.done():
+                continue
+            if "error" in response:
+                future.set_exception(JsSignError(response["error"]))
+            else:
+                future.set_result(response.get("result"))
+
+        # 进程退出，还没拿到结果的请求全部失败，下一次调用时会重新拉起进程
+        futures, self._futures = self._futures, {}
+        for future in futures.values():
+            if not future.done():
+                future.set_exception(JsSignError(f"sign worker for {self.script_path} exited"))
+
+    async def _send(self, request: Dict) -> Any:
+        await self._ensure_started()
+        self.pending += 1
+        try:
+            async with self._semaphore:
+                request_id = next(self._ids)
+                future = asyncio.get_running_loop().create_future()
+                self._futures[request_id] = future
+                request["id"] = request_id
+                self._process.stdin.write((json.dumps(request, ensure_ascii=False) + "\n").encode("utf-8"))
+                await self._process.stdin.drain()
+                return await future
+        finally:
+            self.pending -= 1
+
+    async def call(self, fn: str, *args) -> Any:
+        return await self._send({"fn": fn, "args": list(args)})
+
+    async def call_batch(self, fn: str, args_list: Sequence[Sequence]) -> List[Any]:
+        return await self._send({"fn": fn, "batch": [list(args) for args in args_list]})
+
+    async def close(self):
+        if self.alive:
+            self._process.stdin.close()
+            try:
+                await asyncio.wait_for(self._process.wait(), timeout=3)
+            except asyncio.TimeoutError:
+                self._process.kill()
+        if self._reader_task is not None:
+            await asyncio.gather(self._reader_task, return_exceptions=True)
+        self._process = None
+        self._reader_task = None
+
+    def kill(self):
+        """
+        原事件循环已经结束时无法再优雅关闭，直接结束进程
+        """
+        if self.alive:
+            try:
+                self._process.kill()
+            except ProcessLookupError:
+                pass
+        self._process = None
+
+
+class JsSignPool:
+    def __init__(self, script_path: str, size: Optional[int] = None, worker_concurrency: Optional[int] = None):
+        """
+        Args:
+            script_path: 签名脚本路径，例如 libs/douyin.js
+            size: 常驻进程数量
+            worker_concurrency: 单个进程同时在途的请求数
+        """
+        self.script_path = os.path.abspath(script_path)
+        self.size = max(size or config.JS_SIGN_POOL_SIZE, 1)
+        self.worker_concurrency = worker_concurrency or config.JS_SIGN_WORKER_CONCURRENCY
+        self.use_node = shutil.which("node") is not None
+        self._workers: List[JsSignWorker] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._execjs_ctx = None
+        if not self.use_node:
+            utils.logger.warning(
+                f"[JsSignPool] node is not installed, fallback to execjs in a thread pool for {script_path}"
+            )
+
+    def _get_workers(self) -> List[JsSignWorker]:
+        # 子进程的管道绑定在创建它的事件循环上，换了事件循环（例如退出清理时）需要重新启动
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            for worker in self._workers:
+                worker.kill()
+            self._workers = [JsSignWorker(self.script_path, self.worker_concurrency) for _ in range(self.size)]
+            self._loop = loop
+        return self._workers
+
+    def _pick_worker(self) -> JsSignWorker:
+        return min(self._get_workers(), key=lambda worker: worker.pending)
+
+    def _execjs_call(self, fn: str, *args) -> Any:
+        if self._execjs_ctx is None:
+            import execjs
+            with open(self.script_path, encoding="utf-8-sig") as f:
+                self._execjs_ctx = execjs.compile(f.read())
+        return self._execjs_ctx.call(fn, *args)
+
+    async def sign(self, fn: str, *args) -> Any:
+        """
+        调用签名脚本中的函数
+        Args:
+            fn: 函数名
+            *args: 函数参数，需要能被 json 序列化
+
+        Returns:
+
+        """
+        if not self.use_node:
+            return await asyncio.get_running_loop().run_in_executor(None, self._execjs_call, fn, *args)
+        return await self._pick_worker().call(fn, *args)
+
+    async def sign_many(self, fn: str, args_list: Sequence[Sequence]) -> List[Any]:
+        """
+        批量签名，按进程数量切分后每个进程一次请求处理一批，结果顺序与参数顺序一致
+        Args:
+            fn: 函数名
+            args_list: 每次调用的参数列表
+
+        Returns:
+
+        """
+        if not args_list:
+            return []
+        if not self.use_node:
+            return [await self.sign(fn, *args) for args in args_list]
+        workers = self._get_workers()
+        chunk_size = (len(args_list) + len(workers) - 1) // len(workers)
+        chunks = [args_list[i:i + chunk_size] for i in range(0, len(args_list), chunk_size)]
+        results = await asyncio.gather(
+            *[worker.call_batch(fn, chunk) for worker, chunk in zip(workers, chunks)]
+        )
+        return [result for chunk_result in results for result in chunk_result]
+
+    async def close(self):
+        workers, self._workers = self._workers, []
+        if self._loop is asyncio.get_running_loop():
+            await asyncio.gather(*[worker.close() for worker in workers], return_exceptions=True)
+        else:
+            for worker in workers:
+                worker.kill()
+        self._loop = None
+
+
+_sign_pools: Dict[str, JsSignPool] = {}
+
+
+def get_sign_pool(script_path: str) -> JsSignPool:
+    """
+    获取签名脚本对应的进程池，同一个脚本全局共用一个
+    Args:
+        script_path: 签名脚本路径
+
+    Returns:
+
+    """
+    key = os.path.abspath(script_path)
+    if key not in _sign_pools:
+        _sign_pools[key] = JsSignPool(script_path)
+    return _sign_pools[key]
+
+
+async def close_sign_pools():
+    """
+    关闭所有常驻的签名进程
+    """
+    for pool in list(_sign_pools.values()):
+        await pool.close()
@@ -0,0 +1,275 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 多关键词并行搜索
+#            原来逐个关键词串行搜索，这里同时运行多个关键词任务，共用调度器和限速器；
+#            每个任务有自己的上下文，source_keyword_var 互不影响；
+#            多个关键词搜到同一个帖子时只抓取、存储一次，存储时 source_keyword 记录已经命中的关键词，
+#            存储之后才命中的关键词记录在 NoteKeywordIndex；每个关键词的数量只计算存储成功的帖子
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional
+
+import config
+from async_sqlite_db import AsyncSqliteDB
+from tools import utils
+from var import source_keyword_var
+
+_CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS crawler_note_keyword (
+    platform TEXT NOT NULL,
+    note_id TEXT NOT NULL,
+    keyword TEXT NOT NULL,
+    PRIMARY KEY (platform, note_id, keyword)
+);
+"""
+
+
+class NoteKeywordIndex:
+    def __init__(self, platform: str, db_path: Optional[str] = None):
+        """
+        记录被多个关键词搜到的帖子命中了哪些关键词。帖子只存储一次，存储之后才搜到它的关键词不会出现在
+        source_keyword 里，csv/json/jsonl 这类追加写入的存储也不能再改写那一行，所以单独记录在这里
+        Args:
+            platform: 平台名称
+            db_path: SQLite 文件路径
+        """
+        self.platform = platform
+        self.db_path = db_path or config.NOTE_KEYWORD_DB_PATH
+        self._db: Optional[AsyncSqliteDB] = None
+
+    async def add(self, note_id: str, keywords: List[str]):
+        """
+        记录帖子命中的关键词，已经记录过的跳过
+        Args:
+            note_id: 帖子ID
+            keywords: 命中的关键词
+
+        Returns:
+
+        """
+        if self._db is None:
+            db = AsyncSqliteDB(self.db_path)
+            await db.executescript(_CREATE_TABLE_SQL)
+            self._db = db
+        for keyword in keywords:
+            await self._db.execute(
+                "INSERT OR IGNORE INTO crawler_note_keyword (platform, note_id, keyword) VALUES (?, ?, ?)",
+                self.platform, str(note_id), keyword
+            )
+
+    async def close(self):
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+
+_note_keyword_indexes: Dict[str, NoteKeywordIndex] = {}
+
+
+def get_note_keyword_index(platform: str) -> NoteKeywordIndex:
+    """
+    获取平台对应的帖子关键词记录，同一个平台共用
+    """
+    index = _note_keyword_indexes.get(platform)
+    if index is None:
+        index = NoteKeywordIndex(platform)
+        _note_keyword_indexes[platform] = index
+    return index
+
+
+async def close_note_keyword_indexes():
+    """
+    关闭所有平台的帖子关键词记录
+    """
+    for index in _note_keyword_indexes.values():
+        try:
+            await index.close()
+        except Exception as e:
+            utils.logger.error(f"[close_note_keyword_indexes] close note keyword index {index.platform} error: {e}")
+
+
+class KeywordNotes:
+    def __init__(self, max_notes_count: Optional[int] = None, budget_scope: Optional[str] = None,
+                 platform: Optional[str] = None):
+        """
+        Args:
+            max_notes_count: 最多抓取的帖子数量
+            budget_scope: keyword 表示每个关键词各自计数，global 表示所有关键词共用一个数量
+            platform: 平台名称，传入时把被多个关键词搜到的帖子记录到 NoteKeywordIndex
+        """
+        self.max_notes_count = config.CRAWLER_MAX_NOTES_COUNT if max_notes_count is None else max_notes_count
+        self.budget_scope = budget_scope or config.CRAWLER_MAX_NOTES_COUNT_SCOPE
+        self.keyword_index = get_note_keyword_index(platform) if platform else None
+        # 已经存储成功的帖子数量
+        self._counts: Dict[str, int] = {}
+        # 已经登记、还没有存储完成的帖子，帖子ID -> 计数的 key
+        self._pending: Dict[str, str] = {}
+        self._note_keywords: Dict[str, List[str]] = {}
+        self._changed: Optional[asyncio.Condition] = None
+
+    def _budget_key(self, keyword: str) -> str:
+        return "" if self.budget_scope == "global" else keyword
+
+    def _get_changed(self) -> asyncio.Condition:
+        if self._changed is None:
+            self._changed = asyncio.Condition()
+        return self._changed
+
+    def _pending_count(self, budget_key: str) -> int:
+        return sum(1 for key in self._pending.values() if key == budget_key)
+
+    def is_exhausted(self, keyword: str) -> bool:
+        """
+        关键词（global 模式下为所有关键词）已经存储和正在处理的帖子数量是否已经达到上限
+        """
+        budget_key = self._budget_key(keyword)
+        return self._counts.get(budget_key, 0) + self._pending_count(budget_key) >= self.max_notes_count
+
+    async def wait_budget(self, keyword: str) -> bool:
+        """
+        关键词是否还能继续登记帖子。正在处理的帖子先占着名额，名额被占满时等它们存储完成或失败之后再判断
+        Args:
+            keyword: 搜索关键词
+
+        Returns:
+            False 表示存储成功的帖子数量已经达到上限
+        """
+        budget_key = self._budget_key(keyword)
+        changed = self._get_changed()
+        async with changed:
+            await changed.wait_for(
+                lambda: self._counts.get(budget_key, 0) >= self.max_notes_count or not self.is_exhausted(keyword)
+            )
+        return not self.is_exhausted(keyword)
+
+    async def claim(self, note_id: str, keyword: str) -> bool:
+        """
+        登记关键词搜到的帖子，登记的帖子占一个名额，存储成功之后才计入关键词的数量
+        Args:
+            note_id: 帖子ID
+            keyword: 搜索关键词
+
+        Returns:
+            True 表示第一次搜到，需要抓取和存储；False 表示其他关键词已经登记过，只记录命中的关键词，不再重复存储
+        """
+        keywords = self._note_keywords.get(note_id)
+        if keywords is not None:
+            if keyword not in keywords:
+                keywords.append(keyword)
+                if self.keyword_index is not None:
+                    await self.keyword_index.add(note_id, keywords)
+            return False
+        self._note_keywords[note_id] = [keyword]
+        self._pending[note_id] = self._budget_key(keyword)
+        return True
+
+    async def finish(self, note_id: str, stored: bool):
+        """
+        登记过的帖子处理结束，存储成功时计入关键词的数量，失败或跳过时释放名额，重复调用时忽略
+        Args:
+            note_id: 帖子ID
+            stored: 是否存储成功
+
+        Returns:
+
+        """
+        budget_key = self._pending.pop(note_id, None)
+        if budget_key is None:
+            return
+        if stored:
+            self._counts[budget_key] = self._counts.get(budget_key, 0) + 1
+        changed = self._get_changed()
+        async with changed:
+            changed.notify_all()
+
+    async def release(self, note_id: str):
+        """
+        登记过的帖子没有存储（详情请求失败、最近已经抓取过等），释放名额
+        """
+        await self.finish(note_id, stored=False)
+
+    @asynccontextmanager
+    async def storing(self, note_id: str) -> AsyncIterator[None]:
+        """
+        存储登记过的帖子：source_keyword 换成命中的所有关键词，正常结束时计入关键词的数量，出错时释放名额
+        """
+        try:
+            with self.keyword_context(note_id):
+                yield
+        except BaseException:
+            await self.release(note_id)
+            raise
+        await self.finish(note_id, stored=True)
+
+    def keywords_of(self, note_id: str) -> str:
+        """
+        帖子命中的所有关键词，逗号分隔
+        """
+        return ",".join(self._note_keywords.get(note_id, []))
+
+    @contextmanager
+    def keyword_context(self, note_id: str) -> Iterator[None]:
+        """
+        存储帖子时把 source_keyword 换成命中的所有关键词
+        """
+        keywords = self.keywords_of(note_id)
+        if not keywords:
+            yield
+            return
+        token = source_keyword_var.set(keywords)
+        try:
+            yield
+        finally:
+            source_keyword_var.reset(token)
+
+
+def split_keywords(keywords: str) -> List[str]:
+    """
+    拆分逗号分隔的关键词，去掉空白和重复的关键词
+    """
+    result: List[str] = []
+    for keyword in keywords.split(","):
+        keyword = keyword.strip()
+        if keyword and keyword not in result:
+            result.append(keyword)
+    return result
+
+
+async def run_keyword_workers(keywords: List[str], search_keyword: Callable[[str], Awaitable[None]],
+                              workers: Optional[int] = None):
+    """
+    同时搜索多个关键词
+    Args:
+        keywords: 关键词列表
+        search_keyword: 搜索单个关键词的协程函数
+        workers: 同时搜索的关键词数量，1 表示逐个关键词搜索
+
+    Returns:
+
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    for keyword in keywords:
+        queue.put_nowait(keyword)
+
+    async def worker():
+        while not queue.empty():
+            keyword = queue.get_nowait()
+            # 每个任务有自己的上下文，这里设置的关键词只影响当前任务
+            source_keyword_var.set(keyword)
+            try:
+                await search_keyword(keyword)
+            except Exception as e:
+                utils.logger.error(f"[run_keyword_workers] search keyword: {keyword} error: {e}")
+
+    workers = max(min(workers or config.KEYWORD_WORKERS, len(keywords)), 1)
+    await asyncio.gather(*[asyncio.create_task(worker()) for _ in range(workers)])
@@ -0,0 +1,321 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 媒体文件流式下载
+#            之前下载图片、视频时先把 response.content 整个读进内存再写文件，几个视频同时下载时内存占用很高；
+#            这里用 httpx 的流式响应按块写入同目录下的临时文件，下载完成后原子重命名为目标文件，
+#            每个下载占用的内存只有一个块的大小，下载中断不会留下不完整的目标文件；
+#            大文件（视频）支持分段下载：先探测文件大小和是否支持 Range，按字节区间多个连接并发下载到同一个临时文件，
+#            各分段进度记录在旁边的清单文件里，连接断开或程序退出后下次从已下载的位置继续，最后校验文件大小
+import asyncio
+import json
+import os
+import pathlib
+import re
+import time
+from typing import List, Optional, Tuple
+
+import aiofiles
+import httpx
+
+import config
+from tools import utils
+
+# 临时文件后缀
+TEMP_FILE_SUFFIX = ".part"
+
+# 分段下载进度清单文件后缀
+MANIFEST_FILE_SUFFIX = ".part.json"
+
+# 每个分段每下载多少字节保存一次清单
+MANIFEST_SAVE_BYTES = 4 * 1024 * 1024
+
+
+class DownloadProgress:
+    def __init__(self, url: str, total_bytes: Optional[int], report_interval: float):
+        """
+        单个文件的下载进度和速度统计
+        Args:
+            url: 下载地址
+            total_bytes: 文件大小，响应头没有 Content-Length 时为 None
+            report_interval: 输出进度日志的间隔（秒），<=0 表示只在下载完成时输出
+        """
+        self.url = url
+        self.total_bytes = total_bytes
+        self.report_interval = report_interval
+        self.downloaded_bytes = 0
+        # 断点续传时已经下载好的字节数，不计入下载速度
+        self.resumed_bytes = 0
+        self.start_time = time.monotonic()
+        self._last_report_time = self.start_time
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start_time
+
+    @property
+    def speed(self) -> float:
+        """
+        平均下载速度（字节/秒）
+        """
+        return (self.downloaded_bytes - self.resumed_bytes) / max(self.elapsed, 1e-6)
+
+    def _describe(self) -> str:
+        downloaded_mb = self.downloaded_bytes / 1024 / 1024
+        if self.total_bytes:
+            percent = self.downloaded_bytes * 100 / self.total_bytes
+            size = f"{downloaded_mb:.2f}/{self.total_bytes / 1024 / 1024:.2f}MB ({percent:.1f}%)"
+        else:
+            size = f"{downloaded_mb:.2f}MB"
+        return f"{size}, {self.speed / 1024 / 1024:.2f}MB/s, {self.elapsed:.1f}s"
+
+    def update(self, chunk_size: int):
+        self.downloaded_bytes += chunk_size
+        now = time.monotonic()
+        if self.report_interval > 0 and now - self._last_report_time >= self.report_interval:
+            self._last_report_time = now
+            utils.logger.info(f"[DownloadProgress] downloading {self.url}: {self._describe()}")
+
+    def finish(self, save_file_name: str):
+        utils.logger.info(f"[DownloadProgress] saved {save_file_name}: {self._describe()}")
+
+
+async def stream_download(client: httpx.AsyncClient, url: str, save_file_name: str,
+                          chunk_size: Optional[int] = None, **kwargs) -> bool:
+    """
+    流式下载文件：按块写入临时文件，下载完成后重命名为目标文件
+    Args:
+        client: httpx 客户端
+        url: 下载地址
+        save_file_name: 保存的文件路径，目录不存在时自动创建
+        chunk_size: 每次读取写入的块大小（字节），默认 MEDIA_DOWNLOAD_CHUNK_SIZE
+        **kwargs: 其他请求参数，例如 headers、timeout
+
+    Returns:
+        是否下载成功
+    """
+    chunk_size = chunk_size or config.MEDIA_DOWNLOAD_CHUNK_SIZE
+    pathlib.Path(save_file_name).parent.mkdir(parents=True, exist_ok=True)
+    temp_file_name = save_file_name + TEMP_FILE_SUFFIX
+    try:
+        async with client.stream("GET", url, **kwargs) as response:
+            if response.status_code != 200:
+                utils.logger.error(
+                    f"[stream_download] request {url} err, status code: {response.status_code}"
+                )
+                return False
+            content_length = response.headers.get("Content-Length")
+            progress = DownloadProgress(
+                url, int(content_length) if content_length and content_length.isdigit() else None,
+                config.MEDIA_DOWNLOAD_PROGRESS_INTERVAL
+            )
+            async with aiofiles.open(temp_file_name, "wb") as f:
+                async for chunk in response.aiter_bytes(chunk_size):
+                    await f.write(chunk)
+                    progress.update(len(chunk))
+        os.replace(temp_file_name, save_file_name)
+        progress.finish(save_file_name)
+        return True
+    except BaseException:
+        # 下载失败或被取消时删除临时文件，不留下不完整的文件
+        if os.path.exists(temp_file_name):
+            os.remove(temp_file_name)
+        raise
+
+
+class _RangeManifest:
+    def __init__(self, manifest_file_name: str, total_bytes: int, parts: List[List[int]]):
+        """
+        分段下载进度清单
+        Args:
+            manifest_file_name: 清单文件路径
+            total_bytes: 文件大小
+            parts: 每个分段的 [起始位置, 结束位置（包含）, 已下载字节数]
+        """
+        self.manifest_file_name = manifest_file_name
+        self.total_bytes = total_bytes
+        self.parts = parts
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def load_or_create(cls, manifest_file_name: str, temp_file_name: str, total_bytes: int,
+                       connections: int) -> "_RangeManifest":
+        """
+        读取上次的清单，文件大小不一致或者临时文件不存在时重新划分分段
+        """
+        if os.path.exists(manifest_file_name) and os.path.exists(temp_file_name):
+            try:
+                with open(manifest_file_name, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("total_bytes") == total_bytes and os.path.getsize(temp_file_name) == total_bytes:
+                    return cls(manifest_file_name, total_bytes, data["parts"])
+            except (ValueError, KeyError, OSError) as e:
+                utils.logger.warning(f"[_RangeManifest] invalid manifest {manifest_file_name}, restart download: {e}")
+        part_size = -(-total_bytes // connections)
+        parts = [[start, min(start + part_size, total_bytes) - 1, 0] for start in range(0, total_bytes, part_size)]
+        # 预先创建和目标大小一致的临时文件，各分段直接写到自己的位置
+        with open(temp_file_name, "wb") as f:
+            f.truncate(total_bytes)
+        return cls(manifest_file_name, total_bytes, parts)
+
+    @property
+    def downloaded_bytes(self) -> int:
+        return sum(part[2] for part in self.parts)
+
+    @property
+    def completed(self) -> bool:
+        return all(part[2] >= part[1] - part[0] + 1 for part in self.parts)
+
+    async def save(self):
+        async with self._lock:
+            temp_manifest = self.manifest_file_name + ".tmp"
+            async with aiofiles.open(temp_manifest, "w", encoding="utf-8") as f:
+                await f.write(json.dumps({"total_bytes": self.total_bytes, "parts": self.parts}))
+            os.replace(temp_manifest, self.manifest_file_name)
+
+    def remove(self):
+        if os.path.exists(self.manifest_file_name):
+            os.remove(self.manifest_file_name)
+
+
+_connection_loop: Optional[asyncio.AbstractEventLoop] = None
+_connection_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def _get_connection_semaphore() -> asyncio.Semaphore:
+    """
+    所有分段下载共用的连接数上限，信号量绑定在事件循环上，换了事件循环时重新创建
+    """
+    global _connection_loop, _connection_semaphore
+    loop = asyncio.get_running_loop()
+    if _connection_semaphore is None or _connection_loop is not loop:
+        _connection_semaphore = asyncio.Semaphore(max(config.MEDIA_DOWNLOAD_MAX_CONNECTIONS, 1))
+        _connection_loop = loop
+    return _connection_semaphore
+
+
+def _with_range(kwargs: dict, start: int, end: int) -> dict:
+    """
+    在请求参数的 headers 里加上 Range
+    """
+    kwargs = dict(kwargs)
+    headers = dict(kwargs.get("headers") or {})
+    headers["Range"] = f"bytes={start}-{end}"
+    kwargs["headers"] = headers
+    return kwargs
+
+
+async def probe_range_support(client: httpx.AsyncClient, url: str, **kwargs) -> Tuple[Optional[int], bool]:
+    """
+    请求第一个字节，探测文件大小以及服务端是否支持 Range
+    Args:
+        client: httpx 客户端
+        url: 下载地址
+        **kwargs: 其他请求参数
+
+    Returns:
+        (文件大小, 是否支持 Range)，探测失败时文件大小为 None
+    """
+    async with client.stream("GET", url, **_with_range(kwargs, 0, 0)) as response:
+        if response.status_code == 206:
+            match = re.search(r"/(\d+)$", response.headers.get("Content-Range", ""))
+            if match:
+                return int(match.group(1)), True
+        if response.status_code == 200:
+            content_length = response.headers.get("Content-Length", "")
+            return (int(content_length) if content_length.isdigit() else None), False
+        return None, False
+
+
+async def _download_range(client: httpx.AsyncClient, url: str, temp_file_name: str, part: List[int],
+                          manifest: _RangeManifest, progress: DownloadProgress, chunk_size: int, **kwargs):
+    """
+    下载一个分段，连接断开时从该分段已下载的位置重试
+    """
+    start, end = part[0], part[1]
+    part_size = end - start + 1
+    for attempt in range(config.MEDIA_RANGE_RETRIES + 1):
+        if part[2] >= part_size:
+            return
+        saved_bytes = part[2]
+        try:
+            async with _get_connection_semaphore():
+                async with client.stream("GET", url, **_with_range(kwargs, start + part[2], end)) as response:
+                    if response.status_code != 206:
+                        utils.logger.error(
+                            f"[_download_range] request {url} range {start}-{end} err, status code: {response.status_code}"
+                        )
+                        return
+                    async with aiofiles.open(temp_file_name, "r+b") as f:
+                        await f.seek(start + part[2])
+                        async for chunk in response.aiter_bytes(chunk_size):
+                            chunk = chunk[:part_size - part[2]]
+                            await f.write(chunk)
+                            part[2] += len(chunk)
+                            progress.update(len(chunk))
+                            if part[2] - saved_bytes >= MANIFEST_SAVE_BYTES:
+                                saved_bytes = part[2]
+                                await manifest.save()
+        except httpx.HTTPError as e:
+            utils.logger.warning(
+                f"[_download_range] download {url} range {start}-{end} err, attempt {attempt + 1}, "
+                f"downloaded {part[2]}/{part_size} bytes: {e}"
+            )
+        finally:
+            await manifest.save()
+
+
+async def ranged_download(client: httpx.AsyncClient, url: str, save_file_name: str,
+                          connections: Optional[int] = None, chunk_size: Optional[int] = None, **kwargs) -> bool:
+    """
+    分段并发下载大文件，支持断点续传；服务端不支持 Range 或者文件较小时退化为单连接流式下载
+    Args:
+        client: httpx 客户端
+        url: 下载地址
+        save_file_name: 保存的文件路径，目录不存在时自动创建
+        connections: 单个文件的并发连接数，默认 MEDIA_RANGE_CONNECTIONS_PER_FILE
+        chunk_size: 每次读取写入的块大小（字节），默认 MEDIA_DOWNLOAD_CHUNK_SIZE
+        **kwargs: 其他请求参数，例如 headers、timeout
+
+    Returns:
+        是否下载成功，失败时保留临时文件和清单，下次下载同一个文件时继续
+    """
+    connections = connections or config.MEDIA_RANGE_CONNECTIONS_PER_FILE
+    chunk_size = chunk_size or config.MEDIA_DOWNLOAD_CHUNK_SIZE
+    total_bytes, accept_ranges = await probe_range_support(client, url, **kwargs)
+    if not accept_ranges or not total_bytes or total_bytes < config.MEDIA_RANGE_MIN_SIZE:
+        return await stream_download(client, url, save_file_name, chunk_size=chunk_size, **kwargs)
+
+    pathlib.Path(save_file_name).parent.mkdir(parents=True, exist_ok=True)
+    temp_file_name = save_file_name + TEMP_FILE_SUFFIX
+    manifest = _RangeManifest.load_or_create(
+        save_file_name + MANIFEST_FILE_SUFFIX, temp_file_name, total_bytes, max(connections, 1)
+    )
+    progress = DownloadProgress(url, total_bytes, config.MEDIA_DOWNLOAD_PROGRESS_INTERVAL)
+    progress.downloaded_bytes = progress.resumed_bytes = manifest.downloaded_bytes
+    if progress.resumed_bytes:
+        utils.logger.info(f"[ranged_download] resume {save_file_name} from {progress.resumed_bytes}/{total_bytes} bytes")
+    await asyncio.gather(*[
+        _download_range(client, url, temp_file_name, part, manifest, progress, chunk_size, **kwargs)
+        for part in manifest.parts
+    ])
+
+    if not manifest.completed or os.path.getsize(temp_file_name) != total_bytes:
+        utils.logger.error(
+            f"[ranged_download] download {url} incomplete, {manifest.downloaded_bytes}/{total_bytes} bytes, "
+            f"keep {temp_file_name} for resume"
+        )
+        return False
+    os.replace(temp_file_name, save_file_name)
+    manifest.remove()
+    progress.finish(save_file_name)
+    return True
@@ -0,0 +1,255 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 按资源ID保存的媒体文件库
+#            之前图片、视频按帖子目录保存（data/xhs/images/<note_id>/<n>.jpg），每次运行都重新下载覆盖，
+#            多个帖子引用同一个 CDN 资源时也会各存一份；
+#            这里按平台稳定的资源ID（小红书 trace id、微博 pid、B站 cid）把文件只保存一份，
+#            在 SQLite 里记录资源信息和帖子到资源的索引，已经存在的资源在发起任何请求之前就跳过，
+#            原来的帖子目录下用硬链接指向资源文件，目录结构保持不变且不额外占用磁盘
+import asyncio
+import hashlib
+import os
+import pathlib
+import re
+import shutil
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import config
+from async_sqlite_db import AsyncSqliteDB
+from tools import utils
+
+_CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS crawler_media_asset (
+    platform TEXT NOT NULL,
+    asset_id TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT DEFAULT NULL,
+    created_at INTEGER NOT NULL,
+    PRIMARY KEY (platform, asset_id)
+);
+CREATE TABLE IF NOT EXISTS crawler_media_note_asset (
+    platform TEXT NOT NULL,
+    note_id TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    asset_id TEXT NOT NULL,
+    PRIMARY KEY (platform, note_id, file_name)
+);
+"""
+
+
+def _file_sha256(file_name: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(file_name, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+class MediaStore:
+    def __init__(self, platform: str, asset_dir: Optional[str] = None, db_path: Optional[str] = None,
+                 enabled: Optional[bool] = None, verify_hash: Optional[bool] = None):
+        """
+        Args:
+            platform: 平台名称
+            asset_dir: 资源文件保存目录
+            db_path: 资源索引的 SQLite 文件路径
+            enabled: 是否开启，关闭时直接下载到帖子目录
+            verify_hash: 是否记录并校验资源文件的 sha256，校验失败的资源重新下载
+        """
+        self.platform = platform
+        self.asset_dir = asset_dir or os.path.join(config.MEDIA_STORE_DIR, platform)
+        self.db_path = db_path or config.MEDIA_STORE_DB_PATH
+        self.enabled = config.ENABLE_MEDIA_STORE if enabled is None else enabled
+        self.verify_hash = config.MEDIA_STORE_VERIFY_HASH if verify_hash is None else verify_hash
+        self._db: Optional[AsyncSqliteDB] = None
+        self._asset_locks: Dict[str, asyncio.Lock] = {}
+        # 每个资源锁上正在持有或等待的协程数，降到 0 时删掉锁，避免锁字典随资源数一直增长
+        self._asset_lock_users: Dict[str, int] = {}
+        # 统计信息
+        self.downloaded = 0
+        self.skipped = 0
+
+    async def _get_db(self) -> AsyncSqliteDB:
+        if self._db is None:
+            db = AsyncSqliteDB(self.db_path)
+            await db.executescript(_CREATE_TABLE_SQL)
+            self._db = db
+        return self._db
+
+    def asset_file_name(self, asset_id: str, extension: str) -> str:
+        """
+        资源文件路径，按资源ID前两个字符分目录，避免单个目录文件过多
+        Args:
+            asset_id: 资源ID
+            extension: 文件后缀，例如 .jpg
+
+        Returns:
+
+        """
+        safe_asset_id = re.sub(r"[^\w.-]", "_", asset_id)
+        return os.path.join(self.asset_dir, safe_asset_id[:2], f"{safe_asset_id}{extension}")
+
+    async def _is_present(self, asset_id: str, asset_file_name: str) -> bool:
+        """
+        资源是否已经完整保存过
+        """
+        db = await self._get_db()
+        row = await db.get_first(
+            "SELECT size, sha256 FROM crawler_media_asset WHERE platform=? AND asset_id=?", self.platform, asset_id
+        )
+        if not row or not os.path.exists(asset_file_name) or os.path.getsize(asset_file_name) != row["size"]:
+            return False
+        if self.verify_hash and row["sha256"]:
+            sha256 = await asyncio.get_running_loop().run_in_executor(None, _file_sha256, asset_file_name)
+            if sha256 != row["sha256"]:
+                utils.logger.warning(f"[MediaStore] asset {asset_file_name} sha256 mismatch, download again")
+                return False
+        return True
+
+    async def _record_asset(self, asset_id: str, asset_file_name: str):
+        sha256 = None
+        if self.verify_hash:
+            sha256 = await asyncio.get_running_loop().run_in_executor(None, _file_sha256, asset_file_name)
+        db = await self._get_db()
+        await db.execute(
+            "INSERT OR REPLACE INTO crawler_media_asset (platform, asset_id, file_name, size, sha256, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            self.platform, asset_id, asset_file_name, os.path.getsize(asset_file_name), sha256, int(time.time())
+        )
+
+    @staticmethod
+    def _link(asset_file_name: str, note_file_name: str):
+        """
+        在帖子目录下创建指向资源文件的硬链接，文件系统不支持硬链接时复制一份
+        """
+        pathlib.Path(note_file_name).parent.mkdir(parents=True, exist_ok=True)
+        if os.path.exists(note_file_name):
+            if os.path.samefile(asset_file_name, note_file_name):
+                return
+            os.remove(note_file_name)
+        try:
+            os.link(asset_file_name, note_file_name)
+        except OSError:
+            shutil.copyfile(asset_file_name, note_file_name)
+
+    @asynccontextmanager
+    async def _asset_lock(self, asset_id: str):
+        """
+        按资源ID加锁，最后一个使用者释放后把锁从字典里删掉
+        Args:
+            asset_id: 资源ID
+
+        Returns:
+
+        """
+        lock = self._asset_locks.setdefault(asset_id, asyncio.Lock())
+        self._asset_lock_users[asset_id] = self._asset_lock_users.get(asset_id, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._asset_lock_users[asset_id] -= 1
+            if not self._asset_lock_users[asset_id]:
+                del self._asset_lock_users[asset_id]
+                del self._asset_locks[asset_id]
+
+    async def fetch(self, note_id: str, asset_id: str, note_file_name: str,
+                    download: Callable[[str], Awaitable[bool]]) -> bool:
+        """
+        获取帖子的一个媒体资源：资源已经存在时跳过下载，否则调用 download 下载到资源目录，
+        然后在帖子目录下链接到资源文件并记录帖子到资源的索引
+        Args:
+            note_id: 帖子ID
+            asset_id: 资源ID，为空时按原来的方式直接下载到帖子目录
+            note_file_name: 帖子目录下的文件路径
+            download: 下载函数，参数是保存的文件路径，返回是否下载成功
+
+        Returns:
+            是否获取成功
+        """
+        if not self.enabled or not asset_id:
+            return await download(note_file_name)
+        asset_id = str(asset_id)
+        asset_file_name = self.asset_file_name(asset_id, os.path.splitext(note_file_name)[1])
+        # 多个帖子同时引用同一个资源时只下载一次
+        async with self._asset_lock(asset_id):
+            if await self._is_present(asset_id, asset_file_name):
+                self.skipped += 1
+                utils.logger.info(f"[MediaStore.fetch] asset {asset_id} already saved, skip download")
+            else:
+                if not await download(asset_file_name):
+                    return False
+                await self._record_asset(asset_id, asset_file_name)
+                self.downloaded += 1
+        self._link(asset_file_name, note_file_name)
+        db = await self._get_db()
+        await db.execute(
+            "INSERT OR REPLACE INTO crawler_media_note_asset (platform, note_id, file_name, asset_id) VALUES (?, ?, ?, ?)",
+            self.platform, str(note_id), note_file_name, asset_id
+        )
+        return True
+
+    async def note_assets(self, note_id: str) -> List[Dict]:
+        """
+        查询帖子引用的资源
+        Args:
+            note_id: 帖子ID
+
+        Returns:
+            帖子目录下的文件路径、资源ID和资源文件路径
+        """
+        db = await self._get_db()
+        return await db.query(
+            "SELECT n.file_name, n.asset_id, a.file_name AS asset_file_name, a.size FROM crawler_media_note_asset n "
+            "LEFT JOIN crawler_media_asset a ON a.platform=n.platform AND a.asset_id=n.asset_id "
+            "WHERE n.platform=? AND n.note_id=? ORDER BY n.file_name",
+            self.platform, str(note_id)
+        )
+
+    async def close(self):
+        if self._db is not None:
+            if self.downloaded or self.skipped:
+                utils.logger.info(
+                    f"[MediaStore] platform {self.platform} downloaded {self.downloaded} assets, "
+                    f"skipped {self.skipped} existing assets"
+                )
+            await self._db.close()
+            self._db = None
+
+
+_media_stores: Dict[str, MediaStore] = {}
+
+
+def get_media_store(platform: str) -> MediaStore:
+    """
+    获取平台对应的媒体文件库，同一个平台共用
+    """
+    store = _media_stores.get(platform)
+    if store is None:
+        store = MediaStore(platform)
+        _media_stores[platform] = store
+    return store
+
+
+async def close_media_stores():
+    """
+    关闭所有平台的媒体文件库
+    """
+    for store in _media_stores.values():
+        try:
+            await store.close()
+        except Exception as e:
+            utils.logger.error(f"[close_media_stores] close media store {store.platform} error: {e}")
@@ -0,0 +1,240 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 自适应限速器
+#            按 平台 + 接口 + 账号/代理 维护令牌桶，请求前先取令牌；速率按 AIMD 调整：
+#            连续成功一定次数后加性提速，遇到封禁、验证码等信号时乘性降速，替代各处固定的随机 sleep
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Tuple, Type
+from urllib.parse import urlparse
+
+import config
+from tools import utils
+
+
+class AdaptiveTokenBucket:
+    def __init__(self, rate: float, burst: float, min_rate: float, max_rate: float,
+                 increase_step: float, decrease_factor: float, success_threshold: int):
+        """
+        Args:
+            rate: 初始速率，每秒请求数
+            burst: 令牌桶容量，允许的突发请求数
+            min_rate: 速率下限
+            max_rate: 速率上限
+            increase_step: 每次提速增加的速率（加性增）
+            decrease_factor: 降速时速率乘以的系数（乘性减）
+            success_threshold: 连续成功多少次后提速一次
+        """
+        self.min_rate = min_rate
+        self.max_rate = max(max_rate, min_rate)
+        self.rate = min(max(rate, self.min_rate), self.max_rate)
+        self.burst = max(burst, 1.0)
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.success_threshold = max(success_threshold, 1)
+        self.tokens = self.burst
+        self._last_refill_time = time.monotonic()
+        self._success_count = 0
+        # 统计信息
+        self.acquired = 0
+        self.successes = 0
+        self.failures = 0
+        self.total_wait_time = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._last_refill_time) * self.rate)
+        self._last_refill_time = now
+
+    def reserve(self) -> float:
+        """
+        预占一个令牌，返回需要等待的秒数
+        令牌数允许为负，表示已经被排队中的请求预占，后来的请求依次排在后面，不需要加锁
+        """
+        self._refill()
+        self.tokens -= 1
+        self.acquired += 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    async def acquire(self):
+        wait_time = self.reserve()
+        if wait_time > 0:
+            self.total_wait_time += wait_time
+            await asyncio.sleep(wait_time)
+
+    def on_success(self):
+        self.successes += 1
+        self._success_count += 1
+        if self._success_count >= self.success_threshold:
+            self._success_count = 0
+            self._refill()
+            self.rate = min(self.rate + self.increase_step, self.max_rate)
+
+    def on_failure(self):
+        self.failures += 1
+        self._success_count = 0
+        self._refill()
+        self.rate = max(self.rate * self.decrease_factor, self.min_rate)
+        # 清空已经积攒的令牌，降速立即生效
+        self.tokens = min(self.tokens, 0.0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rate": round(self.rate, 3),
+            "acquired": self.acquired,
+            "successes": self.successes,
+            "failures": self.failures,
+            "wait_time_s": round(self.total_wait_time, 3),
+        }
+
+
+class RateLimitSlot:
+    """
+    limit() 上下文中拿到的对象，请求没有抛出异常但识别到了限流信号时调用 throttled()
+    """
+
+    def __init__(self):
+        self.is_throttled = False
+
+    def throttled(self):
+        self.is_throttled = True
+
+
+class RateLimiter:
+    def __init__(self, platform: str, throttle_errors: Tuple[Type[BaseException], ...] = ()):
+        """
+        Args:
+            platform: 平台名称
+            throttle_errors: 表示被限流/封禁的异常类型，请求抛出这些异常时降速
+        """
+        self.platform = platform
+        self.throttle_errors = throttle_errors
+        self._buckets: Dict[Tuple[str, str], AdaptiveTokenBucket] = {}
+
+    @staticmethod
+    def _endpoint_key(url: str) -> str:
+        return urlparse(url).path or url
+
+    @staticmethod
+    def _identity_key(identity: Any) -> str:
+        if not identity:
+            return ""
+        if isinstance(identity, str):
+            return identity
+        return json.dumps(identity, sort_keys=True, default=str)
+
+    def get_bucket(self, url: str, identity: Any = None) -> AdaptiveTokenBucket:
+        """
+        获取 接口 + 账号/代理 对应的令牌桶
+        Args:
+            url: 请求地址，按 path 区分接口
+            identity: 账号或者代理
+
+        Returns:
+
+        """
+        key = (self._endpoint_key(url), self._identity_key(identity))
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = AdaptiveTokenBucket(
+                rate=config.RATE_LIMIT_INITIAL_RATE,
+                burst=config.RATE_LIMIT_BURST,
+                min_rate=config.RATE_LIMIT_MIN_RATE,
+                max_rate=config.RATE_LIMIT_MAX_RATE,
+                increase_step=config.RATE_LIMIT_INCREASE_STEP,
+                decrease_factor=config.RATE_LIMIT_DECREASE_FACTOR,
+                success_threshold=config.RATE_LIMIT_SUCCESS_THRESHOLD,
+            )
+            self._buckets[key] = bucket
+        return bucket
+
+    @asynccontextmanager
+    async def limit(self, url: str, identity: Any = None) -> AsyncIterator[RateLimitSlot]:
+        """
+        请求前取令牌，请求结束后根据结果调整速率
+        Args:
+            url: 请求地址
+            identity: 账号或者代理
+
+        Returns:
+
+        """
+        slot = RateLimitSlot()
+        if not config.ENABLE_RATE_LIMIT:
+            yield slot
+            return
+
+        bucket = self.get_bucket(url, identity)
+        await bucket.acquire()
+        try:
+            yield slot
+        except BaseException as e:
+            if slot.is_throttled or isinstance(e, self.throttle_errors):
+                self._on_throttled(bucket, url)
+            raise
+        if slot.is_throttled:
+            self._on_throttled(bucket, url)
+        else:
+            bucket.on_success()
+
+    def _on_throttled(self, bucket: AdaptiveTokenBucket, url: str):
+        bucket.on_failure()
+        utils.logger.warning(
+            f"[RateLimiter] {self.platform} {self._endpoint_key(url)} throttled, slow down to {bucket.rate:.3f} req/s"
+        )
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            f"{endpoint}|{identity}" if identity else endpoint: bucket.stats()
+            for (endpoint, identity), bucket in self._buckets.items()
+        }
+
+
+_rate_limiters: Dict[str, RateLimiter] = {}
+
+
+def get_rate_limiter(platform: str, throttle_errors: Optional[Tuple[Type[BaseException], ...]] = None) -> RateLimiter:
+    """
+    获取平台对应的限速器，同一个平台的所有客户端共用，令牌桶按接口和账号/代理区分
+    Args:
+        platform: 平台名称
+        throttle_errors: 表示被限流/封禁的异常类型
+
+    Returns:
+
+    """
+    limiter = _rate_limiters.get(platform)
+    if limiter is None:
+        limiter = RateLimiter(platform, throttle_errors or ())
+        _rate_limiters[platform] = limiter
+    elif throttle_errors:
+        limiter.throttle_errors = throttle_errors
+    return limiter
+
+
+async def crawl_sleep(crawl_interval: float):
+    """
+    翻页、抓取子评论等循环之间的等待
+    开启自适应限速时请求节奏已经由令牌桶控制，这里只让出事件循环；关闭时保持原来的固定等待
+    Args:
+        crawl_interval: 关闭自适应限速时的等待秒数
+
+    Returns:
+
+    """
+    if config.ENABLE_RATE_LIMIT:
+        await asyncio.sleep(0)
+    else:
+        await asyncio.sleep(crawl_interval)
@@ -0,0 +1,159 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 已抓取ID索引
+#            同一个帖子/视频经常在多个关键词、多页搜索结果以及连续几天的运行中反复出现，每次都会重新请求详情和全部评论；
+#            这里按平台记录抓取过详情、评论的ID和抓取时间，内存中保存一份，同时写入 SQLite 文件，
+#            下次运行时加载新鲜期内的记录，新鲜期内再次遇到的帖子跳过详情和评论请求
+import asyncio
+import time
+from typing import Dict, Optional, Tuple
+
+import config
+from async_sqlite_db import AsyncSqliteDB
+from tools import utils
+
+
+class SeenKind:
+    DETAIL = "detail"
+    COMMENTS = "comments"
+
+
+_CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS crawler_seen_index (
+    platform TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    fetched_at INTEGER NOT NULL,
+    PRIMARY KEY (platform, kind, item_id)
+);
+"""
+
+
+class SeenIndex:
+    def __init__(self, platform: str, db_path: Optional[str] = None, fresh_hours: Optional[float] = None,
+                 enabled: Optional[bool] = None):
+        """
+        Args:
+            platform: 平台名称
+            db_path: 持久化的 SQLite 文件路径
+            fresh_hours: 新鲜期（小时），抓取时间在新鲜期内的帖子不再重复抓取，<=0 表示只在本次运行内去重，不读写文件
+            enabled: 是否开启，关闭时所有帖子都视为未抓取过
+        """
+        self.platform = platform
+        self.db_path = db_path or config.SEEN_INDEX_DB_PATH
+        self.fresh_seconds = (config.SEEN_INDEX_FRESH_HOURS if fresh_hours is None else fresh_hours) * 3600
+        self.enabled = config.ENABLE_SEEN_INDEX if enabled is None else enabled
+        self._seen: Dict[Tuple[str, str], float] = {}
+        self._db: Optional[AsyncSqliteDB] = None
+        self._loaded = False
+        self._load_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def persistent(self) -> bool:
+        return self.enabled and self.fresh_seconds > 0
+
+    async def _ensure_loaded(self):
+        """
+        第一次使用时建表，并加载新鲜期内的记录
+        """
+        if self._loaded or not self.persistent:
+            return
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+        async with self._load_lock:
+            if self._loaded:
+                return
+            self._db = AsyncSqliteDB(self.db_path)
+            await self._db.executescript(_CREATE_TABLE_SQL)
+            rows = await self._db.query(
+                "SELECT kind, item_id, fetched_at FROM crawler_seen_index WHERE platform=? AND fetched_at>=?",
+                self.platform, int(time.time() - self.fresh_seconds)
+            )
+            for row in rows:
+                self._seen[(row["kind"], row["item_id"])] = row["fetched_at"]
+            self._loaded = True
+            utils.logger.info(f"[SeenIndex] platform {self.platform} loaded {len(rows)} fresh records")
+
+    async def is_fresh(self, kind: str, item_id: str) -> bool:
+        """
+        帖子是否在新鲜期内抓取过
+        Args:
+            kind: 抓取的内容，详情或评论
+            item_id: 帖子ID
+
+        Returns:
+
+        """
+        if not self.enabled or not item_id:
+            return False
+        await self._ensure_loaded()
+        fetched_at = self._seen.get((kind, str(item_id)))
+        if fetched_at is None:
+            return False
+        return self.fresh_seconds <= 0 or time.time() - fetched_at < self.fresh_seconds
+
+    async def mark(self, kind: str, item_id: str):
+        """
+        记录帖子已经抓取
+        Args:
+            kind: 抓取的内容，详情或评论
+            item_id: 帖子ID
+
+        Returns:
+
+        """
+        if not self.enabled or not item_id:
+            return
+        await self._ensure_loaded()
+        now = int(time.time())
+        self._seen[(kind, str(item_id))] = now
+        if self._db is not None:
+            await self._db.execute(
+                "INSERT INTO crawler_seen_index (platform, kind, item_id, fetched_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(platform, kind, item_id) DO UPDATE SET fetched_at=excluded.fetched_at",
+                self.platform, kind, str(item_id), now
+            )
+
+    async def close(self):
+        """
+        提交未写入的记录并关闭数据库连接
+        """
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+        self._loaded = False
+
+
+_seen_indexes: Dict[str, SeenIndex] = {}
+
+
+def get_seen_index(platform: str) -> SeenIndex:
+    """
+    获取平台对应的已抓取ID索引，同一个平台共用
+    """
+    seen_index = _seen_indexes.get(platform)
+    if seen_index is None:
+        seen_index = SeenIndex(platform)
+        _seen_indexes[platform] = seen_index
+    return seen_index
+
+
+async def close_seen_indexes():
+    """
+    关闭所有平台的已抓取ID索引
+    """
+    for seen_index in _seen_indexes.values():
+        try:
+            await seen_index.close()
+        except Exception as e:
+            utils.logger.error(f"[close_seen_indexes] close seen index {seen_index.platform} error: {e}")
@@ -0,0 +1,110 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 二级评论的并发展开
+#            之前逐条一级评论、逐页串行翻二级评论，热门帖子开启 ENABLE_GET_SUB_COMMENTS 后一个帖子就要几分钟；
+#            这里多条一级评论的二级评论同时展开，每翻一页占用调度器的一个并发名额（实际请求速率仍由限速器控制），
+#            并且按帖子限制二级评论总数、按一级评论限制翻页数，避免楼中楼很深的帖子拖住整个爬取
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional, Sequence
+
+import config
+from tools import utils
+from tools.crawl_scheduler import RequestClass, SchedulerLimit, get_crawl_scheduler
+
+
+class SubCommentBudget:
+    def __init__(self, max_count: Optional[int] = None, max_pages: Optional[int] = None, host: str = "",
+                 request_class: str = RequestClass.API):
+        """
+        单个帖子的二级评论配额，同一个帖子的所有一级评论共用
+        Args:
+            max_count: 单个帖子最多爬取的二级评论数量，<=0 表示不限制
+            max_pages: 每条一级评论最多翻多少页二级评论，<=0 表示不限制
+            host: 二级评论接口的域名或者 URL，翻页时按域名占用调度器名额
+            request_class: 二级评论请求的类型，见 RequestClass
+        """
+        self.max_count = config.CRAWLER_MAX_SUB_COMMENTS_COUNT_SINGLENOTES if max_count is None else max_count
+        self.max_pages = config.CRAWLER_MAX_SUB_COMMENTS_PAGES if max_pages is None else max_pages
+        self.host = host
+        self.request_class = request_class
+        self.count = 0
+
+    @property
+    def exhausted(self) -> bool:
+        return 0 < self.max_count <= self.count
+
+    def page_allowed(self, page: int) -> bool:
+        """
+        Args:
+            page: 当前一级评论下已经翻过的页数
+
+        Returns:
+            是否还可以继续翻页
+        """
+        if self.exhausted:
+            return False
+        return self.max_pages <= 0 or page < self.max_pages
+
+    def page_limit(self) -> SchedulerLimit:
+        """
+        翻一页二级评论占用的调度器名额，拿到名额之后再调用 page_allowed 检查配额，
+        排队期间配额已经用完的一级评论就不再发出请求
+        """
+        return get_crawl_scheduler().limit(self.request_class, host=self.host)
+
+    def take(self, comments: List) -> List:
+        """
+        从配额中扣除一页二级评论，超出配额的部分丢弃
+        Args:
+            comments: 一页二级评论
+
+        Returns:
+            配额内的二级评论
+        """
+        if self.max_count > 0:
+            comments = comments[:max(self.max_count - self.count, 0)]
+        self.count += len(comments)
+        return comments
+
+
+async def expand_sub_comments(roots: Sequence[Any], expand: Callable[[Any], Awaitable[List]],
+                              budget: SubCommentBudget) -> List:
+    """
+    并发展开多条一级评论下的二级评论，并发数由调度器控制：expand 里每翻一页都要先拿到 budget.page_limit() 的名额
+    Args:
+        roots: 需要展开的一级评论
+        expand: 展开单条一级评论的协程函数，返回该评论下抓到的二级评论
+        budget: 帖子的二级评论配额
+
+    Returns:
+        按一级评论顺序合并后的二级评论
+    """
+
+    async def run(root: Any) -> List:
+        if budget.exhausted:
+            return []
+        return await expand(root)
+
+    results = await asyncio.gather(*[run(root) for root in roots], return_exceptions=True)
+    sub_comments: List = []
+    first_error: Optional[BaseException] = None
+    for result in results:
+        if isinstance(result, BaseException):
+            utils.logger.error(f"[expand_sub_comments] expand sub comments error: {result}")
+            first_error = first_error or result
+            continue
+        sub_comments.extend(result)
+    if first_error is not None:
+        # 其他一级评论已经抓完了，再把异常抛给上层（例如触发限速降速或者账号被封的处理）
+        raise first_error
+    return sub_comments
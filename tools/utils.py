@@ -10,7 +10,11 @@
 
 
 import argparse
+import asyncio
+import contextvars
 import logging
+import threading
+from typing import Any, Coroutine, Optional
 
 from .crawler_util import *
 from .slider_util import *
@@ -40,3 +44,36 @@ def str2bool(v):
         return False
     else:
         raise argparse.ArgumentTypeError('Boolean value expected.')
+
+
+def run_coroutine_sync(coro: Coroutine, context: Optional[contextvars.Context] = None) -> Any:
+    """
+    在新的事件循环中同步执行协程，用于程序退出时的清理逻辑
+    信号处理函数触发时原来的事件循环还处于运行状态，当前线程不能再启动事件循环，这时放到一个新线程里执行
+    Args:
+        coro: 要执行的协程
+        context: 执行时使用的上下文变量，默认使用当前上下文
+
+    Returns:
+
+    """
+    context = context or contextvars.copy_context()
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return context.run(asyncio.run, coro)
+
+    result = {}
+
+    def runner():
+        try:
+            result["value"] = context.run(asyncio.run, coro)
+        except BaseException as e:
+            result["error"] = e
+
+    thread = threading.Thread(target=runner, name="cleanup-loop")
+    thread.start()
+    thread.join()
+    if "error" in result:
+        raise result["error"]
+    return result.get("value")